@@ -0,0 +1,503 @@
+"""Collection artifact built once per session and shared by the environments.
+
+The sanity and galaxy environments install or import a built collection
+rather than the source tree. The tarball is built on first use into
+``.tox/.tox-ansible/artifacts/<digest>/`` where the digest covers every file
+the build reads, so it is reused until the collection sources change.
+
+The tarball is written in-process, following the file selection and the
+MANIFEST.json/FILES.json layout of ``ansible-galaxy collection build``, with
+sorted members and fixed ownership and timestamps so that the same sources
+give the same bytes. Collections using ``manifest`` directives are built by
+``ansible-galaxy``, which implements the MANIFEST.in style rules.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, NamedTuple
+
+import yaml
+
+
+if TYPE_CHECKING:
+    from tox_ansible.project import Collection
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the file selection or the builder changes the artifact content.
+ARTIFACT_FORMAT = "2"
+# Directories ``ansible-galaxy collection build`` never descends into.
+IGNORED_DIRS = frozenset({"CVS", ".bzr", ".hg", ".git", ".svn", "__pycache__", ".tox"})
+# Paths ``ansible-galaxy collection build`` always leaves out of the tarball.
+DEFAULT_IGNORE_PATTERNS = (
+    "MANIFEST.json",
+    "FILES.json",
+    "galaxy.yml",
+    "galaxy.yaml",
+    ".git",
+    "*.pyc",
+    "*.retry",
+    "tests/output",
+)
+# The galaxy.yml keys copied to MANIFEST.json, with the type they are normalized to.
+COLLECTION_INFO_KEYS = (
+    ("namespace", str),
+    ("name", str),
+    ("version", str),
+    ("authors", list),
+    ("readme", str),
+    ("tags", list),
+    ("description", str),
+    ("license", list),
+    ("license_file", str),
+    ("dependencies", dict),
+    ("repository", str),
+    ("documentation", str),
+    ("homepage", str),
+    ("issues", str),
+)
+MANDATORY_KEYS = ("namespace", "name", "version", "readme", "authors")
+MANIFEST_FORMAT = 1
+# Member timestamp, 1980-01-01 as for reproducible wheels, unless SOURCE_DATE_EPOCH is set.
+DEFAULT_MTIME = 315532800
+_CHUNK_SIZE = 1024 * 1024
+
+
+class CollectionEntry(NamedTuple):
+    """An entry of the collection FILES.json.
+
+    Attributes:
+        name: The path relative to the collection root, with ``/`` separators.
+        ftype: Either "dir" or "file".
+    """
+
+    name: str
+    ftype: str
+
+
+def ignore_patterns(collection: Collection) -> list[str]:
+    """Return the patterns excluded from the collection tarball.
+
+    Args:
+        collection: The collection info.
+
+    Returns:
+        The default patterns, previously built tarballs and ``build_ignore``.
+    """
+    patterns = [
+        *DEFAULT_IGNORE_PATTERNS,
+        f"{collection.namespace}-{collection.name}-*.tar.gz",
+    ]
+    if collection.manifest is None:
+        patterns.extend(collection.build_ignore)
+    return patterns
+
+
+def _is_child_path(path: Path, project_dir: Path) -> bool:
+    """Check whether a symlink resolves inside the collection.
+
+    Args:
+        path: The symlink.
+        project_dir: The collection root directory.
+
+    Returns:
+        True if the resolved path is inside the collection root.
+    """
+    return Path(os.path.realpath(path)).is_relative_to(os.path.realpath(project_dir))
+
+
+def collection_files(project_dir: Path, collection: Collection) -> list[CollectionEntry]:
+    """List the directories and files a collection build packs, sorted by path.
+
+    Symlinked directories are listed but not walked, and skipped when they
+    point outside the collection. With ``manifest`` directives the selection
+    is a superset of what the build packs, which only makes the digest more
+    conservative.
+
+    Args:
+        project_dir: The collection root directory.
+        collection: The collection info.
+
+    Returns:
+        The FILES.json entries, without the root directory.
+    """
+    patterns = ignore_patterns(collection)
+    entries = []
+    for dir_path, dir_names, file_names in os.walk(project_dir):
+        rel_dir = Path(dir_path).relative_to(project_dir).as_posix()
+        prefix = "" if rel_dir == "." else f"{rel_dir}/"
+        kept_dirs = []
+        for name in dir_names:
+            rel_path = f"{prefix}{name}"
+            if name in IGNORED_DIRS or any(fnmatch.fnmatch(rel_path, p) for p in patterns):
+                continue
+            path = Path(dir_path, name)
+            if not path.is_symlink():
+                kept_dirs.append(name)
+            elif not _is_child_path(path, project_dir):
+                logger.warning(
+                    "Skipping '%s' as it is a symbolic link to a directory outside the collection",
+                    path,
+                )
+                continue
+            entries.append(CollectionEntry(rel_path, "dir"))
+        dir_names[:] = kept_dirs
+        entries.extend(
+            CollectionEntry(f"{prefix}{name}", "file")
+            for name in file_names
+            if not any(fnmatch.fnmatch(f"{prefix}{name}", p) for p in patterns)
+        )
+    return sorted(entries)
+
+
+def _file_digest(path: Path) -> str:
+    """Hash the content of a file, following symlinks.
+
+    Args:
+        path: The file to hash.
+
+    Returns:
+        The hex sha256 digest.
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as fileh:
+        while chunk := fileh.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_digest(project_dir: Path, collection: Collection) -> str:
+    """Hash the inputs of a collection build.
+
+    Args:
+        project_dir: The collection root directory.
+        collection: The collection info.
+
+    Returns:
+        The hex sha256 digest of galaxy.yml and every packed entry.
+    """
+    digest = hashlib.sha256(f"tox-ansible-artifact-{ARTIFACT_FORMAT}\n".encode())
+    digest.update(f"galaxy.yml\0{_file_digest(project_dir / 'galaxy.yml')}\n".encode())
+    for entry in collection_files(project_dir, collection):
+        path = project_dir / entry.name
+        link = str(path.readlink()) if path.is_symlink() else ""
+        content = _file_digest(path) if entry.ftype == "file" and path.exists() else entry.ftype
+        digest.update(f"{entry.name}\0{link}\0{content}\n".encode())
+    return digest.hexdigest()
+
+
+def collection_info(project_dir: Path) -> dict[str, Any]:
+    """Read the MANIFEST.json ``collection_info`` from galaxy.yml.
+
+    Args:
+        project_dir: The collection root directory.
+
+    Returns:
+        The collection info, normalized as ``ansible-galaxy`` does.
+    """
+    with (project_dir / "galaxy.yml").open(encoding="utf-8") as galaxy_file:
+        galaxy = yaml.safe_load(galaxy_file) or {}
+    missing = [key for key in MANDATORY_KEYS if key not in galaxy]
+    if missing:
+        err = f"The collection galaxy.yml is missing the mandatory keys: {', '.join(missing)}"
+        logger.critical(err)
+        sys.exit(1)
+    info: dict[str, Any] = {}
+    for key, of_type in COLLECTION_INFO_KEYS:
+        value = galaxy.get(key)
+        if of_type is list:
+            value = [] if value is None else value if isinstance(value, list) else [value]
+        elif of_type is dict and key not in galaxy:
+            value = {}
+        info[key] = value
+    info["license_file"] = info["license_file"] or None
+    return info
+
+
+class _HashingReader:
+    """File wrapper hashing the content as ``tarfile`` copies it."""
+
+    def __init__(self, fileobj: IO[bytes]) -> None:
+        """Initialize the reader.
+
+        Args:
+            fileobj: The file to read.
+        """
+        self._fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        """Read and hash a chunk.
+
+        Args:
+            size: The maximum number of bytes to read.
+
+        Returns:
+            The chunk.
+        """
+        chunk = self._fileobj.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+
+def _tar_info(name: str, mtime: int, mode: int = 0o644) -> tarfile.TarInfo:
+    """Create a tar member header with reproducible metadata.
+
+    Args:
+        name: The member name.
+        mtime: The member timestamp.
+        mode: The member permissions.
+
+    Returns:
+        The member header, owned by root with empty owner names.
+    """
+    info = tarfile.TarInfo(name)
+    info.mtime = mtime
+    info.mode = mode
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    return info
+
+
+def _file_entry(name: str, ftype: str, chksum: str | None = None) -> dict[str, Any]:
+    """Create a FILES.json entry.
+
+    Args:
+        name: The relative path.
+        ftype: Either "dir" or "file".
+        chksum: The sha256 digest of a file.
+
+    Returns:
+        The entry.
+    """
+    return {
+        "name": name,
+        "ftype": ftype,
+        "chksum_type": "sha256" if chksum else None,
+        "chksum_sha256": chksum,
+        "format": MANIFEST_FORMAT,
+    }
+
+
+def _add_entry(
+    tar: tarfile.TarFile,
+    project_dir: Path,
+    entry: CollectionEntry,
+    mtime: int,
+) -> str | None:
+    """Add an entry to the tarball.
+
+    Symlinks resolving inside the collection are kept as relative links,
+    the others are replaced by their target, as ``ansible-galaxy`` does.
+
+    Args:
+        tar: The tarball being written.
+        project_dir: The collection root directory.
+        entry: The entry to add.
+        mtime: The member timestamp.
+
+    Returns:
+        The sha256 digest of a file entry, None for a directory.
+    """
+    path = project_dir / entry.name
+    if path.is_symlink():
+        target = Path(os.path.realpath(path))
+        if not target.exists():
+            err = f"Failed to find the target path '{target}' for the symlink '{path}'."
+            logger.critical(err)
+            sys.exit(1)
+        if _is_child_path(path, project_dir):
+            info = _tar_info(entry.name, mtime)
+            info.type = tarfile.SYMTYPE
+            info.linkname = os.path.relpath(target, start=path.parent)
+            tar.addfile(info)
+            return _file_digest(target) if entry.ftype == "file" else None
+        path = target
+    if entry.ftype == "dir":
+        info = _tar_info(entry.name, mtime, mode=0o755)
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+        return None
+    with path.open("rb") as fileh:
+        file_stat = os.fstat(fileh.fileno())
+        info = _tar_info(
+            entry.name, mtime, mode=0o755 if file_stat.st_mode & stat.S_IXUSR else 0o644
+        )
+        info.size = file_stat.st_size
+        reader = _HashingReader(fileh)
+        tar.addfile(info, reader)
+    return reader.digest.hexdigest()
+
+
+def write_collection_tarball(project_dir: Path, tarball: Path, collection: Collection) -> None:
+    """Write a collection tarball in a single pass over the sources.
+
+    Every file is hashed while it is copied into the archive, so FILES.json
+    and MANIFEST.json are appended after the collection content.
+
+    Args:
+        project_dir: The collection root directory.
+        tarball: The tarball to write.
+        collection: The collection info.
+    """
+    info = collection_info(project_dir)
+    mtime = int(os.environ.get("SOURCE_DATE_EPOCH", DEFAULT_MTIME))
+    files = [_file_entry(".", "dir")]
+    with (
+        tarball.open("wb") as raw,
+        gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=mtime) as gzipped,
+        tarfile.open(fileobj=gzipped, mode="w", format=tarfile.PAX_FORMAT) as tar,
+    ):
+        for entry in collection_files(project_dir, collection):
+            chksum = _add_entry(tar, project_dir, entry, mtime)
+            files.append(_file_entry(entry.name, entry.ftype, chksum))
+        files_json = json.dumps({"files": files, "format": MANIFEST_FORMAT}, indent=True).encode()
+        manifest = {
+            "collection_info": info,
+            "file_manifest_file": _file_entry(
+                "FILES.json",
+                "file",
+                hashlib.sha256(files_json).hexdigest(),
+            ),
+            "format": MANIFEST_FORMAT,
+        }
+        manifest_json = json.dumps(manifest, indent=True).encode()
+        for name, content in (("FILES.json", files_json), ("MANIFEST.json", manifest_json)):
+            member = _tar_info(name, mtime)
+            member.size = len(content)
+            tar.addfile(member, io.BytesIO(content))
+
+
+def cli_builder_available() -> bool:
+    """Check whether ``ansible-galaxy`` can build the artifact.
+
+    Returns:
+        True if ``ansible-galaxy`` is on the PATH.
+    """
+    return shutil.which("ansible-galaxy") is not None
+
+
+def builder_available(collection: Collection) -> bool:
+    """Check whether the artifact of a collection can be built.
+
+    Args:
+        collection: The collection info.
+
+    Returns:
+        True unless ``manifest`` directives need a missing ``ansible-galaxy``.
+    """
+    return collection.manifest is None or cli_builder_available()
+
+
+def build_collection_cli(project_dir: Path, output_dir: Path) -> Path:
+    """Build a collection tarball with ``ansible-galaxy collection build``.
+
+    Args:
+        project_dir: The collection root directory.
+        output_dir: The directory receiving the tarball.
+
+    Returns:
+        The built tarball.
+    """
+    cmd = [
+        "ansible-galaxy",
+        "collection",
+        "build",
+        "--output-path",
+        str(output_dir),
+        str(project_dir),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, check=False, text=True)  # noqa: S603
+    if proc.returncode != 0:
+        err = f"Failed to build the collection artifact: {proc.stdout}{proc.stderr}"
+        logger.critical(err)
+        sys.exit(1)
+    return next(output_dir.glob("*.tar.gz"))
+
+
+def build_collection(project_dir: Path, output_dir: Path, collection: Collection) -> Path:
+    """Build a collection tarball, in-process unless ``manifest`` directives are used.
+
+    Args:
+        project_dir: The collection root directory.
+        output_dir: The directory receiving the tarball.
+        collection: The collection info.
+
+    Returns:
+        The built tarball.
+    """
+    if collection.manifest is not None:
+        return build_collection_cli(project_dir, output_dir)
+    tarball = output_dir / f"{collection.namespace}-{collection.name}-{collection.version}.tar.gz"
+    write_collection_tarball(project_dir, tarball, collection)
+    return tarball
+
+
+@dataclass(frozen=True)
+class CollectionArtifact:
+    """A collection tarball shared by the environments of a session.
+
+    Attributes:
+        project_dir: The collection root directory.
+        collection: The collection info.
+        digest: The digest of the build inputs.
+        artifacts_dir: The directory holding the artifacts of every digest.
+    """
+
+    project_dir: Path
+    collection: Collection
+    digest: str
+    artifacts_dir: Path
+
+    @property
+    def path(self) -> Path:
+        """The tarball path, named as ``ansible-galaxy`` names it.
+
+        Returns:
+            The tarball path.
+        """
+        name = f"{self.collection.namespace}-{self.collection.name}-{self.collection.version}"
+        return self.artifacts_dir / self.digest / f"{name}.tar.gz"
+
+    def ensure(self) -> Path:
+        """Build the tarball unless it exists, once across parallel environments.
+
+        Artifacts of other digests for the same collection are removed after
+        a build, so only the current sources are kept on disk.
+
+        Returns:
+            The tarball path.
+        """
+        if self.path.exists():
+            return self.path
+
+        from filelock import FileLock  # noqa: PLC0415
+
+        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.artifacts_dir / ".lock"):
+            if self.path.exists():
+                return self.path
+            with tempfile.TemporaryDirectory(dir=self.artifacts_dir) as tmp_dir:
+                built = build_collection(self.project_dir, Path(tmp_dir), self.collection)
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                built.replace(self.path)
+            for stale in self.artifacts_dir.glob(f"*/{self.path.name}"):
+                if stale != self.path:
+                    shutil.rmtree(stale.parent)
+        return self.path
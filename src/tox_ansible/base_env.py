@@ -0,0 +1,199 @@
+"""Base environments cloned into the environments of the tox-uv runners.
+
+uv ignores the packages the ``.pth`` file of the shared layers adds, so the
+environments of the tox-uv runners are not layered. The ade, pytest and
+ansible-core stack they share is instead installed once per python and core
+with ``uv pip install --prefix`` into
+``.tox/.tox-ansible/bases/<python>-<core>/<key>/``, where the key covers the
+interpreter and the requirements. Before tox installs the dependencies of an
+environment, the prefix is cloned into it with the primitives of the layers,
+so uv finds the stack installed and only installs the packages of the test
+type.
+
+Files are cloned with a reflink where the filesystem supports it, a hard
+link otherwise, and copied as a last resort. Installers replace files rather
+than writing them in place, so an environment upgrading a package does not
+alter the base. Console scripts are copied with their shebang pointing at
+the interpreter of the environment.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import shutil
+import subprocess
+import tempfile
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from tox_ansible.layers import clone_tree
+from tox_ansible.wheelhouse import no_index_args
+
+
+if TYPE_CHECKING:
+    from tox_ansible.layers import SessionLayers
+
+logger = logging.getLogger(__name__)
+
+# Written into an environment populated from a base, holding the base key.
+BASE_MARKER = ".tox-ansible-base"
+
+
+def find_uv() -> str | None:
+    """Find the uv executable tox-uv runs.
+
+    Returns:
+        The path of uv, None if it is not installed.
+    """
+    try:
+        from uv import find_uv_bin  # noqa: PLC0415
+
+        return find_uv_bin()
+    except (ImportError, FileNotFoundError):
+        return shutil.which("uv")
+
+
+def install_prefix(
+    python: Path,
+    prefix: Path,
+    requirements: tuple[str, ...],
+    wheelhouse: Path | None = None,
+) -> bool:
+    """Install requirements into a prefix with uv, for an interpreter.
+
+    Args:
+        python: The interpreter the prefix is installed for.
+        prefix: The prefix to install into.
+        requirements: The requirements.
+        wheelhouse: The wheelhouse to install from instead of the index.
+
+    Returns:
+        False if uv is missing or the installation failed.
+    """
+    uv = find_uv()
+    if uv is None:
+        logger.warning("Unable to find uv, installing each environment instead")
+        return False
+    cmd = [
+        uv,
+        "pip",
+        "install",
+        "--quiet",
+        "--python",
+        str(python),
+        "--prefix",
+        str(prefix),
+        *no_index_args(wheelhouse),
+        *requirements,
+    ]
+    proc = subprocess.run(cmd, capture_output=True, check=False, text=True)  # noqa: S603
+    if proc.returncode != 0:
+        logger.warning(
+            "Unable to install the base environment, installing each environment instead: %s%s",
+            proc.stdout,
+            proc.stderr,
+        )
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class BaseEnv:
+    """The packages shared by the environments of a python and core pair.
+
+    Attributes:
+        bases_dir: The directory holding the bases of every pair.
+        name: The python and core factors, e.g. ``py3.13-2.19``.
+        python: The interpreter of the environment being populated.
+        requirements: The requirements installed into the base.
+        wheelhouse: The wheelhouse the base is installed from instead of the index.
+    """
+
+    bases_dir: Path
+    name: str
+    python: Path
+    requirements: tuple[str, ...]
+    wheelhouse: Path | None = field(default=None, compare=False)
+
+    @cached_property
+    def key(self) -> str:
+        """The digest of the interpreter and the requirements.
+
+        Returns:
+            The key of the base.
+        """
+        payload = json.dumps([str(self.python.resolve()), sorted(self.requirements)])
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    @property
+    def path(self) -> Path:
+        """The prefix of the base.
+
+        Returns:
+            The prefix path.
+        """
+        return self.bases_dir / self.name / self.key
+
+    def _ensure(self, session: SessionLayers) -> bool:
+        """Install the base unless it exists; the caller holds the lock.
+
+        Bases of other keys for the pair are removed after an installation:
+        the environments populated from them hold their own files.
+
+        Args:
+            session: The layers of the tox session, recording failed installations.
+
+        Returns:
+            False if the base could not be installed.
+        """
+        if self.path.exists():
+            return True
+        if self.path in session.failed:
+            return False
+        with tempfile.TemporaryDirectory(dir=self.path.parent) as tmp_dir:
+            prefix = Path(tmp_dir) / "prefix"
+            logger.info("Installing the %s base environment", self.name)
+            if not install_prefix(self.python, prefix, self.requirements, self.wheelhouse):
+                session.failed.add(self.path)
+                return False
+            prefix.replace(self.path)
+        for stale in self.path.parent.iterdir():
+            if stale.is_dir() and stale != self.path:
+                shutil.rmtree(stale)
+        return True
+
+    def populate(self, env_dir: Path, session: SessionLayers) -> bool:
+        """Populate an environment from the base, installing the base once.
+
+        An environment already populated from the same base is left as is.
+
+        Args:
+            env_dir: The environment directory.
+            session: The layers of the tox session, recording failed installations.
+
+        Returns:
+            Whether the environment holds the packages of the base.
+        """
+        marker = env_dir / BASE_MARKER
+        if marker.is_file() and marker.read_text(encoding="utf-8") == self.key:
+            return True
+
+        from filelock import FileLock  # noqa: PLC0415
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.bases_dir / f"{self.name}.lock"):
+            if not self._ensure(session):
+                return False
+            cloned = 0
+            if (self.path / "bin").is_dir():
+                cloned += clone_tree(self.path / "bin", env_dir / "bin", self.python)
+            if (self.path / "lib").is_dir():
+                cloned += clone_tree(self.path / "lib", env_dir / "lib", self.python, scripts=False)
+        logger.info("Populated %s with %d files of the %s base", env_dir, cloned, self.name)
+        marker.write_text(self.key, encoding="utf-8")
+        return True
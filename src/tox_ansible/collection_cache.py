@@ -0,0 +1,304 @@
+"""Cache of the collections the requirements.yml files of the tests install.
+
+ade installs the collections of ``tests/requirements.yml`` and the
+requirements files of each test type in every environment, downloading the
+same collections from Galaxy each time. When ``ansible-galaxy`` is on the
+PATH, each requirements file is instead resolved and downloaded once per
+session with ``ansible-galaxy collection download``, into
+``.tox/.tox-ansible/collections/``:
+
+- ``<namespace>.<name>/<version>/<namespace>-<name>-<version>.tar.gz`` holds
+  the tarball of each collection version, shared by every requirements file.
+- ``resolved/<digest>.json`` lists the collection versions a requirements
+  file, keyed by the digest of its content, resolved to.
+
+The environments install the tarballs with ``ansible-galaxy collection
+install --offline --no-deps``, reading the arguments from
+``args/<env>/<file>``, written before the commands run. The resolution of a
+requirements file is reused by later runs until the file changes or
+``--ansible-reprovision`` is given. With ``--ansible-offline``, the
+environments only install from the cache, and a requirements file that was
+never resolved is an error.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import weakref
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import yaml
+
+from tox_ansible.artifact import _file_digest
+from tox_ansible.project import project_context
+
+
+if TYPE_CHECKING:
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+RESOLVED_DIR = "resolved"
+
+
+def collections_dir(work_dir: Path) -> Path:
+    """Return the collection cache directory of a tox work dir.
+
+    Args:
+        work_dir: The tox work dir.
+
+    Returns:
+        The cache directory, shared by the sessions using the same work dir.
+    """
+    return work_dir / ".tox-ansible" / "collections"
+
+
+def download_available() -> bool:
+    """Check whether the collections can be downloaded into the cache.
+
+    Returns:
+        True if ``ansible-galaxy`` is on the PATH.
+    """
+    return shutil.which("ansible-galaxy") is not None
+
+
+def download_collections(requirements: Path, download_dir: Path, cwd: Path) -> list[str] | None:
+    """Download the collections of a requirements file and their dependencies.
+
+    Args:
+        requirements: The requirements file.
+        download_dir: The directory receiving the tarballs.
+        cwd: The directory relative paths of the requirements are resolved from.
+
+    Returns:
+        The names of the downloaded tarballs, None if the download failed.
+    """
+    cmd = [
+        "ansible-galaxy",
+        "collection",
+        "download",
+        "-r",
+        str(requirements),
+        "-p",
+        str(download_dir),
+    ]
+    proc = subprocess.run(  # noqa: S603
+        cmd,
+        capture_output=True,
+        check=False,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        text=True,
+    )
+    if proc.returncode != 0:
+        logger.warning(
+            "Unable to download the collections of %s, installing them from Galaxy: %s%s",
+            requirements,
+            proc.stdout,
+            proc.stderr,
+        )
+        return None
+    with (download_dir / "requirements.yml").open(encoding="utf-8") as fileh:
+        downloaded = yaml.safe_load(fileh) or {}
+    return [str(entry["name"]) for entry in downloaded.get("collections") or []]
+
+
+def _tarball_key(name: str) -> tuple[str, str]:
+    """Split the file name of a collection tarball.
+
+    Namespaces and names only hold lowercase letters, digits and underscores.
+
+    Args:
+        name: The tarball name, e.g. ``ns-coll-1.0.0.tar.gz``.
+
+    Returns:
+        The ``namespace.name`` of the collection and its version.
+    """
+    namespace, coll, version = name.removesuffix(".tar.gz").split("-", 2)
+    return f"{namespace}.{coll}", version
+
+
+@dataclass
+class CollectionCache:
+    """The collection tarballs shared by the environments of a session.
+
+    Attributes:
+        cache_dir: The cache root.
+        project_dir: The directory the requirements files are relative to.
+        offline: Whether only the cached collections are installed.
+        refresh: Whether the requirements files are resolved again once per session.
+        resolved: The tarballs each requirements file resolved to in this session.
+    """
+
+    cache_dir: Path
+    project_dir: Path
+    offline: bool = False
+    refresh: bool = False
+    resolved: dict[str, list[Path] | None] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def tarball(self, fqcn: str, version: str, name: str) -> Path:
+        """Return where the tarball of a collection version is cached.
+
+        Args:
+            fqcn: The ``namespace.name`` of the collection.
+            version: The collection version.
+            name: The tarball name.
+
+        Returns:
+            The tarball path.
+        """
+        return self.cache_dir / fqcn / version / name
+
+    def _record_file(self, digest: str) -> Path:
+        """Return the record of the resolution of a requirements file.
+
+        Args:
+            digest: The digest of the requirements file.
+
+        Returns:
+            The record path.
+        """
+        return self.cache_dir / RESOLVED_DIR / f"{digest}.json"
+
+    def _recorded(self, digest: str) -> list[Path] | None:
+        """Read the tarballs a requirements file resolved to in an earlier run.
+
+        Args:
+            digest: The digest of the requirements file.
+
+        Returns:
+            The tarballs, None unless recorded and all cached.
+        """
+        try:
+            names = json.loads(self._record_file(digest).read_text(encoding="utf-8"))
+            tarballs = [self.tarball(*_tarball_key(name), name) for name in names]
+        except (OSError, ValueError, TypeError):
+            return None
+        return tarballs if all(tarball.is_file() for tarball in tarballs) else None
+
+    def _download(self, requirements: Path, digest: str) -> list[Path] | None:
+        """Download the collections of a requirements file into the cache.
+
+        Args:
+            requirements: The requirements file.
+            digest: The digest of the requirements file.
+
+        Returns:
+            The tarballs, None if the download failed.
+        """
+        from filelock import FileLock  # noqa: PLC0415
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.cache_dir / ".lock"):
+            if not self.refresh and (tarballs := self._recorded(digest)) is not None:
+                return tarballs
+            with tempfile.TemporaryDirectory(dir=self.cache_dir) as tmp_dir:
+                download_dir = Path(tmp_dir)
+                logger.info("Downloading the collections of %s", requirements)
+                downloaded = download_collections(requirements, download_dir, self.project_dir)
+                if downloaded is None:
+                    return None
+                names = sorted(downloaded)
+                for name in names:
+                    tarball = self.tarball(*_tarball_key(name), name)
+                    if not tarball.is_file():
+                        tarball.parent.mkdir(parents=True, exist_ok=True)
+                        (download_dir / name).replace(tarball)
+            record = self._record_file(digest)
+            record.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = record.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(names, indent=2), encoding="utf-8")
+            tmp_file.replace(record)
+        return [self.tarball(*_tarball_key(name), name) for name in names]
+
+    def _resolve(self, requirements: Path) -> list[Path] | None:
+        """Resolve a requirements file from the records or by downloading it.
+
+        Args:
+            requirements: The requirements file.
+
+        Returns:
+            The tarballs, None if the collections have to be installed from Galaxy.
+        """
+        digest = _file_digest(requirements)
+        if self.offline or not self.refresh:
+            tarballs = self._recorded(digest)
+            if tarballs is not None:
+                return tarballs
+        if self.offline:
+            err = (
+                f"The collections of {requirements} are not cached,"
+                " run once without --ansible-offline to download them"
+            )
+            logger.critical(err)
+            sys.exit(1)
+        if not download_available():
+            return None
+        return self._download(requirements, digest)
+
+    def tarballs(self, requirements: str) -> list[Path] | None:
+        """Resolve a requirements file once per session.
+
+        Args:
+            requirements: The requirements file, relative to the project.
+
+        Returns:
+            The cached tarballs of its collections and their dependencies,
+            None if the collections have to be installed from Galaxy.
+        """
+        with self._lock:
+            if requirements not in self.resolved:
+                self.resolved[requirements] = self._resolve(self.project_dir / requirements)
+            return self.resolved[requirements]
+
+    def install_args(self, requirements: str) -> str:
+        """Return the ``ansible-galaxy collection install`` arguments for a requirements file.
+
+        Args:
+            requirements: The requirements file, relative to the project.
+
+        Returns:
+            The cached tarballs to install without contacting Galaxy, or the
+            requirements file.
+        """
+        tarballs = self.tarballs(requirements)
+        if tarballs is None:
+            return f"-r {self.project_dir / requirements}"
+        return " ".join(["--offline", "--no-deps", *(str(tarball) for tarball in tarballs)])
+
+
+_COLLECTION_CACHES: weakref.WeakKeyDictionary[State, CollectionCache] = weakref.WeakKeyDictionary()
+_COLLECTION_CACHES_LOCK = threading.Lock()
+
+
+def collection_cache(state: State) -> CollectionCache:
+    """Return the collection cache of the tox session.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        The session cache.
+    """
+    with _COLLECTION_CACHES_LOCK:
+        cache = _COLLECTION_CACHES.get(state)
+        if cache is None:
+            options = state.conf.options
+            cache = CollectionCache(
+                cache_dir=collections_dir(Path(state.conf.core["work_dir"])),
+                project_dir=project_context(state).project_dir,
+                offline=getattr(options, "ansible_offline", False),
+                refresh=getattr(options, "ansible_reprovision", False),
+            )
+            _COLLECTION_CACHES[state] = cache
+        return cache
@@ -0,0 +1,56 @@
+"""The tox configuration set of the ``[ansible]`` section."""
+
+from __future__ import annotations
+
+from tox.config.sets import ConfigSet
+
+from tox_ansible.project import DEFAULT_CORE_REVISION_TTL
+
+
+class AnsibleConfigSet(ConfigSet):
+    """The ansible configuration."""
+
+    def register_config(self) -> None:
+        """Register the ansible configuration."""
+        self.add_config(
+            "coverage",
+            of_type=bool,
+            default=False,
+            desc="enable coverage reporting for unit tests",
+        )
+        self.add_config(
+            "skip",
+            of_type=list[str],
+            default=[],
+            desc="ansible configuration",
+        )
+        self.add_config(
+            "downstream",
+            of_type=bool,
+            default=False,
+            desc="union AAP/cert extras onto the upstream matrix (ADR-001)",
+        )
+        self.add_config(
+            "molecule",
+            of_type=str,
+            default="auto",
+            desc="molecule test type: 'auto' (discover), 'true' (force on), 'false' (force off)",
+        )
+        self.add_config(
+            "molecule_append",
+            of_type=list[str],
+            default=[],
+            desc="extra argv appended to the default 'molecule test --all' command",
+        )
+        self.add_config(
+            "molecule_commands",
+            of_type=list[str],
+            default=[],
+            desc="full replacement molecule commands (ignores default and molecule_append)",
+        )
+        self.add_config(
+            "core_revision_ttl",
+            of_type=str,
+            default=str(DEFAULT_CORE_REVISION_TTL),
+            desc="seconds a resolved devel/milestone ansible-core commit is reused across runs",
+        )
@@ -0,0 +1,554 @@
+"""Cache of ansible-core wheels shared by the environments and across runs.
+
+ade installs ansible-core for a ``stable-X.Y``, ``devel`` or ``milestone``
+factor from the branch archive, building it again in every environment.
+The cache resolves each branch to a commit once per session with
+``git ls-remote``, builds that commit into a wheel once, and keeps it in
+``.tox/.tox-ansible/cores/<ref>/<commit>/`` for the environments of this and
+later runs. File locks serialize the builds of parallel tox runs. Wheels of
+older commits are removed once a day old and no longer named by the
+ansible-core requirements of an environment of the work dir. The
+environments install the wheel with their ``deps``, by the installer tox uses,
+and ade finds ansible-core installed; ade is only given the archive URL of the
+commit, or the branch, when no wheel can be built.
+
+The resolved commits are recorded in ``.tox/.tox-ansible/cores/revisions.json``
+and reused by later runs for ``core_revision_ttl`` seconds, so that ``devel``
+and ``milestone`` stay on one commit across a run and the runs following it.
+The ``TOX_ANSIBLE_CORE_REVISIONS`` environment variable pins branches
+explicitly, e.g. ``devel=<commit>,milestone=<commit>``, which lets the jobs of
+a CI matrix install the commits resolved when the matrix was generated.
+With ``--ansible-offline``, the recorded commits are reused however old they
+are and the repository is never contacted.
+
+The repository is ``https://github.com/ansible/ansible`` unless the
+``TOX_ANSIBLE_CORE_REPO`` environment variable names another one, either a
+URL serving GitHub style ``/archive/<commit>.tar.gz`` archives or a local
+git repository, which allows testing without network access.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import weakref
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from tox_ansible.project import DEFAULT_CORE_REVISION_TTL, project_context
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+CORE_REPO_ENV = "TOX_ANSIBLE_CORE_REPO"
+DEFAULT_CORE_REPO = "https://github.com/ansible/ansible"
+CORE_REVISIONS_ENV = "TOX_ANSIBLE_CORE_REVISIONS"
+REVISIONS_FILE = "revisions.json"
+# Core factors passed to ade as branch names rather than stable-X.Y.
+BRANCH_FACTORS = ("devel", "milestone")
+# Seconds the wheel of an older commit is kept, for the sessions still installing it.
+STALE_WHEEL_AGE = 24 * 3600
+_GIT_TIMEOUT = 60
+
+
+def core_ref(core: str) -> str:
+    """Return the ansible-core branch of a core factor.
+
+    Args:
+        core: The core factor, e.g. "2.19" or "devel".
+
+    Returns:
+        The branch name, e.g. "stable-2.19" or "devel".
+    """
+    return core if core in BRANCH_FACTORS else f"stable-{core}"
+
+
+def core_repo() -> str:
+    """Return the ansible-core repository the cache builds from.
+
+    Returns:
+        The repository URL or local path.
+    """
+    return os.environ.get(CORE_REPO_ENV) or DEFAULT_CORE_REPO
+
+
+def cores_dir(work_dir: Path) -> Path:
+    """Build the directory of the ansible-core wheel cache.
+
+    Args:
+        work_dir: The tox work directory.
+
+    Returns:
+        The cache directory, shared by the sessions using the same work dir.
+    """
+    return work_dir / ".tox-ansible" / "cores"
+
+
+def cache_available() -> bool:
+    """Check whether branches can be resolved to commits.
+
+    Returns:
+        True if git is on the PATH.
+    """
+    return shutil.which("git") is not None
+
+
+def wheel_build_available() -> bool:
+    """Check whether wheels can be built.
+
+    Returns:
+        True if pip can be run by this interpreter.
+    """
+    return importlib.util.find_spec("pip") is not None
+
+
+def pinned_revisions() -> dict[str, str]:
+    """Read the branches pinned by the environment.
+
+    Entries without a commit, e.g. ``stable-2.19=``, are ignored.
+
+    Returns:
+        The commit of each pinned branch.
+    """
+    pins = {}
+    for item in os.environ.get(CORE_REVISIONS_ENV, "").split(","):
+        ref, sep, revision = item.strip().partition("=")
+        if sep and ref:
+            if revision:
+                pins[ref] = revision
+        elif item.strip():
+            logger.warning("Ignoring malformed %s entry: %s", CORE_REVISIONS_ENV, item.strip())
+    return pins
+
+
+def archive_url(repo: str, revision: str) -> str:
+    """Build the source archive URL of a commit.
+
+    Args:
+        repo: The repository URL.
+        revision: The commit id.
+
+    Returns:
+        The GitHub style archive URL.
+    """
+    return f"{repo.removesuffix('.git')}/archive/{revision}.tar.gz"
+
+
+def resolve_revision(repo: str, ref: str) -> str | None:
+    """Resolve a branch of the repository to its head commit.
+
+    A failure is only logged at info level: the branch is then installed as
+    before, and the github matrix printed on stdout stays parseable.
+
+    Args:
+        repo: The repository URL or local path.
+        ref: The branch name.
+
+    Returns:
+        The commit id, or None if the repository cannot be reached.
+    """
+    cmd = ["git", "ls-remote", "--heads", repo, f"refs/heads/{ref}"]
+    try:
+        proc = subprocess.run(  # noqa: S603
+            cmd,
+            capture_output=True,
+            check=True,
+            text=True,
+            timeout=_GIT_TIMEOUT,
+        )
+    except (OSError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as exc:
+        logger.info("Unable to resolve ansible-core %s from %s: %s", ref, repo, exc)
+        return None
+    revision, _, _ = proc.stdout.partition("\t")
+    if not revision:
+        logger.info("Unable to resolve ansible-core %s from %s: no such branch", ref, repo)
+        return None
+    return revision
+
+
+def fetch_archive(repo: str, revision: str, archive: Path) -> None:
+    """Fetch the source archive of a commit.
+
+    Args:
+        repo: The repository URL or local path.
+        revision: The commit id.
+        archive: The tar.gz file to write.
+    """
+    if Path(repo).is_dir():
+        cmd = [
+            "git",
+            "-C",
+            repo,
+            "archive",
+            "--format=tar.gz",
+            f"--prefix=ansible-{revision}/",
+            f"--output={archive}",
+            revision,
+        ]
+        subprocess.run(cmd, capture_output=True, check=True)  # noqa: S603
+        return
+    url = archive_url(repo, revision)
+    with urllib.request.urlopen(url) as response, archive.open("wb") as fileh:  # noqa: S310
+        shutil.copyfileobj(response, fileh)
+
+
+def build_wheel(archive: Path, wheel_dir: Path, python: str = sys.executable) -> Path | None:
+    """Build the ansible-core wheel of a source archive.
+
+    The wheel is pure Python and shared by the environments of every python,
+    so the ``requires-python`` of the branch is not checked against the
+    interpreter running pip.
+
+    Args:
+        archive: The source archive.
+        wheel_dir: The directory receiving the wheel.
+        python: The interpreter running pip.
+
+    Returns:
+        The built wheel, None if the build failed.
+    """
+    cmd = [
+        python,
+        "-m",
+        "pip",
+        "wheel",
+        "--no-deps",
+        "--wheel-dir",
+        str(wheel_dir),
+        "--ignore-requires-python",
+        str(archive),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, check=False, text=True)  # noqa: S603
+    if proc.returncode != 0:
+        logger.warning(
+            "Unable to build ansible-core from %s, ade installs it instead: %s%s",
+            archive,
+            proc.stdout,
+            proc.stderr,
+        )
+        return None
+    return next(wheel_dir.glob("ansible_core-*.whl"))
+
+
+@dataclass
+class CoreWheelCache:
+    """The ansible-core wheels built for the core factors of a session.
+
+    Attributes:
+        cache_dir: The cache root, holding a ``<ref>/<commit>/`` directory per wheel.
+        repo: The repository URL or local path.
+        ttl: Seconds a commit recorded by an earlier run is reused, 0 to always resolve.
+        offline: Whether the repository is never contacted, reusing any recorded commit.
+        revisions: The commit each branch resolved to in this session.
+        failed: The commits whose wheel could not be built in this session.
+    """
+
+    cache_dir: Path
+    repo: str = field(default_factory=core_repo)
+    ttl: int = DEFAULT_CORE_REVISION_TTL
+    offline: bool = False
+    revisions: dict[str, str | None] = field(default_factory=dict)
+    failed: set[str] = field(default_factory=set)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def pointers_dir(self) -> Path:
+        """The ansible-core requirements and ade arguments of each environment.
+
+        Returns:
+            The pointers directory.
+        """
+        return self.cache_dir / "acv"
+
+    @property
+    def revisions_file(self) -> Path:
+        """The commits recorded by earlier runs.
+
+        Returns:
+            The revisions file path.
+        """
+        return self.cache_dir / REVISIONS_FILE
+
+    def _recorded(self) -> dict[str, Any]:
+        """Read the commits recorded by earlier runs.
+
+        Returns:
+            The ``{"revision": ..., "resolved": ...}`` record of each branch.
+        """
+        try:
+            recorded = json.loads(self.revisions_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return recorded if isinstance(recorded, dict) else {}
+
+    def _recorded_revision(self, ref: str) -> str | None:
+        """Return the commit recorded for a branch unless it expired.
+
+        Args:
+            ref: The branch name.
+
+        Returns:
+            The commit id, or None.
+        """
+        if self.ttl <= 0 and not self.offline:
+            return None
+        record = self._recorded().get(ref)
+        if not isinstance(record, dict):
+            return None
+        revision, resolved = record.get("revision"), record.get("resolved")
+        if not isinstance(revision, str) or not isinstance(resolved, (int, float)):
+            return None
+        if self.offline:
+            return revision
+        return revision if 0 <= time.time() - resolved < self.ttl else None
+
+    def _record(self, ref: str, revision: str) -> None:
+        """Record the commit a branch resolved to for later runs.
+
+        Args:
+            ref: The branch name.
+            revision: The commit id.
+        """
+        from filelock import FileLock  # noqa: PLC0415
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.cache_dir / f"{REVISIONS_FILE}.lock"):
+            recorded = self._recorded()
+            recorded[ref] = {"revision": revision, "resolved": time.time()}
+            tmp_file = self.revisions_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(recorded, indent=2, sort_keys=True), encoding="utf-8")
+            tmp_file.replace(self.revisions_file)
+
+    def _resolve(self, ref: str) -> str | None:
+        """Resolve a branch from the pins, the recent records or the repository.
+
+        Args:
+            ref: The branch name.
+
+        Returns:
+            The commit id, or None if the repository cannot be reached or,
+            offline, no commit was recorded.
+        """
+        revision = pinned_revisions().get(ref) or self._recorded_revision(ref)
+        if revision is not None or self.offline:
+            return revision
+        revision = resolve_revision(self.repo, ref)
+        if revision is not None:
+            self._record(ref, revision)
+        return revision
+
+    def revision(self, ref: str) -> str | None:
+        """Resolve a branch once per session.
+
+        Args:
+            ref: The branch name.
+
+        Returns:
+            The commit id, or None if the repository cannot be reached.
+        """
+        with self._lock:
+            if ref not in self.revisions:
+                self.revisions[ref] = self._resolve(ref)
+            return self.revisions[ref]
+
+    def known_revision(self, ref: str) -> str | None:
+        """Return the commit a branch is known to resolve to, without reaching the repository.
+
+        Args:
+            ref: The branch name.
+
+        Returns:
+            The commit resolved in the session, pinned or recently recorded, or None.
+        """
+        with self._lock:
+            if ref in self.revisions:
+                return self.revisions[ref]
+        return pinned_revisions().get(ref) or self._recorded_revision(ref)
+
+    def _cached_wheel(self, ref: str, revision: str | None) -> Path | None:
+        """Find a built wheel.
+
+        Args:
+            ref: The branch name.
+            revision: The commit id, None for the newest wheel of the branch.
+
+        Returns:
+            The wheel, if built.
+        """
+        pattern = f"{revision or '*'}/ansible_core-*.whl"
+        wheels = sorted((self.cache_dir / ref).glob(pattern), key=lambda path: path.stat().st_mtime)
+        return wheels[-1] if wheels else None
+
+    def ensure(self, core: str) -> Path | None:
+        """Build the wheel of a core factor unless it is cached.
+
+        When the repository cannot be reached, the newest wheel built for
+        the branch is used. A commit that cannot be fetched or built is not
+        tried again in the session.
+
+        Args:
+            core: The core factor, e.g. "2.19" or "devel".
+
+        Returns:
+            The wheel, or None to let ade install from the branch or the commit.
+        """
+        ref = core_ref(core)
+        revision = self.revision(ref)
+        if revision is None:
+            return self._cached_wheel(ref, None)
+        wheel = self._cached_wheel(ref, revision)
+        if wheel is not None or revision in self.failed:
+            return wheel
+
+        from filelock import FileLock  # noqa: PLC0415
+
+        ref_dir = self.cache_dir / ref
+        ref_dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.cache_dir / f"{ref}.lock"):
+            wheel = self._cached_wheel(ref, revision)
+            if wheel is not None:
+                return wheel
+            with tempfile.TemporaryDirectory(dir=ref_dir) as tmp_dir:
+                archive = Path(tmp_dir) / "ansible-core.tar.gz"
+                wheel_dir = Path(tmp_dir) / "wheel"
+                logger.info("Building ansible-core %s at %s", ref, revision)
+                try:
+                    fetch_archive(self.repo, revision, archive)
+                except (OSError, ValueError, subprocess.CalledProcessError) as exc:
+                    logger.warning("Unable to fetch ansible-core %s at %s: %s", ref, revision, exc)
+                    self.failed.add(revision)
+                    return None
+                if build_wheel(archive, wheel_dir) is None:
+                    self.failed.add(revision)
+                    return None
+                wheel_dir.replace(ref_dir / revision)
+            self._prune(ref, revision)
+        return self._cached_wheel(ref, revision)
+
+    def _prune(self, ref: str, revision: str) -> None:
+        """Remove the wheels of older commits of a branch no environment installs.
+
+        A wheel is kept while the pointers of an environment name it, and for
+        ``STALE_WHEEL_AGE`` after it was built, as another session may have
+        resolved the branch to it without writing its pointers yet. The
+        caller holds the lock of the branch.
+
+        Args:
+            ref: The branch name.
+            revision: The commit just built.
+        """
+        from tox_ansible.sync import _remove  # noqa: PLC0415
+
+        pointers = self.pointers_dir
+        used = (
+            "".join(
+                path.read_text(encoding="utf-8") for path in pointers.iterdir() if path.is_file()
+            )
+            if pointers.is_dir()
+            else ""
+        )
+        now = time.time()
+        for stale in (self.cache_dir / ref).iterdir():
+            if stale.name == revision or f"/{ref}/{stale.name}/" in used:
+                continue
+            if stale.is_dir() and now - stale.stat().st_mtime < STALE_WHEEL_AGE:
+                continue
+            _remove(stale)
+
+    def wheel(self, core: str) -> Path | None:
+        """Return the wheel of a core factor, built unless cached.
+
+        Args:
+            core: The core factor, e.g. "2.19" or "devel".
+
+        Returns:
+            The wheel, None if pip is missing or the wheel cannot be built.
+        """
+        return self.ensure(core) if wheel_build_available() else None
+
+    def acv(self, core: str) -> str:
+        """Return the ``--acv`` value ade installs a core factor from.
+
+        ade only installs versions, http(s) URLs and branches, so the wheel is
+        installed with the ``deps`` of the environment instead.
+
+        Args:
+            core: The core factor, e.g. "2.19" or "devel".
+
+        Returns:
+            The archive URL of the resolved commit, or the branch name.
+        """
+        ref = core_ref(core)
+        revision = self.revision(ref)
+        if revision is not None and not Path(self.repo).is_dir():
+            return archive_url(self.repo, revision)
+        return ref
+
+    def source(self, core: str) -> str:
+        """Return the ansible-core installed for a core factor.
+
+        Args:
+            core: The core factor, e.g. "2.19" or "devel".
+
+        Returns:
+            The wheel URL, or else the ``--acv`` value of ade.
+        """
+        wheel = self.wheel(core)
+        return wheel.as_uri() if wheel is not None else self.acv(core)
+
+    def moving_revisions(self, cores: Iterable[str]) -> dict[str, str]:
+        """Resolve the branch factors among core factors.
+
+        Args:
+            cores: The core factors.
+
+        Returns:
+            The commit of each resolved ``devel`` or ``milestone`` factor.
+        """
+        revisions = {}
+        for core in sorted(set(cores).intersection(BRANCH_FACTORS)):
+            revision = self.revision(core_ref(core))
+            if revision is not None:
+                revisions[core] = revision
+        return revisions
+
+
+_CORE_CACHES: weakref.WeakKeyDictionary[State, CoreWheelCache] = weakref.WeakKeyDictionary()
+_CORE_CACHES_LOCK = threading.Lock()
+
+
+def core_cache(state: State) -> CoreWheelCache:
+    """Return the ansible-core wheel cache of the tox session.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        The session cache.
+    """
+    with _CORE_CACHES_LOCK:
+        cache = _CORE_CACHES.get(state)
+        if cache is None:
+            cache = CoreWheelCache(
+                cache_dir=cores_dir(Path(state.conf.core["work_dir"])),
+                ttl=project_context(state).ansible_config.core_revision_ttl,
+                offline=getattr(state.conf.options, "ansible_offline", False),
+            )
+            _CORE_CACHES[state] = cache
+        return cache
@@ -0,0 +1,462 @@
+"""Merged and locked Python dependencies of the test environments.
+
+The unit, integration and molecule environments install the requirements of
+``tox-ansible`` and of the ``PYTHON_DEPENDENCY_FILES`` of the project. The
+files are read as pip would: ``-r`` includes are expanded relative to the
+including file, comments and line continuations are removed, and the paths
+of ``-c``, ``-e`` and local requirements are made absolute. The requirements
+naming the same distribution under the same marker are merged into one, and
+pins no version can satisfy together are reported with the files they come
+from.
+
+The requirements of every test type are resolved together once per python
+and core with ``pip install --dry-run --report``, into
+``.tox/.tox-ansible/locks/<python>-<core>.txt``, which the environments
+install their own requirements with as a constraints file. The lock is
+reused by later runs until its inputs change, or once per session with
+``--ansible-reprovision``, and resolved from the wheelhouse when one is used.
+When the resolution fails, the lock holds no pin and the environments
+install unlocked, as before.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import subprocess
+import sys
+import tempfile
+import threading
+import weakref
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import Version
+
+from tox_ansible.wheelhouse import active_wheelhouse, no_index_args
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+# The first line of a lock file, followed by the digest of its inputs.
+LOCK_HEADER = "# tox-ansible lock"
+# Marks a lock holding no pin: not resolved offline, or followed by the digest
+# of the inputs whose resolution failed, not retried until they change.
+UNRESOLVED = "unresolved"
+# ade installs ansible-core, so the lock never pins it.
+UNLOCKED = frozenset({"ansible-core"})
+
+_INCLUDE_OPTIONS = ("-r", "--requirement")
+_PATH_OPTIONS = ("-c", "--constraint", "-e", "--editable", "-f", "--find-links")
+
+# A requirement line and the file it comes from.
+SourcedLine = tuple[str, str]
+
+
+@dataclass(frozen=True)
+class RequirementFiles:
+    """The lines of requirement files, with their includes expanded.
+
+    Attributes:
+        requirements: The requirement lines and their files.
+        options: The option lines, e.g. constraints files, index options and
+            editable installs, without duplicates.
+    """
+
+    requirements: tuple[SourcedLine, ...] = ()
+    options: tuple[str, ...] = ()
+
+
+def _logical_lines(path: Path) -> list[str]:
+    """Read the lines of a requirement file as pip does.
+
+    Args:
+        path: The requirement file.
+
+    Returns:
+        The lines, continuations joined, without comments and blank lines.
+    """
+    text = path.read_text(encoding="utf-8").replace("\\\n", "")
+    lines = []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        line = line.split(" #", 1)[0].split("\t#", 1)[0].strip()  # noqa: PLW2901
+        if line:
+            lines.append(line)
+    return lines
+
+
+def _split_option(line: str) -> tuple[str, str] | None:
+    """Split an option line taking a value.
+
+    Args:
+        line: The requirement file line.
+
+    Returns:
+        The option and its value, None for a requirement or an option without value.
+    """
+    for option in (*_INCLUDE_OPTIONS, *_PATH_OPTIONS):
+        if line == option:
+            return None
+        if line.startswith((f"{option} ", f"{option}=")):
+            return option, line[len(option) + 1 :].strip()
+        if not option.startswith("--") and line.startswith(option):
+            return option, line[len(option) :].strip()
+    return None
+
+
+def _absolute(value: str, base: Path) -> str:
+    """Make a relative local path absolute, leaving URLs as is.
+
+    Args:
+        value: A path, with optional extras, or a URL.
+        base: The directory of the file the value comes from.
+
+    Returns:
+        The absolute path, or the URL.
+    """
+    if "://" in value or Path(value).is_absolute():
+        return value
+    path, bracket, extras = value.partition("[")
+    return f"{(base / path).resolve()}{bracket}{extras}"
+
+
+def read_requirement_files(root: Path, files: Iterable[str]) -> RequirementFiles:
+    """Read requirement files, expanding their ``-r`` includes.
+
+    Args:
+        root: The directory the files are relative to.
+        files: The requirement files.
+
+    Returns:
+        The requirement and option lines, in file order.
+    """
+    requirements: list[SourcedLine] = []
+    options: dict[str, None] = {}
+    seen: set[Path] = set()
+    base = root.resolve()
+
+    def _read(path: Path, source: str) -> None:
+        """Read a requirement file and the files it includes, once.
+
+        Args:
+            path: The requirement file.
+            source: The name of the file in messages.
+        """
+        path = path.resolve()
+        if path in seen:
+            return
+        seen.add(path)
+        if not path.is_file():
+            err = f"Unable to read the requirements file {path}, included by {source}"
+            logger.critical(err)
+            sys.exit(1)
+        name = path.relative_to(base) if path.is_relative_to(base) else path
+        for line in _logical_lines(path):
+            option = _split_option(line)
+            if option is not None and option[0] in _INCLUDE_OPTIONS:
+                _read(path.parent / option[1], str(name))
+            elif option is not None:
+                options[f"{option[0]} {_absolute(option[1], path.parent)}"] = None
+            elif line.startswith("-"):
+                options[line] = None
+            else:
+                local = line.startswith(".")
+                requirements.append((_absolute(line, path.parent) if local else line, str(name)))
+
+    for file in files:
+        _read(root / file, file)
+    return RequirementFiles(tuple(requirements), tuple(options))
+
+
+def _satisfiable(specifier: SpecifierSet) -> bool:
+    """Check the ``==`` pins of a specifier set are allowed by its other specifiers.
+
+    Ranges are left to the resolver, only pins are checked.
+
+    Args:
+        specifier: The merged specifier set.
+
+    Returns:
+        False if no version can satisfy the specifier set.
+    """
+    pins = [
+        Version(spec.version)
+        for spec in specifier
+        if spec.operator == "==" and not spec.version.endswith(".*")
+    ]
+    return all(specifier.contains(pin, prereleases=True) for pin in pins)
+
+
+def merge_requirements(lines: Iterable[SourcedLine]) -> list[str]:
+    """Merge the requirements naming the same distribution under the same marker.
+
+    The extras are united and the specifiers intersected. Lines that are not
+    requirements, such as local paths or URLs, are kept once, as is.
+
+    Args:
+        lines: The requirement lines and the files they come from.
+
+    Returns:
+        The merged requirements, in order of first occurrence.
+    """
+    merged: dict[tuple[str, str] | str, Requirement | str] = {}
+    sources: dict[tuple[str, str], list[SourcedLine]] = {}
+    for line, source in lines:
+        try:
+            req = Requirement(line)
+        except InvalidRequirement:
+            merged.setdefault(line, line)
+            continue
+        key = (canonicalize_name(req.name), str(req.marker or ""))
+        sources.setdefault(key, []).append((line, source))
+        current = merged.get(key)
+        if not isinstance(current, Requirement):
+            merged[key] = req
+            continue
+        if current.url and req.url and current.url != req.url:
+            _conflict(req.name, sources[key])
+        current.extras |= req.extras
+        current.specifier &= req.specifier
+        if not _satisfiable(current.specifier):
+            _conflict(req.name, sources[key])
+        current.url = current.url or req.url
+        if current.url:
+            # A direct reference has no version specifier.
+            current.specifier = SpecifierSet()
+    return [str(req) for req in merged.values()]
+
+
+def _conflict(name: str, lines: Sequence[SourcedLine]) -> None:
+    """Report requirements no version can satisfy together.
+
+    Args:
+        name: The distribution name.
+        lines: The requirements of the distribution and the files they come from.
+    """
+    found = ", ".join(f"{line} ({source})" for line, source in lines)
+    err = f"Conflicting requirements for {name}: {found}"
+    logger.critical(err)
+    sys.exit(1)
+
+
+def locks_dir(work_dir: Path) -> Path:
+    """Build the directory of the dependency locks.
+
+    Args:
+        work_dir: The tox work dir.
+
+    Returns:
+        The locks directory, shared by the sessions using the same work dir.
+    """
+    return work_dir / ".tox-ansible" / "locks"
+
+
+def lock_digest(python: Path, requirements: Sequence[str]) -> str:
+    """Hash the inputs of a lock.
+
+    Args:
+        python: The interpreter resolving the lock.
+        requirements: The requirement and option lines.
+
+    Returns:
+        The digest.
+    """
+    payload = json.dumps([str(python.resolve()), sorted(requirements)])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def resolve_pins(
+    python: Path,
+    requirements: Sequence[str],
+    wheelhouse: Path | None = None,
+) -> list[str] | None:
+    """Resolve requirements into exact versions with the pip of an interpreter.
+
+    Args:
+        python: The interpreter running pip.
+        requirements: The requirement and option lines.
+        wheelhouse: The wheelhouse to resolve from instead of the index.
+
+    Returns:
+        The ``name==version`` pins of the distributions from an index, None if
+        the resolution failed.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = Path(tmp_dir) / "requirements.in"
+        inputs.write_text("\n".join(requirements) + "\n", encoding="utf-8")
+        report = Path(tmp_dir) / "report.json"
+        cmd = [
+            str(python),
+            "-m",
+            "pip",
+            "install",
+            "--dry-run",
+            "--ignore-installed",
+            "--quiet",
+            "--disable-pip-version-check",
+            "--report",
+            str(report),
+            *no_index_args(wheelhouse),
+            "-r",
+            str(inputs),
+        ]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, check=False, text=True)  # noqa: S603
+        except OSError as exc:
+            proc = subprocess.CompletedProcess(cmd, 1, "", str(exc))
+        if proc.returncode != 0:
+            logger.warning(
+                "Unable to lock the Python dependencies, installing them unlocked: %s%s",
+                proc.stdout,
+                proc.stderr,
+            )
+            return None
+        installs = json.loads(report.read_text(encoding="utf-8")).get("install", [])
+    pins = {
+        canonicalize_name(item["metadata"]["name"]): item["metadata"]["version"]
+        for item in installs
+        if not item.get("is_direct")
+    }
+    return [f"{name}=={version}" for name, version in sorted(pins.items()) if name not in UNLOCKED]
+
+
+def _read_digest(lock_file: Path) -> str | None:
+    """Read the digest of the inputs a lock was resolved from.
+
+    Args:
+        lock_file: The lock file.
+
+    Returns:
+        The digest, prefixed with ``unresolved`` if the resolution failed,
+        None if the file is missing or not a lock.
+    """
+    try:
+        with lock_file.open(encoding="utf-8") as fileh:
+            header = fileh.readline().strip()
+    except OSError:
+        return None
+    digest = header.removeprefix(LOCK_HEADER).strip()
+    return digest if header.startswith(LOCK_HEADER) and digest else None
+
+
+@dataclass
+class DependencyLocks:
+    """The dependency locks of the pythons and cores of a session.
+
+    Attributes:
+        locks_dir: The directory of the lock files.
+        offline: Whether locks are only reused, unless resolved from the wheelhouse.
+        refresh: Whether the locks are resolved again once per session.
+        wheelhouse: The wheelhouse the locks are resolved from instead of the index.
+        resolved: Whether each lock named in this session holds pins.
+    """
+
+    locks_dir: Path
+    offline: bool = False
+    refresh: bool = False
+    wheelhouse: Path | None = None
+    resolved: dict[str, bool] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def path(self, name: str) -> Path:
+        """Return the lock file of a python and core.
+
+        Args:
+            name: The python and core factors, e.g. ``py3.13-2.19``.
+
+        Returns:
+            The lock file.
+        """
+        return self.locks_dir / f"{name}.txt"
+
+    def _ensure(self, name: str, python: Path, requirements: Sequence[str]) -> bool:
+        """Resolve a lock unless it was resolved from the same inputs.
+
+        Args:
+            name: The python and core factors.
+            python: The interpreter resolving the lock.
+            requirements: The requirement and option lines.
+
+        Returns:
+            Whether the lock holds pins.
+        """
+        from filelock import FileLock  # noqa: PLC0415
+
+        digest = lock_digest(python, requirements)
+        lock_file = self.path(name)
+        self.locks_dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.locks_dir / f"{name}.lock"):
+            current = None if self.refresh else _read_digest(lock_file)
+            if current == digest:
+                return True
+            if current == f"{UNRESOLVED} {digest}":
+                logger.info("The Python dependencies of %s failed to lock before", name)
+                return False
+            if self.offline and self.wheelhouse is None:
+                logger.info("The Python dependencies of %s are not locked offline", name)
+                pins, stamp = None, UNRESOLVED
+            else:
+                logger.info("Locking the Python dependencies of %s", name)
+                pins = resolve_pins(python, requirements, self.wheelhouse)
+                stamp = digest if pins is not None else f"{UNRESOLVED} {digest}"
+            header = f"{LOCK_HEADER} {stamp}"
+            tmp_file = lock_file.with_suffix(".tmp")
+            tmp_file.write_text("\n".join([header, *(pins or [])]) + "\n", encoding="utf-8")
+            tmp_file.replace(lock_file)
+        return pins is not None
+
+    def ensure(self, name: str, python: Path, requirements: Sequence[str]) -> bool:
+        """Make the lock of a python and core current, once per session.
+
+        Args:
+            name: The python and core factors, e.g. ``py3.13-2.19``.
+            python: The interpreter resolving the lock.
+            requirements: The requirement and option lines of every test type.
+
+        Returns:
+            Whether the lock holds pins, False if the environments install unlocked.
+        """
+        with self._lock:
+            if name not in self.resolved:
+                self.resolved[name] = self._ensure(name, python, requirements)
+            return self.resolved[name]
+
+
+_DEPENDENCY_LOCKS: weakref.WeakKeyDictionary[State, DependencyLocks] = weakref.WeakKeyDictionary()
+_DEPENDENCY_LOCKS_LOCK = threading.Lock()
+
+
+def dependency_locks(state: State) -> DependencyLocks:
+    """Return the dependency locks of the tox session.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        The session locks.
+    """
+    with _DEPENDENCY_LOCKS_LOCK:
+        locks = _DEPENDENCY_LOCKS.get(state)
+        if locks is None:
+            options = state.conf.options
+            locks = DependencyLocks(
+                locks_dir=locks_dir(Path(state.conf.core["work_dir"])),
+                offline=getattr(options, "ansible_offline", False),
+                refresh=getattr(options, "ansible_reprovision", False),
+                wheelhouse=active_wheelhouse(state),
+            )
+            _DEPENDENCY_LOCKS[state] = locks
+        return locks
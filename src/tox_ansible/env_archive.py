@@ -0,0 +1,320 @@
+"""Portable archives of the provisioned environments.
+
+``--export-env DIR`` packs every Ansible environment provisioned by the run
+into ``DIR/<env>.tar.gz``: a manifest holding the provisioning fingerprint
+and the paths the environment was built at, the shared files of the work dir
+it uses (its site-packages layers, its dependency lock and the ansible-core
+wheel ade installed) and the environment directory itself.
+
+``--import-env DIR`` extracts the archive of an environment in one streaming
+pass before tox installs its dependencies. The shared files missing from the
+work dir are moved into place, then the fingerprint of the environment is
+computed; when it matches the manifest, the paths of the original location
+are rewritten in the text files and symlinks of the environment, which
+replaces the one tox created. tox then finds its dependencies installed and
+``commands_pre`` is skipped as provisioned. Otherwise the environment is
+provisioned as usual.
+
+The fingerprint does not depend on the paths of the environment, the work
+dir or the project, so an archive exported by a CI job can be imported by
+another one, or by another work dir of the same machine, as long as the
+python, ansible-core, the dependencies and the collection files are the same.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+import os
+import re
+import tarfile
+import tempfile
+import time
+
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Any
+
+from tox_ansible.provision import PROVISION_PENDING, PROVISION_STAMP
+from tox_ansible.sync import _remove
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Mapping
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the layout of the archives changes.
+ARCHIVE_FORMAT = "1"
+# The first member of an archive.
+MANIFEST_NAME = "manifest.json"
+# The archive directories of the shared files and of the environment.
+_SHARED = "shared"
+_ENV = "env"
+# Directories of an environment tox fills again on every run.
+_TRANSIENT = ("log", "tmp")
+# Keeps the absolute symlinks of the environment, e.g. to its base python.
+_EXTRACT_FILTER: dict[str, Any] = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+
+
+def archive_path(archive_dir: Path, env_name: str) -> Path:
+    """Build the archive path of an environment.
+
+    Args:
+        archive_dir: The directory holding the archives.
+        env_name: The environment name.
+
+    Returns:
+        The archive path.
+    """
+    return archive_dir / f"{env_name}.tar.gz"
+
+
+def shared_root(env_dir: Path) -> Path:
+    """Build the directory of the files shared by the environments of a work dir.
+
+    Args:
+        env_dir: The environment directory.
+
+    Returns:
+        The ``.tox-ansible`` directory of the work dir.
+    """
+    return env_dir.parent / ".tox-ansible"
+
+
+def _skip_transient(info: tarfile.TarInfo) -> tarfile.TarInfo | None:
+    """Leave out the members of an environment recreated by tox or the next run.
+
+    Args:
+        info: The archive member.
+
+    Returns:
+        The member, None to leave it out.
+    """
+    parts = PurePosixPath(info.name).parts
+    if len(parts) > 1 and (parts[1] in _TRANSIENT or parts[1] == PROVISION_PENDING):
+        return None
+    return info
+
+
+def export_env(  # noqa: PLR0913
+    archive: Path,
+    *,
+    env_name: str,
+    env_dir: Path,
+    project_dir: Path,
+    fingerprint: str,
+    shared: Iterable[Path],
+) -> None:
+    """Pack a provisioned environment and the shared files it uses into an archive.
+
+    Args:
+        archive: The archive to write.
+        env_name: The environment name.
+        env_dir: The environment directory.
+        project_dir: The collection root directory.
+        fingerprint: The provisioning fingerprint of the environment.
+        shared: The shared files and directories, below the work dir.
+    """
+    root = shared_root(env_dir)
+    shared_names = [path.relative_to(root).as_posix() for path in shared]
+    manifest = {
+        "format": ARCHIVE_FORMAT,
+        "env": env_name,
+        "fingerprint": fingerprint,
+        "env_dir": str(env_dir),
+        "work_dir": str(env_dir.parent),
+        "project_dir": str(project_dir),
+        "shared": shared_names,
+    }
+    content = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=archive.parent, suffix=".tmp", delete=False) as tmp:
+        tmp_file = Path(tmp.name)
+        with tarfile.open(
+            fileobj=tmp,
+            mode="w:gz",
+            compresslevel=6,
+            format=tarfile.PAX_FORMAT,
+        ) as tar:
+            member = tarfile.TarInfo(MANIFEST_NAME)
+            member.size = len(content)
+            member.mtime = int(time.time())
+            tar.addfile(member, io.BytesIO(content))
+            for name in shared_names:
+                tar.add(root / name, f"{_SHARED}/{name}")
+            tar.add(env_dir, _ENV, filter=_skip_transient)
+    tmp_file.replace(archive)
+    logger.info("Exported %s to %s", env_name, archive)
+
+
+def relocate(root: Path, replacements: Mapping[str, str]) -> int:
+    """Rewrite the paths of another location in the text files and symlinks below a directory.
+
+    Files holding a NUL byte, such as compiled modules and shared libraries,
+    are left as is.
+
+    Args:
+        root: The directory to rewrite.
+        replacements: The new path of each old path.
+
+    Returns:
+        The number of files and symlinks rewritten.
+    """
+    changes = {old.encode(): new.encode() for old, new in replacements.items() if old != new}
+    if not changes:
+        return 0
+    pattern = re.compile(
+        b"|".join(re.escape(old) for old in sorted(changes, key=len, reverse=True))
+    )
+    rewritten = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in [*dirnames, *filenames]:
+            path = Path(dirpath) / name
+            if path.is_symlink():
+                target = os.fsencode(path.readlink())
+                relocated = pattern.sub(lambda match: changes[match[0]], target)
+                if relocated != target:
+                    path.unlink()
+                    path.symlink_to(os.fsdecode(relocated))
+                    rewritten += 1
+            elif name in filenames:
+                data = path.read_bytes()
+                if b"\0" in data:
+                    continue
+                relocated = pattern.sub(lambda match: changes[match[0]], data)
+                if relocated != data:
+                    path.write_bytes(relocated)
+                    rewritten += 1
+    return rewritten
+
+
+def _read_manifest(tar: tarfile.TarFile, member: tarfile.TarInfo) -> dict[str, Any] | None:
+    """Read the manifest from the first member of an archive.
+
+    Args:
+        tar: The archive opened for streaming.
+        member: The first member.
+
+    Returns:
+        The manifest, None if the member is not a valid one.
+    """
+    if member.name != MANIFEST_NAME:
+        return None
+    stream = tar.extractfile(member)
+    if stream is None:
+        return None
+    try:
+        manifest = json.loads(stream.read())
+    except ValueError:
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def _restore_shared(staging: Path, root: Path, names: Iterable[str]) -> None:
+    """Move the shared files of an archive missing from the work dir into place.
+
+    Args:
+        staging: The extracted shared files.
+        root: The ``.tox-ansible`` directory of the work dir.
+        names: The shared files and directories, relative to both.
+    """
+    for name in names:
+        rel = PurePosixPath(name)
+        if rel.is_absolute() or ".." in rel.parts:
+            continue
+        src, dst = staging / rel, root / rel
+        if dst.exists() or not (src.exists() or src.is_symlink()):
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            src.replace(dst)
+        except OSError:
+            # Restored by a parallel environment in the meantime.
+            continue
+
+
+def _replace_env(src: Path, env_dir: Path) -> None:
+    """Replace the contents of an environment, keeping the directories tox fills.
+
+    Args:
+        src: The relocated environment.
+        env_dir: The environment directory.
+    """
+    for child in env_dir.iterdir():
+        if child.name not in _TRANSIENT:
+            _remove(child)
+    for child in src.iterdir():
+        child.replace(env_dir / child.name)
+
+
+def import_env(
+    archive: Path,
+    *,
+    env_name: str,
+    env_dir: Path,
+    project_dir: Path,
+    fingerprint: Callable[[], str | None],
+) -> bool:
+    """Replace an environment with its archive, when provisioned with the same inputs.
+
+    Args:
+        archive: The archive.
+        env_name: The environment name.
+        env_dir: The environment directory.
+        project_dir: The collection root directory.
+        fingerprint: Computes the current provisioning fingerprint, once the
+            shared files of the archive are restored.
+
+    Returns:
+        True if the environment was imported.
+    """
+    root = shared_root(env_dir)
+    stamp = env_dir / PROVISION_STAMP
+    root.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=root, prefix="import-") as tmp_dir:
+        staging = Path(tmp_dir)
+        try:
+            with tarfile.open(archive, mode="r|gz") as tar:
+                manifest = None
+                for member in tar:
+                    if manifest is None:
+                        manifest = _read_manifest(tar, member)
+                        if (
+                            manifest is None
+                            or manifest.get("format") != ARCHIVE_FORMAT
+                            or manifest.get("env") != env_name
+                        ):
+                            logger.warning(
+                                "%s is not an archive of %s, ignoring it", archive, env_name
+                            )
+                            return False
+                        if (
+                            stamp.is_file()
+                            and stamp.read_text(encoding="utf-8") == manifest["fingerprint"]
+                        ):
+                            return False
+                        continue
+                    tar.extract(member, staging, **_EXTRACT_FILTER)
+        except (OSError, tarfile.TarError) as exc:
+            logger.warning("Unable to read %s, ignoring it: %s", archive, exc)
+            return False
+        if manifest is None:
+            logger.warning("%s is empty, ignoring it", archive)
+            return False
+
+        _restore_shared(staging / _SHARED, root, manifest.get("shared", []))
+        if fingerprint() != manifest["fingerprint"]:
+            logger.info("%s was provisioned with other inputs, provisioning %s", archive, env_name)
+            return False
+        relocate(
+            staging / _ENV,
+            {
+                manifest["env_dir"]: str(env_dir),
+                manifest["work_dir"]: str(env_dir.parent),
+                manifest["project_dir"]: str(project_dir),
+            },
+        )
+        _replace_env(staging / _ENV, env_dir)
+    logger.info("Imported %s from %s", env_name, archive)
+    return True
@@ -0,0 +1,1422 @@
+"""Per-environment tox configuration: dependencies, settings and commands."""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+
+from functools import cached_property, partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from tox.config.loader.memory import MemoryLoader
+from tox.config.types import EnvList
+
+from tox_ansible.artifact import CollectionArtifact, builder_available
+from tox_ansible.base_env import BaseEnv
+from tox_ansible.collection_cache import collection_cache, download_available
+from tox_ansible.core_cache import BRANCH_FACTORS, cache_available, core_cache, core_ref
+from tox_ansible.dependencies import dependency_locks, merge_requirements
+from tox_ansible.env_archive import archive_path, export_env, import_env, shared_root
+from tox_ansible.layers import Layer, compose, composed_layers, session_layers
+from tox_ansible.matrix import EnvFactors, desc_for_env, env_factors
+from tox_ansible.project import (
+    PYTHON_DEPENDENCY_FILES,
+    TEST_REQUIREMENTS_YML,
+    Collection,
+    ProjectContext,
+    ProjectIndex,
+    _coverage_enabled,
+    in_action,
+    project_context,
+)
+from tox_ansible.provision import (
+    env_depends,
+    is_provisioned,
+    provision_fingerprint,
+    record_command,
+    start_provisioning,
+)
+from tox_ansible.sync import sync_collection
+from tox_ansible.wheelhouse import active_wheelhouse, index_env
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from tox.config.sets import EnvConfigSet
+    from tox.session.state import State
+    from tox.tox_env.api import ToxEnv
+
+logger = logging.getLogger(__name__)
+
+ADE_DEP = "ansible-dev-environment>=26.2.0"
+ALLOWED_EXTERNALS = [
+    "ade",
+    "bash",
+    "echo",
+    "git",
+    "sh",
+]
+
+# Without the minimal pytest-ansible condition, installation may fail in some
+# cases (pip, uv).
+OUR_DEPS = [
+    "pytest>=7.4.3",  # Oct 2023
+    "pytest-xdist>=3.4.0",  # Nov 2023
+    "pytest-ansible>=v4.1.1",  # latest version still supporting py39 (Oct 2023)
+    "ansible-compat>=25.11.0",  # Nov 2025
+]
+COVERAGE_DEPS = [
+    "coverage>=7.0.0",  # Dec 2022
+    "pytest-cov>=4.1.0",  # May 2023
+]
+MOLECULE_DEP = "molecule>=26.4.0"
+# Test types using the built collection instead of the source tree.
+ARTIFACT_TEST_TYPES = ("galaxy", "sanity")
+# Test types composed of the shared tooling and core layers.
+LAYERED_TEST_TYPES = ("integration", "molecule", "sanity", "unit")
+# The requirements of the tooling layer of each python.
+TOOLING_LAYER_DEPS = (ADE_DEP, *OUR_DEPS, *COVERAGE_DEPS)
+# Removed from the tooling layer, as each core installs its own.
+TOOLING_LAYER_EXCLUDE = ("ansible-core",)
+# Test types installing the Python dependencies, locked per python and core.
+LOCKED_TEST_TYPES = ("integration", "molecule", "unit")
+# The cache directory variable of each installer, and its shared cache.
+SHARED_CACHE_VARS = {"PIP_CACHE_DIR": "pip", "UV_CACHE_DIR": "uv"}
+# The git directory of the sanity workspace, kept in the environment directory.
+SANITY_GIT_DIR = ".tox-ansible-git"
+
+
+class AnsibleTestConf:
+    """Ansible test configuration of a tox environment, computed on first access.
+
+    Every key listed by ``provided_keys`` is a property holding the value of the tox
+    configuration key with the same name. Nothing is computed until tox reads
+    it, so listing the environments or running a single one does not pay for
+    the commands and dependencies of the whole matrix.
+
+    Attributes:
+        test_type: The test type factor of the environment name.
+        provisioned: Whether the environment was provisioned with the same inputs,
+            known once ``prepare`` ran.
+        provision_only: Whether only the provisioning commands run.
+    """
+
+    def __init__(self, env_conf: EnvConfigSet, state: State, factors: EnvFactors) -> None:
+        """Initialize the configuration.
+
+        Args:
+            env_conf: The environment configuration object.
+            state: The state object.
+            factors: The parsed factors of the environment name.
+        """
+        self._env_conf = env_conf
+        self._state = state
+        self.test_type = factors.test_type
+        # Use the python factor of the environment name (e.g., py3.11 from integration-py3.11-2.18)
+        # to explicitly set base_python, preventing tox misinterpreting ansible versions as Python
+        self._python = factors.python
+        self._ansible_version = factors.core
+        self.provisioned = False
+        self.provision_only = getattr(state.conf.options, "provision_only", False)
+
+    def provided_keys(self) -> list[str]:
+        """List the tox configuration keys provided for the environment.
+
+        Returns:
+            The configuration keys.
+        """
+        keys = [
+            "allowlist_externals",
+            "commands",
+            "commands_pre",
+            "deps",
+            "description",
+            "passenv",
+            "setenv",
+            "skip_install",
+        ]
+        if self._python:
+            keys.append("base_python")
+        if self.provision_only:
+            keys.append("depends")
+        return keys
+
+    @cached_property
+    def _context(self) -> ProjectContext:
+        """The session project context.
+
+        Returns:
+            The project context.
+        """
+        return project_context(self._state)
+
+    @cached_property
+    def coverage_enabled(self) -> bool:
+        """Whether unit test coverage is enabled for the environment.
+
+        Returns:
+            True if coverage is enabled.
+        """
+        return self.test_type == "unit" and _coverage_enabled(self._state)
+
+    @cached_property
+    def coverage_config(self) -> Path | None:
+        """The coverage configuration path, if coverage is enabled.
+
+        Returns:
+            The coverage configuration path or None.
+        """
+        return _coverage_config_path(self._env_conf) if self.coverage_enabled else None
+
+    def write_coverage_config(self) -> None:
+        """Write the coverage configuration when coverage is enabled."""
+        if self.coverage_enabled:
+            _write_coverage_config(env_conf=self._env_conf, collection=self._context.collection)
+
+    @cached_property
+    def artifact(self) -> CollectionArtifact | None:
+        """The session collection artifact, for the test types using one.
+
+        Returns:
+            The artifact, or None to use the source tree.
+        """
+        if not self._uses_artifact:
+            return None
+        return CollectionArtifact(
+            project_dir=self._context.project_dir,
+            collection=self._context.collection,
+            digest=self._context.source_digest,
+            artifacts_dir=_artifacts_dir(self._env_conf),
+        )
+
+    @cached_property
+    def _uses_artifact(self) -> bool:
+        """Whether the test type uses the session artifact and it can be built.
+
+        Returns:
+            True if the artifact is used, without hashing the sources.
+        """
+        return self.test_type in ARTIFACT_TEST_TYPES and builder_available(
+            self._context.collection,
+        )
+
+    @cached_property
+    def artifact_pointer(self) -> Path | None:
+        """The file naming the artifact sanity installs, written once it is built.
+
+        The artifact is named after the source digest, which the commands and
+        their fingerprint do not need to hash.
+
+        Returns:
+            The pointer file path or None.
+        """
+        if self.test_type != "sanity" or not self._uses_artifact:
+            return None
+        return _artifacts_dir(self._env_conf) / "pointers" / self._env_conf.name
+
+    @property
+    def artifact_path(self) -> Path | None:
+        """The collection artifact path, if the environment uses one.
+
+        Returns:
+            The tarball path or None.
+        """
+        return self.artifact.path if self.artifact is not None else None
+
+    @cached_property
+    def core_pointer(self) -> Path | None:
+        """The file holding the ansible-core arguments of ade, when the wheel cache is used.
+
+        Returns:
+            The pointer file path or None.
+        """
+        if self.test_type == "galaxy" or not cache_available():
+            return None
+        return core_cache(self._state).pointers_dir / self._env_conf.name
+
+    def write_core_pointer(self) -> None:
+        """Point ade at the commit of the session, or at nothing when the wheel is installed."""
+        if self.core_pointer is None:
+            return
+        self.core_pointer.parent.mkdir(parents=True, exist_ok=True)
+        args = "" if self.core_wheel is not None else f"--acv {self.acv}"
+        self.core_pointer.write_text(args, encoding="utf-8")
+
+    @property
+    def core_requirements(self) -> Path | None:
+        """The requirements file of the ``deps`` installing the ansible-core wheel.
+
+        Returns:
+            The requirements file path or None.
+        """
+        if self.core_pointer is None:
+            return None
+        return self.core_pointer.with_name(f"{self.core_pointer.name}.txt")
+
+    def write_core_requirements(self) -> None:
+        """Install the ansible-core wheel of the session with the ``deps``, when built."""
+        if self.core_requirements is None:
+            return
+        self.core_requirements.parent.mkdir(parents=True, exist_ok=True)
+        self.core_requirements.write_text(
+            f"ansible-core @ {self.core_source}\n" if self.core_wheel is not None else "",
+            encoding="utf-8",
+        )
+
+    @cached_property
+    def collections_args(self) -> Path | None:
+        """The directory of the files naming the collections to install, when cached.
+
+        Returns:
+            The directory, holding a file per requirements file, or None.
+        """
+        if not self._found_reqs:
+            return None
+        if not download_available() and not getattr(
+            self._state.conf.options, "ansible_offline", False
+        ):
+            return None
+        return collection_cache(self._state).cache_dir / "args" / self._env_conf.name
+
+    def write_collections_args(self) -> None:
+        """Point the requirements installs at the cached collections, downloaded or reused."""
+        if self.collections_args is None:
+            return
+        cache = collection_cache(self._state)
+        self.collections_args.mkdir(parents=True, exist_ok=True)
+        for req_path in self._found_reqs:
+            (self.collections_args / _args_name(req_path)).write_text(
+                cache.install_args(req_path),
+                encoding="utf-8",
+            )
+
+    @cached_property
+    def _found_reqs(self) -> list[str]:
+        """The requirements files of the test type the project has.
+
+        Returns:
+            The requirements files, relative to the project.
+        """
+        index = self._context.index
+        return [
+            path for path in TEST_REQUIREMENTS_YML.get(self.test_type, []) if index.has_file(path)
+        ]
+
+    def compose_layers(self, env_dir: Path, python: Path) -> None:
+        """Add the shared tooling and core layers to the environment.
+
+        The core layer is only used when ansible-core is pinned to a wheel or
+        a commit, as a branch would be installed again by ade. Environments
+        of the tox-uv runners are not layered, as uv ignores the packages of
+        the ``.pth`` file: they are populated from the base environment of
+        their python and core instead.
+
+        Args:
+            env_dir: The environment directory.
+            python: The interpreter of the environment.
+        """
+        if self.test_type not in LAYERED_TEST_TYPES:
+            return
+        wheelhouse = active_wheelhouse(self._state)
+        if str(self._env_conf["runner"]).startswith("uv"):
+            core = (self.core_source,) if "://" in self.core_source else ()
+            base = BaseEnv(
+                _bases_dir(self._env_conf),
+                f"{self._python}-{self._ansible_version}",
+                python,
+                (*TOOLING_LAYER_DEPS, *core),
+                wheelhouse,
+            )
+            base.populate(env_dir, session_layers(self._state))
+            return
+        layers_dir = _layers_dir(self._env_conf)
+        tooling = Layer(
+            layers_dir,
+            self._python,
+            python,
+            TOOLING_LAYER_DEPS,
+            wheelhouse,
+            exclude=TOOLING_LAYER_EXCLUDE,
+        )
+        layers = [tooling]
+        if "://" in self.core_source:
+            name = f"{self._python}-{self._ansible_version}"
+            layers.insert(0, Layer(layers_dir, name, python, (self.core_source,), wheelhouse))
+        compose(env_dir, python, layers, session_layers(self._state))
+
+    @cached_property
+    def dependency_lock(self) -> Path | None:
+        """The lock file shared by the environments of the same python and core.
+
+        A branch of ansible-core named without its archive is not locked, as
+        the lock would be resolved with the core of the index. Environments
+        of the tox-uv runners are not locked either: the lock is resolved with
+        the pip of the environment, which they do not have.
+
+        Returns:
+            The lock file, None if the test type installs no Python dependencies
+            or the environment is not locked.
+        """
+        if self.test_type not in LOCKED_TEST_TYPES:
+            return None
+        if "://" not in self.core_source or str(self._env_conf["runner"]).startswith("uv"):
+            return None
+        return dependency_locks(self._state).path(f"{self._python}-{self._ansible_version}")
+
+    def lock_dependencies(self, python: Path) -> None:
+        """Resolve the dependency lock the ``deps`` are installed with, unless current.
+
+        Args:
+            python: The interpreter of the environment.
+        """
+        if self.dependency_lock is None:
+            return
+        dependency_locks(self._state).ensure(
+            self.dependency_lock.stem,
+            python,
+            conf_lock_requirements(index=self._context.index, acv=self.core_source),
+        )
+
+    def shared_paths(self, env_dir: Path) -> list[Path]:
+        """The shared files of the work dir the environment uses.
+
+        Args:
+            env_dir: The environment directory.
+
+        Returns:
+            Its layers, its dependency lock and the ansible-core wheel it installed.
+        """
+        paths = composed_layers(env_dir, _layers_dir(self._env_conf))
+        if self.dependency_lock is not None:
+            paths.append(self.dependency_lock)
+        if self.core_wheel is not None:
+            paths.append(self.core_wheel.parent)
+        root = shared_root(env_dir)
+        return [path for path in paths if path.exists() and path.is_relative_to(root)]
+
+    def import_archive(self, env_dir: Path) -> None:
+        """Replace the environment with its ``--import-env`` archive, if provisioned alike.
+
+        Args:
+            env_dir: The environment directory.
+        """
+        archive_dir = getattr(self._state.conf.options, "import_env", None)
+        if archive_dir is None or not self._provision_commands:
+            return
+        archive = archive_path(Path(archive_dir), self._env_conf.name)
+        if not archive.is_file():
+            logger.info(
+                "%s has no archive in %s, provisioning it", self._env_conf.name, archive_dir
+            )
+            return
+        import_env(
+            archive,
+            env_name=self._env_conf.name,
+            env_dir=env_dir,
+            project_dir=self._context.project_dir,
+            fingerprint=self.provision_fingerprint,
+        )
+
+    def export_archive(self) -> None:
+        """Pack the provisioned environment into the directory given with ``--export-env``."""
+        archive_dir = getattr(self._state.conf.options, "export_env", None)
+        if archive_dir is None or not self._provision_commands:
+            return
+        env_dir = Path(self._env_conf["env_dir"])
+        fingerprint = self.provision_fingerprint()
+        if fingerprint is None or not is_provisioned(env_dir, fingerprint):
+            logger.warning("%s is not provisioned, not exporting it", self._env_conf.name)
+            return
+        export_env(
+            archive_path(Path(archive_dir), self._env_conf.name),
+            env_name=self._env_conf.name,
+            env_dir=env_dir,
+            project_dir=self._context.project_dir,
+            fingerprint=fingerprint,
+            shared=self.shared_paths(env_dir),
+        )
+
+    @cached_property
+    def acv(self) -> str:
+        """The ansible-core installed by ade when no wheel is built.
+
+        Returns:
+            The archive of the session, or the ref of the core factor.
+        """
+        if not cache_available():
+            return core_ref(self._ansible_version)
+        return core_cache(self._state).acv(self._ansible_version)
+
+    @cached_property
+    def core_wheel(self) -> Path | None:
+        """The ansible-core wheel of the session, installed with the ``deps``.
+
+        Returns:
+            The wheel, None if it is not built or the environment installs no core.
+        """
+        if self.core_pointer is None:
+            return None
+        return core_cache(self._state).wheel(self._ansible_version)
+
+    @property
+    def core_source(self) -> str:
+        """The ansible-core installed.
+
+        Returns:
+            The wheel URL, or else the ``--acv`` value of ade.
+        """
+        return self.core_wheel.as_uri() if self.core_wheel is not None else self.acv
+
+    def provision_fingerprint(self) -> str | None:
+        """Hash the inputs of the provisioning commands.
+
+        Returns:
+            The fingerprint, None if the environment has no provisioning
+            commands or installs a branch of ansible-core by name, which
+            moves without notice.
+        """
+        if not self._provision_commands:
+            return None
+        if self._ansible_version in BRANCH_FACTORS and "://" not in self.core_source:
+            return None
+        index = self._context.index
+        files = [
+            "galaxy.yml",
+            *TEST_REQUIREMENTS_YML.get(self.test_type, []),
+            *PYTHON_DEPENDENCY_FILES,
+        ]
+        return provision_fingerprint(
+            env_dir=Path(self._env_conf["env_dir"]),
+            acv=self.core_source,
+            deps=self.deps,
+            commands=self._provision_commands,
+            project_dir=self._context.project_dir,
+            files=[name for name in files if name == "galaxy.yml" or index.has_file(name)],
+            source=self._context.source_digest if self.reinstalls_sources else "",
+        )
+
+    @property
+    def reinstalls_sources(self) -> bool:
+        """Whether a change of the sources provisions the environment again.
+
+        Returns:
+            True for sanity, which installs a copy of the collection, when the
+            copy cannot be synced.
+        """
+        return self.test_type == "sanity" and self._context.collection.manifest is not None
+
+    def sync_installed(self) -> bool:
+        """Apply the changes of the sources to the copy of the collection sanity installed.
+
+        Returns:
+            False if the collection has to be installed again.
+        """
+        if self.test_type != "sanity":
+            return True
+        collection = self._context.collection
+        return sync_collection(
+            self._context.project_dir,
+            collection,
+            _collection_install_path(self._env_conf, collection),
+        )
+
+    def prepare(self) -> None:
+        """Write the files the commands read and build the shared artifacts.
+
+        Nothing is provisioned again when the provisioning inputs did not
+        change since the last successful provisioning of the environment,
+        unless ``--ansible-reprovision`` is given. The changes of the sources
+        are then synced into the copy of the collection sanity installed.
+        """
+        self.write_coverage_config()
+        self.write_core_pointer()
+        if self._provision_commands:
+            env_dir = Path(self._env_conf["env_dir"])
+            fingerprint = self.provision_fingerprint()
+            reprovision = getattr(self._state.conf.options, "ansible_reprovision", False)
+            if (
+                fingerprint is not None
+                and not reprovision
+                and is_provisioned(env_dir, fingerprint)
+                and self.sync_installed()
+            ):
+                logger.info("%s is provisioned, skipping commands_pre", self._env_conf.name)
+                self.provisioned = True
+                return
+            start_provisioning(env_dir, fingerprint)
+            self.write_collections_args()
+        if self.artifact is not None:
+            artifact = self.artifact.ensure()
+            if self.artifact_pointer is not None:
+                self.artifact_pointer.parent.mkdir(parents=True, exist_ok=True)
+                self.artifact_pointer.write_text(str(artifact), encoding="utf-8")
+
+    @property
+    def allowlist_externals(self) -> list[str]:
+        """The allowed external commands.
+
+        Returns:
+            The allowed external commands.
+        """
+        return ALLOWED_EXTERNALS
+
+    @property
+    def base_python(self) -> list[str]:
+        """The base Python interpreter to use.
+
+        Returns:
+            The base Python factor.
+        """
+        return [self._python]
+
+    @cached_property
+    def commands(self) -> list[str]:
+        """The commands to run.
+
+        Returns:
+            The commands, none when only provisioning.
+        """
+        if self.provision_only:
+            return []
+        if self.test_type == "molecule":
+            molecule_commands = self._context.ansible_config.molecule_commands
+            molecule_append = self._context.ansible_config.molecule_append
+        else:
+            molecule_commands = []
+            molecule_append = []
+        return conf_commands(
+            collection=self._context.collection,
+            env_conf=self._env_conf,
+            pos_args=self._state.conf.pos_args(to_path=None),
+            test_type=self.test_type,
+            coverage_config=self.coverage_config,
+            molecule_commands=molecule_commands,
+            molecule_append=molecule_append,
+            artifact=self.artifact_path,
+        )
+
+    @property
+    def depends(self) -> EnvList:
+        """The environments provisioned before this one with ``--provision-only``.
+
+        Returns:
+            The first environment of the core, for the others.
+        """
+        return EnvList(env_depends(self._state, self._env_conf.name))
+
+    @property
+    def commands_pre(self) -> list[str]:
+        """The pre-run commands, recording the provisioning once they succeeded.
+
+        Returns:
+            The pre-run commands, none if the environment is provisioned.
+        """
+        if self.provisioned or not self._provision_commands:
+            return []
+        return [*self._provision_commands, record_command(Path(self._env_conf["env_dir"]))]
+
+    @cached_property
+    def _provision_commands(self) -> list[str]:
+        """The commands installing ansible-core, the collection and its requirements.
+
+        Returns:
+            The provisioning commands.
+        """
+        return conf_commands_pre(
+            collection=self._context.collection,
+            env_conf=self._env_conf,
+            test_type=self.test_type,
+            ansible_version=self._ansible_version,
+            index=self._context.index,
+            artifact_pointer=self.artifact_pointer,
+            core_pointer=self.core_pointer,
+            collections_args=self.collections_args,
+        )
+
+    @cached_property
+    def deps(self) -> str:
+        """The dependencies for the test.
+
+        Returns:
+            The dependencies.
+        """
+        return conf_deps(
+            test_type=self.test_type,
+            coverage_enabled=self.coverage_enabled,
+            index=self._context.index,
+            lock=self.dependency_lock,
+            core=self.core_requirements,
+        )
+
+    @cached_property
+    def description(self) -> str:
+        """The description of the test.
+
+        The commit of a moving core is only named when known without reaching
+        the repository, so that ``tox list`` stays offline.
+
+        Returns:
+            The description.
+        """
+        revision = None
+        if self._ansible_version in BRANCH_FACTORS:
+            revision = core_cache(self._state).known_revision(core_ref(self._ansible_version))
+        return desc_for_env(self._env_conf.name, revision)
+
+    @property
+    def passenv(self) -> list[str]:
+        """The pass environment.
+
+        Returns:
+            The passed environment variables.
+        """
+        return conf_passenv()
+
+    @cached_property
+    def setenv(self) -> str:
+        """The set environment variables for the test.
+
+        Returns:
+            The set environment variables.
+        """
+        return conf_setenv(
+            env_conf=self._env_conf,
+            test_type=self.test_type,
+            wheelhouse=active_wheelhouse(self._state),
+        )
+
+    @property
+    def skip_install(self) -> bool:
+        """Skip the installation.
+
+        Returns:
+            Always True, ade installs the collection.
+        """
+        return True
+
+
+class _LazyValues(dict[str, Any]):
+    """Dictionary computing each value on first lookup and keeping it."""
+
+    def __init__(self, factories: dict[str, Callable[[], Any]]) -> None:
+        """Initialize the dictionary.
+
+        Args:
+            factories: The value factory of every key.
+        """
+        super().__init__()
+        self._factories = factories
+
+    def __missing__(self, key: str) -> Any:  # noqa: ANN401
+        """Compute and store a value.
+
+        Args:
+            key: The key.
+
+        Returns:
+            The computed value.
+        """
+        value = self._factories[key]()
+        self[key] = value
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        """Check whether a key can be provided, without computing it.
+
+        Args:
+            key: The key.
+
+        Returns:
+            True if the key has a factory.
+        """
+        return key in self._factories
+
+
+class AnsibleTestLoader(MemoryLoader):
+    """Memory loader computing each value of an ``AnsibleTestConf`` when tox reads it.
+
+    Attributes:
+        test_conf: The lazily computed test configuration.
+    """
+
+    def __init__(self, test_conf: AnsibleTestConf) -> None:
+        """Initialize the loader.
+
+        Args:
+            test_conf: The test configuration to serve.
+        """
+        super().__init__()
+        self.test_conf = test_conf
+        self.raw = _LazyValues(
+            {key: partial(getattr, test_conf, key) for key in test_conf.provided_keys()}
+        )
+
+    def found_keys(self) -> set[str]:
+        """List the provided keys without computing their values.
+
+        Returns:
+            The configuration keys.
+        """
+        return set(self.test_conf.provided_keys())
+
+
+def add_env_config(env_conf: EnvConfigSet, state: State) -> None:
+    """Add the test requirements and ansible-core to the virtual environment.
+
+    Args:
+        env_conf: The environment configuration object.
+        state: The state object.
+    """
+    factors = env_factors(env_conf.name)
+    if not factors.is_ansible_env:
+        return
+    env_conf.loaders.append(AnsibleTestLoader(AnsibleTestConf(env_conf, state, factors)))
+
+
+def before_run_commands(tox_env: ToxEnv) -> None:
+    """Write the files and build the artifact the commands of an ansible environment need.
+
+    Kept out of the configuration loading so that inspecting the
+    configuration has no side effect on disk.
+
+    Args:
+        tox_env: The tox environment about to run its commands.
+    """
+    for loader in tox_env.conf.loaders:
+        if isinstance(loader, AnsibleTestLoader):
+            loader.test_conf.prepare()
+
+
+def before_install(tox_env: ToxEnv, of_type: str) -> None:
+    """Compose an ansible environment of the shared layers and lock its deps before installing them.
+
+    With ``--import-env``, the environment is first replaced with its archive
+    when it was provisioned with the same inputs.
+
+    Args:
+        tox_env: The tox environment about to install packages.
+        of_type: The kind of packages being installed.
+    """
+    if of_type != "deps":
+        return
+    for loader in tox_env.conf.loaders:
+        if isinstance(loader, AnsibleTestLoader):
+            python = Path(tox_env.conf["env_python"])
+            loader.test_conf.import_archive(Path(tox_env.conf["env_dir"]))
+            loader.test_conf.write_core_requirements()
+            loader.test_conf.compose_layers(Path(tox_env.conf["env_dir"]), python)
+            loader.test_conf.lock_dependencies(python)
+
+
+def after_run_commands(tox_env: ToxEnv) -> None:
+    """Export an ansible environment once provisioned, with ``--export-env``.
+
+    Args:
+        tox_env: The tox environment that ran its commands.
+    """
+    for loader in tox_env.conf.loaders:
+        if isinstance(loader, AnsibleTestLoader):
+            loader.test_conf.export_archive()
+
+
+def _site_packages_path(env_conf: EnvConfigSet) -> Path:
+    """Build the site-packages path of a tox environment.
+
+    Args:
+        env_conf: The tox environment configuration object.
+
+    Returns:
+        The site-packages path.
+    """
+    py_ver = env_factors(env_conf.name).py_version
+    return Path(env_conf["env_dir"]) / "lib" / f"python{py_ver}" / "site-packages"
+
+
+def _collection_install_path(env_conf: EnvConfigSet, collection: Collection) -> Path:
+    """Build the collection installation path inside a tox environment.
+
+    Args:
+        env_conf: The tox environment configuration object.
+        collection: The collection info.
+
+    Returns:
+        The installed collection path.
+    """
+    return (
+        _site_packages_path(env_conf)
+        / "ansible_collections"
+        / collection.namespace
+        / collection.name
+    )
+
+
+def _args_name(req_path: str) -> str:
+    """Name the file holding the install arguments of a requirements file.
+
+    Args:
+        req_path: The requirements file, relative to the project.
+
+    Returns:
+        The file name, e.g. ``tests-unit-requirements.yml``.
+    """
+    return req_path.replace("/", "-")
+
+
+def _artifacts_dir(env_conf: EnvConfigSet) -> Path:
+    """Build the directory shared by the collection artifacts of the session.
+
+    Args:
+        env_conf: The tox environment configuration object.
+
+    Returns:
+        The artifacts directory.
+    """
+    return Path(env_conf["env_dir"]).parent / ".tox-ansible" / "artifacts"
+
+
+def _bases_dir(env_conf: EnvConfigSet) -> Path:
+    """Build the directory of the base environments of the tox-uv runners.
+
+    Args:
+        env_conf: The tox environment configuration object.
+
+    Returns:
+        The bases directory, shared by the sessions using the same work dir.
+    """
+    return Path(env_conf["env_dir"]).parent / ".tox-ansible" / "bases"
+
+
+def _layers_dir(env_conf: EnvConfigSet) -> Path:
+    """Build the directory of the shared site-packages layers.
+
+    Args:
+        env_conf: The tox environment configuration object.
+
+    Returns:
+        The layers directory, shared by the sessions using the same work dir.
+    """
+    return Path(env_conf["env_dir"]).parent / ".tox-ansible" / "layers"
+
+
+def _shared_cache_dir(env_conf: EnvConfigSet) -> Path:
+    """Build the directory of the installer caches shared by the environments.
+
+    Args:
+        env_conf: The tox environment configuration object.
+
+    Returns:
+        The shared cache directory, used by the sessions using the same work dir.
+    """
+    return Path(env_conf["env_dir"]).parent / ".tox-ansible" / "cache"
+
+
+def _coverage_config_path(env_conf: EnvConfigSet) -> Path:
+    """Build the environment-specific coverage configuration path.
+
+    Args:
+        env_conf: The tox environment configuration object.
+
+    Returns:
+        The coverage configuration path.
+    """
+    return Path(env_conf["env_dir"]).parent / ".tox-ansible" / "coverage" / f"{env_conf.name}.ini"
+
+
+def _write_coverage_config(
+    env_conf: EnvConfigSet,
+    collection: Collection,
+) -> Path:
+    """Write an environment-specific coverage configuration.
+
+    Args:
+        env_conf: The tox environment configuration object.
+        collection: The collection info.
+
+    Returns:
+        The generated coverage configuration path.
+    """
+    coverage_config = _coverage_config_path(env_conf)
+    coverage_config.parent.mkdir(parents=True, exist_ok=True)
+    installed_plugins = _collection_install_path(env_conf, collection) / "plugins"
+    coverage_data = Path(env_conf["env_dir"]).resolve() / ".coverage"
+    coverage_config.write_text(
+        "[run]\n"
+        f"data_file = {coverage_data}\n"
+        "source =\n"
+        "    plugins\n"
+        f"    {installed_plugins}\n"
+        "\n"
+        "[paths]\n"
+        "source =\n"
+        "    plugins\n"
+        f"    {installed_plugins}\n"
+        "\n"
+        "[report]\n"
+        "include_namespace_packages = true\n"
+        "show_missing = true\n",
+        encoding="utf-8",
+    )
+    return coverage_config
+
+
+def conf_commands(  # noqa: PLR0913
+    collection: Collection,
+    env_conf: EnvConfigSet,
+    pos_args: tuple[str, ...] | None,
+    test_type: str,
+    *,
+    coverage_config: Path | None = None,
+    molecule_commands: list[str] | None = None,
+    molecule_append: list[str] | None = None,
+    artifact: Path | None = None,
+) -> list[str]:
+    """Build the commands for the tox environment.
+
+    Args:
+        collection: The collection info.
+        env_conf: The tox environment configuration object.
+        pos_args: Positional arguments passed to tox command.
+        test_type: The test type.
+        coverage_config: The generated coverage configuration path.
+        molecule_commands: Full-replacement molecule commands from config.
+        molecule_append: Extra argv appended to the default molecule command.
+        artifact: The built collection tarball imported by galaxy tests.
+
+    Returns:
+        The commands to run.
+    """
+    if test_type in ["integration", "unit"]:
+        return conf_commands_for_integration_unit(
+            pos_args=pos_args,
+            test_type=test_type,
+            coverage_config=coverage_config,
+        )
+    if test_type == "molecule":
+        return conf_commands_for_molecule(
+            pos_args=pos_args,
+            molecule_commands=molecule_commands,
+            molecule_append=molecule_append,
+        )
+    if test_type == "sanity":
+        return conf_commands_for_sanity(
+            collection=collection,
+            env_conf=env_conf,
+            pos_args=pos_args,
+        )
+    if test_type == "galaxy":
+        return conf_commands_for_galaxy(
+            collection=collection,
+            env_conf=env_conf,
+            artifact=artifact,
+        )
+    err = f"Unknown test type {test_type}"
+    logger.critical(err)
+    sys.exit(1)
+
+
+def conf_commands_for_integration_unit(
+    pos_args: tuple[str, ...] | None,
+    test_type: str,
+    coverage_config: Path | None = None,
+) -> list[str]:
+    """Build the commands for integration and unit tests.
+
+    Args:
+        pos_args: Positional arguments passed to tox command.
+        test_type: The test type, either "integration" or "unit".
+        coverage_config: The generated coverage configuration path.
+
+    Returns:
+        The commands to run.
+    """
+    args = f" {' '.join(pos_args)} " if pos_args else " "
+    coverage_args = (
+        f" --cov --cov-config={coverage_config}"
+        if test_type == "unit" and coverage_config is not None
+        else ""
+    )
+
+    # Use pytest ansible unit inject only to inject the collection path
+    # into the collection finder
+    command = (
+        f"python3 -m pytest{coverage_args} "
+        f"--ansible-unit-inject-only{args}{Path()}/tests/{test_type}"
+    )
+    return [command]
+
+
+def conf_commands_for_molecule(
+    pos_args: tuple[str, ...] | None,
+    molecule_commands: list[str] | None = None,
+    molecule_append: list[str] | None = None,
+) -> list[str]:
+    """Build the commands for molecule tests.
+
+    Default is ``python3 -m molecule test --all``. ``molecule_append`` adds
+    argv after that default. Non-empty ``molecule_commands`` fully replaces the
+    default (and ignores ``molecule_append`` / ``pos_args``).
+
+    Args:
+        pos_args: Positional arguments passed to tox command.
+        molecule_commands: Full-replacement molecule commands from config.
+        molecule_append: Extra argv appended to the default molecule command.
+
+    Returns:
+        The commands to run.
+    """
+    if molecule_commands:
+        return list(molecule_commands)
+
+    parts = ["python3", "-m", "molecule", "test", "--all"]
+    if molecule_append:
+        parts.extend(molecule_append)
+    if pos_args:
+        parts.extend(pos_args)
+    return [" ".join(parts)]
+
+
+def conf_commands_for_sanity(
+    collection: Collection,
+    env_conf: EnvConfigSet,
+    pos_args: tuple[str, ...] | None,
+) -> list[str]:
+    """Add commands for sanity tests.
+
+    Args:
+        collection: The collection info.
+        env_conf: The tox environment configuration object.
+        pos_args: Positional arguments passed to tox command.
+
+    Returns:
+        The commands to run.
+    """
+    commands = []
+
+    args = f" {' '.join(pos_args)}" if pos_args else ""
+
+    py_ver = env_factors(env_conf.name).py_version
+    collection_path = _collection_install_path(env_conf, collection)
+
+    command = f"ansible-test sanity --local --requirements --python {py_ver}{args}"
+    full_command = f"bash -c 'cd {collection_path} && {command}'"
+    commands.append(full_command)
+    return commands
+
+
+def conf_commands_for_galaxy(
+    collection: Collection,  # noqa: ARG001
+    env_conf: EnvConfigSet,
+    artifact: Path | None = None,
+) -> list[str]:
+    """Add commands for galaxy tests.
+
+    Args:
+        collection: The collection info.
+        env_conf: The tox environment configuration object.
+        artifact: The built collection tarball, the importer builds its own when None.
+
+    Returns:
+        The commands to run.
+    """
+    commands = []
+    env_tmp_dir = env_conf["env_tmp_dir"]
+    env_log_dir = env_conf["env_log_dir"]
+    env_python = env_conf["env_python"]
+    if artifact is not None:
+        source = str(artifact)
+    else:
+        config_dir = env_conf._conf.src_path.parent.resolve()
+        source = f"--git-clone-path {config_dir}"
+    commands.append(
+        f"bash -c 'cd {env_log_dir} && "
+        f"{env_python} -m galaxy_importer.main "
+        f"{source} --output-path {env_tmp_dir}'"
+    )
+
+    return commands
+
+
+def _add_collection_req_commands(  # noqa: PLR0913
+    commands: list[str],
+    found_reqs: list[str],
+    envdir: str,
+    core_args: str,
+    end_group: str,
+    *,
+    site_packages: Path | None = None,
+    collections_args: Path | None = None,
+) -> None:
+    """Append install commands for each discovered requirements file.
+
+    Args:
+        commands: The command list to append to.
+        found_reqs: Requirement file paths that exist on disk.
+        envdir: The tox environment directory.
+        core_args: The ansible-core arguments of ade.
+        end_group: The CI group-close command string.
+        site_packages: The site-packages directory of the environment.
+        collections_args: The directory of the files naming the cached
+            collections to install, written before the commands run, instead
+            of installing the requirements files with ade.
+    """
+    if collections_args is not None and site_packages is not None:
+        if in_action():
+            commands.append("echo ::group::Install collection requirements from the cache")
+        for req_path in found_reqs:
+            args_file = collections_args / _args_name(req_path)
+            commands.append(
+                "bash -c 'ansible-galaxy collection install --force"
+                f" -p {site_packages} $(cat {args_file})'",
+            )
+        if in_action():
+            commands.append(end_group)
+        return
+    if in_action():
+        commands.append("echo ::group::Install collection requirements with ade")
+    for req_path in found_reqs:
+        ade_req_cmd = f"ade install -r {req_path} --venv {envdir} {core_args} --no-seed --im none"
+        commands.append(
+            f"bash -c '{ade_req_cmd}; rc=$?; if [ $rc -ne 0 ] && [ $rc -ne 2 ]; then exit $rc; fi'",
+        )
+    if in_action():
+        commands.append(end_group)
+
+
+def _add_sanity_git_init(
+    commands: list[str],
+    env_conf: EnvConfigSet,
+    collection: Collection,
+    end_group: str,
+) -> None:
+    """Append the command making the installed collection a git workspace, for ansible#68499.
+
+    The git directory lives in the environment directory, outside the
+    collection replaced by each installation, and is created once with the
+    branch name given on the command line rather than in the global git
+    configuration, which parallel environments would write concurrently. Later
+    installations only link the collection to it again.
+
+    Args:
+        commands: The command list to append to.
+        env_conf: The tox environment configuration object.
+        collection: The collection info.
+        end_group: The CI group-close command string.
+    """
+    collection_path = _collection_install_path(env_conf, collection)
+    git_dir = Path(env_conf["env_dir"]) / SANITY_GIT_DIR
+    if in_action():  # pragma: no cover
+        commands.append("echo ::group::Initialize the collection to avoid ansible #68499")
+    git_init = f"git -c init.defaultBranch=main init -q --separate-git-dir {git_dir} ."
+    commands.append(f"bash -c 'cd {collection_path} && if [ ! -e .git ]; then {git_init}; fi'")
+    if in_action():  # pragma: no cover
+        commands.append(end_group)
+
+
+def conf_commands_pre(  # noqa: PLR0913, PLR0917
+    env_conf: EnvConfigSet,
+    collection: Collection,
+    test_type: str,
+    ansible_version: str,
+    index: ProjectIndex | None = None,
+    artifact_pointer: Path | None = None,
+    core_pointer: Path | None = None,
+    collections_args: Path | None = None,
+) -> list[str]:
+    """Install the collection using ade (ansible-dev-environment).
+
+    Args:
+        env_conf: The tox environment configuration object.
+        collection: The collection info.
+        test_type: The test type, either "integration", "unit", "sanity", or "galaxy".
+        ansible_version: The ansible version factor from the env name.
+        index: The project index, scanned from the current directory when omitted.
+        artifact_pointer: The file naming the built collection tarball installed by
+            sanity tests instead of the source tree, written before the commands run.
+        core_pointer: The file naming the ansible-core wheel or commit, written
+            before the commands run, instead of the branch of the factor.
+        collections_args: The directory of the files naming the cached collections
+            of the requirements files, written before the commands run.
+
+    Returns:
+        The commands to pre run.
+    """
+    if test_type == "galaxy":
+        return []
+
+    commands = []
+    envdir = env_conf["env_dir"]
+    end_group = "echo ::endgroup::"
+
+    if core_pointer is not None:
+        core_args = f"$(cat {core_pointer})"
+    else:
+        core_args = f"--acv {core_ref(ansible_version)}"
+
+    if in_action():
+        commands.append("echo ::group::Install collection with ade")
+    editable = " -e" if test_type != "sanity" else ""
+    # ade only installs collections from a directory, the artifact is
+    # installed by ansible-galaxy once ade installed ansible-core.
+    source = "" if test_type == "sanity" and artifact_pointer is not None else " ."
+    ade_cmd = f"ade install{editable} --venv {envdir} {core_args} --no-seed --im none{source}"
+    commands.append(
+        f"bash -c '{ade_cmd}; rc=$?; if [ $rc -ne 0 ] && [ $rc -ne 2 ]; then exit $rc; fi'",
+    )
+    if not source:
+        commands.append(
+            "bash -c 'ansible-galaxy collection install --force"
+            f" -p {_site_packages_path(env_conf)} $(cat {artifact_pointer})'",
+        )
+    if in_action():
+        commands.append(end_group)
+
+    req_paths = TEST_REQUIREMENTS_YML.get(test_type, [])
+    if index is None:
+        index = ProjectIndex.scan(Path.cwd())
+    found_reqs = [p for p in req_paths if index.has_file(p)]
+    if found_reqs:
+        _add_collection_req_commands(
+            commands,
+            found_reqs,
+            envdir,
+            core_args,
+            end_group,
+            site_packages=_site_packages_path(env_conf),
+            collections_args=collections_args,
+        )
+
+    if test_type == "sanity":
+        _add_sanity_git_init(commands, env_conf, collection, end_group)
+
+    return commands
+
+
+def _test_deps(test_type: str, *, coverage_enabled: bool, index: ProjectIndex) -> list[str]:
+    """Assemble dependencies for integration and unit test environments.
+
+    Args:
+        test_type: The test type, either "integration" or "unit".
+        coverage_enabled: Whether unit test coverage is enabled.
+        index: The project index used to read the Python dependency files.
+
+    Returns:
+        The merged requirements, followed by the options of the dependency files.
+    """
+    deps = list(OUR_DEPS)
+    if test_type == "unit" and coverage_enabled:
+        deps.extend(COVERAGE_DEPS)
+    if test_type in ("integration", "molecule"):
+        deps.append(MOLECULE_DEP)
+    project = index.python_requirements
+    merged = merge_requirements([*((dep, "tox-ansible") for dep in deps), *project.requirements])
+    return [*merged, *project.options]
+
+
+def conf_lock_requirements(index: ProjectIndex, acv: str) -> list[str]:
+    """Assemble the dependencies of every locked test type of a python and core.
+
+    Args:
+        index: The project index used to read the Python dependency files.
+        acv: The ansible-core installed, resolved with the dependencies when
+            it is a wheel or an archive.
+
+    Returns:
+        The merged requirements, followed by the options of the dependency files.
+    """
+    deps = [*TOOLING_LAYER_DEPS, MOLECULE_DEP]
+    project = index.python_requirements
+    merged = merge_requirements([*((dep, "tox-ansible") for dep in deps), *project.requirements])
+    core = [f"ansible-core @ {acv}"] if "://" in acv else []
+    return [*merged, *core, *project.options]
+
+
+def conf_deps(
+    test_type: str,
+    *,
+    coverage_enabled: bool = False,
+    index: ProjectIndex | None = None,
+    lock: Path | None = None,
+    core: Path | None = None,
+) -> str:
+    """Add dependencies to the tox environment.
+
+    Args:
+        test_type: The test type, either "integration", "unit", or "sanity".
+        coverage_enabled: Whether unit test coverage is enabled.
+        index: The project index, scanned from the current directory when omitted.
+        lock: The dependency lock constraining the installed versions.
+        core: The requirements file installing the ansible-core wheel,
+            written before the dependencies are installed.
+
+    Returns:
+        The dependencies.
+    """
+    deps: list[str] = []
+    if test_type == "galaxy":
+        deps.append("galaxy-importer>=0.4.31")
+    else:
+        deps.append(ADE_DEP)
+        if core is not None:
+            deps.append(f"-r {core}")
+        if test_type in ("integration", "molecule", "unit"):
+            if index is None:
+                index = ProjectIndex.scan(Path.cwd())
+            deps.extend(
+                _test_deps(test_type, coverage_enabled=coverage_enabled, index=index),
+            )
+            if lock is not None:
+                deps.append(f"-c {lock}")
+    return "\n".join(deps)
+
+
+def conf_passenv() -> list[str]:
+    """Build the pass environment variables for the tox environment.
+
+    Returns:
+        The pass environment variables.
+    """
+    passenv = []
+    passenv.append("GITHUB_TOKEN")
+    return passenv
+
+
+def conf_setenv(env_conf: EnvConfigSet, test_type: str, *, wheelhouse: Path | None = None) -> str:
+    """Build the set environment variables for the tox environment.
+
+    Set the XDG_CACHE_HOME to the environment directory to isolate it, while
+    pip and uv share their caches of downloaded and built wheels, which they
+    update safely from parallel environments. A cache directory set by the
+    user is kept.
+
+    Args:
+        env_conf: The tox environment configuration object.
+        test_type: The test type.
+        wheelhouse: The wheelhouse the installers use instead of an index.
+
+    Returns:
+        The set environment variables.
+    """
+    setenv = [
+        f"XDG_CACHE_HOME={env_conf['env_dir']}/.cache",
+    ]
+    cache_dir = _shared_cache_dir(env_conf)
+    setenv.extend(
+        f"{var}={cache_dir / name}"
+        for var, name in SHARED_CACHE_VARS.items()
+        if var not in os.environ
+    )
+    if wheelhouse is not None:
+        setenv.extend(f"{var}={value}" for var, value in index_env(wheelhouse).items())
+
+    if test_type != "galaxy":
+        setenv.insert(0, "ANSIBLE_COLLECTIONS_PATH=.")
+
+    # due to the ceilings used by galaxy-importer, use of constraints will
+    # likely cause installation failures.
+    if test_type == "galaxy":
+        setenv.append("PIP_CONSTRAINT=/dev/null")
+        setenv.append("UV_CONSTRAINT=/dev/null")
+    return "\n".join(setenv)
@@ -0,0 +1,446 @@
+"""Shared site-packages layers composed into the environments.
+
+``OUR_DEPS``, ``COVERAGE_DEPS`` and ade are the same in every environment,
+and only ansible-core differs between the cores. They are installed once into
+read-only layers under ``.tox/.tox-ansible/layers/``: a tooling layer per
+python in ``<python>/<key>/`` and a core layer per python and core in
+``<python>-<core>/<key>/``, where the key covers the interpreter and the
+requirements. ansible-core, pulled in by pytest-ansible and ansible-compat,
+is removed from the tooling layer: an environment gets it from its core layer
+or from ade. Before tox installs the dependencies of an environment, a
+``.pth`` file adds the layers to its ``sys.path`` after its own
+site-packages, so only the collection and the packages of its test type are
+installed into the environment.
+
+An environment resolves imports from its own site-packages first, then from
+the core layer, then from the tooling layer. Installers do not remove files
+outside the environment, so upgrading a layered package installs the new
+version into the environment, where it shadows the layer. Console scripts of
+the layers are copied into the environment with their shebang pointing at
+its interpreter.
+
+A layer that could not be installed is not tried again in the same tox
+session. Layers of older keys are removed once no environment of the work dir
+is composed of them anymore.
+"""
+
+from __future__ import annotations
+
+import csv
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import weakref
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from tox_ansible.wheelhouse import no_index_args
+
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+# The .pth file composing the layers into an environment.
+LAYERS_PTH = "_tox_ansible_layers.pth"
+# Written into a composed environment, holding the keys of its layers.
+LAYERS_MARKER = ".tox-ansible-layers"
+# The FICLONE ioctl request of Linux, cloning a file into another.
+_FICLONE = 0x40049409
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    """Clone a file sharing its blocks, on filesystems supporting it.
+
+    Args:
+        src: The source file.
+        dst: The file to create.
+
+    Raises:
+        OSError: If the platform or the filesystem cannot clone files.
+    """
+    if sys.platform != "linux":
+        raise OSError(errno.EOPNOTSUPP, "reflinks are only supported on Linux")
+
+    import fcntl  # noqa: PLC0415
+
+    with src.open("rb") as src_fileh, dst.open("wb") as dst_fileh:
+        fcntl.ioctl(dst_fileh.fileno(), _FICLONE, src_fileh.fileno())
+    shutil.copystat(src, dst)
+
+
+def _link_file(src: Path, dst: Path, *, reflink: bool) -> bool:
+    """Clone a file with a reflink, a hard link or a copy.
+
+    Args:
+        src: The source file.
+        dst: The file to create.
+        reflink: Whether reflinks are worth trying.
+
+    Returns:
+        Whether reflinks are worth trying for the next files.
+    """
+    if reflink:
+        try:
+            _reflink(src, dst)
+        except OSError:
+            dst.unlink(missing_ok=True)
+            reflink = False
+        else:
+            return True
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return reflink
+
+
+def _copy_script(src: Path, dst: Path, python: Path) -> bool:
+    """Copy a console script, pointing its shebang at another interpreter.
+
+    Args:
+        src: The script of the layer.
+        dst: The script to create.
+        python: The interpreter of the environment.
+
+    Returns:
+        False if the file is not a python script.
+    """
+    content = src.read_bytes()
+    first_line, newline, rest = content.partition(b"\n")
+    if not first_line.startswith(b"#!") or b"python" not in first_line:
+        return False
+    dst.write_bytes(f"#!{python}".encode() + newline + rest)
+    dst.chmod(stat.S_IMODE(src.stat().st_mode) | stat.S_IWUSR)
+    return True
+
+
+def clone_tree(src: Path, dst: Path, python: Path, *, scripts: bool = True) -> int:
+    """Clone the files of a directory into an environment, keeping existing files.
+
+    Args:
+        src: The directory of the layer.
+        dst: The directory of the environment.
+        python: The interpreter of the environment.
+        scripts: Whether the files are console scripts, their shebang rewritten.
+
+    Returns:
+        The number of files cloned.
+    """
+    reflink = True
+    cloned = 0
+    for root, _, files in os.walk(src):
+        rel = Path(root).relative_to(src)
+        (dst / rel).mkdir(parents=True, exist_ok=True)
+        for name in files:
+            src_file, dst_file = Path(root) / name, dst / rel / name
+            if dst_file.exists() or dst_file.is_symlink():
+                continue
+            cloned += 1
+            if not (scripts and _copy_script(src_file, dst_file, python)):
+                reflink = _link_file(src_file, dst_file, reflink=reflink)
+    return cloned
+
+
+def _make_read_only(root: Path) -> None:
+    """Remove the write permission of the files below a directory.
+
+    Directories stay writable so that stale layers can be removed.
+
+    Args:
+        root: The directory.
+    """
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = Path(dirpath) / name
+            if not path.is_symlink():
+                path.chmod(stat.S_IMODE(path.stat().st_mode) & ~0o222)
+
+
+def install_layer(
+    python: Path,
+    target: Path,
+    requirements: tuple[str, ...],
+    wheelhouse: Path | None = None,
+) -> bool:
+    """Install requirements into a layer with the pip of an interpreter.
+
+    Args:
+        python: The interpreter running pip.
+        target: The layer directory to install into.
+        requirements: The requirements.
+        wheelhouse: The wheelhouse to install from instead of the index.
+
+    Returns:
+        False if pip is missing or the installation failed.
+    """
+    cmd = [
+        str(python),
+        "-m",
+        "pip",
+        "install",
+        "--disable-pip-version-check",
+        "--no-warn-script-location",
+        "--target",
+        str(target),
+        *no_index_args(wheelhouse),
+        *requirements,
+    ]
+    proc = subprocess.run(cmd, capture_output=True, check=False, text=True)  # noqa: S603
+    if proc.returncode != 0:
+        logger.warning(
+            "Unable to install a shared layer, installing each environment instead: %s%s",
+            proc.stdout,
+            proc.stderr,
+        )
+        return False
+    return True
+
+
+def strip_distribution(target: Path, name: str) -> bool:
+    """Remove a distribution and its scripts from a layer, keeping its dependencies.
+
+    Args:
+        target: The layer directory pip installed into.
+        name: The distribution name, e.g. ``ansible-core``.
+
+    Returns:
+        Whether the distribution was installed in the layer.
+    """
+    prefix = re.sub(r"[-_.]+", "_", name).lower()
+    dist_infos = [
+        path
+        for path in target.glob("*.dist-info")
+        if path.name.lower().startswith(f"{prefix}-") and (path / "RECORD").is_file()
+    ]
+    for dist_info in dist_infos:
+        record = (dist_info / "RECORD").read_text(encoding="utf-8")
+        for row in csv.reader(record.splitlines()):
+            # Scripts are recorded relative to the lib/python of the home scheme.
+            path = target / row[0].removeprefix("../../")
+            if path.is_file() or path.is_symlink():
+                path.unlink()
+        shutil.rmtree(dist_info, ignore_errors=True)
+    for dirpath, _, _ in os.walk(target, topdown=False):
+        directory = Path(dirpath)
+        if directory != target and not any(directory.iterdir()):
+            directory.rmdir()
+    return bool(dist_infos)
+
+
+def site_packages(env_dir: Path) -> Path | None:
+    """Find the site-packages directory of a virtual environment.
+
+    Args:
+        env_dir: The environment directory.
+
+    Returns:
+        The site-packages directory, None if there is none.
+    """
+    return next(iter(sorted(env_dir.glob("lib/python*/site-packages"))), None)
+
+
+@dataclass(frozen=True)
+class Layer:
+    """Packages installed once and shared by the environments.
+
+    Attributes:
+        layers_dir: The directory holding every layer.
+        name: The factors the layer is shared by, e.g. ``py3.13`` or ``py3.13-2.19``.
+        python: The interpreter of the environment being composed.
+        requirements: The requirements installed into the layer.
+        wheelhouse: The wheelhouse the layer is installed from instead of the index.
+        exclude: The distributions removed once installed, their dependencies kept.
+    """
+
+    layers_dir: Path
+    name: str
+    python: Path
+    requirements: tuple[str, ...]
+    wheelhouse: Path | None = field(default=None, compare=False)
+    exclude: tuple[str, ...] = ()
+
+    @cached_property
+    def key(self) -> str:
+        """The digest of the interpreter, the requirements and the exclusions.
+
+        Returns:
+            The key of the layer.
+        """
+        payload: list[object] = [str(self.python.resolve()), sorted(self.requirements)]
+        if self.exclude:
+            payload.append(sorted(self.exclude))
+        return hashlib.sha256(json.dumps(payload).encode()).hexdigest()[:16]
+
+    @property
+    def path(self) -> Path:
+        """The layer directory, added to ``sys.path``.
+
+        Returns:
+            The layer path.
+        """
+        return self.layers_dir / self.name / self.key
+
+    def ensure(self, session: SessionLayers) -> bool:
+        """Install the layer unless it exists, once across parallel environments.
+
+        Args:
+            session: The layers of the tox session.
+
+        Returns:
+            False if the layer could not be installed.
+        """
+        if self.path.exists():
+            return True
+        if self.path in session.failed:
+            return False
+
+        from filelock import FileLock  # noqa: PLC0415
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.layers_dir / f"{self.name}.lock"):
+            if self.path.exists():
+                return True
+            if self.path in session.failed:
+                return False
+            with tempfile.TemporaryDirectory(dir=self.path.parent) as tmp_dir:
+                target = Path(tmp_dir) / "layer"
+                logger.info("Installing the %s layer", self.name)
+                if not install_layer(self.python, target, self.requirements, self.wheelhouse):
+                    session.failed.add(self.path)
+                    return False
+                for name in self.exclude:
+                    strip_distribution(target, name)
+                _make_read_only(target)
+                target.replace(self.path)
+        return True
+
+    def prune(self, work_dir: Path, keep: set[Path]) -> None:
+        """Remove the layers of other keys with the same name no environment uses.
+
+        Args:
+            work_dir: The work dir holding the environments composed of layers.
+            keep: The layers used in the tox session, even when not composed yet.
+        """
+        from filelock import FileLock  # noqa: PLC0415
+
+        with FileLock(self.layers_dir / f"{self.name}.lock"):
+            used = set(keep)
+            for marker in work_dir.glob(f"*/{LAYERS_MARKER}"):
+                used.update(composed_layers(marker.parent, self.layers_dir))
+            for stale in self.path.parent.iterdir():
+                if stale.is_dir() and stale not in used:
+                    shutil.rmtree(stale)
+
+
+@dataclass
+class SessionLayers:
+    """The layers of a tox session.
+
+    Attributes:
+        failed: The layers that could not be installed, not tried again.
+        used: The layers the environments of the session are composed of.
+    """
+
+    failed: set[Path] = field(default_factory=set)
+    used: set[Path] = field(default_factory=set)
+
+
+_SESSION_LAYERS: weakref.WeakKeyDictionary[State, SessionLayers] = weakref.WeakKeyDictionary()
+_SESSION_LAYERS_LOCK = threading.Lock()
+
+
+def session_layers(state: State) -> SessionLayers:
+    """Return the layers of the tox session.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        The session layers.
+    """
+    with _SESSION_LAYERS_LOCK:
+        return _SESSION_LAYERS.setdefault(state, SessionLayers())
+
+
+def compose(
+    env_dir: Path,
+    python: Path,
+    layers: Sequence[Layer],
+    session: SessionLayers | None = None,
+) -> bool:
+    """Add layers to the ``sys.path`` of an environment, the first one first.
+
+    An environment already composed of the same layers is left as is. Once
+    composed, the layers of older keys no environment uses are removed.
+
+    Args:
+        env_dir: The environment directory.
+        python: The interpreter of the environment.
+        layers: The layers, by decreasing precedence.
+        session: The layers of the tox session, a new one if not given.
+
+    Returns:
+        Whether the environment resolves imports from the layers.
+    """
+    session = SessionLayers() if session is None else session
+    keys = "\n".join(f"{layer.name} {layer.key}" for layer in layers)
+    marker = env_dir / LAYERS_MARKER
+    if marker.is_file() and marker.read_text(encoding="utf-8") == keys:
+        return True
+    site_dir = site_packages(env_dir)
+    if site_dir is None or not all(layer.ensure(session) for layer in layers):
+        return False
+    session.used.update(layer.path for layer in layers)
+
+    cloned = 0
+    for layer in layers:
+        if (layer.path / "bin").is_dir():
+            cloned += clone_tree(layer.path / "bin", env_dir / "bin", python)
+    # An import line lets site process the .pth files of the layers too.
+    add_dirs = "; ".join(f"site.addsitedir({str(layer.path)!r})" for layer in layers)
+    (site_dir / LAYERS_PTH).write_text(f"import site; {add_dirs}\n", encoding="utf-8")
+    logger.info(
+        "Composed %s of the %s layers, with %d scripts",
+        env_dir,
+        ", ".join(layer.name for layer in layers),
+        cloned,
+    )
+    marker.write_text(keys, encoding="utf-8")
+    for layer in layers:
+        layer.prune(env_dir.parent, session.used)
+    return True
+
+
+def composed_layers(env_dir: Path, layers_dir: Path) -> list[Path]:
+    """Return the layers an environment was composed of.
+
+    Args:
+        env_dir: The environment directory.
+        layers_dir: The directory holding every layer.
+
+    Returns:
+        The layer directories, none if the environment is not composed.
+    """
+    marker = env_dir / LAYERS_MARKER
+    if not marker.is_file():
+        return []
+    return [
+        layers_dir / name / key
+        for name, key in (line.split() for line in marker.read_text(encoding="utf-8").splitlines())
+    ]
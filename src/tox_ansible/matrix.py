@@ -0,0 +1,793 @@
+# cspell:ignore envlist
+"""Ansible test matrix generation and GitHub matrix output.
+
+Only ``add_ansible_matrix`` and ``generate_gh_matrix`` need tox; everything
+else, including the standalone generator run with ``python -m
+tox_ansible.matrix`` or ``tox-ansible-matrix``, works without importing it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import uuid
+
+from dataclasses import dataclass
+from itertools import groupby, product
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.version import InvalidVersion, Version
+
+from tox_ansible.core_cache import CoreWheelCache, cache_available, cores_dir
+from tox_ansible.project import (
+    RUNTIME_YML,
+    AnsibleConfiguration,
+    ProjectIndex,
+    _should_include_molecule,
+    in_action,
+    load_project_config,
+    project_context,
+    read_requires_ansible,
+    read_work_dir,
+)
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from tox.config.types import EnvList
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+ENV_LIST = """
+galaxy
+{integration, molecule, sanity, unit}-py3.11-{ 2.19 }
+{integration, molecule, sanity, unit}-py3.12-{2.19, 2.20, 2.21}
+{integration, molecule, sanity, unit}-py3.13-{2.19, 2.20, 2.21, milestone, devel}
+{integration, molecule, sanity, unit}-py3.14-{2.20, 2.21, milestone, devel}
+"""
+# ^ py314 is NOT supported before 2.20! If is in official metadata of the
+# release branch, is not supported.
+# https://docs.ansible.com/projects/ansible/latest/reference_appendices/release_and_maintenance.html#ansible-core-support-matrix
+
+# Additive AAP/cert cores not already present in ENV_LIST (ADR-001).
+# Used when downstream=true -> upstream union DOWNSTREAM_EXTRA.
+# Python floor for extras is Hub/partner cert minimum (3.12+), not tox's 3.11 floor.
+# https://access.redhat.com/support/policy/updates/ansible-automation-platform
+DOWNSTREAM_EXTRA = """
+{integration, sanity, unit}-py3.12-{2.16, 2.18}
+{integration, sanity, unit}-py3.13-{2.18}
+"""
+
+
+# Test types of the generated ``{test_type}-py{python}-{core}`` environments.
+TEST_TYPES = ("integration", "molecule", "sanity", "unit")
+# Number of factors in a ``{test_type}-py{python}-{core}`` environment name.
+EXPECTED_FACTORS = 3
+# Python used for the gh-matrix entry of the single-name galaxy environment.
+GALAXY_PYTHON = "3.14"
+
+# Values accepted by --matrix-scope.
+MATRIX_SCOPES = ("all", "galaxy", "molecule", "sanity", "integration", "unit")
+# tox configuration files, in the order tox looks for them.
+TOX_CONFIG_FILES = ("tox.ini", "setup.cfg", "pyproject.toml", "tox.toml")
+
+_SORT_SPLIT_RE = re.compile(r"\.|-|py")
+# Mirrors tox.tox_env.python.api.PY_FACTORS_RE, so names parse without tox.
+PY_FACTORS_RE = re.compile(
+    r"""
+    ^(?!py$)
+    (?P<impl>py|pypy|cpython|jython|graalpy|rustpython|ironpython)
+    (?:
+    (?P<version>[2-9]\.?[0-9]?[0-9]?)
+    (?P<threaded>t?)
+    )?$
+    """,
+    re.VERBOSE,
+)
+# A run of brace groups, or a comma separating environment expressions.
+_ENV_EXPR_RE = re.compile(r"((?:\{[^}]+\})+)|,")
+_BRACE_GROUP_RE = re.compile(r"\{([^}]+)\}")
+# A numeric ansible-core factor, e.g. "2.19".
+_CORE_SERIES_RE = re.compile(r"\d+\.\d+")
+
+
+def expand_env_list(value: str) -> list[str]:
+    """Expand a tox ``env_list`` value without tox.
+
+    Supports the generative ``{a, b}-py3.13-{2.19, devel}`` syntax used by
+    ``ENV_LIST`` and ``DOWNSTREAM_EXTRA``, as ``StrConvert.to_env_list`` does.
+
+    Args:
+        value: The env_list value, one or more expressions per line.
+
+    Returns:
+        The environment names, in order and without duplicates.
+    """
+    envs: dict[str, None] = {}
+    for line in value.split("\n"):
+        for is_expr, group in groupby(_ENV_EXPR_RE.split(line), key=bool):
+            if not is_expr:
+                continue
+            elements = _BRACE_GROUP_RE.split("".join(group).strip())
+            alternatives = [[item.strip() for item in element.split(",")] for element in elements]
+            envs.update(dict.fromkeys("".join(parts) for parts in product(*alternatives)))
+    return list(envs)
+
+
+def custom_sort(string: str) -> tuple[int, ...]:
+    """Convert a env name into a tuple of ints.
+
+    In the case of a string, use the ord() of the first two characters.
+
+    Args:
+        string: The string to sort.
+
+    Returns:
+        The tuple of converted values.
+    """
+    parts = _SORT_SPLIT_RE.split(string)
+    converted = []
+    for part in parts:
+        if not part:
+            continue
+        try:
+            converted.append(int(part))
+        except ValueError:
+            num_part = "".join((str(ord(char)).rjust(3, "0")) for char in part[0:2])
+            converted.append(int(num_part))
+    return tuple(converted)
+
+
+def _python_version(version: str) -> tuple[int, ...]:
+    """Convert a python factor version to a tuple of ints.
+
+    Args:
+        version: The version part of a python factor (e.g. "3.13" or "313").
+
+    Returns:
+        The version tuple, (3, 13) for both examples.
+    """
+    if "." not in version:
+        version = f"{version[0]}.{version[1:]}"
+    return tuple(int(part) for part in version.split(".") if part)
+
+
+class EnvFactors(NamedTuple):
+    """Factors of an environment name, parsed once and shared by every hook.
+
+    Use ``env_factors`` rather than ``parse`` to get the interned instance.
+
+    Attributes:
+        name: The environment name.
+        parts: The dash separated factors of the name.
+        test_type: The first factor (e.g. "unit").
+        python: The python factor (e.g. "py3.13"), empty if there is none.
+        python_version: The python version as ints (e.g. (3, 13)).
+        core: The ansible-core factor (e.g. "2.19" or "devel"), empty if there is none.
+        flags: Any extra factors between the python and the core factors.
+        py_candidates: The version of every python-like factor, used by the gh-matrix.
+        sort_key: The ``custom_sort`` key of the name.
+    """
+
+    name: str
+    parts: tuple[str, ...]
+    test_type: str
+    python: str
+    python_version: tuple[int, ...]
+    core: str
+    flags: tuple[str, ...]
+    py_candidates: tuple[str, ...]
+    sort_key: tuple[int, ...]
+
+    @classmethod
+    def parse(cls, name: str) -> EnvFactors:
+        """Parse an environment name.
+
+        Args:
+            name: The environment name.
+
+        Returns:
+            The parsed factors.
+        """
+        parts = tuple(name.split("-"))
+        has_core = len(parts) >= EXPECTED_FACTORS
+        python = parts[1] if has_core and parts[1].startswith("py") else ""
+        python_match = PY_FACTORS_RE.match(python)
+        if name == "galaxy":
+            py_candidates: tuple[str, ...] = (GALAXY_PYTHON,)
+        else:
+            py_candidates = tuple(
+                match["version"]
+                for part in parts
+                if (match := PY_FACTORS_RE.match(part)) and match["version"]
+            )
+        return cls(
+            name=name,
+            parts=parts,
+            test_type=parts[0],
+            python=python,
+            python_version=(
+                _python_version(python_match["version"])
+                if python_match and python_match["version"]
+                else ()
+            ),
+            core=parts[-1] if has_core else "",
+            flags=parts[2:-1],
+            py_candidates=py_candidates,
+            sort_key=custom_sort(name),
+        )
+
+    @property
+    def py_version(self) -> str:
+        """The python factor without its ``py`` prefix (e.g. "3.13").
+
+        Returns:
+            The python version string.
+        """
+        return self.python.replace("py", "")
+
+    @property
+    def is_ansible_env(self) -> bool:
+        """Whether tox-ansible configures this environment.
+
+        Returns:
+            True for galaxy and ``{test_type}-py{python}-{core}`` environments.
+        """
+        return "galaxy" in self.parts or (
+            len(self.parts) == EXPECTED_FACTORS and self.test_type in TEST_TYPES
+        )
+
+    def in_scope(self, scope: str) -> bool:
+        """Return whether the environment belongs to the requested scope.
+
+        Args:
+            scope: The requested matrix scope.
+
+        Returns:
+            Whether the environment belongs to the scope.
+        """
+        return scope in ("all", self.name) or self.name.startswith(f"{scope}-")
+
+
+# Intern table of the parsed environment names.
+_ENV_FACTORS: dict[str, EnvFactors] = {}
+
+
+def env_factors(name: str) -> EnvFactors:
+    """Return the interned factors of an environment name.
+
+    Args:
+        name: The environment name.
+
+    Returns:
+        The parsed factors.
+    """
+    factors = _ENV_FACTORS.get(name)
+    if factors is None:
+        factors = _ENV_FACTORS[name] = EnvFactors.parse(name)
+    return factors
+
+
+def desc_for_env(env: str, revision: str | None = None) -> str:
+    """Generate a description for an environment.
+
+    Args:
+        env: The environment name.
+        revision: The commit a ``devel`` or ``milestone`` core resolved to.
+
+    Returns:
+        The environment description.
+    """
+    if env == "galaxy":
+        return "Build collection and run galaxy-importer on it"
+    factors = env_factors(env)
+    ansible_pkg = "ansible-core"
+    core = f"{factors.core} ({revision[:12]})" if revision else factors.core
+
+    return (
+        f"{factors.test_type.capitalize()} tests using {ansible_pkg} {core}"
+        f" and python {factors.python[2:]}"
+    )
+
+
+def _env_in_scope(env_name: str, scope: str) -> bool:
+    """Return whether an environment belongs to the requested scope.
+
+    Args:
+        env_name: The tox environment name.
+        scope: The requested matrix scope.
+
+    Returns:
+        Whether the environment belongs to the scope.
+    """
+    return env_factors(env_name).in_scope(scope)
+
+
+@dataclass(frozen=True)
+class EnvFilter:
+    """Compiled scope and skip filter applied to the candidate environments.
+
+    The skip fragments are compiled into a single alternation so each name is
+    scanned once, and candidates are bucketed by test type so only the bucket
+    a scope can match is visited.
+
+    Attributes:
+        scope: The requested matrix scope.
+        skip: The compiled skip fragments, None when nothing is skipped.
+        excluded_types: Test types dropped from the matrix.
+        excluded_cores: ansible-core factors dropped from the matrix.
+    """
+
+    scope: str = "all"
+    skip: re.Pattern[str] | None = None
+    excluded_types: frozenset[str] = frozenset()
+    excluded_cores: frozenset[str] = frozenset()
+
+    @classmethod
+    def compile(
+        cls,
+        scope: str = "all",
+        skip: Iterable[str] = (),
+        excluded_types: Iterable[str] = (),
+        excluded_cores: Iterable[str] = (),
+    ) -> EnvFilter:
+        """Compile a filter.
+
+        Args:
+            scope: The requested matrix scope.
+            skip: Environment name fragments to skip.
+            excluded_types: Test types to drop.
+            excluded_cores: ansible-core factors to drop.
+
+        Returns:
+            The compiled filter.
+        """
+        # Longest first so the alternation reports the most specific fragment.
+        fragments = sorted(set(skip), key=lambda fragment: (-len(fragment), fragment))
+        return cls(
+            scope=scope,
+            skip=re.compile("|".join(map(re.escape, fragments))) if fragments else None,
+            excluded_types=frozenset(excluded_types),
+            excluded_cores=frozenset(excluded_cores),
+        )
+
+    def matches(self, factors: EnvFactors) -> bool:
+        """Return whether an environment passes the filter.
+
+        Args:
+            factors: The parsed environment name.
+
+        Returns:
+            Whether the environment is kept.
+        """
+        return (
+            factors.test_type not in self.excluded_types
+            and factors.core not in self.excluded_cores
+            and factors.in_scope(self.scope)
+            and (self.skip is None or self.skip.search(factors.name) is None)
+        )
+
+    def apply(self, env_names: Iterable[str]) -> list[str]:
+        """Filter and sort environment names in one pass.
+
+        Args:
+            env_names: The candidate environment names.
+
+        Returns:
+            The kept names, ordered by ``custom_sort``.
+        """
+        buckets: dict[str, list[EnvFactors]] = {}
+        for env_name in env_names:
+            factors = env_factors(env_name)
+            buckets.setdefault(factors.test_type, []).append(factors)
+        if self.scope == "all":
+            selected = [factors for bucket in buckets.values() for factors in bucket]
+        else:
+            # Any name in scope shares the first factor of the scope.
+            selected = buckets.get(self.scope.partition("-")[0], [])
+        kept = [factors for factors in selected if self.matches(factors)]
+        kept.sort(key=lambda factors: factors.sort_key)
+        return [factors.name for factors in kept]
+
+
+def _core_releases(core: str, next_minor: tuple[int, int]) -> list[Version]:
+    """Return the releases an ansible-core factor stands for.
+
+    A numeric factor is tested by its first and last patch release, plus the
+    patch releases around any bound of the specifier in that series, so a
+    series is kept if some release of it is allowed. devel and milestone are
+    pre-releases of the minor version following the newest numeric factor.
+
+    Args:
+        core: The ansible-core factor, e.g. "2.19" or "devel".
+        next_minor: The minor version following the newest numeric factor.
+
+    Returns:
+        The releases to test, empty for an unknown factor.
+    """
+    if core in ("devel", "milestone"):
+        return [Version(f"{next_minor[0]}.{next_minor[1]}.0.dev0")]
+    if not _CORE_SERIES_RE.fullmatch(core):
+        return []
+    return [Version(f"{core}.{patch}") for patch in (0, 9999)]
+
+
+def cores_outside_requires_ansible(requires_ansible: str, cores: Iterable[str]) -> list[str]:
+    """Return the ansible-core factors a ``requires_ansible`` specifier excludes.
+
+    Args:
+        requires_ansible: The specifier from meta/runtime.yml, e.g. ">=2.16.0".
+        cores: The ansible-core factors of the matrix.
+
+    Returns:
+        The excluded factors, empty if the specifier is invalid.
+    """
+    try:
+        specifier = SpecifierSet(requires_ansible)
+        # Patch releases next to a bound in the same series, e.g. 2.19.3 for ">2.19.2".
+        bounds = [Version(spec.version.removesuffix(".*")) for spec in specifier]
+    except (InvalidSpecifier, InvalidVersion):
+        # An arbitrary equality, e.g. "===2.16.0-custom", names no version.
+        logger.warning(
+            "Invalid requires_ansible %r in %s, not pruning the matrix",
+            requires_ansible,
+            RUNTIME_YML,
+        )
+        return []
+    cores = list(dict.fromkeys(core for core in cores if core))
+    newest = max(
+        (Version(core).release[:2] for core in cores if _CORE_SERIES_RE.fullmatch(core)),
+        default=(2, 0),
+    )
+    next_minor = (newest[0], newest[1] + 1)
+    excluded = []
+    for core in cores:
+        releases = _core_releases(core, next_minor)
+        if not releases:
+            continue
+        series = releases[0].release[:2]
+        releases.extend(
+            Version(f"{series[0]}.{series[1]}.{patch}")
+            for bound in bounds
+            if bound.release[:2] == series
+            for patch in (max(bound.micro - 1, 0), bound.micro, bound.micro + 1)
+        )
+        if not any(specifier.contains(release, prereleases=True) for release in releases):
+            excluded.append(core)
+    return excluded
+
+
+def matrix_env_names(
+    ansible_config: AnsibleConfiguration,
+    index: ProjectIndex,
+    scope: str = "all",
+    requires_ansible: str | None = None,
+) -> list[str]:
+    """Select the ansible environments of a project.
+
+    When ``downstream`` is enabled in project config, unions ``DOWNSTREAM_EXTRA``
+    onto the upstream ``ENV_LIST`` before applying ``skip``. Cores outside the
+    ``requires_ansible`` range of meta/runtime.yml are dropped.
+
+    Args:
+        ansible_config: The tox-ansible configuration.
+        index: The project index.
+        scope: The matrix scope to select.
+        requires_ansible: The ``requires_ansible`` specifier of the collection.
+
+    Returns:
+        The environment names, ordered by ``custom_sort``.
+    """
+    env_names = expand_env_list(ENV_LIST)
+    if ansible_config.downstream:
+        # Deduplicate extras against the upstream env list (final order is
+        # set by custom_sort below).
+        env_names = list(dict.fromkeys([*env_names, *expand_env_list(DOWNSTREAM_EXTRA)]))
+    excluded_types = set()
+    if not _should_include_molecule(ansible_config.molecule, index.root, index):
+        excluded_types.add("molecule")
+    if not index.has_integration_tests:
+        excluded_types.add("integration")
+    excluded_cores: list[str] = []
+    if requires_ansible is not None:
+        excluded_cores = cores_outside_requires_ansible(
+            requires_ansible,
+            sorted((env_factors(env).core for env in env_names), key=custom_sort),
+        )
+    if excluded_cores:
+        logger.warning(
+            "Skipping ansible-core %s environments: outside requires_ansible %r of %s",
+            ", ".join(excluded_cores),
+            requires_ansible,
+            RUNTIME_YML,
+        )
+    env_filter = EnvFilter.compile(
+        scope=scope,
+        skip=ansible_config.skip,
+        excluded_types=excluded_types,
+        excluded_cores=excluded_cores,
+    )
+    return env_filter.apply(env_names)
+
+
+def selected_envs(state: State, env_names: Iterable[str]) -> list[str]:
+    """Keep the environments of the matrix selected with ``-e``.
+
+    Args:
+        state: The tox state object.
+        env_names: The environments of the matrix.
+
+    Returns:
+        The selected environments, all of them without ``-e``.
+    """
+    env_names = list(env_names)
+    selection = state.conf.options.env
+    if selection.is_all or selection.is_default_list:
+        return env_names
+    selected = set(selection)
+    return [name for name in env_names if name in selected]
+
+
+def add_ansible_matrix(state: State, scope: str = "all") -> EnvList:
+    """Add the ansible matrix to the state.
+
+    Args:
+        state: The state object.
+        scope: The matrix scope to add.
+
+    Returns:
+        The environment list.
+    """
+    from tox.config.loader.memory import MemoryLoader  # noqa: PLC0415
+    from tox.config.types import EnvList  # noqa: PLC0415
+
+    context = project_context(state)
+
+    if state.conf.src_path.name == "tox.ini" and context.pyproject_config is None:
+        msg = (
+            "Using a default tox.ini file with tox-ansible plugin is not recommended."
+            " Consider adding a [tool.tox-ansible] section to pyproject.toml or using"
+            " a tox-ansible.ini file (`tox --ansible -c tox-ansible.ini`) to avoid"
+            " unintentionally overriding the tox-ansible environment configurations."
+        )
+        logger.warning(msg)
+
+    env_list = EnvList(
+        matrix_env_names(
+            context.ansible_config,
+            context.index,
+            scope,
+            requires_ansible=context.requires_ansible,
+        ),
+    )
+    state.conf.core.loaders.insert(
+        0,
+        MemoryLoader(
+            env_list=env_list,
+            ignore_base_python_conflict=True,
+        ),
+    )
+    return env_list
+
+
+def _check_num_candidates(candidates: list[str], env_name: str) -> None:
+    """Check the number of candidates.
+
+    Args:
+        candidates: The candidates.
+        env_name: The environment name.
+    """
+    if env_name == "galaxy":
+        return
+    if len(candidates) > 1:
+        err = f"Multiple python versions found in {env_name}"
+        logger.critical(err)
+        sys.exit(1)
+    if len(candidates) == 0:
+        err = f"No python version found in {env_name}"
+        logger.critical(err)
+        sys.exit(1)
+
+
+def _gen_version(candidates: list[str]) -> str:
+    """Generate the version from the candidates.
+
+    Args:
+        candidates: The candidates.
+
+    Returns:
+        The version.
+    """
+    if "." in candidates[0]:
+        return candidates[0]
+    return f"{candidates[0][0]}.{candidates[0][1:]}"
+
+
+def _extract_py_candidates(env_name: str) -> list[str]:
+    """Extract Python version candidates from an environment name.
+
+    Args:
+        env_name: The tox environment name (e.g. "unit-py3.11-2.19").
+
+    Returns:
+        A list of Python version strings found in the environment factors.
+    """
+    return list(env_factors(env_name).py_candidates)
+
+
+def generate_gh_matrix(
+    env_list: EnvList,
+    section: str,
+    cache: CoreWheelCache | None = None,
+) -> None:
+    """Generate the github matrix.
+
+    Args:
+        env_list: The environment list.
+        section: The test section to be generated.
+        cache: The session ansible-core cache resolving ``devel`` and ``milestone``.
+    """
+    emit_gh_matrix(env_list.envs, section, cache)
+
+
+def emit_gh_matrix(
+    env_names: Iterable[str],
+    section: str,
+    cache: CoreWheelCache | None = None,
+) -> None:
+    """Print the github matrix, or append it to ``GITHUB_OUTPUT`` in an action.
+
+    Entries of a ``devel`` or ``milestone`` core resolved by the cache carry
+    the commit as ``ansible_core_revision``.
+
+    Args:
+        env_names: The environment names.
+        section: The test section to be generated.
+        cache: The session ansible-core cache resolving ``devel`` and ``milestone``.
+    """
+    in_scope = [name for name in env_names if env_factors(name).in_scope(section)]
+    revisions = (
+        cache.moving_revisions(env_factors(name).core for name in in_scope)
+        if cache is not None
+        else {}
+    )
+    results = []
+    for env_name in in_scope:
+        factors = env_factors(env_name)
+        candidates = list(factors.py_candidates)
+
+        _check_num_candidates(candidates=candidates, env_name=env_name)
+        version = _gen_version(candidates=candidates)
+        revision = revisions.get(factors.core)
+
+        entry = {
+            "description": desc_for_env(env_name, revision),
+            "factors": list(factors.parts),
+            "name": env_name,
+            "python": version,
+        }
+        if revision is not None:
+            entry["ansible_core_revision"] = revision
+        results.append(entry)
+
+    gh_output = os.getenv("GITHUB_OUTPUT")
+    if not gh_output and not in_action():
+        value = json.dumps(results, indent=2, sort_keys=True)
+        print(value)  # noqa: T201
+        return
+
+    if not gh_output:  # pragma: no cover
+        err = "GITHUB_OUTPUT environment variable not set"
+        logger.critical(err)
+        sys.exit(1)
+
+    value = json.dumps(results)
+
+    if "\n" in value:
+        eof = f"EOF-{uuid.uuid4()}"
+        encoded = f"envlist<<{eof}\n{value}\n{eof}\n"
+    else:
+        encoded = f"envlist={value}\n"
+
+    with Path(gh_output).open("a", encoding="utf-8") as fileh:
+        fileh.write(encoded)
+
+
+def find_config_file(directory: Path) -> Path:
+    """Find the tox configuration file of a directory, as tox does.
+
+    Args:
+        directory: The directory to look in.
+
+    Returns:
+        The first existing file of ``TOX_CONFIG_FILES``, ``tox.ini`` if none exists.
+    """
+    for name in TOX_CONFIG_FILES:
+        candidate = directory / name
+        if candidate.is_file():
+            return candidate
+    return directory / TOX_CONFIG_FILES[0]
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Emit the github matrix of a collection without tox.
+
+    Produces the same output as ``tox --ansible --gh-matrix`` for the
+    ``[tool.tox-ansible]`` and ``[ansible]`` configuration sections. The
+    ``devel`` and ``milestone`` entries carry the commit pinned by
+    ``TOX_ANSIBLE_CORE_REVISIONS`` or recorded by an earlier run; with
+    ``--pin-revisions`` the others are resolved from the ansible-core
+    repository.
+
+    Args:
+        argv: The command line arguments, ``sys.argv[1:]`` when omitted.
+
+    Returns:
+        The exit code.
+    """
+    parser = argparse.ArgumentParser(
+        prog="tox-ansible-matrix",
+        description="Emit the tox-ansible github matrix without running tox.",
+    )
+    parser.add_argument(
+        "-c",
+        "--conf",
+        type=Path,
+        default=None,
+        help="The tox configuration file, e.g. tox-ansible.ini (default: discovered in cwd)",
+    )
+    parser.add_argument(
+        "--matrix-scope",
+        default="all",
+        choices=MATRIX_SCOPES,
+        help="Limit the GitHub matrix output to the selected scope",
+    )
+    parser.add_argument(
+        "--workdir",
+        dest="work_dir",
+        type=Path,
+        default=None,
+        help="The tox work dir recording the resolved commits (default: as tox resolves it)",
+    )
+    parser.add_argument(
+        "--pin-revisions",
+        action="store_true",
+        help="Resolve devel and milestone to their head commit with git ls-remote",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(levelname)s %(message)s")
+
+    config_file = args.conf if args.conf is not None else find_config_file(Path.cwd())
+    if args.conf is not None and not config_file.is_file():
+        err = f"config file {config_file} does not exist"
+        logger.critical(err)
+        return 1
+    _, ansible_config = load_project_config(config_file)
+    project_dir = config_file.parent.resolve()
+    env_names = matrix_env_names(
+        ansible_config,
+        ProjectIndex.scan(project_dir),
+        scope=args.matrix_scope,
+        requires_ansible=read_requires_ansible(project_dir),
+    )
+    work_dir = args.work_dir if args.work_dir is not None else read_work_dir(config_file)
+    # Without --pin-revisions, only the pinned and recorded commits are used.
+    cache = CoreWheelCache(
+        cache_dir=cores_dir(work_dir),
+        ttl=ansible_config.core_revision_ttl,
+        offline=not (args.pin_revisions and cache_available()),
+    )
+    emit_gh_matrix(env_names, args.matrix_scope, cache)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
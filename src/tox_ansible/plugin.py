@@ -1,229 +1,98 @@
-# cspell:ignore envlist
-"""tox plugin to emit a github matrix."""
+"""tox plugin to emit a github matrix.
+
+This module is the ``tox`` entry point and is imported by every tox
+invocation, with or without ``--ansible``. It therefore only registers the
+CLI options and the hook shims; matrix generation, project parsing and the
+command builders live in sibling modules imported on first use.
+"""
 
 from __future__ import annotations
 
-import json
+import importlib
 import logging
-import os
-import re
 import sys
-import uuid
 
-from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, TypeVar
 
-
-try:
-    import tomllib
-except ModuleNotFoundError:  # pragma: no cover
-    import tomli as tomllib  # type: ignore[no-redef]
-
-import yaml
-
-from tox.config.loader.memory import MemoryLoader
-from tox.config.loader.section import Section
-from tox.config.loader.str_convert import StrConvert
-from tox.config.sets import ConfigSet, CoreConfigSet, EnvConfigSet
 from tox.plugin import impl
-from tox.tox_env.python.api import PY_FACTORS_RE
 
 
 if TYPE_CHECKING:
-    from tox.config.cli.parser import ToxParser
-    from tox.config.types import EnvList
+    from collections.abc import Callable
+
+    from tox.config.cli.parser import Parsed, ToxParser
+    from tox.config.sets import CoreConfigSet, EnvConfigSet
+    from tox.execute import Outcome
     from tox.session.state import State
+    from tox.tox_env.api import ToxEnv
+
+T = TypeVar("T")
+
+# The options only valid with --ansible, by destination.
+_ANSIBLE_OPTIONS = (
+    "gh_matrix",
+    "coverage",
+    "ansible_profile",
+    "ansible_reprovision",
+    "ansible_offline",
+    "ansible_wheelhouse",
+    "provision_only",
+    "export_env",
+    "import_env",
+)
 
 logger = logging.getLogger(__name__)
 
-ALLOWED_EXTERNALS = [
-    "ade",
-    "bash",
-    "echo",
-    "git",
-    "sh",
-]
-ENV_LIST = """
-galaxy
-{integration, molecule, sanity, unit}-py3.11-{ 2.19 }
-{integration, molecule, sanity, unit}-py3.12-{2.19, 2.20, 2.21}
-{integration, molecule, sanity, unit}-py3.13-{2.19, 2.20, 2.21, milestone, devel}
-{integration, molecule, sanity, unit}-py3.14-{2.20, 2.21, milestone, devel}
-"""
-# ^ py314 is NOT supported before 2.20! If is in official metadata of the
-# release branch, is not supported.
-# https://docs.ansible.com/projects/ansible/latest/reference_appendices/release_and_maintenance.html#ansible-core-support-matrix
-
-# Additive AAP/cert cores not already present in ENV_LIST (ADR-001).
-# Used when downstream=true -> upstream union DOWNSTREAM_EXTRA.
-# Python floor for extras is Hub/partner cert minimum (3.12+), not tox's 3.11 floor.
-# https://access.redhat.com/support/policy/updates/ansible-automation-platform
-DOWNSTREAM_EXTRA = """
-{integration, sanity, unit}-py3.12-{2.16, 2.18}
-{integration, sanity, unit}-py3.13-{2.18}
-"""
+# Modules searched, in order, for names historically defined in this module.
+_LAZY_MODULES = (
+    "tox_ansible.project",
+    "tox_ansible.matrix",
+    "tox_ansible.environment",
+    "tox_ansible.config_set",
+)
 
-# Without the minimal pytest-ansible condition, installation may fail in some
-# cases (pip, uv).
-OUR_DEPS = [
-    "pytest>=7.4.3",  # Oct 2023
-    "pytest-xdist>=3.4.0",  # Nov 2023
-    "pytest-ansible>=v4.1.1",  # latest version still supporting py39 (Oct 2023)
-    "ansible-compat>=25.11.0",  # Nov 2025
-]
-COVERAGE_DEPS = [
-    "coverage>=7.0.0",  # Dec 2022
-    "pytest-cov>=4.1.0",  # May 2023
-]
-
-# Paths checked for collection requirements files, keyed by test type.
-# From https://github.com/ansible/ansible-compat/blob/main/src/ansible_compat/constants.py#L6-L14
-SHARED_REQUIREMENTS_YML = "tests/requirements.yml"
-TEST_REQUIREMENTS_YML: dict[str, list[str]] = {
-    "unit": [
-        SHARED_REQUIREMENTS_YML,
-        "tests/unit/requirements.yml",
-    ],
-    "integration": [
-        SHARED_REQUIREMENTS_YML,
-        "tests/integration/requirements.yml",
-    ],
-    # Molecule shares integration collection deps during migration; also
-    # accepts a dedicated molecule requirements file when collections split.
-    "molecule": [
-        SHARED_REQUIREMENTS_YML,
-        "tests/integration/requirements.yml",
-        "tests/molecule/requirements.yml",
-    ],
-}
-
-PYTHON_DEPENDENCY_FILES: list[str] = [
-    "test-requirements.txt",
-    "requirements-test.txt",
-    "requirements.txt",
-    "tests/unit/requirements.txt",
-    "tests/integration/requirements.txt",
-    # https://docs.ansible.com/projects/builder/en/latest/collection_metadata/
-    "meta/ee-requirements.txt",
-]
-
-T = TypeVar("T", bound=ConfigSet)
-
-
-class AnsibleConfigSet(ConfigSet):
-    """The ansible configuration."""
-
-    def register_config(self) -> None:
-        """Register the ansible configuration."""
-        self.add_config(
-            "coverage",
-            of_type=bool,
-            default=False,
-            desc="enable coverage reporting for unit tests",
-        )
-        self.add_config(
-            "skip",
-            of_type=list[str],
-            default=[],
-            desc="ansible configuration",
-        )
-        self.add_config(
-            "downstream",
-            of_type=bool,
-            default=False,
-            desc="union AAP/cert extras onto the upstream matrix (ADR-001)",
-        )
-        self.add_config(
-            "molecule",
-            of_type=str,
-            default="auto",
-            desc="molecule test type: 'auto' (discover), 'true' (force on), 'false' (force off)",
-        )
-        self.add_config(
-            "molecule_append",
-            of_type=list[str],
-            default=[],
-            desc="extra argv appended to the default 'molecule test --all' command",
-        )
-        self.add_config(
-            "molecule_commands",
-            of_type=list[str],
-            default=[],
-            desc="full replacement molecule commands (ignores default and molecule_append)",
-        )
-
-
-@dataclass
-class AnsibleConfiguration:
-    """User-provided tox-ansible configuration.
-
-    Attributes:
-        coverage: Enable coverage reporting for unit tests.
-        skip: Environment name fragments to skip.
-        downstream: When true, union DOWNSTREAM_EXTRA onto ENV_LIST.
-        molecule: Molecule test type mode ("auto", "true", or "false").
-        molecule_append: Extra argv appended to the default molecule command.
-        molecule_commands: Full-replacement molecule commands.
-    """
 
-    coverage: bool = False
-    skip: list[str] = field(default_factory=list)
-    downstream: bool = False
-    molecule: str = "auto"
-    molecule_append: list[str] = field(default_factory=list)
-    molecule_commands: list[str] = field(default_factory=list)
-
-
-@dataclass
-class AnsibleTestConf:  # pylint: disable=too-many-instance-attributes
-    """Ansible test configuration.
-
-    Attributes:
-        description: The description of the test.
-        deps: The dependencies for the test.
-        setenv: The set environment variables for the test.
-        skip_install: Skip the installation.
-        base_python: The base Python interpreter to use.
-        allowlist_externals: The allowed external commands.
-        commands_pre: The pre-run commands.
-        commands: The commands to run.
-        passenv: The pass environment
-    """
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    """Resolve names that moved out of this module on first access.
 
-    description: str
-    deps: str
-    setenv: str
-    skip_install: bool
-    base_python: list[str] = field(default_factory=list)
-    allowlist_externals: list[str] = field(default_factory=list)
-    commands_pre: list[str] = field(default_factory=list)
-    commands: list[str] = field(default_factory=list)
-    passenv: list[str] = field(default_factory=list)
+    Args:
+        name: The attribute name.
 
+    Returns:
+        The attribute from the module defining it.
+
+    Raises:
+        AttributeError: If no tox-ansible module defines the name.
+    """
+    for module_name in _LAZY_MODULES:
+        module = importlib.import_module(module_name)
+        if name in vars(module):
+            return vars(module)[name]
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
 
-def custom_sort(string: str) -> tuple[int, ...]:
-    """Convert a env name into a tuple of ints.
 
-    In the case of a string, use the ord() of the first two characters.
+def _run_hook(options: Parsed, name: str, func: Callable[..., T], *args: Any) -> T:  # noqa: ANN401
+    """Call a hook implementation, in a timing span when ``--ansible-profile`` is given.
 
     Args:
-        string: The string to sort.
+        options: The parsed tox CLI options.
+        name: The span name.
+        func: The hook implementation.
+        *args: The hook arguments.
 
     Returns:
-        The tuple of converted values.
+        The hook result.
     """
-    parts = re.split(r"\.|-|py", string)
-    converted = []
-    for part in parts:
-        if not part:
-            continue
-        try:
-            converted.append(int(part))
-        except ValueError:
-            num_part = "".join((str(ord(char)).rjust(3, "0")) for char in part[0:2])
-            converted.append(int(num_part))
-    return tuple(converted)
+    dump_path = getattr(options, "ansible_profile", None)
+    if dump_path is None:
+        return func(*args)
+
+    from tox_ansible.profiling import start  # noqa: PLC0415
+
+    with start(dump_path).span(name):
+        return func(*args)
 
 
 @impl
@@ -269,982 +138,215 @@ def tox_add_option(parser: ToxParser) -> None:
         help="Disable coverage reporting for unit tests",
     )
 
-
-@impl
-def tox_add_core_config(
-    core_conf: CoreConfigSet,  # noqa: ARG001 # pylint: disable=unused-argument
-    state: State,
-) -> None:
-    """Dump the environment list and exit.
-
-    Args:
-        core_conf: The core configuration object.
-        state: The state object.
-    """
-    if state.conf.options.gh_matrix and not state.conf.options.ansible:  # pragma: no cover
-        err = "The --gh-matrix option requires --ansible"
-        logger.critical(err)
-        sys.exit(1)
-
-    if state.conf.options.coverage and not state.conf.options.ansible:  # pragma: no cover
-        err = "The --coverage option requires --ansible"
-        logger.critical(err)
-        sys.exit(1)
-
-    if not state.conf.options.ansible:  # pragma: no cover
-        return
-
-    env_list = add_ansible_matrix(state, scope=state.conf.options.matrix_scope)
-
-    if not state.conf.options.gh_matrix:  # pragma: no cover
-        return
-
-    generate_gh_matrix(env_list=env_list, section=state.conf.options.matrix_scope)
-    sys.exit(0)
-
-
-@impl
-def tox_add_env_config(env_conf: EnvConfigSet, state: State) -> None:
-    """Add the test requirements and ansible-core to the virtual environment.
-
-    Args:
-        env_conf: The environment configuration object.
-        state: The state object.
-    """
-    if not state.conf.options.ansible:  # pragma: no cover
-        return
-
-    factors = env_conf.name.split("-")
-    expected_factors = 3
-    if "galaxy" not in factors and (
-        len(factors) != expected_factors
-        or factors[0]
-        not in [
-            "integration",
-            "molecule",
-            "sanity",
-            "unit",
-        ]
-    ):
-        return
-    # When run nested, work_dir might become .tox instead of cwd and we don't
-    # want to use `state.conf.work_dir` to find the galaxy file. PWD is more
-    # reliable, even if there is a chance it might be also changed.
-    galaxy_path = state.conf.src_path.parent.resolve() / "galaxy.yml"
-    collection = get_collection(galaxy_path=galaxy_path)
-    pos_args = state.conf.pos_args(to_path=None)
-
-    # Extract Python version from environment name (e.g., py3.11 from integration-py3.11-2.18)
-    # and explicitly set base_python to prevent tox misinterpreting ansible versions as Python
-    base_python: list[str] = []
-    if len(factors) >= expected_factors and factors[1].startswith("py"):
-        base_python = [factors[1]]
-    test_type = factors[0]
-    ansible_version = factors[-1] if len(factors) == expected_factors else ""
-    coverage_enabled = test_type == "unit" and _coverage_enabled(state)
-    coverage_config = (
-        _write_coverage_config(env_conf=env_conf, collection=collection)
-        if coverage_enabled
-        else None
-    )
-    if test_type == "molecule":
-        ansible_config = _load_ansible_config(state)
-        molecule_commands = ansible_config.molecule_commands
-        molecule_append = ansible_config.molecule_append
-    else:
-        molecule_commands = []
-        molecule_append = []
-
-    conf = AnsibleTestConf(
-        allowlist_externals=ALLOWED_EXTERNALS,
-        base_python=base_python,
-        commands_pre=conf_commands_pre(
-            collection=collection,
-            env_conf=env_conf,
-            test_type=test_type,
-            ansible_version=ansible_version,
-        ),
-        commands=conf_commands(
-            collection=collection,
-            env_conf=env_conf,
-            pos_args=pos_args,
-            test_type=test_type,
-            coverage_config=coverage_config,
-            molecule_commands=molecule_commands,
-            molecule_append=molecule_append,
+    parser.add_argument(
+        "--ansible-reprovision",
+        action="store_true",
+        default=False,
+        help=(
+            "Run the commands_pre of the Ansible environments even if their"
+            " provisioning inputs did not change since the last run"
         ),
-        description=desc_for_env(env_conf.name),
-        deps=conf_deps(test_type=test_type, coverage_enabled=coverage_enabled),
-        passenv=conf_passenv(),
-        setenv=conf_setenv(env_conf=env_conf, test_type=test_type),
-        skip_install=True,
     )
-    loader_args = asdict(conf)
-    if not base_python:
-        del loader_args["base_python"]
-    loader = MemoryLoader(**loader_args)
-    env_conf.loaders.append(loader)
-
-
-def desc_for_env(env: str) -> str:
-    """Generate a description for an environment.
-
-    Args:
-        env: The environment name.
-
-    Returns:
-        The environment description.
-    """
-    if env == "galaxy":
-        return "Build collection and run galaxy-importer on it"
-    test_type, python, core = env.split("-")
-    ansible_pkg = "ansible-core"
-
-    return f"{test_type.capitalize()} tests using {ansible_pkg} {core} and python {python[2:]}"
-
-
-def in_action() -> bool:
-    """Check if running on Github Actions platform.
-
-    Returns:
-        True if running on Github Actions platform.
-    """
-    return os.environ.get("GITHUB_ACTIONS") == "true"
-
-
-def _load_pyproject_config(project_dir: Path) -> dict[str, Any] | None:
-    """Load tox-ansible configuration from pyproject.toml.
-
-    Looks for ``[tool.tox-ansible]`` in the project's ``pyproject.toml``.
-
-    Args:
-        project_dir: The project root directory containing pyproject.toml.
-
-    Returns:
-        The parsed ``[tool.tox-ansible]`` table, or ``None`` if the file
-        or section is not found.
-    """
-    pyproject_path = project_dir / "pyproject.toml"
-    if not pyproject_path.exists():
-        return None
-    try:
-        with pyproject_path.open("rb") as fh:
-            data = tomllib.load(fh)
-    except tomllib.TOMLDecodeError:
-        logger.warning("Failed to parse %s, skipping", pyproject_path)
-        return None
-    return data.get("tool", {}).get("tox-ansible")
-
-
-def _coerce_bool(value: object, *, default: bool = False) -> bool:
-    """Coerce a config value to bool with explicit string and int handling.
-
-    Args:
-        value: Raw value from TOML or similar.
-        default: Fallback when the value cannot be interpreted.
-
-    Returns:
-        The coerced boolean.
-    """
-    if isinstance(value, bool):
-        return value
-    if isinstance(value, int) and value in {0, 1}:
-        return bool(value)
-    if isinstance(value, str):
-        normalized = value.strip().lower()
-        if normalized in {"true", "1", "yes", "on"}:
-            return True
-        if normalized in {"false", "0", "no", "off", ""}:
-            return False
-    elif value is None:
-        return default
-    logger.warning("Invalid boolean config value %r; using %s", value, default)
-    return default
-
-
-def _coerce_molecule_setting(value: object, *, default: str = "auto") -> str:
-    """Coerce a pyproject ``molecule`` value to ``auto``, ``true``, or ``false``.
-
-    Args:
-        value: Raw value from TOML (bool, int, str) or INI (str).
-        default: Fallback when the value cannot be interpreted.
 
-    Returns:
-        Normalized molecule mode string.
-    """
-    if isinstance(value, bool):
-        return "true" if value else "false"
-    if isinstance(value, int) and value in {0, 1}:
-        return "true" if value else "false"
-    if value is None:
-        return default
-    if isinstance(value, str):
-        normalized = value.strip().lower()
-        modes = {
-            "true": "true",
-            "1": "true",
-            "yes": "true",
-            "on": "true",
-            "false": "false",
-            "0": "false",
-            "no": "false",
-            "off": "false",
-            "auto": "auto",
-            "": "auto",
-        }
-        if normalized in modes:
-            return modes[normalized]
-    logger.warning("Invalid molecule config value %r; using %r", value, default)
-    return default
-
-
-def discover_molecule_scenarios(project_dir: Path) -> bool:
-    """Check if molecule scenarios exist in the collection.
-
-    Looks for subdirectories under ``extensions/molecule/`` that contain
-    a ``molecule.yml`` file.
-
-    Args:
-        project_dir: The project root directory.
-
-    Returns:
-        True if at least one molecule scenario is found.
-    """
-    molecule_dir = project_dir / "extensions" / "molecule"
-    if not molecule_dir.is_dir():
-        return False
-    return any(
-        (scenario / "molecule.yml").is_file()
-        for scenario in molecule_dir.iterdir()
-        if scenario.is_dir()
+    parser.add_argument(
+        "--ansible-offline",
+        action="store_true",
+        default=False,
+        help=(
+            "Install the collections of the requirements files from the local cache"
+            " and use the recorded ansible-core commits, without contacting Galaxy or GitHub"
+        ),
     )
 
-
-def discover_integration_tests(project_dir: Path) -> bool:
-    """Check if ansible-test or pytest-style integration tests exist.
-
-    Looks for non-empty ``tests/integration/targets/`` (ansible-test) or
-    pytest modules under ``tests/integration/`` (``test_*.py`` / ``*_test.py``).
-
-    Args:
-        project_dir: The project root directory.
-
-    Returns:
-        True if integration test content is found.
-    """
-    targets = project_dir / "tests" / "integration" / "targets"
-    if targets.is_dir() and any(targets.iterdir()):
-        return True
-
-    integration_dir = project_dir / "tests" / "integration"
-    if not integration_dir.is_dir():
-        return False
-
-    return any(
-        path.name.startswith("test_") or path.name.endswith("_test.py")
-        for path in integration_dir.rglob("*.py")
+    parser.add_argument(
+        "--ansible-wheelhouse",
+        choices=["build", "use"],
+        default=None,
+        help=(
+            "Build the wheels of the Python packages of the Ansible environments into a"
+            " local wheelhouse and exit, or install them from it without an index"
+        ),
     )
 
-
-def _should_include_molecule(
-    molecule_setting: str,
-    project_dir: Path,
-) -> bool:
-    """Determine whether molecule environments should be included.
-
-    Args:
-        molecule_setting: The molecule config value ("auto", "true", or "false").
-        project_dir: The project root directory.
-
-    Returns:
-        True if molecule environments should be included.
-    """
-    if molecule_setting == "true":
-        return True
-    if molecule_setting == "false":
-        return False
-    return discover_molecule_scenarios(project_dir)
-
-
-def _load_ansible_config(state: State) -> AnsibleConfiguration:
-    """Load tox-ansible configuration using TOML-over-INI precedence.
-
-    Args:
-        state: The tox state object.
-
-    Returns:
-        The resolved tox-ansible configuration.
-    """
-    project_dir = state.conf.src_path.parent.resolve()
-    pyproject_config = _load_pyproject_config(project_dir)
-
-    if pyproject_config is not None:
-        return AnsibleConfiguration(
-            coverage=_coerce_bool(pyproject_config.get("coverage", False)),
-            skip=pyproject_config.get("skip", []),
-            downstream=_coerce_bool(pyproject_config.get("downstream", False)),
-            molecule=_coerce_molecule_setting(
-                pyproject_config.get("molecule", "auto"),
-            ),
-            molecule_append=pyproject_config.get("molecule_append", []),
-            molecule_commands=pyproject_config.get("molecule_commands", []),
-        )
-
-    ansible_config = state.conf.get_section_config(
-        Section(None, "ansible"),
-        base=[],
-        of_type=AnsibleConfigSet,
-        for_env=None,
-    )
-    return AnsibleConfiguration(
-        coverage=ansible_config["coverage"],
-        skip=ansible_config["skip"],
-        downstream=ansible_config["downstream"],
-        molecule=_coerce_molecule_setting(ansible_config["molecule"]),
-        molecule_append=ansible_config["molecule_append"],
-        molecule_commands=ansible_config["molecule_commands"],
+    parser.add_argument(
+        "--provision-only",
+        action="store_true",
+        default=False,
+        help=(
+            "Create the selected Ansible environments and run their commands_pre"
+            " without their tests, with tox run-parallel"
+        ),
     )
 
+    parser.add_argument(
+        "--export-env",
+        default=None,
+        metavar="ARCHIVE_DIR",
+        type=Path,
+        of_type=Path,
+        help="Pack each provisioned Ansible environment into ARCHIVE_DIR/<env>.tar.gz",
+    )
 
-def _coverage_enabled(state: State) -> bool:
-    """Resolve coverage from the CLI and project configuration.
-
-    Explicit CLI options take precedence over project configuration.
-
-    Args:
-        state: The tox state object.
-
-    Returns:
-        Whether unit test coverage is enabled.
-    """
-    cli_coverage: bool | None = getattr(state.conf.options, "coverage", None)
-    if cli_coverage is not None:
-        return cli_coverage
-    return _load_ansible_config(state).coverage
-
-
-def _env_in_scope(env_name: str, scope: str) -> bool:
-    """Return whether an environment belongs to the requested scope.
-
-    Args:
-        env_name: The tox environment name.
-        scope: The requested matrix scope.
-
-    Returns:
-        Whether the environment belongs to the scope.
-    """
-    return scope in ("all", env_name) or env_name.startswith(f"{scope}-")
-
-
-def add_ansible_matrix(state: State, scope: str = "all") -> EnvList:
-    """Add the ansible matrix to the state.
-
-    When ``downstream`` is enabled in project config, unions ``DOWNSTREAM_EXTRA``
-    onto the upstream ``ENV_LIST`` before applying ``skip``.
-
-    Args:
-        state: The state object.
-        scope: The matrix scope to add.
-
-    Returns:
-        The environment list.
-    """
-    project_dir = state.conf.src_path.parent.resolve()
-    pyproject_config = _load_pyproject_config(project_dir)
-
-    if state.conf.src_path.name == "tox.ini" and pyproject_config is None:
-        msg = (
-            "Using a default tox.ini file with tox-ansible plugin is not recommended."
-            " Consider adding a [tool.tox-ansible] section to pyproject.toml or using"
-            " a tox-ansible.ini file (`tox --ansible -c tox-ansible.ini`) to avoid"
-            " unintentionally overriding the tox-ansible environment configurations."
-        )
-        logger.warning(msg)
-
-    ansible_config = _load_ansible_config(state)
-
-    env_list = StrConvert().to_env_list(ENV_LIST)
-    if ansible_config.downstream:
-        extra = StrConvert().to_env_list(DOWNSTREAM_EXTRA)
-        # Deduplicate extras against the upstream env list (final order is
-        # set by custom_sort below).
-        seen = set(env_list.envs)
-        for env_name in extra.envs:
-            if env_name not in seen:
-                env_list.envs.append(env_name)
-                seen.add(env_name)
-    env_list.envs = [
-        env
-        for env in env_list.envs
-        if _env_in_scope(env, scope) and all(skip not in env for skip in ansible_config.skip)
-    ]
-    if not _should_include_molecule(ansible_config.molecule, project_dir):
-        env_list.envs = [env for env in env_list.envs if not env.startswith("molecule-")]
-    if not discover_integration_tests(project_dir):
-        env_list.envs = [env for env in env_list.envs if not env.startswith("integration-")]
-    env_list.envs = sorted(env_list.envs, key=custom_sort)
-    state.conf.core.loaders.insert(
-        0,
-        MemoryLoader(
-            env_list=env_list,
-            ignore_base_python_conflict=True,
+    parser.add_argument(
+        "--import-env",
+        default=None,
+        metavar="ARCHIVE_DIR",
+        type=Path,
+        of_type=Path,
+        help=(
+            "Extract the Ansible environments from ARCHIVE_DIR/<env>.tar.gz instead of"
+            " provisioning them, when they were provisioned with the same inputs"
         ),
     )
-    return env_list
-
-
-def _check_num_candidates(candidates: list[str], env_name: str) -> None:
-    """Check the number of candidates.
 
-    Args:
-        candidates: The candidates.
-        env_name: The environment name.
-    """
-    if env_name == "galaxy":
-        return
-    if len(candidates) > 1:
-        err = f"Multiple python versions found in {env_name}"
-        logger.critical(err)
-        sys.exit(1)
-    if len(candidates) == 0:
-        err = f"No python version found in {env_name}"
-        logger.critical(err)
-        sys.exit(1)
-
-
-def _gen_version(candidates: list[str]) -> str:
-    """Generate the version from the candidates.
-
-    Args:
-        candidates: The candidates.
-
-    Returns:
-        The version.
-    """
-    if "." in candidates[0]:
-        return candidates[0]
-    return f"{candidates[0][0]}.{candidates[0][1:]}"
+    parser.add_argument(
+        "--ansible-profile",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="PSTATS_FILE",
+        of_type=str,
+        help=(
+            "Print the time spent in the tox-ansible hooks and helpers at exit,"
+            " optionally writing cProfile statistics to PSTATS_FILE"
+        ),
+    )
 
 
-def _extract_py_candidates(env_name: str) -> list[str]:
-    """Extract Python version candidates from an environment name.
+@impl
+def tox_add_core_config(
+    core_conf: CoreConfigSet,  # noqa: ARG001 # pylint: disable=unused-argument
+    state: State,
+) -> None:
+    """Dump the environment list and exit.
 
     Args:
-        env_name: The tox environment name (e.g. "unit-py3.11-2.19").
-
-    Returns:
-        A list of Python version strings found in the environment factors.
+        core_conf: The core configuration object.
+        state: The state object.
     """
-    if env_name == "galaxy":
-        return ["3.14"]
-    candidates = []
-    for factor in env_name.split("-"):
-        match = PY_FACTORS_RE.match(factor)
-        if match:
-            candidates.append(match[2])
-    return candidates
-
-
-def generate_gh_matrix(env_list: EnvList, section: str) -> None:
-    """Generate the github matrix.
+    options = state.conf.options
+    for name in _ANSIBLE_OPTIONS:
+        if getattr(options, name) not in (None, False) and not options.ansible:  # pragma: no cover
+            err = f"The --{name.replace('_', '-')} option requires --ansible"
+            logger.critical(err)
+            sys.exit(1)
 
-    Args:
-        env_list: The environment list.
-        section: The test section to be generated.
-    """
-    results = []
-    for env_name in env_list.envs:
-        if not _env_in_scope(env_name, section):  # pragma: no cover
-            continue
-        factors = env_name.split("-")
-        candidates = _extract_py_candidates(env_name)
-
-        _check_num_candidates(candidates=candidates, env_name=env_name)
-        version = _gen_version(candidates=candidates)
-
-        results.append(
-            {
-                "description": desc_for_env(env_name),
-                "factors": factors,
-                "name": env_name,
-                "python": version,
-            },
-        )
-
-    gh_output = os.getenv("GITHUB_OUTPUT")
-    if not gh_output and not in_action():
-        value = json.dumps(results, indent=2, sort_keys=True)
-        print(value)  # noqa: T201
+    if not state.conf.options.ansible:  # pragma: no cover
         return
 
-    if not gh_output:  # pragma: no cover
-        err = "GITHUB_OUTPUT environment variable not set"
-        logger.critical(err)
-        sys.exit(1)
-
-    value = json.dumps(results)
-
-    if "\n" in value:
-        eof = f"EOF-{uuid.uuid4()}"
-        encoded = f"envlist<<{eof}\n{value}\n{eof}\n"
-    else:
-        encoded = f"envlist={value}\n"
+    _run_hook(state.conf.options, "tox_add_core_config", _add_core_config, state)
 
-    with Path(gh_output).open("a", encoding="utf-8") as fileh:
-        fileh.write(encoded)
-
-
-@dataclass
-class Collection:
-    """Collection information.
-
-    Attributes:
-        name: The collection name.
-        namespace: The collection namespace.
-        version: The collection version.
-    """
 
-    name: str
-    namespace: str
-    version: str
+def _add_core_config(state: State) -> None:
+    """Add the ansible matrix, then emit the github matrix or build the wheelhouse if requested.
 
-
-def get_collection(galaxy_path: Path) -> Collection:
-    """Extract collection information from the galaxy.yml file.
+    With ``--provision-only``, the selected environments are run by
+    ``tox run-parallel`` without their tests.
 
     Args:
-        galaxy_path: The path to the galaxy.yml file.
-
-    Returns:
-        The collection name and namespace.
-    """
-    try:
-        with galaxy_path.open() as galaxy_file:
-            galaxy = yaml.safe_load(galaxy_file)
-    except FileNotFoundError:
-        err = f"Unable to find galaxy.yml file at {galaxy_path}"
-        logger.critical(err)
-        sys.exit(1)
-
-    try:
-        c_name = galaxy["name"]
-        c_namespace = galaxy["namespace"]
-        c_version = galaxy["version"]
-    except KeyError as exc:
-        err = f"Unable to find {exc} in galaxy.yml"
-        logger.critical(err)
-        sys.exit(1)
-    return Collection(name=c_name, namespace=c_namespace, version=c_version)
-
-
-def _collection_install_path(env_conf: EnvConfigSet, collection: Collection) -> Path:
-    """Build the collection installation path inside a tox environment.
-
-    Args:
-        env_conf: The tox environment configuration object.
-        collection: The collection info.
-
-    Returns:
-        The installed collection path.
-    """
-    py_ver = env_conf.name.split("-")[1].replace("py", "")
-    return (
-        Path(env_conf["env_dir"])
-        / "lib"
-        / f"python{py_ver}"
-        / "site-packages"
-        / "ansible_collections"
-        / collection.namespace
-        / collection.name
-    )
-
-
-def _write_coverage_config(
-    env_conf: EnvConfigSet,
-    collection: Collection,
-) -> Path:
-    """Write an environment-specific coverage configuration.
-
-    Args:
-        env_conf: The tox environment configuration object.
-        collection: The collection info.
-
-    Returns:
-        The generated coverage configuration path.
+        state: The state object.
     """
-    coverage_dir = Path(env_conf["env_dir"]).parent / ".tox-ansible" / "coverage"
-    coverage_dir.mkdir(parents=True, exist_ok=True)
-    coverage_config = coverage_dir / f"{env_conf.name}.ini"
-    installed_plugins = _collection_install_path(env_conf, collection) / "plugins"
-    coverage_data = Path(env_conf["env_dir"]).resolve() / ".coverage"
-    coverage_config.write_text(
-        "[run]\n"
-        f"data_file = {coverage_data}\n"
-        "source =\n"
-        "    plugins\n"
-        f"    {installed_plugins}\n"
-        "\n"
-        "[paths]\n"
-        "source =\n"
-        "    plugins\n"
-        f"    {installed_plugins}\n"
-        "\n"
-        "[report]\n"
-        "include_namespace_packages = true\n"
-        "show_missing = true\n",
-        encoding="utf-8",
+    from tox_ansible.core_cache import cache_available, core_cache  # noqa: PLC0415
+    from tox_ansible.matrix import add_ansible_matrix, generate_gh_matrix  # noqa: PLC0415
+    from tox_ansible.provision import start_provision_only  # noqa: PLC0415
+    from tox_ansible.wheelhouse import (  # noqa: PLC0415
+        WHEELHOUSE_BUILD,
+        active_wheelhouse,
+        build_wheelhouse,
     )
-    return coverage_config
 
+    env_list = add_ansible_matrix(state, scope=state.conf.options.matrix_scope)
 
-def conf_commands(  # noqa: PLR0913
-    collection: Collection,
-    env_conf: EnvConfigSet,
-    pos_args: tuple[str, ...] | None,
-    test_type: str,
-    *,
-    coverage_config: Path | None = None,
-    molecule_commands: list[str] | None = None,
-    molecule_append: list[str] | None = None,
-) -> list[str]:
-    """Build the commands for the tox environment.
-
-    Args:
-        collection: The collection info.
-        env_conf: The tox environment configuration object.
-        pos_args: Positional arguments passed to tox command.
-        test_type: The test type.
-        coverage_config: The generated coverage configuration path.
-        molecule_commands: Full-replacement molecule commands from config.
-        molecule_append: Extra argv appended to the default molecule command.
+    if state.conf.options.ansible_wheelhouse == WHEELHOUSE_BUILD:
+        build_wheelhouse(state, env_list.envs)
+        sys.exit(0)
+    # Fail before running anything when the wheelhouse to use was never built.
+    active_wheelhouse(state)
 
-    Returns:
-        The commands to run.
-    """
-    if test_type in ["integration", "unit"]:
-        return conf_commands_for_integration_unit(
-            pos_args=pos_args,
-            test_type=test_type,
-            coverage_config=coverage_config,
-        )
-    if test_type == "molecule":
-        return conf_commands_for_molecule(
-            pos_args=pos_args,
-            molecule_commands=molecule_commands,
-            molecule_append=molecule_append,
-        )
-    if test_type == "sanity":
-        return conf_commands_for_sanity(
-            collection=collection,
-            env_conf=env_conf,
-            pos_args=pos_args,
-        )
-    if test_type == "galaxy":
-        return conf_commands_for_galaxy(
-            collection=collection,
-            env_conf=env_conf,
-        )
-    err = f"Unknown test type {test_type}"
-    logger.critical(err)
-    sys.exit(1)
-
-
-def conf_commands_for_integration_unit(
-    pos_args: tuple[str, ...] | None,
-    test_type: str,
-    coverage_config: Path | None = None,
-) -> list[str]:
-    """Build the commands for integration and unit tests.
+    if state.conf.options.provision_only:
+        start_provision_only(state, env_list.envs)
 
-    Args:
-        pos_args: Positional arguments passed to tox command.
-        test_type: The test type, either "integration" or "unit".
-        coverage_config: The generated coverage configuration path.
-
-    Returns:
-        The commands to run.
-    """
-    args = f" {' '.join(pos_args)} " if pos_args else " "
-    coverage_args = (
-        f" --cov --cov-config={coverage_config}"
-        if test_type == "unit" and coverage_config is not None
-        else ""
-    )
+    if not state.conf.options.gh_matrix:  # pragma: no cover
+        return
 
-    # Use pytest ansible unit inject only to inject the collection path
-    # into the collection finder
-    command = (
-        f"python3 -m pytest{coverage_args} "
-        f"--ansible-unit-inject-only{args}{Path()}/tests/{test_type}"
+    generate_gh_matrix(
+        env_list=env_list,
+        section=state.conf.options.matrix_scope,
+        cache=core_cache(state) if cache_available() else None,
     )
-    return [command]
-
-
-def conf_commands_for_molecule(
-    pos_args: tuple[str, ...] | None,
-    molecule_commands: list[str] | None = None,
-    molecule_append: list[str] | None = None,
-) -> list[str]:
-    """Build the commands for molecule tests.
-
-    Default is ``python3 -m molecule test --all``. ``molecule_append`` adds
-    argv after that default. Non-empty ``molecule_commands`` fully replaces the
-    default (and ignores ``molecule_append`` / ``pos_args``).
-
-    Args:
-        pos_args: Positional arguments passed to tox command.
-        molecule_commands: Full-replacement molecule commands from config.
-        molecule_append: Extra argv appended to the default molecule command.
-
-    Returns:
-        The commands to run.
-    """
-    if molecule_commands:
-        return list(molecule_commands)
-
-    parts = ["python3", "-m", "molecule", "test", "--all"]
-    if molecule_append:
-        parts.extend(molecule_append)
-    if pos_args:
-        parts.extend(pos_args)
-    return [" ".join(parts)]
+    sys.exit(0)
 
 
-def conf_commands_for_sanity(
-    collection: Collection,
-    env_conf: EnvConfigSet,
-    pos_args: tuple[str, ...] | None,
-) -> list[str]:
-    """Add commands for sanity tests.
+@impl
+def tox_add_env_config(env_conf: EnvConfigSet, state: State) -> None:
+    """Add the test requirements and ansible-core to the virtual environment.
 
     Args:
-        collection: The collection info.
-        env_conf: The tox environment configuration object.
-        pos_args: Positional arguments passed to tox command.
-
-    Returns:
-        The commands to run.
+        env_conf: The environment configuration object.
+        state: The state object.
     """
-    commands = []
-
-    args = f" {' '.join(pos_args)}" if pos_args else ""
+    if not state.conf.options.ansible:  # pragma: no cover
+        return
 
-    py_ver = env_conf.name.split("-")[1].replace("py", "")
-    collection_path = _collection_install_path(env_conf, collection)
+    from tox_ansible.environment import add_env_config  # noqa: PLC0415
 
-    command = f"ansible-test sanity --local --requirements --python {py_ver}{args}"
-    full_command = f"bash -c 'cd {collection_path} && {command}'"
-    commands.append(full_command)
-    return commands
+    _run_hook(state.conf.options, "tox_add_env_config", add_env_config, env_conf, state)
 
 
-def conf_commands_for_galaxy(
-    collection: Collection,  # noqa: ARG001
-    env_conf: EnvConfigSet,
-) -> list[str]:
-    """Add commands for sanity tests.
+@impl
+def tox_before_run_commands(tox_env: ToxEnv) -> None:
+    """Prepare the files needed by the commands of an ansible environment.
 
     Args:
-        collection: The collection info.
-        env_conf: The tox environment configuration object.
-
-    Returns:
-        The commands to run.
+        tox_env: The tox environment about to run its commands.
     """
-    commands = []
-    env_tmp_dir = env_conf["env_tmp_dir"]
-    env_log_dir = env_conf["env_log_dir"]
-    env_python = env_conf["env_python"]
-    config_dir = env_conf._conf.src_path.parent.resolve()
-    commands.append(
-        f"bash -c 'cd {env_log_dir} && "
-        f"{env_python} -m galaxy_importer.main "
-        f"--git-clone-path {config_dir} --output-path {env_tmp_dir}'"
-    )
+    if not tox_env.options.ansible:  # pragma: no cover
+        return
 
-    return commands
+    from tox_ansible.environment import before_run_commands  # noqa: PLC0415
 
+    _run_hook(tox_env.options, "tox_before_run_commands", before_run_commands, tox_env)
 
-def _add_collection_req_commands(
-    commands: list[str],
-    found_reqs: list[str],
-    envdir: str,
-    acv: str,
-    end_group: str,
-) -> None:
-    """Append ade install commands for each discovered requirements file.
 
-    Args:
-        commands: The command list to append to.
-        found_reqs: Requirement file paths that exist on disk.
-        envdir: The tox environment directory.
-        acv: The ansible-core version specifier.
-        end_group: The CI group-close command string.
-    """
-    if in_action():
-        commands.append("echo ::group::Install collection requirements with ade")
-    for req_path in found_reqs:
-        ade_req_cmd = f"ade install -r {req_path} --venv {envdir} --acv {acv} --no-seed --im none"
-        commands.append(
-            f"bash -c '{ade_req_cmd}; rc=$?; if [ $rc -ne 0 ] && [ $rc -ne 2 ]; then exit $rc; fi'",
-        )
-    if in_action():
-        commands.append(end_group)
-
-
-def _add_sanity_git_init(
-    commands: list[str],
-    env_conf: EnvConfigSet,
-    collection: Collection,
-    end_group: str,
+@impl
+def tox_after_run_commands(
+    tox_env: ToxEnv,
+    exit_code: int,  # noqa: ARG001 # pylint: disable=unused-argument
+    outcomes: list[Outcome],  # noqa: ARG001 # pylint: disable=unused-argument
 ) -> None:
-    """Append git-init commands needed to work around ansible/ansible#68499.
-
-    Args:
-        commands: The command list to append to.
-        env_conf: The tox environment configuration object.
-        collection: The collection info.
-        end_group: The CI group-close command string.
-    """
-    collection_path = _collection_install_path(env_conf, collection)
-    if in_action():  # pragma: no cover
-        commands.append("echo ::group::Initialize the collection to avoid ansible #68499")
-    git_cfg = "git config --global init.defaultBranch main"
-    git_init = "git init ."
-    commands.append(f"bash -c 'cd {collection_path} && {git_cfg} && {git_init}'")
-    if in_action():  # pragma: no cover
-        commands.append(end_group)
-
-
-def conf_commands_pre(
-    env_conf: EnvConfigSet,
-    collection: Collection,
-    test_type: str,
-    ansible_version: str,
-) -> list[str]:
-    """Install the collection using ade (ansible-dev-environment).
+    """Export an ansible environment once provisioned.
 
     Args:
-        env_conf: The tox environment configuration object.
-        collection: The collection info.
-        test_type: The test type, either "integration", "unit", "sanity", or "galaxy".
-        ansible_version: The ansible version factor from the env name.
-
-    Returns:
-        The commands to pre run.
+        tox_env: The tox environment that ran its commands.
+        exit_code: The exit code of the commands.
+        outcomes: The outcomes of the commands.
     """
-    if test_type == "galaxy":
-        return []
-
-    commands = []
-    envdir = env_conf["env_dir"]
-    end_group = "echo ::endgroup::"
-
-    if ansible_version in ("devel", "milestone"):
-        acv = ansible_version
-    else:
-        acv = f"stable-{ansible_version}"
-
-    if in_action():
-        commands.append("echo ::group::Install collection with ade")
-    editable = " -e" if test_type != "sanity" else ""
-    ade_cmd = f"ade install{editable} --venv {envdir} --acv {acv} --no-seed --im none ."
-    commands.append(
-        f"bash -c '{ade_cmd}; rc=$?; if [ $rc -ne 0 ] && [ $rc -ne 2 ]; then exit $rc; fi'",
-    )
-    if in_action():
-        commands.append(end_group)
-
-    req_paths = TEST_REQUIREMENTS_YML.get(test_type, [])
-    cwd = Path.cwd()
-    found_reqs = [p for p in req_paths if (cwd / p).is_file()]
-    if found_reqs:
-        _add_collection_req_commands(commands, found_reqs, envdir, acv, end_group)
-
-    if test_type == "sanity":
-        _add_sanity_git_init(commands, env_conf, collection, end_group)
-
-    return commands
+    if not tox_env.options.ansible:  # pragma: no cover
+        return
 
+    from tox_ansible.environment import after_run_commands  # noqa: PLC0415
 
-def _test_deps(test_type: str, *, coverage_enabled: bool) -> list[str]:
-    """Assemble dependencies for integration and unit test environments.
+    _run_hook(tox_env.options, "tox_after_run_commands", after_run_commands, tox_env)
 
-    Args:
-        test_type: The test type, either "integration" or "unit".
-        coverage_enabled: Whether unit test coverage is enabled.
 
-    Returns:
-        The dependencies as a list of requirement strings.
-    """
-    deps = list(OUR_DEPS)
-    if test_type == "unit" and coverage_enabled:
-        deps.extend(COVERAGE_DEPS)
-    if test_type in ("integration", "molecule"):
-        deps.append("molecule>=26.4.0")
-    cwd = Path.cwd()
-    for req_file in PYTHON_DEPENDENCY_FILES:
-        try:
-            with (cwd / req_file).open() as fileh:
-                deps.extend(fileh.read().splitlines())
-        except FileNotFoundError:  # noqa: PERF203
-            pass
-    return deps
-
-
-def conf_deps(test_type: str, *, coverage_enabled: bool = False) -> str:
-    """Add dependencies to the tox environment.
+@impl
+def tox_on_install(
+    tox_env: ToxEnv,
+    arguments: Any,  # noqa: ANN401, ARG001 # pylint: disable=unused-argument
+    section: str,  # noqa: ARG001 # pylint: disable=unused-argument
+    of_type: str,
+) -> None:
+    """Compose an ansible environment of the shared layers before its deps are installed.
 
     Args:
-        test_type: The test type, either "integration", "unit", or "sanity".
-        coverage_enabled: Whether unit test coverage is enabled.
-
-    Returns:
-        The dependencies.
+        tox_env: The tox environment about to install packages.
+        arguments: The packages to install.
+        section: The configuration section of the packages.
+        of_type: The kind of packages being installed.
     """
-    deps: list[str] = []
-    if test_type == "galaxy":
-        deps.append("galaxy-importer>=0.4.31")
-    else:
-        deps.append("ansible-dev-environment>=26.2.0")
-        if test_type in ("integration", "molecule", "unit"):
-            deps.extend(_test_deps(test_type, coverage_enabled=coverage_enabled))
-    return "\n".join(deps)
-
-
-def conf_passenv() -> list[str]:
-    """Build the pass environment variables for the tox environment.
-
-    Returns:
-        The pass environment variables.
-    """
-    passenv = []
-    passenv.append("GITHUB_TOKEN")
-    return passenv
-
-
-def conf_setenv(env_conf: EnvConfigSet, test_type: str) -> str:
-    """Build the set environment variables for the tox environment.
-
-    Set the XDG_CACHE_HOME to the environment directory to isolate it
+    if not tox_env.options.ansible:  # pragma: no cover
+        return
 
-    Args:
-        env_conf: The tox environment configuration object.
-        test_type: The test type.
+    from tox_ansible.environment import before_install  # noqa: PLC0415
 
-    Returns:
-        The set environment variables.
-    """
-    setenv = [
-        f"XDG_CACHE_HOME={env_conf['env_dir']}/.cache",
-    ]
-
-    if test_type != "galaxy":
-        setenv.insert(0, "ANSIBLE_COLLECTIONS_PATH=.")
-
-    # due to the ceilings used by galaxy-importer, use of constraints will
-    # likely cause installation failures.
-    if test_type == "galaxy":
-        setenv.append("PIP_CONSTRAINT=/dev/null")
-        setenv.append("UV_CONSTRAINT=/dev/null")
-    return "\n".join(setenv)
+    _run_hook(tox_env.options, "tox_on_install", before_install, tox_env, of_type)
@@ -0,0 +1,225 @@
+"""Timing spans for the tox-ansible hooks, enabled with ``--ansible-profile``.
+
+The plugin only imports this module when the option is given. Starting the
+profiler wraps the helpers listed in ``PROFILED_HELPERS`` in place, so calls
+made through their module globals are timed, and registers an exit handler
+printing the breakdown to stderr (stdout carries ``--gh-matrix`` output).
+"""
+
+from __future__ import annotations
+
+import atexit
+import cProfile
+import functools
+import importlib
+import sys
+import time
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, TypeVar
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+
+T = TypeVar("T")
+
+# Helpers wrapped with a span of the same name, as (module, attribute) pairs.
+# A dotted attribute names a classmethod.
+PROFILED_HELPERS = (
+    ("tox_ansible.project", "_build_project_context"),
+    ("tox_ansible.project", "_load_pyproject_config"),
+    ("tox_ansible.project", "_load_ansible_config"),
+    ("tox_ansible.project", "get_collection"),
+    ("tox_ansible.project", "source_digest"),
+    ("tox_ansible.project", "ProjectIndex.scan"),
+    ("tox_ansible.project", "read_requirement_files"),
+    ("tox_ansible.artifact", "build_collection"),
+    ("tox_ansible.core_cache", "resolve_revision"),
+    ("tox_ansible.core_cache", "build_wheel"),
+    ("tox_ansible.collection_cache", "download_collections"),
+    ("tox_ansible.dependencies", "resolve_pins"),
+    ("tox_ansible.wheelhouse", "build_wheels"),
+    ("tox_ansible.layers", "install_layer"),
+    ("tox_ansible.layers", "compose"),
+    ("tox_ansible.matrix", "add_ansible_matrix"),
+    ("tox_ansible.matrix", "generate_gh_matrix"),
+    ("tox_ansible.environment", "add_env_config"),
+    ("tox_ansible.environment", "before_run_commands"),
+    ("tox_ansible.environment", "before_install"),
+    ("tox_ansible.environment", "conf_commands"),
+    ("tox_ansible.environment", "conf_commands_pre"),
+    ("tox_ansible.environment", "conf_deps"),
+    ("tox_ansible.environment", "conf_setenv"),
+    ("tox_ansible.environment", "provision_fingerprint"),
+    ("tox_ansible.environment", "sync_collection"),
+)
+
+
+@dataclass
+class SpanStats:
+    """Accumulated timings of a span.
+
+    Attributes:
+        calls: The number of times the span was entered.
+        total: The time spent in the span itself, excluding nested spans.
+        cumulative: The time spent in the span, including nested spans.
+    """
+
+    calls: int = 0
+    total: float = 0.0
+    cumulative: float = 0.0
+
+
+@dataclass
+class Profiler:
+    """Collect nested timing spans and an optional cProfile dump.
+
+    Attributes:
+        dump_path: Where to write the cProfile statistics, None to skip them.
+        stats: The accumulated timings by span name.
+        own: The time spent inside top level spans.
+        started: The ``perf_counter`` value when profiling started.
+    """
+
+    dump_path: Path | None = None
+    stats: dict[str, SpanStats] = field(default_factory=dict)
+    own: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+    _children: list[float] = field(default_factory=list)
+    _cprofile: cProfile.Profile | None = None
+    _originals: list[tuple[object, str, object]] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        """Start the cProfile collection when a dump was requested."""
+        if self.dump_path is not None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the enclosed block.
+
+        Args:
+            name: The span name.
+
+        Yields:
+            Nothing.
+        """
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._children.pop()
+            stats = self.stats.setdefault(name, SpanStats())
+            stats.calls += 1
+            stats.total += elapsed - children
+            stats.cumulative += elapsed
+            if self._children:
+                self._children[-1] += elapsed
+            else:
+                self.own += elapsed
+
+    def wrap(self, name: str, func: Callable[..., T]) -> Callable[..., T]:
+        """Wrap a function in a span.
+
+        Args:
+            name: The span name.
+            func: The function to wrap.
+
+        Returns:
+            The wrapped function.
+        """
+
+        @functools.wraps(func)
+        def _wrapped(*args: Any, **kwargs: Any) -> T:  # noqa: ANN401
+            with self.span(name):
+                return func(*args, **kwargs)
+
+        return _wrapped
+
+    def install(self) -> None:
+        """Wrap the ``PROFILED_HELPERS`` in place."""
+        for module_name, attr in PROFILED_HELPERS:
+            owner: object = importlib.import_module(module_name)
+            *owner_path, name = attr.split(".")
+            for part in owner_path:
+                owner = getattr(owner, part)
+            original = vars(owner)[name]
+            self._originals.append((owner, name, original))
+            wrapped = self.wrap(attr, getattr(owner, name))
+            setattr(owner, name, staticmethod(wrapped) if owner_path else wrapped)
+
+    def uninstall(self) -> None:
+        """Restore the wrapped helpers."""
+        while self._originals:
+            owner, name, original = self._originals.pop()
+            setattr(owner, name, original)
+
+    def report(self) -> str:
+        """Format the per span breakdown.
+
+        Returns:
+            The report, slowest cumulative span first.
+        """
+        wall = time.perf_counter() - self.started
+        width = max((len(name) for name in self.stats), default=4)
+        lines = [
+            (
+                f"tox-ansible profile: {self.own:.4f}s in tox-ansible, "
+                f"{wall - self.own:.4f}s elsewhere, {wall:.4f}s wall"
+            ),
+            f"{'span':<{width}}  {'calls':>6}  {'total':>9}  {'cumulative':>10}",
+        ]
+        lines.extend(
+            f"{name:<{width}}  {stats.calls:>6}  {stats.total:>8.4f}s  {stats.cumulative:>9.4f}s"
+            for name, stats in sorted(
+                self.stats.items(),
+                key=lambda item: (-item[1].cumulative, item[0]),
+            )
+        )
+        return "\n".join(lines) + "\n"
+
+    def finish(self) -> None:
+        """Stop profiling, write the cProfile dump and print the report."""
+        self.uninstall()
+        if self._cprofile is not None and self.dump_path is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.dump_path)
+        sys.stderr.write(self.report())
+        if self.dump_path is not None:
+            sys.stderr.write(f"cProfile statistics written to {self.dump_path}\n")
+
+
+_PROFILER: Profiler | None = None
+
+
+def start(dump_path: str) -> Profiler:
+    """Start profiling the session, once.
+
+    Args:
+        dump_path: The ``--ansible-profile`` value, a cProfile output path or empty.
+
+    Returns:
+        The session profiler.
+    """
+    global _PROFILER  # noqa: PLW0603
+    if _PROFILER is None:
+        _PROFILER = Profiler(dump_path=Path(dump_path) if dump_path else None)
+        _PROFILER.install()
+        atexit.register(stop)
+    return _PROFILER
+
+
+def stop() -> None:
+    """Stop profiling the session and print the report, if it was started."""
+    global _PROFILER
+    if _PROFILER is None:
+        return
+    profiler, _PROFILER = _PROFILER, None
+    profiler.finish()
@@ -0,0 +1,840 @@
+"""Collection project discovery and tox-ansible configuration.
+
+This module does not import tox, so that the standalone matrix generator
+(``python -m tox_ansible.matrix``) can use it; tox is only imported by the
+helpers taking a tox ``State``.
+"""
+
+from __future__ import annotations
+
+import configparser
+import logging
+import os
+import posixpath
+import sys
+import weakref
+
+from dataclasses import dataclass, field
+from functools import cached_property
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # pragma: no cover
+    import tomli as tomllib  # type: ignore[no-redef]
+
+import yaml
+
+from tox_ansible.artifact import source_digest
+from tox_ansible.dependencies import RequirementFiles, read_requirement_files
+
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+# Paths checked for collection requirements files, keyed by test type.
+# From https://github.com/ansible/ansible-compat/blob/main/src/ansible_compat/constants.py#L6-L14
+SHARED_REQUIREMENTS_YML = "tests/requirements.yml"
+TEST_REQUIREMENTS_YML: dict[str, list[str]] = {
+    "unit": [
+        SHARED_REQUIREMENTS_YML,
+        "tests/unit/requirements.yml",
+    ],
+    "integration": [
+        SHARED_REQUIREMENTS_YML,
+        "tests/integration/requirements.yml",
+    ],
+    # Molecule shares integration collection deps during migration; also
+    # accepts a dedicated molecule requirements file when collections split.
+    "molecule": [
+        SHARED_REQUIREMENTS_YML,
+        "tests/integration/requirements.yml",
+        "tests/molecule/requirements.yml",
+    ],
+}
+
+PYTHON_DEPENDENCY_FILES: list[str] = [
+    "test-requirements.txt",
+    "requirements-test.txt",
+    "requirements.txt",
+    "tests/unit/requirements.txt",
+    "tests/integration/requirements.txt",
+    # https://docs.ansible.com/projects/builder/en/latest/collection_metadata/
+    "meta/ee-requirements.txt",
+]
+
+RUNTIME_YML = "meta/runtime.yml"
+MOLECULE_DIR = "extensions/molecule"
+INTEGRATION_DIR = "tests/integration"
+INTEGRATION_TARGETS_DIR = f"{INTEGRATION_DIR}/targets"
+# Directories never descended into while looking for pytest integration modules.
+PRUNED_DIRS = frozenset({"__pycache__", "fixtures", "node_modules", "site-packages"})
+
+# Seconds the ansible-core commit a branch resolved to is reused by later runs.
+DEFAULT_CORE_REVISION_TTL = 3600
+
+# ``(st_mtime_ns, st_size)`` of a project file, ``None`` when it does not exist.
+FileStamp = tuple[int, int] | None
+
+
+@dataclass
+class AnsibleConfiguration:
+    """User-provided tox-ansible configuration.
+
+    Attributes:
+        coverage: Enable coverage reporting for unit tests.
+        skip: Environment name fragments to skip.
+        downstream: When true, union DOWNSTREAM_EXTRA onto ENV_LIST.
+        molecule: Molecule test type mode ("auto", "true", or "false").
+        molecule_append: Extra argv appended to the default molecule command.
+        molecule_commands: Full-replacement molecule commands.
+        core_revision_ttl: Seconds a resolved ansible-core branch commit is reused.
+    """
+
+    coverage: bool = False
+    skip: list[str] = field(default_factory=list)
+    downstream: bool = False
+    molecule: str = "auto"
+    molecule_append: list[str] = field(default_factory=list)
+    molecule_commands: list[str] = field(default_factory=list)
+    core_revision_ttl: int = DEFAULT_CORE_REVISION_TTL
+
+
+@dataclass
+class Collection:
+    """Collection information.
+
+    Attributes:
+        name: The collection name.
+        namespace: The collection namespace.
+        version: The collection version.
+        build_ignore: The galaxy.yml ``build_ignore`` patterns.
+        manifest: The galaxy.yml ``manifest`` directives, None when not used.
+    """
+
+    name: str
+    namespace: str
+    version: str
+    build_ignore: list[str] = field(default_factory=list)
+    manifest: dict[str, Any] | None = None
+
+
+def get_collection(galaxy_path: Path) -> Collection:
+    """Extract collection information from the galaxy.yml file.
+
+    Args:
+        galaxy_path: The path to the galaxy.yml file.
+
+    Returns:
+        The collection name and namespace.
+    """
+    try:
+        with galaxy_path.open() as galaxy_file:
+            galaxy = yaml.safe_load(galaxy_file)
+    except FileNotFoundError:
+        err = f"Unable to find galaxy.yml file at {galaxy_path}"
+        logger.critical(err)
+        sys.exit(1)
+
+    try:
+        c_name = galaxy["name"]
+        c_namespace = galaxy["namespace"]
+        c_version = galaxy["version"]
+    except KeyError as exc:
+        err = f"Unable to find {exc} in galaxy.yml"
+        logger.critical(err)
+        sys.exit(1)
+    # A manifest key, even without directives, replaces build_ignore by
+    # MANIFEST.in style rules.
+    manifest = (galaxy["manifest"] or {}) if "manifest" in galaxy else None
+    return Collection(
+        name=c_name,
+        namespace=c_namespace,
+        version=c_version,
+        build_ignore=galaxy.get("build_ignore") or [],
+        manifest=manifest,
+    )
+
+
+def read_requires_ansible(project_dir: Path) -> str | None:
+    """Read the ``requires_ansible`` specifier from meta/runtime.yml.
+
+    Args:
+        project_dir: The project root directory.
+
+    Returns:
+        The specifier, or ``None`` if the file or key is missing or invalid.
+    """
+    runtime_path = project_dir / RUNTIME_YML
+    try:
+        with runtime_path.open(encoding="utf-8") as runtime_file:
+            runtime = yaml.safe_load(runtime_file)
+    except FileNotFoundError:
+        return None
+    except yaml.YAMLError:
+        logger.warning("Failed to parse %s, ignoring requires_ansible", runtime_path)
+        return None
+    value = runtime.get("requires_ansible") if isinstance(runtime, dict) else None
+    if value is not None and not isinstance(value, str):
+        logger.warning("Invalid requires_ansible value %r in %s, ignoring it", value, runtime_path)
+        return None
+    return value
+
+
+def in_action() -> bool:
+    """Check if running on Github Actions platform.
+
+    Returns:
+        True if running on Github Actions platform.
+    """
+    return os.environ.get("GITHUB_ACTIONS") == "true"
+
+
+def _load_pyproject_config(project_dir: Path) -> dict[str, Any] | None:
+    """Load tox-ansible configuration from pyproject.toml.
+
+    Looks for ``[tool.tox-ansible]`` in the project's ``pyproject.toml``.
+
+    Args:
+        project_dir: The project root directory containing pyproject.toml.
+
+    Returns:
+        The parsed ``[tool.tox-ansible]`` table, or ``None`` if the file
+        or section is not found.
+    """
+    pyproject_path = project_dir / "pyproject.toml"
+    if not pyproject_path.exists():
+        return None
+    try:
+        with pyproject_path.open("rb") as fh:
+            data = tomllib.load(fh)
+    except tomllib.TOMLDecodeError:
+        logger.warning("Failed to parse %s, skipping", pyproject_path)
+        return None
+    return data.get("tool", {}).get("tox-ansible")
+
+
+def _coerce_bool(value: object, *, default: bool = False) -> bool:
+    """Coerce a config value to bool with explicit string and int handling.
+
+    Args:
+        value: Raw value from TOML or similar.
+        default: Fallback when the value cannot be interpreted.
+
+    Returns:
+        The coerced boolean.
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in {0, 1}:
+        return bool(value)
+    if isinstance(value, str):
+        normalized = value.strip().lower()
+        if normalized in {"true", "1", "yes", "on"}:
+            return True
+        if normalized in {"false", "0", "no", "off", ""}:
+            return False
+    elif value is None:
+        return default
+    logger.warning("Invalid boolean config value %r; using %s", value, default)
+    return default
+
+
+def _coerce_molecule_setting(value: object, *, default: str = "auto") -> str:
+    """Coerce a pyproject ``molecule`` value to ``auto``, ``true``, or ``false``.
+
+    Args:
+        value: Raw value from TOML (bool, int, str) or INI (str).
+        default: Fallback when the value cannot be interpreted.
+
+    Returns:
+        Normalized molecule mode string.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int) and value in {0, 1}:
+        return "true" if value else "false"
+    if value is None:
+        return default
+    if isinstance(value, str):
+        normalized = value.strip().lower()
+        modes = {
+            "true": "true",
+            "1": "true",
+            "yes": "true",
+            "on": "true",
+            "false": "false",
+            "0": "false",
+            "no": "false",
+            "off": "false",
+            "auto": "auto",
+            "": "auto",
+        }
+        if normalized in modes:
+            return modes[normalized]
+    logger.warning("Invalid molecule config value %r; using %r", value, default)
+    return default
+
+
+def _coerce_ttl(value: object, *, default: int = DEFAULT_CORE_REVISION_TTL) -> int:
+    """Coerce a config value to a non-negative number of seconds.
+
+    Args:
+        value: Raw value from TOML (int, str) or INI (str).
+        default: Fallback when the value cannot be interpreted.
+
+    Returns:
+        The number of seconds.
+    """
+    if value is None:
+        return default
+    if not isinstance(value, bool) and isinstance(value, (int, str)):
+        try:
+            seconds = int(value)
+        except ValueError:
+            pass
+        else:
+            if seconds >= 0:
+                return seconds
+    logger.warning("Invalid core_revision_ttl config value %r; using %s", value, default)
+    return default
+
+
+def _scan_dir(path: Path) -> dict[str, os.DirEntry[str]]:
+    """List a directory once, keeping the cached entry type information.
+
+    Args:
+        path: The directory to list.
+
+    Returns:
+        The directory entries keyed by name, empty if the directory is missing.
+    """
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name: entry for entry in entries}
+    except OSError:
+        return {}
+
+
+def _is_test_module(name: str) -> bool:
+    """Check whether a file name looks like a pytest module.
+
+    Args:
+        name: The file name.
+
+    Returns:
+        True for ``test_*.py`` and ``*_test.py`` files.
+    """
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+@dataclass(frozen=True)
+class ProjectIndex:
+    """Index of the collection paths probed by the plugin.
+
+    Built by a single ``os.scandir`` pass so that every hook answers its
+    discovery and requirement lookups from memory instead of the disk.
+
+    Attributes:
+        root: The project root directory.
+        files: Relative paths of the requirements files that exist.
+        molecule_scenarios: Names of the molecule scenarios.
+        integration_targets: Names of the ansible-test integration targets.
+        integration_modules: Relative paths of the pytest integration modules.
+    """
+
+    root: Path
+    files: frozenset[str]
+    molecule_scenarios: tuple[str, ...]
+    integration_targets: tuple[str, ...]
+    integration_modules: tuple[str, ...]
+
+    @classmethod
+    def scan(cls, root: Path) -> ProjectIndex:
+        """Probe the project directory.
+
+        Every directory is listed at most once. The walk for pytest modules
+        skips hidden directories, virtual environments, ``PRUNED_DIRS`` and
+        the ansible-test targets.
+
+        Args:
+            root: The project root directory.
+
+        Returns:
+            The project index.
+        """
+        listings: dict[str, dict[str, os.DirEntry[str]]] = {}
+
+        def listing(rel: str) -> dict[str, os.DirEntry[str]]:
+            if rel not in listings:
+                listings[rel] = _scan_dir(root / rel)
+            return listings[rel]
+
+        probes = dict.fromkeys(
+            chain(PYTHON_DEPENDENCY_FILES, *TEST_REQUIREMENTS_YML.values()),
+        )
+        files = frozenset(
+            probe
+            for probe in probes
+            if (entry := listing(posixpath.dirname(probe)).get(posixpath.basename(probe)))
+            and entry.is_file()
+        )
+
+        molecule_scenarios = tuple(
+            sorted(
+                name
+                for name, entry in listing(MOLECULE_DIR).items()
+                if entry.is_dir() and Path(entry.path, "molecule.yml").is_file()
+            ),
+        )
+        integration_targets = tuple(sorted(listing(INTEGRATION_TARGETS_DIR)))
+
+        integration_modules: list[str] = []
+        pending = [INTEGRATION_DIR]
+        while pending:
+            rel = pending.pop()
+            entries = listing(rel)
+            if "pyvenv.cfg" in entries:
+                continue
+            for name, entry in entries.items():
+                child = f"{rel}/{name}"
+                if entry.is_dir(follow_symlinks=False):
+                    if not (
+                        name.startswith(".")
+                        or name in PRUNED_DIRS
+                        or child == INTEGRATION_TARGETS_DIR
+                    ):
+                        pending.append(child)
+                elif _is_test_module(name):
+                    integration_modules.append(child)
+
+        return cls(
+            root=root,
+            files=files,
+            molecule_scenarios=molecule_scenarios,
+            integration_targets=integration_targets,
+            integration_modules=tuple(sorted(integration_modules)),
+        )
+
+    def has_file(self, rel_path: str) -> bool:
+        """Check whether a probed requirements file exists.
+
+        Args:
+            rel_path: The path relative to the project root.
+
+        Returns:
+            True if the file exists.
+        """
+        return rel_path in self.files
+
+    @property
+    def has_molecule_scenarios(self) -> bool:
+        """Whether at least one molecule scenario exists."""
+        return bool(self.molecule_scenarios)
+
+    @property
+    def has_integration_tests(self) -> bool:
+        """Whether ansible-test targets or pytest integration modules exist."""
+        return bool(self.integration_targets or self.integration_modules)
+
+    @cached_property
+    def python_requirements(self) -> RequirementFiles:
+        """The requirements of every existing ``PYTHON_DEPENDENCY_FILES`` entry.
+
+        Returns:
+            The requirement and option lines, with the ``-r`` includes expanded.
+        """
+        files = [req_file for req_file in PYTHON_DEPENDENCY_FILES if self.has_file(req_file)]
+        return read_requirement_files(self.root, files)
+
+
+def discover_molecule_scenarios(project_dir: Path) -> bool:
+    """Check if molecule scenarios exist in the collection.
+
+    Looks for subdirectories under ``extensions/molecule/`` that contain
+    a ``molecule.yml`` file.
+
+    Args:
+        project_dir: The project root directory.
+
+    Returns:
+        True if at least one molecule scenario is found.
+    """
+    return ProjectIndex.scan(project_dir).has_molecule_scenarios
+
+
+def discover_integration_tests(project_dir: Path) -> bool:
+    """Check if ansible-test or pytest-style integration tests exist.
+
+    Looks for non-empty ``tests/integration/targets/`` (ansible-test) or
+    pytest modules under ``tests/integration/`` (``test_*.py`` / ``*_test.py``).
+
+    Args:
+        project_dir: The project root directory.
+
+    Returns:
+        True if integration test content is found.
+    """
+    return ProjectIndex.scan(project_dir).has_integration_tests
+
+
+def _should_include_molecule(
+    molecule_setting: str,
+    project_dir: Path,
+    index: ProjectIndex | None = None,
+) -> bool:
+    """Determine whether molecule environments should be included.
+
+    Args:
+        molecule_setting: The molecule config value ("auto", "true", or "false").
+        project_dir: The project root directory.
+        index: The project index, scanned from ``project_dir`` when omitted.
+
+    Returns:
+        True if molecule environments should be included.
+    """
+    if molecule_setting == "true":
+        return True
+    if molecule_setting == "false":
+        return False
+    if index is None:
+        return discover_molecule_scenarios(project_dir)
+    return index.has_molecule_scenarios
+
+
+def _load_ansible_config(state: State) -> AnsibleConfiguration:
+    """Load tox-ansible configuration using TOML-over-INI precedence.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        The resolved tox-ansible configuration.
+    """
+    project_dir = state.conf.src_path.parent.resolve()
+    return _resolve_ansible_config(state, _load_pyproject_config(project_dir))
+
+
+def _resolve_ansible_config(
+    state: State,
+    pyproject_config: dict[str, Any] | None,
+) -> AnsibleConfiguration:
+    """Resolve tox-ansible configuration from an already parsed pyproject table.
+
+    Args:
+        state: The tox state object.
+        pyproject_config: The ``[tool.tox-ansible]`` table, or ``None`` to
+            fall back to the ``[ansible]`` section of the tox configuration.
+
+    Returns:
+        The resolved tox-ansible configuration.
+    """
+    if pyproject_config is not None:
+        return _ansible_config_from_table(pyproject_config)
+
+    from tox.config.loader.section import Section  # noqa: PLC0415
+
+    from tox_ansible.config_set import AnsibleConfigSet  # noqa: PLC0415
+
+    ansible_config = state.conf.get_section_config(
+        Section(None, "ansible"),
+        base=[],
+        of_type=AnsibleConfigSet,
+        for_env=None,
+    )
+    return AnsibleConfiguration(
+        coverage=ansible_config["coverage"],
+        skip=ansible_config["skip"],
+        downstream=ansible_config["downstream"],
+        molecule=_coerce_molecule_setting(ansible_config["molecule"]),
+        molecule_append=ansible_config["molecule_append"],
+        molecule_commands=ansible_config["molecule_commands"],
+        core_revision_ttl=_coerce_ttl(ansible_config["core_revision_ttl"]),
+    )
+
+
+def _ansible_config_from_table(table: Mapping[str, Any]) -> AnsibleConfiguration:
+    """Build the tox-ansible configuration from a ``[tool.tox-ansible]`` table.
+
+    Args:
+        table: The parsed table.
+
+    Returns:
+        The tox-ansible configuration.
+    """
+    return AnsibleConfiguration(
+        coverage=_coerce_bool(table.get("coverage", False)),
+        skip=table.get("skip", []),
+        downstream=_coerce_bool(table.get("downstream", False)),
+        molecule=_coerce_molecule_setting(table.get("molecule", "auto")),
+        molecule_append=table.get("molecule_append", []),
+        molecule_commands=table.get("molecule_commands", []),
+        core_revision_ttl=_coerce_ttl(table.get("core_revision_ttl")),
+    )
+
+
+def _ini_list(value: str) -> list[str]:
+    """Split an INI list value the way tox does.
+
+    Args:
+        value: The raw value, one item per line or comma separated.
+
+    Returns:
+        The non-empty stripped items.
+    """
+    separator = "\n" if "\n" in value else ","
+    return [item.strip() for item in value.split(separator) if item.strip()]
+
+
+def load_project_config(
+    config_file: Path,
+) -> tuple[dict[str, Any] | None, AnsibleConfiguration]:
+    """Resolve the tox-ansible configuration without tox.
+
+    Uses the same TOML-over-INI precedence as the plugin: ``[tool.tox-ansible]``
+    in ``pyproject.toml`` wins over the ``[ansible]`` section of an INI
+    configuration file. tox substitutions are not expanded.
+
+    Args:
+        config_file: The tox configuration file, e.g. ``tox-ansible.ini``.
+
+    Returns:
+        The ``[tool.tox-ansible]`` table, if any, and the resolved configuration.
+    """
+    pyproject_config = _load_pyproject_config(config_file.parent.resolve())
+    if pyproject_config is not None:
+        return pyproject_config, _ansible_config_from_table(pyproject_config)
+    parser = configparser.ConfigParser(interpolation=None)
+    if config_file.suffix != ".toml":
+        parser.read(config_file, encoding="utf-8")
+    if not parser.has_section("ansible"):
+        return None, AnsibleConfiguration()
+    section = parser["ansible"]
+    return None, AnsibleConfiguration(
+        coverage=_coerce_bool(section.get("coverage", "false")),
+        skip=_ini_list(section.get("skip", "")),
+        downstream=_coerce_bool(section.get("downstream", "false")),
+        molecule=_coerce_molecule_setting(section.get("molecule", "auto")),
+        molecule_append=_ini_list(section.get("molecule_append", "")),
+        molecule_commands=_ini_list(section.get("molecule_commands", "")),
+        core_revision_ttl=_coerce_ttl(section.get("core_revision_ttl")),
+    )
+
+
+def _configured_work_dir(config_file: Path) -> str | None:
+    """Read the work dir set in a tox configuration file.
+
+    Args:
+        config_file: The tox configuration file.
+
+    Returns:
+        The raw ``work_dir`` value, None if not set.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    section = "tox:tox" if config_file.name == "setup.cfg" else "tox"
+    if config_file.suffix == ".toml":
+        try:
+            data = tomllib.loads(config_file.read_text(encoding="utf-8"))
+        except (OSError, tomllib.TOMLDecodeError):
+            return None
+        table = (
+            data.get("tool", {}).get("tox", {}) if config_file.name == "pyproject.toml" else data
+        )
+        if isinstance(table.get("work_dir"), str):
+            return str(table["work_dir"])
+        legacy = table.get("legacy_tox_ini")
+        if not isinstance(legacy, str):
+            return None
+        parser.read_string(legacy)
+    else:
+        try:
+            parser.read(config_file, encoding="utf-8")
+        except configparser.Error:
+            return None
+    if not parser.has_section(section):
+        return None
+    return parser[section].get("work_dir") or parser[section].get("toxworkdir")
+
+
+def read_work_dir(config_file: Path) -> Path:
+    """Resolve the tox work dir of a configuration file without tox.
+
+    Reads ``work_dir``, or the legacy ``toxworkdir``, from the ``[tox]``
+    section of an INI file, ``[tox:tox]`` of ``setup.cfg``, ``[tool.tox]`` of
+    ``pyproject.toml`` or the top level of ``tox.toml``. Only the
+    ``{toxinidir}`` and ``{tox_root}`` substitutions are expanded, and a
+    relative path is kept relative to the current directory, as tox does.
+
+    Args:
+        config_file: The tox configuration file.
+
+    Returns:
+        The work dir, ``.tox`` next to the configuration file when not set.
+    """
+    root = config_file.parent.resolve()
+    value = _configured_work_dir(config_file)
+    if not value:
+        return root / ".tox"
+    for substitution in ("{toxinidir}", "{tox_root}"):
+        value = value.replace(substitution, str(root))
+    return Path(value).expanduser()
+
+
+def _file_stamp(path: Path) -> FileStamp:
+    """Return the modification stamp of a project file.
+
+    Args:
+        path: The file to stat.
+
+    Returns:
+        The ``(st_mtime_ns, st_size)`` pair, or ``None`` if the file is missing.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@dataclass(frozen=True)
+class ProjectContext:
+    """Session-scoped view of the collection project, built once per tox run.
+
+    The collection metadata is only parsed on first access so that matrix
+    generation keeps working for projects without a galaxy.yml file.
+
+    Attributes:
+        project_dir: The project root directory.
+        galaxy_path: The path to the collection galaxy.yml file.
+        pyproject_config: The parsed ``[tool.tox-ansible]`` table, if any.
+        ansible_config: The resolved tox-ansible configuration.
+        stamps: The stamp of every file the context was built from.
+    """
+
+    project_dir: Path
+    galaxy_path: Path
+    pyproject_config: dict[str, Any] | None
+    ansible_config: AnsibleConfiguration
+    stamps: tuple[tuple[Path, FileStamp], ...]
+
+    @cached_property
+    def collection(self) -> Collection:
+        """The collection information from galaxy.yml.
+
+        Returns:
+            The collection information.
+        """
+        return get_collection(galaxy_path=self.galaxy_path)
+
+    @cached_property
+    def index(self) -> ProjectIndex:
+        """The filesystem probe index of the project.
+
+        Returns:
+            The project index.
+        """
+        return ProjectIndex.scan(self.project_dir)
+
+    @cached_property
+    def requires_ansible(self) -> str | None:
+        """The ``requires_ansible`` specifier from meta/runtime.yml.
+
+        Returns:
+            The specifier, if declared.
+        """
+        return read_requires_ansible(self.project_dir)
+
+    @cached_property
+    def source_digest(self) -> str:
+        """The digest of the collection build inputs, computed once per session.
+
+        Returns:
+            The hex digest keying the collection artifact.
+        """
+        return source_digest(self.project_dir, self.collection)
+
+    def is_current(self) -> bool:
+        """Check whether none of the source files changed since the build.
+
+        Returns:
+            True if every source file still has the recorded stamp.
+        """
+        return all(_file_stamp(path) == stamp for path, stamp in self.stamps)
+
+
+_PROJECT_CONTEXTS: weakref.WeakKeyDictionary[State, ProjectContext] = weakref.WeakKeyDictionary()
+
+
+def _build_project_context(state: State) -> ProjectContext:
+    """Parse the project files and resolve the tox-ansible configuration.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        A new project context.
+    """
+    # When run nested, work_dir might become .tox instead of cwd and we don't
+    # want to use `state.conf.work_dir` to find the galaxy file. PWD is more
+    # reliable, even if there is a chance it might be also changed.
+    project_dir = state.conf.src_path.parent.resolve()
+    galaxy_path = project_dir / "galaxy.yml"
+    sources = (
+        galaxy_path,
+        project_dir / RUNTIME_YML,
+        project_dir / "pyproject.toml",
+        state.conf.src_path.resolve(),
+    )
+    # Stamp before parsing so that a concurrent edit invalidates the context.
+    stamps = tuple((path, _file_stamp(path)) for path in dict.fromkeys(sources))
+    pyproject_config = _load_pyproject_config(project_dir)
+    return ProjectContext(
+        project_dir=project_dir,
+        galaxy_path=galaxy_path,
+        pyproject_config=pyproject_config,
+        ansible_config=_resolve_ansible_config(state, pyproject_config),
+        stamps=stamps,
+    )
+
+
+def project_context(state: State) -> ProjectContext:
+    """Return the project context attached to the tox state.
+
+    The context is built on first use and rebuilt only when one of the files
+    it was parsed from changes on disk.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        The project context for this state.
+    """
+    context = _PROJECT_CONTEXTS.get(state)
+    if context is None or not context.is_current():
+        context = _build_project_context(state)
+        _PROJECT_CONTEXTS[state] = context
+    return context
+
+
+def _coverage_enabled(state: State) -> bool:
+    """Resolve coverage from the CLI and project configuration.
+
+    Explicit CLI options take precedence over project configuration.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        Whether unit test coverage is enabled.
+    """
+    cli_coverage: bool | None = getattr(state.conf.options, "coverage", None)
+    if cli_coverage is not None:
+        return cli_coverage
+    return project_context(state).ansible_config.coverage
@@ -0,0 +1,210 @@
+"""Provisioning fingerprint of the environments.
+
+The ``commands_pre`` of an environment install ansible-core, the collection
+and its collection requirements with ade, which takes minutes and gives the
+same result as long as its inputs are unchanged. The inputs are hashed into
+a fingerprint, recorded in ``<env_dir>/.tox-ansible-provisioned`` by a last
+``commands_pre`` command once every other one succeeded. When the
+fingerprint of the next run matches, ``commands_pre`` is empty and only the
+test commands run.
+
+The record lives in the environment directory, so recreating the environment
+provisions it again, as does the ``--ansible-reprovision`` option. The paths
+of the environment, the work dir and the project do not change the
+fingerprint, so an environment exported from another work dir is recognized.
+
+``tox run-parallel --provision-only`` runs the selected environments with
+their ``commands_pre`` alone, to warm the caches and provision the matrix before
+the tests run. The environments of each core wait for the first one, which
+fills the shared caches of the core the others then reuse.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sys
+import weakref
+
+from typing import TYPE_CHECKING
+
+from tox_ansible.artifact import _file_digest
+from tox_ansible.matrix import env_factors, selected_envs
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the provisioning commands change in a way the inputs do not show.
+PROVISION_FORMAT = "2"
+# Written once the provisioning commands succeeded, holding their fingerprint.
+PROVISION_STAMP = ".tox-ansible-provisioned"
+# Written before the provisioning commands run, renamed to PROVISION_STAMP after.
+PROVISION_PENDING = ".tox-ansible-provisioning"
+# The tox commands running the environments in parallel, as named on the command line.
+PARALLEL_COMMANDS = frozenset({"run-parallel", "p"})
+
+
+def provision_fingerprint(  # noqa: PLR0913
+    *,
+    env_dir: Path,
+    acv: str,
+    deps: str,
+    commands: Iterable[str],
+    project_dir: Path,
+    files: Iterable[str],
+    source: str = "",
+) -> str:
+    """Hash the inputs of the provisioning commands of an environment.
+
+    The environment, work and project directories are hashed as placeholders,
+    so an environment moved to another work dir keeps its fingerprint.
+
+    Args:
+        env_dir: The environment directory, whose ``pyvenv.cfg`` names the python.
+        acv: The ansible-core installed: a wheel, an archive of a commit or a ref.
+        deps: The dependencies of the environment.
+        commands: The provisioning commands.
+        project_dir: The collection root directory.
+        files: The project files read by the commands, relative to the project.
+        source: The digest of the collection contents, for a non-editable install.
+
+    Returns:
+        The hex sha256 digest.
+    """
+    pyvenv = env_dir / "pyvenv.cfg"
+    payload = {
+        "format": PROVISION_FORMAT,
+        "python": pyvenv.read_text(encoding="utf-8") if pyvenv.is_file() else "",
+        "acv": acv,
+        "deps": deps,
+        "commands": list(commands),
+        "files": {
+            name: _file_digest(project_dir / name) if (project_dir / name).is_file() else ""
+            for name in sorted(files)
+        },
+        "source": source,
+    }
+    text = json.dumps(payload, sort_keys=True)
+    placeholders = {
+        str(env_dir): "<env_dir>",
+        str(env_dir.parent): "<work_dir>",
+        str(project_dir): "<project_dir>",
+    }
+    for path in sorted(placeholders, key=len, reverse=True):
+        text = text.replace(path, placeholders[path])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def is_provisioned(env_dir: Path, fingerprint: str) -> bool:
+    """Check whether an environment was provisioned with the same inputs.
+
+    Args:
+        env_dir: The environment directory.
+        fingerprint: The fingerprint of the current inputs.
+
+    Returns:
+        True if the recorded fingerprint matches.
+    """
+    stamp = env_dir / PROVISION_STAMP
+    return stamp.is_file() and stamp.read_text(encoding="utf-8") == fingerprint
+
+
+def start_provisioning(env_dir: Path, fingerprint: str | None) -> None:
+    """Forget the previous provisioning and stage the fingerprint of the next one.
+
+    Args:
+        env_dir: The environment directory.
+        fingerprint: The fingerprint of the current inputs, None to record nothing.
+    """
+    env_dir.mkdir(parents=True, exist_ok=True)
+    (env_dir / PROVISION_STAMP).unlink(missing_ok=True)
+    pending = env_dir / PROVISION_PENDING
+    if fingerprint is None:
+        pending.unlink(missing_ok=True)
+    else:
+        pending.write_text(fingerprint, encoding="utf-8")
+
+
+def record_command(env_dir: Path) -> str:
+    """Build the command recording the staged fingerprint, run after the provisioning.
+
+    Args:
+        env_dir: The environment directory.
+
+    Returns:
+        The command.
+    """
+    pending, stamp = env_dir / PROVISION_PENDING, env_dir / PROVISION_STAMP
+    return f"bash -c 'if [ -f {pending} ]; then mv -f {pending} {stamp}; fi'"
+
+
+def provision_depends(env_names: Iterable[str]) -> dict[str, list[str]]:
+    """Make the environments of each core wait for the first one.
+
+    The first environment of a core builds its ansible-core wheel and fills
+    the shared caches, which the others find ready instead of waiting on
+    their file locks while holding a slot of the pool.
+
+    Args:
+        env_names: The environments to provision, in the matrix order.
+
+    Returns:
+        The environment each environment depends on, by environment name.
+    """
+    first: dict[str, str] = {}
+    depends: dict[str, list[str]] = {}
+    for name in env_names:
+        core = env_factors(name).core
+        if not core:
+            continue
+        leader = first.setdefault(core, name)
+        if leader != name:
+            depends[name] = [leader]
+    return depends
+
+
+# Written before any environment runs, then only read.
+_PROVISION_DEPENDS: weakref.WeakKeyDictionary[State, dict[str, list[str]]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def start_provision_only(state: State, env_names: Iterable[str]) -> None:
+    """Order the selected environments by core to provision them, without their tests.
+
+    The environments are run by ``tox run-parallel``, with as many workers as
+    there are CPUs unless ``-p`` is given; other commands are rejected.
+
+    Args:
+        state: The tox state object.
+        env_names: The environments of the matrix.
+    """
+    options = state.conf.options
+    if options.command not in PARALLEL_COMMANDS:
+        err = (
+            "The --provision-only option runs the environments in parallel, use"
+            f" `tox run-parallel --ansible --provision-only`, not {options.command}"
+        )
+        logger.critical(err)
+        sys.exit(1)
+    _PROVISION_DEPENDS[state] = provision_depends(selected_envs(state, env_names))
+
+
+def env_depends(state: State, env_name: str) -> list[str]:
+    """Return the environments an environment waits for while provisioning only.
+
+    Args:
+        state: The tox state object.
+        env_name: The environment name.
+
+    Returns:
+        The environment names, none outside ``--provision-only``.
+    """
+    return _PROVISION_DEPENDS.get(state, {}).get(env_name, [])
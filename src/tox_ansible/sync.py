@@ -0,0 +1,189 @@
+"""Incremental sync of the collection installed into the sanity environments.
+
+The sanity environments install the collection rather than linking it, so
+that ansible-test sees a real ``ansible_collections/<namespace>/<name>`` tree.
+Once an environment is provisioned, a change of the sources is applied to the
+installed copy instead of building and installing the collection again: the
+files a build would pack are compared with the FILES.json of the installed
+copy, by size and modification time first and by digest when those differ.
+Changed files are copied, files the sources no longer have are removed, and
+FILES.json and MANIFEST.json are updated to match.
+
+Files the installation did not create, such as ``tests/output`` written by
+ansible-test, are left as is. Collections using ``manifest`` directives are
+installed again, as their file selection is only approximated.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+
+from typing import TYPE_CHECKING, Any
+
+from tox_ansible.artifact import (
+    MANIFEST_FORMAT,
+    _file_digest,
+    _file_entry,
+    _is_child_path,
+    collection_files,
+)
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tox_ansible.project import Collection
+
+logger = logging.getLogger(__name__)
+
+
+def _installed_files(install_dir: Path) -> dict[str, dict[str, Any]] | None:
+    """Read the FILES.json entries of an installed collection.
+
+    Args:
+        install_dir: The installed collection directory.
+
+    Returns:
+        The entries by path, without the root directory, None if unreadable.
+    """
+    try:
+        files = json.loads((install_dir / "FILES.json").read_text(encoding="utf-8"))["files"]
+        return {entry["name"]: entry for entry in files if entry["name"] != "."}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _remove(path: Path) -> None:
+    """Remove a file, a symlink or a directory tree.
+
+    Args:
+        path: The path to remove.
+    """
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _sync_link(src: Path, dst: Path) -> bool:
+    """Point the installed copy of a symlink where the source one points.
+
+    Args:
+        src: The symlink of the sources, resolving inside the collection.
+        dst: The installed path.
+
+    Returns:
+        True if the installed path was changed.
+    """
+    link = os.path.relpath(os.path.realpath(src), start=src.parent)
+    if dst.is_symlink() and str(dst.readlink()) == link:
+        return False
+    _remove(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.symlink_to(link)
+    return True
+
+
+def _sync_file(src: Path, dst: Path, previous: dict[str, Any] | None) -> tuple[str, bool]:
+    """Copy a file into the installed collection unless the copy is current.
+
+    A copy with the size and modification time of the source keeps its
+    recorded digest. A copy with the same content gets the modification time
+    of the source, so that the next sync only compares their stats.
+
+    Args:
+        src: The file of the sources, symlinks followed.
+        dst: The installed path.
+        previous: The FILES.json entry of the installed path, if any.
+
+    Returns:
+        The digest of the file and whether it was copied.
+    """
+    src_stat = src.stat()
+    recorded = previous.get("chksum_sha256") if previous else None
+    current = recorded is not None and dst.is_file() and not dst.is_symlink()
+    if current:
+        dst_stat = dst.stat()
+        if (dst_stat.st_size, dst_stat.st_mtime_ns) == (src_stat.st_size, src_stat.st_mtime_ns):
+            return str(recorded), False
+    chksum = _file_digest(src)
+    copy = not current or chksum != recorded
+    if copy:
+        _remove(dst)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(src, dst)
+        dst.chmod(0o755 if src_stat.st_mode & stat.S_IXUSR else 0o644)
+    os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return chksum, copy
+
+
+def _write_manifests(install_dir: Path, files: list[dict[str, Any]]) -> None:
+    """Write the FILES.json of the installed collection and its digest into MANIFEST.json.
+
+    Args:
+        install_dir: The installed collection directory.
+        files: The FILES.json entries.
+    """
+    files_json = json.dumps({"files": files, "format": MANIFEST_FORMAT}, indent=True).encode()
+    (install_dir / "FILES.json").write_bytes(files_json)
+    manifest_path = install_dir / "MANIFEST.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest["file_manifest_file"] = _file_entry(
+        "FILES.json",
+        "file",
+        hashlib.sha256(files_json).hexdigest(),
+    )
+    manifest_path.write_text(json.dumps(manifest, indent=True), encoding="utf-8")
+
+
+def sync_collection(project_dir: Path, collection: Collection, install_dir: Path) -> bool:
+    """Apply the changes of the sources to an installed collection.
+
+    Args:
+        project_dir: The collection root directory.
+        collection: The collection info.
+        install_dir: The installed collection directory.
+
+    Returns:
+        False if the collection has to be installed again instead.
+    """
+    if collection.manifest is not None:
+        return False
+    installed = _installed_files(install_dir)
+    if installed is None or not (install_dir / "MANIFEST.json").is_file():
+        return False
+
+    files = [_file_entry(".", "dir")]
+    copied = 0
+    for entry in collection_files(project_dir, collection):
+        src, dst = project_dir / entry.name, install_dir / entry.name
+        previous = installed.pop(entry.name, None)
+        chksum = None
+        if src.is_symlink() and _is_child_path(src, project_dir):
+            copied += _sync_link(src, dst)
+            if entry.ftype == "file":
+                chksum = _file_digest(src)
+        elif entry.ftype == "dir":
+            if dst.is_symlink() or (dst.exists() and not dst.is_dir()):
+                _remove(dst)
+            dst.mkdir(parents=True, exist_ok=True)
+        else:
+            chksum, changed = _sync_file(src, dst, previous)
+            copied += changed
+        files.append(_file_entry(entry.name, entry.ftype, chksum))
+
+    removed = 0
+    # Reversed, the entries of a directory come before the directory.
+    for name in sorted(installed, reverse=True):
+        path = install_dir / name
+        if path.is_symlink() or path.exists():
+            _remove(path)
+            removed += 1
+    _write_manifests(install_dir, files)
+    logger.info("Synced %s: %d files copied, %d removed", install_dir, copied, removed)
+    return True
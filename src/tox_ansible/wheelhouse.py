@@ -0,0 +1,223 @@
+"""Local wheelhouse provisioning the environments without a package index.
+
+``--ansible-wheelhouse build`` collects the Python packages of the selected
+environments of the matrix, ``-e`` or the whole matrix: the ``deps`` of each
+test type, with ``OUR_DEPS``, ``COVERAGE_DEPS``, molecule, galaxy-importer and
+the Python dependency files of the collection, and the ansible-core wheels of
+the cores. They are built with ``pip wheel``, run by the interpreter of each
+python factor, into ``.tox/.tox-ansible/wheelhouse/``, which keeps the wheels
+of every python. The collections of the requirements files are downloaded
+into the collection cache on the way, then tox exits.
+
+With ``--ansible-wheelhouse use``, or ``--ansible-offline`` once the
+wheelhouse exists, the environments install from it alone: ``PIP_NO_INDEX``,
+``PIP_FIND_LINKS`` and their uv equivalents are set for tox, ade and the
+installers they run, and the shared layers and the dependency locks are
+installed and resolved from it too.
+"""
+
+from __future__ import annotations
+
+import logging
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from tox.session.state import State
+
+logger = logging.getLogger(__name__)
+
+WHEELHOUSE_BUILD = "build"
+WHEELHOUSE_USE = "use"
+
+
+def wheelhouse_dir(work_dir: Path) -> Path:
+    """Build the wheelhouse directory of a tox work dir.
+
+    Args:
+        work_dir: The tox work dir.
+
+    Returns:
+        The wheelhouse, shared by the sessions using the same work dir.
+    """
+    return work_dir / ".tox-ansible" / "wheelhouse"
+
+
+def index_env(wheelhouse: Path) -> dict[str, str]:
+    """Return the variables making pip and uv install from a wheelhouse alone.
+
+    Args:
+        wheelhouse: The wheelhouse directory.
+
+    Returns:
+        The environment variables.
+    """
+    return {
+        "PIP_NO_INDEX": "1",
+        "PIP_FIND_LINKS": str(wheelhouse),
+        "UV_NO_INDEX": "1",
+        "UV_FIND_LINKS": str(wheelhouse),
+    }
+
+
+def no_index_args(wheelhouse: Path | None) -> list[str]:
+    """Return the pip arguments installing from a wheelhouse alone.
+
+    Args:
+        wheelhouse: The wheelhouse directory, None to use the index.
+
+    Returns:
+        The pip arguments, none without a wheelhouse.
+    """
+    if wheelhouse is None:
+        return []
+    return ["--no-index", "--find-links", str(wheelhouse)]
+
+
+def active_wheelhouse(state: State) -> Path | None:
+    """Return the wheelhouse the environments of the session install from.
+
+    Args:
+        state: The tox state object.
+
+    Returns:
+        The wheelhouse with ``--ansible-wheelhouse use``, or with
+        ``--ansible-offline`` when it exists, None otherwise.
+    """
+    options = state.conf.options
+    mode = getattr(options, "ansible_wheelhouse", None)
+    if mode != WHEELHOUSE_USE and not getattr(options, "ansible_offline", False):
+        return None
+    wheelhouse = wheelhouse_dir(Path(state.conf.core["work_dir"]))
+    if wheelhouse.is_dir():
+        return wheelhouse
+    if mode == WHEELHOUSE_USE:
+        err = (
+            f"The wheelhouse {wheelhouse} does not exist, run once with --ansible-wheelhouse build"
+        )
+        logger.critical(err)
+        sys.exit(1)
+    return None
+
+
+def find_python(python: str) -> Path | None:
+    """Find the interpreter of a python factor on the PATH.
+
+    Args:
+        python: The python factor, e.g. ``py3.13``.
+
+    Returns:
+        The interpreter, None if it is not installed.
+    """
+    found = shutil.which(f"python{python.removeprefix('py')}")
+    return Path(found) if found else None
+
+
+def build_wheels(python: Path, requirements: Sequence[str], wheelhouse: Path) -> None:
+    """Build the wheels of requirements and their dependencies into a wheelhouse.
+
+    Args:
+        python: The interpreter running pip.
+        requirements: The requirement and option lines.
+        wheelhouse: The wheelhouse directory.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs = Path(tmp_dir) / "requirements.txt"
+        inputs.write_text("\n".join(requirements) + "\n", encoding="utf-8")
+        cmd = [
+            str(python),
+            "-m",
+            "pip",
+            "wheel",
+            "--disable-pip-version-check",
+            "--wheel-dir",
+            str(wheelhouse),
+            "-r",
+            str(inputs),
+        ]
+        proc = subprocess.run(cmd, capture_output=True, check=False, text=True)  # noqa: S603
+    if proc.returncode != 0:
+        err = f"Failed to build the wheelhouse with {python}: {proc.stdout}{proc.stderr}"
+        logger.critical(err)
+        sys.exit(1)
+
+
+def wheelhouse_requirements(state: State, env_names: Iterable[str]) -> dict[str, list[str]]:
+    """Collect the Python packages of environments, by python factor.
+
+    The collections of their requirements files are downloaded into the
+    collection cache on the way.
+
+    Args:
+        state: The tox state object.
+        env_names: The environments.
+
+    Returns:
+        The requirement lines of each python factor.
+    """
+    from tox_ansible.collection_cache import collection_cache  # noqa: PLC0415
+    from tox_ansible.core_cache import cache_available, core_cache, core_ref  # noqa: PLC0415
+    from tox_ansible.environment import (  # noqa: PLC0415
+        LOCKED_TEST_TYPES,
+        conf_deps,
+        conf_lock_requirements,
+    )
+    from tox_ansible.matrix import env_factors  # noqa: PLC0415
+    from tox_ansible.project import TEST_REQUIREMENTS_YML, project_context  # noqa: PLC0415
+
+    index = project_context(state).index
+    default_python = f"py{sys.version_info[0]}.{sys.version_info[1]}"
+    requirements: dict[str, dict[str, None]] = {}
+    for name in env_names:
+        factors = env_factors(name)
+        if not factors.is_ansible_env:
+            continue
+        acv = ""
+        if factors.core:
+            ref = core_ref(factors.core)
+            acv = core_cache(state).source(factors.core) if cache_available() else ref
+            if "://" not in acv:
+                logger.warning("ansible-core %s is not cached, ade installs it from %s", ref, acv)
+        if factors.test_type in LOCKED_TEST_TYPES:
+            lines = conf_lock_requirements(index=index, acv=acv)
+        else:
+            lines = conf_deps(test_type=factors.test_type, index=index).splitlines()
+            if "://" in acv:
+                lines.append(f"ansible-core @ {acv}")
+        requirements.setdefault(factors.python or default_python, {}).update(dict.fromkeys(lines))
+        for req_path in TEST_REQUIREMENTS_YML.get(factors.test_type, []):
+            if index.has_file(req_path):
+                collection_cache(state).tarballs(req_path)
+    return {python: list(lines) for python, lines in sorted(requirements.items())}
+
+
+def build_wheelhouse(state: State, env_names: Iterable[str]) -> None:
+    """Build the wheelhouse of the selected environments of the matrix.
+
+    Pythons not installed on the host are skipped with a warning.
+
+    Args:
+        state: The tox state object.
+        env_names: The environments of the matrix.
+    """
+    from tox_ansible.matrix import selected_envs  # noqa: PLC0415
+
+    wheelhouse = wheelhouse_dir(Path(state.conf.core["work_dir"]))
+    wheelhouse.mkdir(parents=True, exist_ok=True)
+    for python, requirements in wheelhouse_requirements(
+        state, selected_envs(state, env_names)
+    ).items():
+        interpreter = find_python(python)
+        if interpreter is None:
+            logger.warning("%s is not installed, skipping its wheels", python)
+            continue
+        logger.info("Building the %s wheels into %s", python, wheelhouse)
+        build_wheels(interpreter, requirements, wheelhouse)
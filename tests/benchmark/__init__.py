@@ -0,0 +1 @@
+"""Benchmarks for the tox-ansible hooks."""
@@ -0,0 +1,124 @@
+"""Benchmark fixtures.
+
+The benchmarks time the tox hooks in-process and compare the best of a few
+rounds against ``baselines.json``. They are skipped unless ``--benchmark`` or
+``--benchmark-update`` is given, as timings taken under coverage or on a busy
+shared worker are meaningless.
+
+The regression threshold is the ratio stored in ``baselines.json`` and can be
+overridden with the ``TOX_ANSIBLE_BENCHMARK_THRESHOLD`` environment variable.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import pytest
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+
+BASELINES_FILE = Path(__file__).parent / "baselines.json"
+# Timings below this floor, in seconds, are compared as if they took this long.
+NOISE_FLOOR = 0.005
+# Number of timed rounds, the fastest one is kept.
+ROUNDS = 3
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    """Skip the benchmarks unless requested.
+
+    Args:
+        config: The pytest configuration.
+        items: The collected tests.
+    """
+    if config.getoption("benchmark") or config.getoption("benchmark_update"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with --benchmark or --benchmark-update")
+    for item in items:
+        if Path(str(item.path)).is_relative_to(Path(__file__).parent):
+            item.add_marker(skip)
+
+
+@dataclass
+class BenchmarkRecorder:
+    """Time benchmark rounds and compare them to the stored baselines.
+
+    Attributes:
+        baselines: The stored baseline timings, in seconds, by benchmark id.
+        threshold: The allowed ratio between a timing and its baseline.
+        update: Whether to record new baselines instead of comparing.
+        results: The timings measured in this session, by benchmark id.
+    """
+
+    baselines: dict[str, float]
+    threshold: float
+    update: bool
+    results: dict[str, float] = field(default_factory=dict)
+
+    def measure(
+        self,
+        benchmark_id: str,
+        func: Callable[[Any], object],
+        setup: Callable[[], Any] = lambda: None,
+    ) -> float:
+        """Time a function and check it against its baseline.
+
+        Args:
+            benchmark_id: The benchmark id, e.g. "add_ansible_matrix[600]".
+            func: The function to time, called with the result of ``setup``.
+            setup: Untimed preparation run before every round.
+
+        Returns:
+            The fastest round, in seconds.
+        """
+        timings = []
+        for _ in range(ROUNDS):
+            arg = setup()
+            start = time.perf_counter()
+            func(arg)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        self.results[benchmark_id] = best
+        if self.update:
+            return best
+        baseline = self.baselines.get(benchmark_id)
+        if baseline is None:
+            pytest.fail(f"No baseline for {benchmark_id}, run with --benchmark-update")
+        limit = max(baseline, NOISE_FLOOR) * self.threshold
+        assert best <= limit, (
+            f"{benchmark_id} took {best:.4f}s, baseline {baseline:.4f}s, limit {limit:.4f}s"
+        )
+        return best
+
+
+@pytest.fixture(scope="session")
+def benchmark_recorder(request: pytest.FixtureRequest) -> Iterator[BenchmarkRecorder]:
+    """Provide the session benchmark recorder, saving the baselines if requested.
+
+    Args:
+        request: The pytest fixture request.
+
+    Yields:
+        The benchmark recorder.
+    """
+    stored = json.loads(BASELINES_FILE.read_text(encoding="utf-8"))
+    threshold = float(os.environ.get("TOX_ANSIBLE_BENCHMARK_THRESHOLD", stored["threshold"]))
+    recorder = BenchmarkRecorder(
+        baselines=stored["baselines"],
+        threshold=threshold,
+        update=request.config.getoption("benchmark_update"),
+    )
+    yield recorder
+    if recorder.update and recorder.results:
+        stored["baselines"] = dict(sorted({**stored["baselines"], **recorder.results}.items()))
+        stored["baselines"] = {key: round(value, 6) for key, value in stored["baselines"].items()}
+        BASELINES_FILE.write_text(json.dumps(stored, indent=2) + "\n", encoding="utf-8")
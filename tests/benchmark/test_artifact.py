@@ -0,0 +1,107 @@
+"""Benchmarks for the in-process collection build.
+
+The fixture collection is synthetic: plugin and test files spread over a few
+directories, at a realistic size and at a large one. The in-process build is
+compared with its baseline, and once with ``ansible-galaxy collection build``
+which it replaces.
+"""
+
+from __future__ import annotations
+
+import shutil
+import time
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from tox_ansible.artifact import build_collection, build_collection_cli
+from tox_ansible.project import get_collection
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tests.benchmark.conftest import BenchmarkRecorder
+
+
+SIZES = (500, 5000)
+DIRS = (
+    "plugins/modules",
+    "plugins/module_utils",
+    "plugins/filter",
+    "roles/role/tasks",
+    "tests/unit/plugins/modules",
+    "tests/integration/targets/target/tasks",
+)
+GALAXY_YML = """\
+namespace: bench
+name: coll
+version: 1.0.0
+readme: README.md
+authors:
+  - Someone
+build_ignore:
+  - "*.log"
+"""
+
+
+def _make_collection(project_dir: Path, size: int) -> None:
+    """Lay out a synthetic collection.
+
+    Args:
+        project_dir: The collection root directory.
+        size: The number of files.
+    """
+    (project_dir / "galaxy.yml").write_text(GALAXY_YML)
+    (project_dir / "README.md").write_text("# bench.coll\n")
+    for rel_dir in DIRS:
+        (project_dir / rel_dir).mkdir(parents=True)
+    content = "# Synthetic plugin\n" + "x = 'value'\n" * 200
+    for index in range(size):
+        rel_dir = DIRS[index % len(DIRS)]
+        suffix = "log" if index % 50 == 0 else "py"
+        (project_dir / rel_dir / f"file_{index}.{suffix}").write_text(content)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_build_collection(
+    size: int,
+    tmp_path: Path,
+    benchmark_recorder: BenchmarkRecorder,
+) -> None:
+    """Benchmark the in-process collection build.
+
+    Args:
+        size: The number of files.
+        tmp_path: Pytest fixture.
+        benchmark_recorder: The benchmark recorder.
+    """
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    _make_collection(project_dir, size)
+    collection = get_collection(project_dir / "galaxy.yml")
+
+    def _setup() -> Path:
+        """Provide an empty output directory.
+
+        Returns:
+            The output directory.
+        """
+        output_dir = tmp_path / "output"
+        shutil.rmtree(output_dir, ignore_errors=True)
+        output_dir.mkdir()
+        return output_dir
+
+    native = benchmark_recorder.measure(
+        f"build_collection[{size}]",
+        lambda output_dir: build_collection(project_dir, output_dir, collection),
+        _setup,
+    )
+
+    if not shutil.which("ansible-galaxy"):
+        return
+    start = time.perf_counter()
+    build_collection_cli(project_dir, _setup())
+    cli = time.perf_counter() - start
+    assert native < cli, f"in-process build {native:.4f}s, ansible-galaxy {cli:.4f}s"
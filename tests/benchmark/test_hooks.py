@@ -0,0 +1,259 @@
+"""Benchmarks for the matrix generation and per environment hooks.
+
+Each benchmark runs at a realistic size and at two synthetic ones, using a
+copy of the ``test_basic`` integration fixture as the project.
+"""
+
+from __future__ import annotations
+
+import io
+import shutil
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from tox.config.cli.parse import Options
+from tox.config.cli.parser import Parsed
+from tox.config.loader.str_convert import StrConvert
+from tox.config.main import Config
+from tox.config.source import discover_source
+from tox.report import ToxHandler
+from tox.session.state import State
+
+from tox_ansible import matrix
+from tox_ansible.environment import add_env_config
+from tox_ansible.matrix import add_ansible_matrix, custom_sort, generate_gh_matrix
+
+
+if TYPE_CHECKING:
+    from tox.config.sets import EnvConfigSet
+
+    from tests.benchmark.conftest import BenchmarkRecorder
+
+
+FIXTURE_DIR = Path(__file__).parent.parent / "fixtures" / "integration" / "test_basic"
+SIZES = (60, 600, 6000)
+TEST_TYPES = ("integration", "molecule", "sanity", "unit")
+PYTHONS = ("3.11", "3.12", "3.13", "3.14")
+CONFIG = """\
+[ansible]
+skip =
+    py3.11-2.3
+    milestone
+"""
+
+
+def _env_names(size: int) -> list[str]:
+    """Generate a synthetic environment list.
+
+    Args:
+        size: The number of environments.
+
+    Returns:
+        The galaxy environment followed by ``{test_type}-py{python}-2.{minor}`` names.
+    """
+    names = ["galaxy"]
+    minor = 0
+    while len(names) < size:
+        names.extend(
+            f"{test_type}-py{python}-2.{minor}" for python in PYTHONS for test_type in TEST_TYPES
+        )
+        minor += 1
+    return names[:size]
+
+
+@pytest.fixture(name="project_dir")
+def fixture_project_dir(tmp_path: Path) -> Path:
+    """Copy the test_basic fixture with a skip configuration.
+
+    Args:
+        tmp_path: Pytest fixture.
+
+    Returns:
+        The project directory.
+    """
+    project_dir = tmp_path / "project"
+    shutil.copytree(FIXTURE_DIR, project_dir)
+    (project_dir / "tox-ansible.ini").write_text(CONFIG)
+    return project_dir
+
+
+def _parsed(project_dir: Path) -> Parsed:
+    """Create the parsed CLI options.
+
+    Args:
+        project_dir: The project directory.
+
+    Returns:
+        The parsed options.
+    """
+    return Parsed(
+        work_dir=project_dir / ".tox",
+        override=[],
+        config_file=project_dir / "tox-ansible.ini",
+        root_dir=project_dir,
+        ansible=True,
+        coverage=None,
+    )
+
+
+def _make_state(project_dir: Path) -> State:
+    """Create a tox state for the project.
+
+    Args:
+        project_dir: The project directory.
+
+    Returns:
+        The configured tox state.
+    """
+    parsed = _parsed(project_dir)
+    output = io.BytesIO()
+    wrapper = io.TextIOWrapper(output, encoding="utf-8", line_buffering=True)
+    return State(
+        options=Options(
+            parsed=parsed,
+            pos_args="",
+            source=discover_source(parsed.config_file, None),
+            cmd_handlers={},
+            log_handler=ToxHandler(level=0, is_colored=False, out_err=(wrapper, wrapper)),
+        ),
+        args=[],
+    )
+
+
+def _make_env_confs(project_dir: Path, names: list[str]) -> tuple[list[EnvConfigSet], State]:
+    """Create the environment configurations for a matrix.
+
+    Args:
+        project_dir: The project directory.
+        names: The environment names.
+
+    Returns:
+        The environment configurations and the state they share.
+    """
+    parsed = _parsed(project_dir)
+    config = Config.make(
+        parsed=parsed,
+        pos_args=[],
+        source=discover_source(parsed.config_file, None),
+        extra_envs=[],
+    )
+    env_confs = []
+    for name in names:
+        env_conf = config.get_env(name)
+        env_conf.add_config(
+            keys=["env_dir", "envdir"],
+            of_type=Path,
+            default=project_dir / ".tox" / name,
+            desc="",
+        )
+        env_confs.append(env_conf)
+    return env_confs, _make_state(project_dir)
+
+
+def _cold_factors() -> None:
+    """Drop the interned environment factors so each round parses names again."""
+    matrix._ENV_FACTORS.clear()
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_add_ansible_matrix(
+    size: int,
+    project_dir: Path,
+    benchmark_recorder: BenchmarkRecorder,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Time the core configuration hook, including the project scan.
+
+    Args:
+        size: The number of candidate environments.
+        project_dir: The project directory.
+        benchmark_recorder: The benchmark recorder.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(matrix, "ENV_LIST", "\n".join(_env_names(size)))
+
+    def _setup() -> State:
+        _cold_factors()
+        return _make_state(project_dir)
+
+    benchmark_recorder.measure(f"add_ansible_matrix[{size}]", add_ansible_matrix, _setup)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_add_env_config(
+    size: int,
+    project_dir: Path,
+    benchmark_recorder: BenchmarkRecorder,
+) -> None:
+    """Time the per environment hook over a full matrix, resolving its values.
+
+    Args:
+        size: The number of environments.
+        project_dir: The project directory.
+        benchmark_recorder: The benchmark recorder.
+    """
+    # The galaxy commands need a provisioned tox environment.
+    names = _env_names(size + 1)[1:]
+
+    def _setup() -> tuple[list[EnvConfigSet], State]:
+        _cold_factors()
+        return _make_env_confs(project_dir, names)
+
+    def _run(args: tuple[list[EnvConfigSet], State]) -> None:
+        env_confs, state = args
+        for env_conf in env_confs:
+            add_env_config(env_conf, state)
+            loader = env_conf.loaders[-1]
+            for key in ("commands", "commands_pre", "deps", "description"):
+                _ = loader.raw[key]  # type: ignore[attr-defined]
+
+    benchmark_recorder.measure(f"add_env_config[{size}]", _run, _setup)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_generate_gh_matrix(
+    size: int,
+    tmp_path: Path,
+    benchmark_recorder: BenchmarkRecorder,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Time the GitHub matrix output.
+
+    Args:
+        size: The number of environments.
+        tmp_path: Pytest fixture.
+        benchmark_recorder: The benchmark recorder.
+        monkeypatch: Pytest fixture.
+    """
+    gh_output = tmp_path / "github_output"
+    monkeypatch.setenv("GITHUB_OUTPUT", str(gh_output))
+    env_list = StrConvert().to_env_list("\n".join(_env_names(size)))
+
+    def _setup() -> None:
+        _cold_factors()
+        gh_output.write_text("")
+
+    benchmark_recorder.measure(
+        f"generate_gh_matrix[{size}]",
+        lambda _: generate_gh_matrix(env_list=env_list, section="all"),
+        _setup,
+    )
+    assert gh_output.read_text().count('"name"') == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_custom_sort(size: int, benchmark_recorder: BenchmarkRecorder) -> None:
+    """Time sorting a shuffled matrix with custom_sort.
+
+    Args:
+        size: The number of environments.
+        benchmark_recorder: The benchmark recorder.
+    """
+    names = sorted(_env_names(size), reverse=True)
+    benchmark_recorder.measure(
+        f"custom_sort[{size}]",
+        lambda _: sorted(names, key=custom_sort),
+    )
@@ -77,6 +77,27 @@ def run(  # noqa: PLR0913
     )
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Add the benchmark options.
+
+    Args:
+        parser: The pytest parser.
+    """
+    group = parser.getgroup("tox-ansible benchmarks")
+    group.addoption(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help="Run the benchmarks under tests/benchmark against their baselines",
+    )
+    group.addoption(
+        "--benchmark-update",
+        action="store_true",
+        default=False,
+        help="Run the benchmarks and rewrite their baselines",
+    )
+
+
 @pytest.fixture(scope="session")
 def tox_bin() -> Path:
     """Provide the path to the tox binary.
@@ -124,6 +145,20 @@ def _tox_in_tox(monkeypatch: pytest.MonkeyPatch) -> None:
     monkeypatch.delenv("TOX_ENV_DIR", raising=False)
 
 
+@pytest.fixture(autouse=True)
+def _offline_core_repo(
+    monkeypatch: pytest.MonkeyPatch, tmp_path_factory: pytest.TempPathFactory
+) -> None:
+    """Keep ansible-core branch resolution off the network.
+
+    Args:
+        monkeypatch: pytest fixture to patch modules
+        tmp_path_factory: pytest fixture to create temporary directories
+    """
+    monkeypatch.setenv("TOX_ANSIBLE_CORE_REPO", str(tmp_path_factory.mktemp("core") / "missing"))
+    monkeypatch.delenv("TOX_ANSIBLE_CORE_REVISIONS", raising=False)
+
+
 @dataclass
 class BasicEnvironment:
     """An structure for an environment.
@@ -66,7 +66,8 @@ def test_gh_matrix(
     assert isinstance(structured, list)
     assert structured
     for entry in structured:
-        assert tuple(sorted(entry)) == ("description", "factors", "name", "python")
+        keys = set(entry) - {"ansible_core_revision"}
+        assert tuple(sorted(keys)) == ("description", "factors", "name", "python")
         assert isinstance(entry["description"], str)
         assert isinstance(entry["factors"], list)
         assert isinstance(entry["name"], str)
@@ -143,6 +144,28 @@ def test_no_ansible_flag_gh(module_fixture_dir: Path, tox_bin: Path) -> None:
     assert "The --gh-matrix option requires --ansible" in proc.stdout
 
 
+def test_provision_only_requires_run_parallel(module_fixture_dir: Path, tox_bin: Path) -> None:
+    """Test that --provision-only is rejected outside tox run-parallel.
+
+    Args:
+        module_fixture_dir: pytest fixture to get the fixtures directory
+        tox_bin: pytest fixture to get the tox binary
+
+    """
+    conf = str(module_fixture_dir / "tox-ansible.ini")
+    for command in ((), ("run",)):
+        cmd = (tox_bin, *command, "--ansible", "--provision-only", "--conf", conf)
+        proc = run(cmd, cwd=module_fixture_dir, check=False, shell=False)
+        assert proc.returncode == 1
+        assert "use `tox run-parallel --ansible --provision-only`" in proc.stdout
+
+    # Accepted by tox p, which then selects the environments.
+    cmd = (tox_bin, "p", "--ansible", "--provision-only", "--conf", conf, "-e", "non-existent")
+    proc = run(cmd, cwd=module_fixture_dir, check=False, shell=False)
+    assert "--provision-only" not in proc.stdout
+    assert "non-existent" in proc.stdout
+
+
 def test_tox_ini_msg(
     module_fixture_dir: Path,
     tox_bin: Path,
@@ -0,0 +1,407 @@
+"""Unit tests for the session collection artifact."""
+
+from __future__ import annotations
+
+import json
+import shutil
+import tarfile
+import threading
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from filelock import FileLock
+
+from tox_ansible import artifact
+from tox_ansible.artifact import (
+    CollectionArtifact,
+    CollectionEntry,
+    build_collection,
+    collection_files,
+    source_digest,
+)
+from tox_ansible.project import Collection, get_collection
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+GALAXY_YML = """\
+namespace: ns
+name: coll
+version: 1.0.0
+readme: README.md
+authors:
+  - Someone
+license: GPL-3.0-or-later
+build_ignore:
+  - docs
+"""
+
+
+def _make_collection(project_dir: Path) -> Collection:
+    """Lay out a small collection.
+
+    Args:
+        project_dir: The collection root directory.
+
+    Returns:
+        The collection info.
+    """
+    project_dir.mkdir(exist_ok=True)
+    (project_dir / "galaxy.yml").write_text(GALAXY_YML)
+    for rel_path in (
+        "README.md",
+        "plugins/modules/mod.py",
+        "plugins/modules/__pycache__/mod.cpython-313.pyc",
+        "tests/output/junit.xml",
+        "tests/unit/test_mod.py",
+        ".git/HEAD",
+        ".tox/env/bin/python",
+        "ns-coll-0.9.0.tar.gz",
+        "docs/notes.txt",
+    ):
+        path = project_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(rel_path)
+    (project_dir / "plugins" / "modules" / "mod.py").chmod(0o755)
+    (project_dir / "plugins" / "modules" / "alias.py").symlink_to("mod.py")
+    (project_dir / "plugins" / "action").symlink_to("modules")
+    (project_dir / "meta").mkdir()
+    return get_collection(project_dir / "galaxy.yml")
+
+
+def test_collection_files(tmp_path: Path) -> None:
+    """Test the file selection follows the ansible-galaxy build rules.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    collection = _make_collection(tmp_path)
+    outside = tmp_path.parent / f"{tmp_path.name}-outside"
+    outside.mkdir()
+    (tmp_path / "plugins" / "filter").symlink_to(outside)
+
+    assert collection_files(tmp_path, collection) == [
+        CollectionEntry("README.md", "file"),
+        CollectionEntry("meta", "dir"),
+        CollectionEntry("plugins", "dir"),
+        CollectionEntry("plugins/action", "dir"),
+        CollectionEntry("plugins/modules", "dir"),
+        CollectionEntry("plugins/modules/alias.py", "file"),
+        CollectionEntry("plugins/modules/mod.py", "file"),
+        CollectionEntry("tests", "dir"),
+        CollectionEntry("tests/unit", "dir"),
+        CollectionEntry("tests/unit/test_mod.py", "file"),
+    ]
+
+
+def test_manifest_ignores_build_ignore(tmp_path: Path) -> None:
+    """Test build_ignore does not apply when the manifest directives are used.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    _make_collection(tmp_path)
+    collection = Collection(
+        name="coll",
+        namespace="ns",
+        version="1.0.0",
+        build_ignore=["docs"],
+        manifest={},
+    )
+
+    assert CollectionEntry("docs/notes.txt", "file") in collection_files(tmp_path, collection)
+
+
+def test_source_digest(tmp_path: Path) -> None:
+    """Test the digest only changes with the build inputs.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    collection = _make_collection(tmp_path)
+    digest = source_digest(tmp_path, collection)
+
+    (tmp_path / "tests" / "output" / "junit.xml").write_text("changed")
+    assert source_digest(tmp_path, collection) == digest
+
+    (tmp_path / "plugins" / "modules" / "mod.py").write_text("changed")
+    assert source_digest(tmp_path, collection) != digest
+
+
+def test_tarball_layout(tmp_path: Path) -> None:
+    """Test the tarball members and manifests match the ansible-galaxy layout.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    project_dir = tmp_path / "project"
+    collection = _make_collection(project_dir)
+    tarball = build_collection(project_dir, tmp_path, collection)
+
+    assert tarball == tmp_path / "ns-coll-1.0.0.tar.gz"
+    with tarfile.open(tarball) as tar:
+        members = {member.name: member for member in tar.getmembers()}
+        files = json.load(tar.extractfile("FILES.json"))  # type: ignore[arg-type]
+        manifest = json.load(tar.extractfile("MANIFEST.json"))  # type: ignore[arg-type]
+        mod = tar.extractfile("plugins/modules/mod.py").read()  # type: ignore[union-attr]
+
+    assert mod == b"plugins/modules/mod.py"
+    assert members["plugins/modules/mod.py"].mode == 0o755  # noqa: PLR2004
+    assert members["README.md"].mode == 0o644  # noqa: PLR2004
+    assert members["meta"].isdir()
+    assert members["plugins/action"].linkname == "modules"
+    assert members["plugins/modules/alias.py"].linkname == "mod.py"
+    assert {member.uname for member in members.values()} == {""}
+    assert {member.mtime for member in members.values()} == {artifact.DEFAULT_MTIME}
+
+    assert files["files"][0] == {
+        "name": ".",
+        "ftype": "dir",
+        "chksum_type": None,
+        "chksum_sha256": None,
+        "format": 1,
+    }
+    by_name = {entry["name"]: entry for entry in files["files"]}
+    assert by_name["plugins/modules/alias.py"] == by_name["plugins/modules/mod.py"] | {
+        "name": "plugins/modules/alias.py",
+    }
+    assert manifest["collection_info"] == {
+        "namespace": "ns",
+        "name": "coll",
+        "version": "1.0.0",
+        "authors": ["Someone"],
+        "readme": "README.md",
+        "tags": [],
+        "description": None,
+        "license": ["GPL-3.0-or-later"],
+        "license_file": None,
+        "dependencies": {},
+        "repository": None,
+        "documentation": None,
+        "homepage": None,
+        "issues": None,
+    }
+
+
+def test_tarball_reproducible(tmp_path: Path) -> None:
+    """Test the same sources give the same bytes.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    project_dir = tmp_path / "project"
+    collection = _make_collection(project_dir)
+    first = build_collection(project_dir, tmp_path, collection).read_bytes()
+    (project_dir / "README.md").touch()
+
+    assert build_collection(project_dir, tmp_path, collection).read_bytes() == first
+
+
+def test_outside_symlink_copied(tmp_path: Path) -> None:
+    """Test a file symlink resolving outside the collection is packed as a file.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    project_dir = tmp_path / "project"
+    collection = _make_collection(project_dir)
+    (tmp_path / "LICENSE").write_text("license")
+    (project_dir / "LICENSE").symlink_to(tmp_path / "LICENSE")
+    tarball = build_collection(project_dir, tmp_path, collection)
+
+    with tarfile.open(tarball) as tar:
+        assert tar.getmember("LICENSE").isfile()
+        assert tar.extractfile("LICENSE").read() == b"license"  # type: ignore[union-attr]
+
+
+def test_broken_symlink(tmp_path: Path) -> None:
+    """Test a broken symlink is fatal.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    project_dir = tmp_path / "project"
+    collection = _make_collection(project_dir)
+    (project_dir / "missing.yml").symlink_to("nowhere.yml")
+    assert CollectionEntry("missing.yml", "file") in collection_files(project_dir, collection)
+    assert source_digest(project_dir, collection)
+
+    with pytest.raises(SystemExit, match="1"):
+        build_collection(project_dir, tmp_path, collection)
+
+
+def test_missing_mandatory_keys(tmp_path: Path) -> None:
+    """Test the mandatory galaxy.yml keys are checked.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    project_dir = tmp_path / "project"
+    collection = _make_collection(project_dir)
+    (project_dir / "galaxy.yml").write_text("namespace: ns\nname: coll\nversion: 1.0.0\n")
+
+    with pytest.raises(SystemExit, match="1"):
+        build_collection(project_dir, tmp_path, collection)
+
+
+@pytest.mark.skipif(not shutil.which("ansible-galaxy"), reason="ansible-galaxy is not installed")
+def test_same_content_as_cli(tmp_path: Path) -> None:
+    """Test the in-process build packs what ansible-galaxy packs.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    project_dir = tmp_path / "project"
+    collection = _make_collection(project_dir)
+    (tmp_path / "cli").mkdir()
+    (tmp_path / "native").mkdir()
+    cli = artifact.build_collection_cli(project_dir, tmp_path / "cli")
+    native = build_collection(project_dir, tmp_path / "native", collection)
+
+    def _describe(tarball: Path) -> tuple[dict[str, tuple[bytes, int, str]], list[dict[str, str]]]:
+        """Describe the members and the FILES.json entries of a tarball.
+
+        Args:
+            tarball: The tarball.
+
+        Returns:
+            The members by name, and the sorted FILES.json entries.
+        """
+        with tarfile.open(tarball) as tar:
+            members = {
+                member.name: (member.type, member.mode, member.linkname)
+                for member in tar.getmembers()
+            }
+            files = json.load(tar.extractfile("FILES.json"))  # type: ignore[arg-type]
+            manifest = json.load(tar.extractfile("MANIFEST.json"))  # type: ignore[arg-type]
+        assert manifest["collection_info"]["name"] == "coll"
+        return members, sorted(files["files"], key=lambda entry: entry["name"])
+
+    assert _describe(native) == _describe(cli)
+
+
+def test_manifest_built_by_cli(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test collections with manifest directives are built by ansible-galaxy.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    collection = Collection(name="coll", namespace="ns", version="1.0.0", manifest={})
+    monkeypatch.setattr(artifact, "build_collection_cli", lambda *_: tmp_path / "cli.tar.gz")
+    monkeypatch.setattr(artifact, "cli_builder_available", lambda: False)
+
+    assert build_collection(tmp_path, tmp_path, collection) == tmp_path / "cli.tar.gz"
+    assert not artifact.builder_available(collection)
+    assert artifact.builder_available(Collection(name="coll", namespace="ns", version="1.0.0"))
+
+
+def test_ensure_builds_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the artifact is built once and replaces the other digests.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    builds: list[Path] = []
+    build = artifact.build_collection
+
+    def _counting_build(project_dir: Path, output_dir: Path, collection: Collection) -> Path:
+        """Count the collection builds.
+
+        Args:
+            project_dir: The collection root directory.
+            output_dir: The directory receiving the tarball.
+            collection: The collection info.
+
+        Returns:
+            The built tarball.
+        """
+        builds.append(project_dir)
+        return build(project_dir, output_dir, collection)
+
+    monkeypatch.setattr(artifact, "build_collection", _counting_build)
+    project_dir = tmp_path / "project"
+    collection = _make_collection(project_dir)
+    artifacts_dir = tmp_path / "artifacts"
+    stale = CollectionArtifact(project_dir, collection, "old", artifacts_dir)
+    current = CollectionArtifact(project_dir, collection, "new", artifacts_dir)
+
+    assert stale.ensure() == artifacts_dir / "old" / "ns-coll-1.0.0.tar.gz"
+    assert current.ensure() == current.path
+    assert current.ensure() == current.path
+
+    assert builds == [project_dir, project_dir]
+    assert not stale.path.parent.exists()
+    assert tarfile.is_tarfile(current.path)
+
+
+def test_ensure_waits_for_parallel_build(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test an artifact built while waiting for the lock is not built again.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(artifact, "build_collection", pytest.fail)
+    collection = Collection(name="coll", namespace="ns", version="1.0.0")
+    artifacts_dir = tmp_path / "artifacts"
+    current = CollectionArtifact(tmp_path, collection, "new", artifacts_dir)
+    artifacts_dir.mkdir()
+    lock = FileLock(artifacts_dir / ".lock")
+    result: list[Path] = []
+
+    with lock:
+        thread = threading.Thread(target=lambda: result.append(current.ensure()))
+        thread.start()
+        thread.join(timeout=0.2)
+        assert thread.is_alive()
+        current.path.parent.mkdir()
+        current.path.write_bytes(b"tarball")
+    thread.join()
+
+    assert result == [current.path]
+
+
+def _fake_ansible_galaxy(bin_dir: Path, body: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Put a fake ansible-galaxy script alone on the PATH.
+
+    Args:
+        bin_dir: The directory receiving the script.
+        body: The shell script body.
+        monkeypatch: Pytest fixture.
+    """
+    script = bin_dir / "ansible-galaxy"
+    script.write_text(f"#!/bin/sh\n{body}\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_dir))
+
+
+def test_build_collection_cli(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the tarball written by ansible-galaxy is returned.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    _fake_ansible_galaxy(tmp_path, ': > "$4/ns-coll-1.0.0.tar.gz"', monkeypatch)
+
+    assert artifact.cli_builder_available()
+    assert artifact.build_collection_cli(tmp_path, tmp_path) == tmp_path / "ns-coll-1.0.0.tar.gz"
+
+
+def test_build_collection_cli_failure(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a failed ansible-galaxy build is fatal.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    _fake_ansible_galaxy(tmp_path, "echo 'ERROR! no galaxy.yml'\nexit 1", monkeypatch)
+
+    with pytest.raises(SystemExit, match="1"):
+        artifact.build_collection_cli(tmp_path, tmp_path)
@@ -0,0 +1,215 @@
+"""Unit tests for the base environments of the tox-uv runners."""
+
+from __future__ import annotations
+
+import shutil
+import sys
+import threading
+import zipfile
+
+from pathlib import Path
+
+import pytest
+
+from filelock import FileLock
+
+from tox_ansible import base_env
+from tox_ansible.base_env import BASE_MARKER, BaseEnv, find_uv, install_prefix
+from tox_ansible.layers import SessionLayers
+
+
+def _write_prefix(prefix: Path, version: str = "1.0") -> None:
+    """Write an installed prefix stand-in.
+
+    Args:
+        prefix: The prefix.
+        version: The version written into the package.
+    """
+    site = prefix / "lib" / "python3.13" / "site-packages"
+    (site / "pkg").mkdir(parents=True)
+    (site / "pkg" / "__init__.py").write_text(f"VERSION = {version!r}\n")
+    (site / "pkg" / "main.py").write_text("#!/usr/bin/env python\n")
+    (prefix / "bin").mkdir()
+    script = prefix / "bin" / "pkg"
+    script.write_text("#!/base/bin/python3\nimport pkg\n")
+    script.chmod(0o755)
+
+
+def _fake_install(
+    python: Path,
+    prefix: Path,
+    requirements: tuple[str, ...],
+    wheelhouse: Path | None = None,
+) -> bool:
+    """Fake a uv installation into a prefix.
+
+    Args:
+        python: The interpreter the prefix is installed for.
+        prefix: The prefix to install into.
+        requirements: The requirements.
+        wheelhouse: The wheelhouse to install from.
+
+    Returns:
+        True.
+    """
+    assert python.name == "python"
+    assert wheelhouse is None
+    _write_prefix(prefix, version=requirements[-1])
+    return True
+
+
+@pytest.mark.skipif(find_uv() is None, reason="uv is not installed")
+def test_install_prefix(tmp_path: Path) -> None:
+    """Test uv installs into the prefix as into a virtual environment, and a failure is reported.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    wheels = tmp_path / "wheels"
+    wheels.mkdir()
+    dist_info = "top-1.0.0.dist-info"
+    with zipfile.ZipFile(wheels / "top-1.0.0-py3-none-any.whl", "w") as whl:
+        whl.writestr("top/__init__.py", "")
+        whl.writestr(f"{dist_info}/METADATA", "Metadata-Version: 2.1\nName: top\nVersion: 1.0.0\n")
+        whl.writestr(
+            f"{dist_info}/WHEEL",
+            "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+        )
+        whl.writestr(f"{dist_info}/RECORD", "")
+    prefix = tmp_path / "prefix"
+    python = Path(sys.executable)
+    version = f"python{sys.version_info.major}.{sys.version_info.minor}"
+
+    assert install_prefix(python, prefix, ("top",), wheels)
+    assert (prefix / "lib" / version / "site-packages" / "top" / "__init__.py").is_file()
+    assert not install_prefix(python, tmp_path / "missing", ("missing",), wheels)
+
+
+def test_install_prefix_without_uv(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a base is not installed without uv.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(base_env, "find_uv", lambda: None)
+    assert not install_prefix(Path(sys.executable), tmp_path / "prefix", ("top",))
+
+
+def test_find_uv(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test uv is looked up on the PATH without its Python package.
+
+    Args:
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setitem(sys.modules, "uv", None)
+    assert find_uv() == shutil.which("uv")
+
+
+def test_populate_installs_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the base is installed once per key and cloned into the environments.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    installs: list[tuple[str, ...]] = []
+
+    def _counting_install(
+        python: Path,
+        prefix: Path,
+        requirements: tuple[str, ...],
+        wheelhouse: Path | None = None,
+    ) -> bool:
+        """Count the installations.
+
+        Args:
+            python: The interpreter the prefix is installed for.
+            prefix: The prefix to install into.
+            requirements: The requirements.
+            wheelhouse: The wheelhouse to install from.
+
+        Returns:
+            True.
+        """
+        installs.append(requirements)
+        return _fake_install(python, prefix, requirements, wheelhouse)
+
+    monkeypatch.setattr(base_env, "install_prefix", _counting_install)
+    bases_dir = tmp_path / "bases"
+    site = "lib/python3.13/site-packages/pkg"
+    interpreter = tmp_path / "python3.13"
+    interpreter.touch()
+    session = SessionLayers()
+
+    def _base(env: str, core: str) -> BaseEnv:
+        """Return the base seen by an environment.
+
+        Args:
+            env: The environment name.
+            core: The pinned ansible-core requirement.
+
+        Returns:
+            The base.
+        """
+        python = tmp_path / env / "bin" / "python"
+        if not python.is_symlink():
+            python.parent.mkdir(parents=True)
+            python.symlink_to(interpreter)
+        return BaseEnv(bases_dir, "py3.13-2.19", python, ("pytest", core))
+
+    unit, sanity = _base("unit", "core-a"), _base("sanity", "core-a")
+    assert unit.key == sanity.key
+    assert unit.populate(tmp_path / "unit", session)
+    assert sanity.populate(tmp_path / "sanity", session)
+    assert unit.populate(tmp_path / "unit", session)
+    assert installs == [("pytest", "core-a")]
+    assert (tmp_path / "sanity" / site / "__init__.py").read_text() == "VERSION = 'core-a'\n"
+    assert (tmp_path / "sanity" / site / "main.py").read_text() == "#!/usr/bin/env python\n"
+    script = tmp_path / "sanity" / "bin" / "pkg"
+    assert script.read_text() == f"#!{tmp_path / 'sanity' / 'bin' / 'python'}\nimport pkg\n"
+    assert (tmp_path / "sanity" / BASE_MARKER).read_text() == unit.key
+
+    moved = _base("unit", "core-b")
+    assert moved.populate(tmp_path / "unit", session)
+    assert len(installs) == 2  # noqa: PLR2004
+    assert [path.name for path in (bases_dir / "py3.13-2.19").iterdir()] == [moved.key]
+
+    monkeypatch.setattr(base_env, "install_prefix", lambda *_: False)
+    failed = _base("unit", "core-c")
+    assert not failed.populate(tmp_path / "unit", session)
+    assert session.failed == {failed.path}
+    monkeypatch.setattr(base_env, "install_prefix", pytest.fail)
+    assert not failed.populate(tmp_path / "sanity", session)
+    assert (tmp_path / "unit" / BASE_MARKER).read_text() == moved.key
+
+
+def test_populate_waits_for_parallel_install(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a base installed while waiting for the lock is not installed again.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(base_env, "install_prefix", pytest.fail)
+    base = BaseEnv(
+        tmp_path / "bases", "py3.13-2.19", tmp_path / "env" / "bin" / "python", ("pytest",)
+    )
+    base.path.parent.mkdir(parents=True)
+    result: list[bool] = []
+
+    with FileLock(tmp_path / "bases" / "py3.13-2.19.lock"):
+        thread = threading.Thread(
+            target=lambda: result.append(base.populate(tmp_path / "env", SessionLayers())),
+        )
+        thread.start()
+        thread.join(timeout=0.5)
+        assert thread.is_alive()
+        _write_prefix(base.path)
+    thread.join()
+
+    assert result == [True]
+    assert (tmp_path / "env" / "bin" / "pkg").exists()
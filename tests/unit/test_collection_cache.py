@@ -0,0 +1,254 @@
+"""Unit tests for the cache of the collections of the requirements files."""
+
+from __future__ import annotations
+
+import json
+import shutil
+import subprocess
+
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, cast
+
+import pytest
+
+from tox_ansible import collection_cache
+from tox_ansible.artifact import build_collection
+from tox_ansible.collection_cache import CollectionCache, collections_dir
+from tox_ansible.core_cache import CoreWheelCache
+from tox_ansible.project import get_collection
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tox.session.state import State
+
+
+needs_galaxy = pytest.mark.skipif(
+    not shutil.which("ansible-galaxy"),
+    reason="ansible-galaxy is not installed",
+)
+
+
+def _publish(server: Path, name: str, version: str, dependencies: str = "{}") -> Path:
+    """Build a collection into the directory standing in for Galaxy.
+
+    Args:
+        server: The directory of the published tarballs.
+        name: The collection name, in the ``ns`` namespace.
+        version: The collection version.
+        dependencies: The galaxy.yml dependencies.
+
+    Returns:
+        The tarball.
+    """
+    src = server.parent / "src" / f"{name}-{version}"
+    src.mkdir(parents=True)
+    (src / "README.md").write_text(name)
+    (src / "galaxy.yml").write_text(
+        f"namespace: ns\nname: {name}\nversion: {version}\nreadme: README.md\n"
+        f"authors: [Someone]\ndependencies: {dependencies}\n",
+    )
+    server.mkdir(exist_ok=True)
+    return build_collection(src, server, get_collection(src / "galaxy.yml"))
+
+
+@pytest.fixture(name="project_dir")
+def fixture_project_dir(tmp_path: Path) -> Path:
+    """Lay out a project requiring a published collection and its dependency.
+
+    Args:
+        tmp_path: Pytest fixture.
+
+    Returns:
+        The project directory.
+    """
+    server = tmp_path / "server"
+    dep = _publish(server, "dep", "1.2.0")
+    top = _publish(server, "top", "1.0.0", '{"ns.dep": ">=1.0.0"}')
+    project_dir = tmp_path / "project"
+    (project_dir / "tests").mkdir(parents=True)
+    (project_dir / "tests" / "requirements.yml").write_text(
+        f"collections:\n  - name: {top}\n    type: file\n  - name: {dep}\n    type: file\n",
+    )
+    return project_dir
+
+
+@needs_galaxy
+def test_download_once(tmp_path: Path, project_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a requirements file is downloaded once, then installed from the cache.
+
+    Args:
+        tmp_path: Pytest fixture.
+        project_dir: The project directory.
+        monkeypatch: Pytest fixture.
+    """
+    cache_dir = collections_dir(tmp_path / ".tox")
+    cache = CollectionCache(cache_dir=cache_dir, project_dir=project_dir)
+
+    tarballs = cache.tarballs("tests/requirements.yml")
+
+    assert tarballs == [
+        cache_dir / "ns.dep" / "1.2.0" / "ns-dep-1.2.0.tar.gz",
+        cache_dir / "ns.top" / "1.0.0" / "ns-top-1.0.0.tar.gz",
+    ]
+    assert all(tarball.is_file() for tarball in tarballs)
+    assert sorted(path.name for path in cache_dir.iterdir()) == [
+        ".lock",
+        "ns.dep",
+        "ns.top",
+        "resolved",
+    ]
+
+    site = tmp_path / "site-packages"
+    args = cache.install_args("tests/requirements.yml")
+    assert args.startswith("--offline --no-deps ")
+    subprocess.run(
+        f"ansible-galaxy collection install --force -p {site} {args}",
+        shell=True,
+        check=True,
+        capture_output=True,
+        stdin=subprocess.DEVNULL,
+    )
+    manifest = json.loads((site / "ansible_collections/ns/dep/MANIFEST.json").read_text())
+    assert manifest["collection_info"]["version"] == "1.2.0"
+
+    shutil.rmtree(tmp_path / "server")
+    monkeypatch.setattr(collection_cache, "download_collections", pytest.fail)
+    assert CollectionCache(cache_dir, project_dir).tarballs("tests/requirements.yml") == tarballs
+    assert (
+        CollectionCache(cache_dir, project_dir, offline=True).install_args(
+            "tests/requirements.yml",
+        )
+        == args
+    )
+
+
+def test_offline_needs_cache(tmp_path: Path, project_dir: Path) -> None:
+    """Test installing offline a requirements file never downloaded is fatal.
+
+    Args:
+        tmp_path: Pytest fixture.
+        project_dir: The project directory.
+    """
+    cache = CollectionCache(collections_dir(tmp_path / ".tox"), project_dir, offline=True)
+
+    with pytest.raises(SystemExit, match="1"):
+        cache.tarballs("tests/requirements.yml")
+
+
+def test_galaxy_fallback(
+    tmp_path: Path,
+    project_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the requirements file is installed from Galaxy when it cannot be cached.
+
+    Args:
+        tmp_path: Pytest fixture.
+        project_dir: The project directory.
+        monkeypatch: Pytest fixture.
+    """
+    requirements = project_dir / "tests" / "requirements.yml"
+    monkeypatch.setattr(collection_cache, "download_available", lambda: False)
+    cache = CollectionCache(collections_dir(tmp_path / ".tox"), project_dir)
+    assert cache.install_args("tests/requirements.yml") == f"-r {requirements}"
+
+    monkeypatch.setattr(collection_cache, "download_available", lambda: True)
+    monkeypatch.setattr(collection_cache, "download_collections", lambda *_: None)
+    cache = CollectionCache(collections_dir(tmp_path / ".tox"), project_dir)
+    assert cache.install_args("tests/requirements.yml") == f"-r {requirements}"
+    assert cache.resolved == {"tests/requirements.yml": None}
+
+
+def test_refresh_and_changes(
+    tmp_path: Path,
+    project_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a changed requirements file or a refresh resolves the collections again.
+
+    Args:
+        tmp_path: Pytest fixture.
+        project_dir: The project directory.
+        monkeypatch: Pytest fixture.
+    """
+    downloads: list[str] = []
+
+    def _download(requirements: Path, download_dir: Path, cwd: Path) -> list[str]:
+        """Fake a download of a single collection.
+
+        Args:
+            requirements: The requirements file.
+            download_dir: The directory receiving the tarballs.
+            cwd: The project directory.
+
+        Returns:
+            The names of the downloaded tarballs.
+        """
+        assert cwd == project_dir
+        downloads.append(requirements.read_text())
+        name = f"ns-top-1.0.{len(downloads)}.tar.gz"
+        (download_dir / name).write_text("tarball")
+        return [name]
+
+    monkeypatch.setattr(collection_cache, "download_available", lambda: True)
+    monkeypatch.setattr(collection_cache, "download_collections", _download)
+    cache_dir = collections_dir(tmp_path / ".tox")
+    requirements = project_dir / "tests" / "requirements.yml"
+
+    first = CollectionCache(cache_dir, project_dir).tarballs("tests/requirements.yml")
+    assert CollectionCache(cache_dir, project_dir).tarballs("tests/requirements.yml") == first
+    refreshed = CollectionCache(cache_dir, project_dir, refresh=True)
+    assert refreshed.tarballs("tests/requirements.yml") != first
+    assert refreshed.tarballs("tests/requirements.yml") != first
+    assert len(downloads) == 2  # noqa: PLR2004
+
+    requirements.write_text("collections: []\n")
+    CollectionCache(cache_dir, project_dir).tarballs("tests/requirements.yml")
+    assert downloads[-1] == "collections: []\n"
+
+
+def test_core_offline(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the wheel cache reuses any recorded commit offline, never contacting the repository.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr("tox_ansible.core_cache.resolve_revision", pytest.fail)
+    revision = "0123456789abcdef0123456789abcdef01234567"
+    (tmp_path / "revisions.json").write_text(
+        json.dumps({"devel": {"revision": revision, "resolved": 0}}),
+    )
+
+    cache = CoreWheelCache(tmp_path, ttl=0, offline=True)
+    assert cache.revision("devel") == revision
+    assert cache.revision("stable-2.19") is None
+
+
+def test_cache_per_session(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test each tox session has its own cache, following the CLI options.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    context = SimpleNamespace(project_dir=tmp_path)
+    monkeypatch.setattr(collection_cache, "project_context", lambda _: context)
+
+    class _Session:
+        """Weak referenceable stand-in for a tox state."""
+
+        conf = SimpleNamespace(
+            core={"work_dir": tmp_path / ".tox"},
+            options=SimpleNamespace(ansible_offline=True, ansible_reprovision=False),
+        )
+
+    state = cast("State", _Session())
+    cache = collection_cache.collection_cache(state)
+
+    assert collection_cache.collection_cache(state) is cache
+    assert cache.cache_dir == tmp_path / ".tox" / ".tox-ansible" / "collections"
+    assert (cache.project_dir, cache.offline, cache.refresh) == (tmp_path, True, False)
+    assert collection_cache.collection_cache(cast("State", _Session())) is not cache
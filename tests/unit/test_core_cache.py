@@ -0,0 +1,496 @@
+"""Unit tests for the ansible-core wheel cache, with a local repository stand-in."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import subprocess
+import tarfile
+import threading
+import time
+
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, cast
+
+import pytest
+
+from filelock import FileLock
+
+from tox_ansible import core_cache
+from tox_ansible.core_cache import (
+    CoreWheelCache,
+    build_wheel,
+    core_ref,
+    core_repo,
+    fetch_archive,
+    resolve_revision,
+)
+from tox_ansible.project import AnsibleConfiguration, _coerce_ttl, load_project_config
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tox.session.state import State
+
+
+def _git(repo: Path, *args: str) -> str:
+    """Run git in the stand-in repository.
+
+    Args:
+        repo: The repository.
+        *args: The git arguments.
+
+    Returns:
+        The command output, stripped.
+    """
+    cmd = ["git", "-C", str(repo), "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    return subprocess.run([*cmd, *args], capture_output=True, check=True, text=True).stdout.strip()
+
+
+def _commit(repo: Path, content: str) -> str:
+    """Commit a new release file on the current branch.
+
+    Args:
+        repo: The repository.
+        content: The release file content.
+
+    Returns:
+        The commit id.
+    """
+    (repo / "release.py").write_text(content)
+    _git(repo, "add", "release.py")
+    _git(repo, "commit", "-q", "-m", content)
+    return _git(repo, "rev-parse", "HEAD")
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(tmp_path: Path) -> Path:
+    """Create a local ansible-core repository stand-in with a stable-2.19 branch.
+
+    Args:
+        tmp_path: Pytest fixture.
+
+    Returns:
+        The repository path.
+    """
+    repo = tmp_path / "ansible"
+    repo.mkdir()
+    _git(repo, "init", "-q", "-b", "devel")
+    _commit(repo, "devel")
+    _git(repo, "checkout", "-q", "-b", "stable-2.19")
+    _commit(repo, "2.19.0")
+    return repo
+
+
+def _fake_build_wheel(archive: Path, wheel_dir: Path) -> Path:
+    """Fake a wheel build, recording the archive content.
+
+    Args:
+        archive: The source archive.
+        wheel_dir: The directory receiving the wheel.
+
+    Returns:
+        The built wheel.
+    """
+    with tarfile.open(archive) as tar:
+        release = next(member for member in tar.getmembers() if member.name.endswith("release.py"))
+        version = tar.extractfile(release).read().decode()  # type: ignore[union-attr]
+    wheel_dir.mkdir()
+    wheel = wheel_dir / f"ansible_core-{version}-py3-none-any.whl"
+    wheel.write_text(version)
+    return wheel
+
+
+def test_core_ref() -> None:
+    """Test the branch of each kind of core factor."""
+    assert core_ref("2.19") == "stable-2.19"
+    assert core_ref("devel") == "devel"
+    assert core_ref("milestone") == "milestone"
+
+
+def test_core_repo(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the repository can be replaced by the environment.
+
+    Args:
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.delenv("TOX_ANSIBLE_CORE_REPO", raising=False)
+    assert core_repo() == "https://github.com/ansible/ansible"
+    monkeypatch.setenv("TOX_ANSIBLE_CORE_REPO", "/srv/ansible")
+    assert core_repo() == "/srv/ansible"
+
+
+def test_resolve_revision(repo: Path, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test branches resolve to their head commit, or None with a warning.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+        caplog: Pytest fixture.
+    """
+    caplog.set_level(logging.INFO)
+    assert resolve_revision(str(repo), "stable-2.19") == _git(repo, "rev-parse", "stable-2.19")
+    assert resolve_revision(str(repo), "stable-2.20") is None
+    assert resolve_revision(str(tmp_path / "missing"), "devel") is None
+    assert "no such branch" in caplog.text
+    assert "Unable to resolve ansible-core devel" in caplog.text
+
+
+def test_fetch_archive(repo: Path, tmp_path: Path) -> None:
+    """Test archives come from a local repository or an archive URL.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+    """
+    revision = _git(repo, "rev-parse", "stable-2.19")
+    archive = tmp_path / "local.tar.gz"
+    fetch_archive(str(repo), revision, archive)
+    with tarfile.open(archive) as tar:
+        assert f"ansible-{revision}/release.py" in tar.getnames()
+
+    served = tmp_path / "served"
+    (served / "archive").mkdir(parents=True)
+    (served / "archive" / f"{revision}.tar.gz").write_bytes(archive.read_bytes())
+    downloaded = tmp_path / "downloaded.tar.gz"
+    fetch_archive(f"{served.as_uri()}.git", revision, downloaded)
+    assert downloaded.read_bytes() == archive.read_bytes()
+
+
+def test_build_wheel(tmp_path: Path) -> None:
+    """Test the wheel written by pip is returned, and a failed build is not fatal.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    python = tmp_path / "python"
+    python.write_text('#!/bin/sh\nmkdir -p "$6"\n: > "$6/ansible_core-2.19.0-py3-none-any.whl"\n')
+    python.chmod(0o755)
+    wheel_dir = tmp_path / "wheel"
+
+    wheel = build_wheel(tmp_path / "core.tar.gz", wheel_dir, python=str(python))
+    assert wheel == wheel_dir / "ansible_core-2.19.0-py3-none-any.whl"
+
+    python.write_text("#!/bin/sh\necho 'requires a different Python'\nexit 1\n")
+    assert build_wheel(tmp_path / "core.tar.gz", wheel_dir, python=str(python)) is None
+
+
+def test_cache_builds_once_per_revision(
+    repo: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a wheel is built once per revision, and reused across sessions.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    builds: list[Path] = []
+
+    def _counting_build(archive: Path, wheel_dir: Path) -> Path:
+        """Count the wheel builds.
+
+        Args:
+            archive: The source archive.
+            wheel_dir: The directory receiving the wheel.
+
+        Returns:
+            The built wheel.
+        """
+        builds.append(archive)
+        return _fake_build_wheel(archive, wheel_dir)
+
+    monkeypatch.setattr(core_cache, "build_wheel", _counting_build)
+    cache_dir = tmp_path / "cores"
+    session = CoreWheelCache(cache_dir=cache_dir, repo=str(repo))
+    revision = _git(repo, "rev-parse", "stable-2.19")
+
+    wheel = session.ensure("2.19")
+    assert wheel == cache_dir / "stable-2.19" / revision / "ansible_core-2.19.0-py3-none-any.whl"
+    assert session.ensure("2.19") == wheel
+    # The branch moves, but the session keeps the revision it resolved.
+    new_revision = _commit(repo, "2.19.1")
+    assert session.ensure("2.19") == wheel
+    assert len(builds) == 1
+
+    next_session = CoreWheelCache(cache_dir=cache_dir, repo=str(repo), ttl=0)
+    new_wheel = next_session.ensure("2.19")
+    assert (
+        new_wheel
+        == cache_dir / "stable-2.19" / new_revision / "ansible_core-2.19.1-py3-none-any.whl"
+    )
+    assert len(builds) == 2  # noqa: PLR2004
+    # Another session may still install the wheel of the older commit.
+    assert wheel.exists()
+
+    offline = CoreWheelCache(cache_dir=cache_dir, repo=str(tmp_path / "unreachable"))
+    assert offline.ensure("2.19") == new_wheel
+    assert offline.ensure("devel") is None
+
+
+def test_stale_wheels_pruned(
+    repo: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the wheels of older commits are removed once old and named by no environment.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(core_cache, "build_wheel", _fake_build_wheel)
+    cache_dir = tmp_path / "cores"
+    day_old = time.time() - core_cache.STALE_WHEEL_AGE - 1
+    wheels = []
+    for version in ("2.19.1", "2.19.2", "2.19.3"):
+        _commit(repo, version)
+        wheel = CoreWheelCache(cache_dir=cache_dir, repo=str(repo), ttl=0).ensure("2.19")
+        assert wheel is not None
+        wheels.append(wheel)
+    used, unused, recent = wheels
+    for wheel in (used, unused):
+        os.utime(wheel.parent, (day_old, day_old))
+    session = CoreWheelCache(cache_dir=cache_dir, repo=str(repo), ttl=0)
+    session.pointers_dir.mkdir()
+    (session.pointers_dir / "unit-py3.13-2.19.txt").write_text(f"ansible-core @ {used.as_uri()}\n")
+    (cache_dir / "stable-2.19" / "stray").write_text("")
+    _commit(repo, "2.19.4")
+
+    assert session.ensure("2.19") is not None
+    assert used.exists()
+    assert not unused.parent.exists()
+    assert recent.exists()
+    assert not (cache_dir / "stable-2.19" / "stray").exists()
+
+
+def test_cache_waits_for_parallel_build(
+    repo: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a wheel built while waiting for the lock is not built again.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(core_cache, "build_wheel", pytest.fail)
+    cache_dir = tmp_path / "cores"
+    session = CoreWheelCache(cache_dir=cache_dir, repo=str(repo))
+    wheel = (
+        cache_dir
+        / "stable-2.19"
+        / _git(repo, "rev-parse", "stable-2.19")
+        / "ansible_core-2.19.0-py3-none-any.whl"
+    )
+    cache_dir.mkdir()
+    result: list[Path | None] = []
+
+    with FileLock(cache_dir / "stable-2.19.lock"):
+        thread = threading.Thread(target=lambda: result.append(session.ensure("2.19")))
+        thread.start()
+        thread.join(timeout=0.5)
+        assert thread.is_alive()
+        wheel.parent.mkdir(parents=True)
+        wheel.write_text("2.19.0")
+    thread.join()
+
+    assert result == [wheel]
+
+
+def test_failed_build_falls_back(
+    repo: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a commit that cannot be built is installed by ade, and built once per session.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    builds: list[Path] = []
+    monkeypatch.setattr(core_cache, "build_wheel", lambda archive, _: builds.append(archive))
+    session = CoreWheelCache(cache_dir=tmp_path / "cores", repo=str(repo))
+
+    assert session.ensure("2.19") is None
+    assert session.ensure("2.19") is None
+    assert session.acv("2.19") == "stable-2.19"
+    assert len(builds) == 1
+
+    unreachable = CoreWheelCache(
+        cache_dir=tmp_path / "cores",
+        repo=str(tmp_path / "unreachable"),
+        revisions={"devel": "abc123"},
+    )
+    assert unreachable.ensure("devel") is None
+    assert unreachable.failed == {"abc123"}
+
+
+def test_revision_reused_within_ttl(
+    repo: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a resolved branch is reused by later sessions until the TTL expires.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    _git(repo, "checkout", "-q", "devel")
+    cache_dir = tmp_path / "cores"
+    first = _git(repo, "rev-parse", "devel")
+    assert CoreWheelCache(cache_dir=cache_dir, repo=str(repo)).revision("devel") == first
+    recorded = json.loads((cache_dir / "revisions.json").read_text())
+    assert recorded["devel"]["revision"] == first
+
+    second = _commit(repo, "devel 2")
+    assert CoreWheelCache(cache_dir=cache_dir, repo=str(repo)).revision("devel") == first
+    assert CoreWheelCache(cache_dir=cache_dir, repo=str(repo), ttl=0).revision("devel") == second
+    monkeypatch.setattr(core_cache.time, "time", lambda: recorded["devel"]["resolved"] + 7200)
+    assert CoreWheelCache(cache_dir=cache_dir, repo=str(repo)).revision("devel") == second
+
+    (cache_dir / "revisions.json").write_text("not json")
+    assert (
+        CoreWheelCache(cache_dir=cache_dir, repo=str(tmp_path / "unreachable")).revision(
+            "devel",
+        )
+        is None
+    )
+
+
+def test_pinned_revisions(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Test branches pinned by the environment are not resolved.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+        caplog: Pytest fixture.
+    """
+    monkeypatch.setenv("TOX_ANSIBLE_CORE_REVISIONS", "devel=abc123, milestone, 2.19=, =def")
+    cache = CoreWheelCache(cache_dir=tmp_path, repo=str(tmp_path / "unreachable"))
+
+    assert cache.moving_revisions(["2.19", "devel", "milestone", "devel"]) == {"devel": "abc123"}
+    assert "Ignoring malformed TOX_ANSIBLE_CORE_REVISIONS entry: milestone" in caplog.text
+    assert not (tmp_path / "revisions.json").exists()
+
+
+def test_acv(repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test ade is only given what it resolves, the wheel being installed with the deps.
+
+    Args:
+        repo: The repository stand-in.
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    installer = pytest.importorskip("ansible_dev_environment.subcommands.installer")
+    monkeypatch.setattr(core_cache, "build_wheel", _fake_build_wheel)
+    monkeypatch.setenv("TOX_ANSIBLE_CORE_REVISIONS", "devel=abc123")
+    cache = CoreWheelCache(cache_dir=tmp_path / "cores", repo=str(repo))
+    wheel = cache.wheel("2.19")
+    assert wheel is not None
+    assert cache.source("2.19") == wheel.as_uri()
+    assert (
+        installer._resolve_core_package(cache.acv("2.19"))
+        == "https://github.com/ansible/ansible/archive/stable-2.19.tar.gz"
+    )
+
+    remote = CoreWheelCache(cache_dir=tmp_path / "cores", repo="https://example.com/ansible.git")
+    assert (
+        installer._resolve_core_package(remote.acv("devel"))
+        == "https://example.com/ansible/archive/abc123.tar.gz"
+    )
+    monkeypatch.setattr(core_cache, "wheel_build_available", lambda: False)
+    assert cache.wheel("2.19") is None
+    assert remote.source("devel") == "https://example.com/ansible/archive/abc123.tar.gz"
+
+
+class _Session:
+    """Weak referenceable stand-in for a tox state.
+
+    Attributes:
+        conf: The configuration stand-in.
+    """
+
+    def __init__(self, work_dir: Path) -> None:
+        """Initialize the stand-in.
+
+        Args:
+            work_dir: The tox work directory.
+        """
+        self.conf = SimpleNamespace(core={"work_dir": work_dir}, options=SimpleNamespace())
+
+
+def test_cache_per_session(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test each tox session has its own cache.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    context = SimpleNamespace(ansible_config=AnsibleConfiguration(core_revision_ttl=60))
+    monkeypatch.setattr(core_cache, "project_context", lambda _: context)
+    state = cast("State", _Session(tmp_path))
+    other = cast("State", _Session(tmp_path))
+    cache = core_cache.core_cache(state)
+
+    assert core_cache.core_cache(state) is cache
+    assert core_cache.core_cache(other) is not cache
+    assert cache.cache_dir == tmp_path / ".tox-ansible" / "cores"
+    assert cache.ttl == 60  # noqa: PLR2004
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    (
+        (0, 0),
+        ("600", 600),
+        (None, 3600),
+        (-1, 3600),
+        ("hour", 3600),
+        (True, 3600),
+    ),
+)
+def test_coerce_ttl(value: object, expected: int) -> None:
+    """Test the TTL accepts non-negative integers and falls back to the default.
+
+    Args:
+        value: The raw configuration value.
+        expected: The coerced TTL.
+    """
+    assert _coerce_ttl(value) == expected
+
+
+@pytest.mark.parametrize(
+    ("name", "content"),
+    (
+        ("pyproject.toml", "[tool.tox-ansible]\ncore_revision_ttl = 0\n"),
+        ("tox-ansible.ini", "[ansible]\ncore_revision_ttl = 0\n"),
+    ),
+)
+def test_core_revision_ttl_config(tmp_path: Path, name: str, content: str) -> None:
+    """Test the TTL is read from both configuration formats.
+
+    Args:
+        tmp_path: Pytest fixture.
+        name: The configuration file name.
+        content: The configuration file content.
+    """
+    config_file = tmp_path / name
+    config_file.write_text(content)
+
+    assert load_project_config(config_file)[1].core_revision_ttl == 0
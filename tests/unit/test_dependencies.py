@@ -0,0 +1,216 @@
+"""Unit tests for the merged and locked Python dependencies."""
+
+from __future__ import annotations
+
+import sys
+import zipfile
+
+from pathlib import Path
+
+import pytest
+
+from tox_ansible import dependencies
+from tox_ansible.dependencies import (
+    LOCK_HEADER,
+    UNRESOLVED,
+    DependencyLocks,
+    lock_digest,
+    merge_requirements,
+    read_requirement_files,
+)
+
+
+def _wheel(wheels: Path, name: str, version: str, *requires: str) -> None:
+    """Write a wheel holding only metadata into a find-links directory.
+
+    Args:
+        wheels: The find-links directory.
+        name: The distribution name.
+        version: The distribution version.
+        *requires: The requirements of the distribution.
+    """
+    dist_info = f"{name}-{version}.dist-info"
+    metadata = f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n"
+    metadata += "".join(f"Requires-Dist: {req}\n" for req in requires)
+    wheels.mkdir(exist_ok=True)
+    with zipfile.ZipFile(wheels / f"{name}-{version}-py3-none-any.whl", "w") as whl:
+        whl.writestr(f"{dist_info}/METADATA", metadata)
+        whl.writestr(
+            f"{dist_info}/WHEEL",
+            "Wheel-Version: 1.0\nGenerator: test\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+        )
+        whl.writestr(f"{dist_info}/RECORD", "")
+
+
+def test_read_requirement_files(tmp_path: Path) -> None:
+    """Test requirement files are read as pip does, includes expanded once.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    (tmp_path / "requirements.txt").write_text(
+        "# comment\n"
+        "requests>=2 \\\n"
+        "    ; python_version >= '3.10'  # trailing comment\n"
+        "\n"
+        "-r tests/unit/requirements.txt\n"
+        "--index-url https://pypi.example.com/simple\n",
+    )
+    (tmp_path / "tests" / "unit").mkdir(parents=True)
+    (tmp_path / "tests" / "unit" / "requirements.txt").write_text(
+        "-r ../../requirements.txt\n-c constraints.txt\n-e ../..[test]\n./vendored\npytest-mock\n",
+    )
+
+    found = read_requirement_files(
+        tmp_path,
+        ["requirements.txt", "tests/unit/requirements.txt"],
+    )
+
+    assert found.requirements == (
+        ("requests>=2     ; python_version >= '3.10'", "requirements.txt"),
+        (str(tmp_path / "tests" / "unit" / "vendored"), "tests/unit/requirements.txt"),
+        ("pytest-mock", "tests/unit/requirements.txt"),
+    )
+    assert found.options == (
+        f"-c {tmp_path / 'tests' / 'unit' / 'constraints.txt'}",
+        f"-e {tmp_path}[test]",
+        "--index-url https://pypi.example.com/simple",
+    )
+
+
+def test_missing_include(tmp_path: Path) -> None:
+    """Test a missing included file is fatal.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    (tmp_path / "requirements.txt").write_text("-r missing.txt\n")
+
+    with pytest.raises(SystemExit, match="1"):
+        read_requirement_files(tmp_path, ["requirements.txt"])
+
+
+def test_merge_requirements() -> None:
+    """Test requirements of the same distribution and marker are merged."""
+    merged = merge_requirements(
+        [
+            ("pytest>=7.4.3", "tox-ansible"),
+            ("Pytest[testing]<9", "requirements.txt"),
+            ("pytest==8.4.1", "test-requirements.txt"),
+            ("requests; python_version < '3.11'", "requirements.txt"),
+            ("requests>=2", "requirements.txt"),
+            ("lib>=1", "requirements.txt"),
+            ("lib @ https://example.com/lib-1.0-py3-none-any.whl", "requirements.txt"),
+            ("./vendored", "requirements.txt"),
+            ("./vendored", "test-requirements.txt"),
+        ],
+    )
+
+    assert merged == [
+        "pytest[testing]<9,==8.4.1,>=7.4.3",
+        'requests; python_version < "3.11"',
+        "requests>=2",
+        "lib @ https://example.com/lib-1.0-py3-none-any.whl",
+        "./vendored",
+    ]
+
+
+@pytest.mark.parametrize(
+    "lines",
+    (
+        pytest.param(["pytest>=7.4.3", "pytest==7.0.0"], id="pin-below-minimum"),
+        pytest.param(["pytest==8.0.0", "pytest==8.1.0"], id="two-pins"),
+        pytest.param(["lib @ https://a/lib.whl", "lib @ https://b/lib.whl"], id="two-urls"),
+    ),
+)
+def test_conflicting_requirements(lines: list[str]) -> None:
+    """Test requirements no version satisfies together are fatal.
+
+    Args:
+        lines: The conflicting requirements.
+    """
+    with pytest.raises(SystemExit, match="1"):
+        merge_requirements([(line, "requirements.txt") for line in lines])
+
+
+def test_lock_resolved_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a lock is resolved with pip and reused until its inputs change.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    wheels = tmp_path / "wheels"
+    _wheel(wheels, "top", "1.0.0", "dep>=1", "ansible-core")
+    _wheel(wheels, "dep", "1.1.0")
+    _wheel(wheels, "dep", "1.2.0")
+    _wheel(wheels, "ansible_core", "2.19.0")
+    python = Path(sys.executable)
+    requirements = ["--no-index", f"--find-links {wheels}", "top", "dep<1.2"]
+    locks_dir = tmp_path / "locks"
+
+    assert DependencyLocks(locks_dir).ensure("py3.13-2.19", python, requirements)
+    lock_file = locks_dir / "py3.13-2.19.txt"
+    header, *pins = lock_file.read_text().splitlines()
+    assert header.startswith(f"{LOCK_HEADER} ")
+    assert pins == ["dep==1.1.0", "top==1.0.0"]
+
+    monkeypatch.setattr(dependencies, "resolve_pins", pytest.fail)
+    locks = DependencyLocks(locks_dir)
+    assert locks.ensure("py3.13-2.19", python, requirements)
+    assert locks.resolved == {"py3.13-2.19": True}
+
+    resolved: list[list[str]] = []
+    monkeypatch.setattr(
+        dependencies,
+        "resolve_pins",
+        lambda _, reqs, __: resolved.append(reqs) or ["dep==1.2.0"],
+    )
+    locks = DependencyLocks(locks_dir, refresh=True)
+    assert locks.ensure("py3.13-2.19", python, requirements)
+    assert locks.ensure("py3.13-2.19", python, requirements)
+    changed = [*requirements[:-1], "dep>=1.2"]
+    assert DependencyLocks(locks_dir).ensure("py3.13-2.19", python, changed)
+    assert resolved == [requirements, changed]
+    assert lock_file.read_text().splitlines()[1:] == ["dep==1.2.0"]
+
+
+def test_lock_unresolved(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a failed resolution leaves a lock without pins, not retried for the same inputs.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    locks_dir = tmp_path / "locks"
+    lock_file = locks_dir / "py3.13-2.19.txt"
+    python = tmp_path / "python"
+
+    assert not DependencyLocks(locks_dir).ensure("py3.13-2.19", python, ["top"])
+    digest = lock_digest(python, ["top"])
+    assert lock_file.read_text() == f"{LOCK_HEADER} {UNRESOLVED} {digest}\n"
+
+    monkeypatch.setattr(dependencies, "resolve_pins", pytest.fail)
+    assert not DependencyLocks(locks_dir).ensure("py3.13-2.19", python, ["top"])
+
+    monkeypatch.setattr(dependencies, "resolve_pins", lambda *_: ["top==1.0.0"])
+    assert DependencyLocks(locks_dir, refresh=True).ensure("py3.13-2.19", python, ["top"])
+    assert lock_file.read_text().splitlines()[1:] == ["top==1.0.0"]
+
+
+def test_lock_skipped_offline(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a lock skipped offline is resolved by the next run online.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    locks_dir = tmp_path / "locks"
+    lock_file = locks_dir / "py3.13-2.19.txt"
+    python = tmp_path / "python"
+    monkeypatch.setattr(dependencies, "resolve_pins", lambda *_: ["top==1.0.0"])
+
+    assert not DependencyLocks(locks_dir, offline=True).ensure("py3.13-2.19", python, ["top"])
+    assert lock_file.read_text() == f"{LOCK_HEADER} {UNRESOLVED}\n"
+    assert DependencyLocks(locks_dir).ensure("py3.13-2.19", python, ["top"])
+    assert lock_file.read_text().splitlines()[1:] == ["top==1.0.0"]
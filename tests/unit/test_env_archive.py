@@ -0,0 +1,215 @@
+"""Unit tests for the portable archives of the provisioned environments."""
+
+from __future__ import annotations
+
+import json
+import tarfile
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from tox_ansible.env_archive import (
+    MANIFEST_NAME,
+    archive_path,
+    export_env,
+    import_env,
+    relocate,
+)
+from tox_ansible.provision import PROVISION_PENDING, PROVISION_STAMP
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _provisioned_env(project_dir: Path) -> Path:
+    """Lay out a provisioned environment and the shared files it uses.
+
+    Args:
+        project_dir: The project directory, holding the work dir.
+
+    Returns:
+        The environment directory.
+    """
+    work_dir = project_dir / ".tox"
+    env_dir = work_dir / "unit"
+    (env_dir / "bin").mkdir(parents=True)
+    (env_dir / "log").mkdir()
+    (env_dir / "log" / "1-install.log").write_text("log")
+    (env_dir / "pyvenv.cfg").write_text(f"command = python -m virtualenv {env_dir}\n")
+    (env_dir / "bin" / "pytest").write_text(f"#!{env_dir}/bin/python\n")
+    (env_dir / "bin" / "module.pyc").write_bytes(f"\0{env_dir}".encode())
+    (env_dir / "collection").symlink_to(project_dir)
+    (env_dir / "layers.pth").write_text(f"{work_dir}/.tox-ansible/layers/py3.13/key\n")
+    (env_dir / PROVISION_STAMP).write_text("fingerprint")
+    (env_dir / PROVISION_PENDING).write_text("fingerprint")
+    layer = work_dir / ".tox-ansible" / "layers" / "py3.13" / "key"
+    layer.mkdir(parents=True)
+    (layer / "pytest.py").write_text("")
+    lock = work_dir / ".tox-ansible" / "locks" / "py3.13-2.19.txt"
+    lock.parent.mkdir(parents=True)
+    lock.write_text("# tox-ansible lock\n")
+    return env_dir
+
+
+def _export(env_dir: Path, archive_dir: Path) -> Path:
+    """Export an environment laid out by ``_provisioned_env``.
+
+    Args:
+        env_dir: The environment directory.
+        archive_dir: The directory receiving the archive.
+
+    Returns:
+        The archive.
+    """
+    shared = env_dir.parent / ".tox-ansible"
+    archive = archive_path(archive_dir, "unit")
+    export_env(
+        archive,
+        env_name="unit",
+        env_dir=env_dir,
+        project_dir=env_dir.parent.parent,
+        fingerprint="fingerprint",
+        shared=[shared / "layers" / "py3.13" / "key", shared / "locks" / "py3.13-2.19.txt"],
+    )
+    return archive
+
+
+def test_relocate(tmp_path: Path) -> None:
+    """Test the paths of the old location are rewritten once, in text files and symlinks.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    (tmp_path / "script").write_text("#!/old/work/env/bin/python\n/old/work/x /old/project\n")
+    (tmp_path / "binary").write_bytes(b"\0/old/work/env")
+    (tmp_path / "link").symlink_to("/old/project/src")
+    (tmp_path / "base").symlink_to("/usr/bin/python3")
+
+    rewritten = relocate(
+        tmp_path,
+        {
+            "/old/work/env": "/new/work/env",
+            "/old/work": "/old/work/new",
+            "/old/project": "/elsewhere",
+        },
+    )
+
+    assert rewritten == 2  # noqa: PLR2004
+    assert (tmp_path / "script").read_text() == (
+        "#!/new/work/env/bin/python\n/old/work/new/x /elsewhere\n"
+    )
+    assert (tmp_path / "binary").read_bytes() == b"\0/old/work/env"
+    assert str((tmp_path / "link").readlink()) == "/elsewhere/src"
+    assert str((tmp_path / "base").readlink()) == "/usr/bin/python3"
+
+
+def test_export_import(tmp_path: Path) -> None:
+    """Test an environment exported from a work dir is imported into another one.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    source_env = _provisioned_env(tmp_path / "a")
+    archive = _export(source_env, tmp_path / "archives")
+
+    with tarfile.open(archive, mode="r|gz") as tar:
+        members = [member.name for member in tar]
+    assert members[0] == MANIFEST_NAME
+    assert "env/log" not in members
+    assert f"env/{PROVISION_PENDING}" not in members
+    assert "shared/locks/py3.13-2.19.txt" in members
+
+    project_dir = tmp_path / "b"
+    env_dir = project_dir / ".tox" / "unit"
+    (env_dir / "log").mkdir(parents=True)
+    (env_dir / "pyvenv.cfg").write_text("created by tox\n")
+
+    assert import_env(
+        archive,
+        env_name="unit",
+        env_dir=env_dir,
+        project_dir=project_dir,
+        fingerprint=lambda: "fingerprint",
+    )
+
+    work_dir = project_dir / ".tox"
+    assert (env_dir / "pyvenv.cfg").read_text() == f"command = python -m virtualenv {env_dir}\n"
+    assert (env_dir / "bin" / "pytest").read_text() == f"#!{env_dir}/bin/python\n"
+    assert (env_dir / "bin" / "module.pyc").read_bytes() == f"\0{source_env}".encode()
+    assert (env_dir / "collection").readlink() == project_dir
+    assert (env_dir / "layers.pth").read_text() == f"{work_dir}/.tox-ansible/layers/py3.13/key\n"
+    assert (env_dir / PROVISION_STAMP).read_text() == "fingerprint"
+    assert sorted(path.name for path in (env_dir / "log").iterdir()) == []
+    assert (work_dir / ".tox-ansible" / "layers" / "py3.13" / "key" / "pytest.py").is_file()
+    assert (work_dir / ".tox-ansible" / "locks" / "py3.13-2.19.txt").is_file()
+    assert not any((work_dir / ".tox-ansible").glob("import-*"))
+
+    # Already holding the environment of the archive.
+    assert not import_env(
+        archive,
+        env_name="unit",
+        env_dir=env_dir,
+        project_dir=project_dir,
+        fingerprint=pytest.fail,
+    )
+
+
+def test_import_other_inputs(tmp_path: Path) -> None:
+    """Test an archive of an environment provisioned with other inputs is not imported.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    archive = _export(_provisioned_env(tmp_path / "a"), tmp_path / "archives")
+    project_dir = tmp_path / "b"
+    env_dir = project_dir / ".tox" / "unit"
+    env_dir.mkdir(parents=True)
+    (env_dir / "pyvenv.cfg").write_text("created by tox\n")
+
+    for env_name, fingerprint in (("unit", "other"), ("sanity", "fingerprint")):
+        assert not import_env(
+            archive,
+            env_name=env_name,
+            env_dir=env_dir,
+            project_dir=project_dir,
+            fingerprint=lambda value=fingerprint: value,  # type: ignore[misc]
+        )
+    assert (env_dir / "pyvenv.cfg").read_text() == "created by tox\n"
+    # The shared files are content addressed, and kept.
+    assert (project_dir / ".tox" / ".tox-ansible" / "locks" / "py3.13-2.19.txt").is_file()
+
+    archive.write_bytes(b"not an archive")
+    assert not import_env(
+        archive,
+        env_name="unit",
+        env_dir=env_dir,
+        project_dir=project_dir,
+        fingerprint=pytest.fail,
+    )
+
+
+def test_manifest(tmp_path: Path) -> None:
+    """Test the manifest records the fingerprint and the original paths.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    env_dir = _provisioned_env(tmp_path)
+    archive = _export(env_dir, tmp_path / "archives")
+
+    with tarfile.open(archive) as tar:
+        stream = tar.extractfile(MANIFEST_NAME)
+        assert stream is not None
+        manifest = json.loads(stream.read())
+
+    assert manifest == {
+        "env": "unit",
+        "env_dir": str(env_dir),
+        "fingerprint": "fingerprint",
+        "format": "1",
+        "project_dir": str(tmp_path),
+        "shared": ["layers/py3.13/key", "locks/py3.13-2.19.txt"],
+        "work_dir": str(tmp_path / ".tox"),
+    }
@@ -0,0 +1,67 @@
+"""Unit tests for the parsed environment factors."""
+
+from __future__ import annotations
+
+from tox_ansible.matrix import EnvFactors, custom_sort, env_factors
+
+
+def test_env_factors_parse() -> None:
+    """Test a generated environment name is split into its factors."""
+    factors = env_factors("unit-py3.13-2.19")
+
+    assert factors.parts == ("unit", "py3.13", "2.19")
+    assert factors.test_type == "unit"
+    assert factors.python == "py3.13"
+    assert factors.py_version == "3.13"
+    assert factors.python_version == (3, 13)
+    assert factors.core == "2.19"
+    assert not factors.flags
+    assert factors.py_candidates == ("3.13",)
+    assert factors.sort_key == custom_sort("unit-py3.13-2.19")
+    assert factors.is_ansible_env
+
+
+def test_env_factors_interned() -> None:
+    """Test every hook shares one parsed instance per name."""
+    assert env_factors("sanity-py3.12-devel") is env_factors("sanity-py3.12-devel")
+    assert env_factors("sanity-py3.12-devel") == EnvFactors.parse("sanity-py3.12-devel")
+
+
+def test_env_factors_galaxy() -> None:
+    """Test the single-name galaxy environment."""
+    factors = env_factors("galaxy")
+
+    assert factors.test_type == "galaxy"
+    assert not factors.python
+    assert not factors.core
+    assert factors.py_candidates == ("3.14",)
+    assert factors.is_ansible_env
+
+
+def test_env_factors_flags_and_compact_python() -> None:
+    """Test extra factors and a compact python factor."""
+    factors = env_factors("unit-py313-extra-2.19")
+
+    assert factors.python_version == (3, 13)
+    assert factors.flags == ("extra",)
+    assert factors.core == "2.19"
+    assert not factors.is_ansible_env
+
+
+def test_env_factors_foreign_env() -> None:
+    """Test names tox-ansible does not manage."""
+    assert not env_factors("lint").is_ansible_env
+    assert not env_factors("lint").python
+    assert not env_factors("docs-foo-bar").is_ansible_env
+    assert env_factors("integration-foo-foo").py_candidates == ()
+
+
+def test_env_factors_in_scope() -> None:
+    """Test scope matching by test type or exact name."""
+    factors = env_factors("unit-py3.13-2.19")
+
+    assert factors.in_scope("all")
+    assert factors.in_scope("unit")
+    assert factors.in_scope("unit-py3.13-2.19")
+    assert not factors.in_scope("sanity")
+    assert not factors.in_scope("un")
@@ -0,0 +1,89 @@
+"""Unit tests for the compiled environment filter."""
+
+from __future__ import annotations
+
+import pytest
+
+from tox.config.loader.str_convert import StrConvert
+
+from tox_ansible.matrix import ENV_LIST, EnvFilter, custom_sort, env_factors
+
+
+def _naive(env_names: list[str], scope: str, skip: list[str], excluded: set[str]) -> list[str]:
+    """Filter environment names the straightforward way.
+
+    Args:
+        env_names: The candidate environment names.
+        scope: The matrix scope.
+        skip: The skip fragments.
+        excluded: The excluded test types.
+
+    Returns:
+        The kept names in sorted order.
+    """
+    return sorted(
+        (
+            env
+            for env in env_names
+            if env_factors(env).in_scope(scope)
+            and env.split("-")[0] not in excluded
+            and all(fragment not in env for fragment in skip)
+        ),
+        key=custom_sort,
+    )
+
+
+LARGE_MATRIX = [
+    *StrConvert()
+    .to_env_list(
+        "{integration, molecule, sanity, unit}-py3.{11,12,13,14}-{a,b,c,d,e,f}-"
+        "{2.16, 2.17, 2.18, 2.19, 2.20, 2.21, milestone, devel}",
+    )
+    .envs,
+    "galaxy",
+]
+
+
+@pytest.mark.parametrize("scope", ("all", "galaxy", "unit", "sanity-py3.12", "unit-py3.13-b-2.19"))
+@pytest.mark.parametrize(
+    ("skip", "excluded"),
+    (
+        ([], set()),
+        (["devel", "py3.11", "-c-", "2.1"], {"molecule"}),
+        (["milestone", "milestone", "a-2.20"], {"integration", "molecule"}),
+        (["galaxy"], set()),
+    ),
+)
+def test_filter_matches_naive(scope: str, skip: list[str], excluded: set[str]) -> None:
+    """Test the compiled filter keeps exactly what substring scanning keeps.
+
+    Args:
+        scope: The matrix scope.
+        skip: The skip fragments.
+        excluded: The excluded test types.
+    """
+    env_filter = EnvFilter.compile(scope=scope, skip=skip, excluded_types=excluded)
+
+    assert env_filter.apply(LARGE_MATRIX) == _naive(LARGE_MATRIX, scope, skip, excluded)
+
+
+def test_filter_regex_metacharacters() -> None:
+    """Test skip fragments are matched literally."""
+    env_filter = EnvFilter.compile(skip=["py3.1*"])
+
+    assert env_filter.apply(["unit-py3.13-2.19", "unit-py3.1*-2.19"]) == ["unit-py3.13-2.19"]
+
+
+def test_filter_empty_fragment_skips_everything() -> None:
+    """Test an empty fragment matches every name, as a substring check would."""
+    env_names = StrConvert().to_env_list(ENV_LIST).envs
+
+    assert not EnvFilter.compile(skip=[""]).apply(env_names)
+
+
+def test_filter_without_skip() -> None:
+    """Test no pattern is compiled without skip fragments."""
+    env_filter = EnvFilter.compile(scope="unit")
+
+    assert env_filter.skip is None
+    assert env_filter.apply(["unit-py3.13-2.19", "sanity-py3.13-2.19"]) == ["unit-py3.13-2.19"]
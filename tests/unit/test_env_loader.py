@@ -0,0 +1,777 @@
+"""Unit tests for the lazily computed environment configuration."""
+
+from __future__ import annotations
+
+import io
+import shutil
+import subprocess
+import tarfile
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, cast
+
+import pytest
+
+from tox.config.cli.parse import Options
+from tox.config.cli.parser import Parsed
+from tox.config.main import Config
+from tox.config.source import discover_source
+from tox.report import ToxHandler
+from tox.session.env_select import CliEnv
+from tox.session.state import State
+
+from tox_ansible import environment
+from tox_ansible.base_env import BaseEnv
+from tox_ansible.collection_cache import CollectionCache
+from tox_ansible.core_cache import CoreWheelCache, core_cache
+from tox_ansible.dependencies import DependencyLocks
+from tox_ansible.environment import (
+    AnsibleTestLoader,
+    add_env_config,
+    after_run_commands,
+    before_install,
+    before_run_commands,
+)
+from tox_ansible.provision import PROVISION_STAMP, start_provision_only
+
+
+if TYPE_CHECKING:
+    from tox.config.sets import EnvConfigSet
+    from tox.tox_env.api import ToxEnv
+
+    from tox_ansible.layers import Layer
+    from tox_ansible.project import Collection
+
+
+def _make_env_conf(
+    tmp_path: Path,
+    env_name: str,
+    *,
+    coverage: bool | None = None,
+    reprovision: bool = False,
+    runner: str = "virtualenv",
+) -> tuple[EnvConfigSet, State]:
+    """Create an environment configuration and its tox state.
+
+    Args:
+        tmp_path: The project directory.
+        env_name: The environment name.
+        coverage: An explicit CLI coverage value.
+        reprovision: Whether ``--ansible-reprovision`` is given.
+        runner: The tox runner of the environment.
+
+    Returns:
+        The environment configuration and the state.
+    """
+    ini_file = tmp_path / "tox-ansible.ini"
+    ini_file.write_text("[ansible]\n")
+    source = discover_source(ini_file, None)
+    parsed = Parsed(
+        work_dir=tmp_path / ".tox",
+        override=[],
+        config_file=ini_file,
+        root_dir=tmp_path,
+        ansible=True,
+        coverage=coverage,
+        ansible_reprovision=reprovision,
+    )
+    env_conf = Config.make(
+        parsed=parsed,
+        pos_args=[],
+        source=source,
+        extra_envs=[],
+    ).get_env(env_name)
+    env_conf.add_config(
+        keys=["env_dir", "envdir"],
+        of_type=Path,
+        default=tmp_path / ".tox" / env_name,
+        desc="",
+    )
+    env_conf.add_config(keys=["runner"], of_type=str, default=runner, desc="")
+    output = io.BytesIO()
+    wrapper = io.TextIOWrapper(output, encoding="utf-8", line_buffering=True)
+    state = State(
+        options=Options(
+            parsed=parsed,
+            pos_args="",
+            source=source,
+            cmd_handlers={},
+            log_handler=ToxHandler(level=0, is_colored=False, out_err=(wrapper, wrapper)),
+        ),
+        args=[],
+    )
+    return env_conf, state
+
+
+def _loader(env_conf: EnvConfigSet) -> AnsibleTestLoader:
+    """Return the ansible loader of an environment.
+
+    Args:
+        env_conf: The environment configuration.
+
+    Returns:
+        The ansible loader.
+    """
+    loader = env_conf.loaders[-1]
+    assert isinstance(loader, AnsibleTestLoader)
+    return loader
+
+
+def test_nothing_computed_on_add(tmp_path: Path) -> None:
+    """Test adding the configuration computes no value and reads no project file.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19")
+
+    add_env_config(env_conf, state)
+    loader = _loader(env_conf)
+
+    assert not dict(loader.raw)
+    assert "commands" in loader.raw
+    assert loader.found_keys() == {
+        "allowlist_externals",
+        "base_python",
+        "commands",
+        "commands_pre",
+        "deps",
+        "description",
+        "passenv",
+        "setenv",
+        "skip_install",
+    }
+    # galaxy.yml is missing, which only matters once a command is needed.
+    assert loader.raw["description"] == "Unit tests using ansible-core 2.19 and python 3.13"
+    with pytest.raises(SystemExit, match="1"):
+        _ = loader.raw["commands"]
+
+
+def test_values_are_memoized(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test each value is computed once however often tox reads it.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19")
+    calls: list[dict[str, Any]] = []
+    conf_commands = environment.conf_commands
+
+    def _counting_conf_commands(**kwargs: Any) -> list[str]:  # noqa: ANN401
+        """Count command builds.
+
+        Args:
+            **kwargs: The conf_commands arguments.
+
+        Returns:
+            The commands.
+        """
+        calls.append(kwargs)
+        return conf_commands(**kwargs)
+
+    monkeypatch.setattr(environment, "conf_commands", _counting_conf_commands)
+    add_env_config(env_conf, state)
+    loader = _loader(env_conf)
+
+    first = loader.raw["commands"]
+    assert loader.raw["commands"] is first
+    assert loader.test_conf.commands is first
+    assert len(calls) == 1
+    assert set(loader.raw) == {"commands"}
+
+
+def test_coverage_config_written_before_commands(tmp_path: Path) -> None:
+    """Test the coverage configuration is only written when commands run.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19", coverage=True)
+    add_env_config(env_conf, state)
+    loader = _loader(env_conf)
+    coverage_config = tmp_path / ".tox" / ".tox-ansible" / "coverage" / "unit-py3.13-2.19.ini"
+
+    assert f"--cov-config={coverage_config}" in loader.raw["commands"][0]
+    assert "pytest-cov>=4.1.0" in loader.raw["deps"]
+    assert not coverage_config.exists()
+
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+
+    assert "include_namespace_packages = true" in coverage_config.read_text()
+
+
+def test_no_coverage_config_without_coverage(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test nothing is written for environments without coverage.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    monkeypatch.setattr(environment, "cache_available", lambda: False)
+    env_conf, state = _make_env_conf(tmp_path, "integration-py3.13-2.19", coverage=True)
+    add_env_config(env_conf, state)
+
+    assert _loader(env_conf).test_conf.coverage_config is None
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+
+    assert not (tmp_path / ".tox" / ".tox-ansible").exists()
+
+
+def test_sanity_artifact_built_before_commands(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test sanity installs the session artifact, built when commands run.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    built: list[Path] = []
+
+    def _build(project_dir: Path, output_dir: Path, collection: Collection) -> Path:
+        """Fake the collection build.
+
+        Args:
+            project_dir: The collection root directory.
+            output_dir: The directory receiving the tarball.
+            collection: The collection info.
+
+        Returns:
+            The built tarball.
+        """
+        assert collection.name == "test"
+        built.append(project_dir)
+        tarball = output_dir / "test-test-1.0.0.tar.gz"
+        tarball.write_bytes(b"tarball")
+        return tarball
+
+    monkeypatch.setattr("tox_ansible.artifact.build_collection", _build)
+    monkeypatch.setattr(environment, "cache_available", lambda: False)
+    env_conf, state = _make_env_conf(tmp_path, "sanity-py3.13-2.19")
+    add_env_config(env_conf, state)
+    pointer = tmp_path / ".tox/.tox-ansible/artifacts/pointers/sanity-py3.13-2.19"
+
+    ade_cmd, galaxy_cmd = _loader(env_conf).raw["commands_pre"][:2]
+    assert "--im none;" in ade_cmd
+    assert galaxy_cmd.startswith("bash -c 'ansible-galaxy collection install --force -p ")
+    assert galaxy_cmd.endswith(f" $(cat {pointer})'")
+    # The commands do not hash the sources the artifact is named after.
+    assert "artifact" not in _loader(env_conf).test_conf.__dict__
+
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+
+    artifact = _loader(env_conf).test_conf.artifact
+    assert artifact is not None
+    assert pointer.read_text() == str(artifact.path)
+    assert artifact.path.read_bytes() == b"tarball"
+    assert built == [tmp_path]
+
+
+def test_galaxy_imports_artifact(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test galaxy imports the session artifact, or the source tree when it cannot be built.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    env_conf, state = _make_env_conf(tmp_path, "galaxy")
+    for key in ("env_tmp_dir", "env_log_dir", "env_python"):
+        env_conf.add_config(keys=[key], of_type=Path, default=tmp_path / key, desc="")
+    add_env_config(env_conf, state)
+    artifact = _loader(env_conf).test_conf.artifact
+    assert artifact is not None
+
+    command = _loader(env_conf).raw["commands"][0]
+    assert f"galaxy_importer.main {artifact.path} --output-path" in command
+
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0\nmanifest:")
+    monkeypatch.setattr("tox_ansible.artifact.cli_builder_available", lambda: False)
+    env_conf, state = _make_env_conf(tmp_path, "galaxy")
+    for key in ("env_tmp_dir", "env_log_dir", "env_python"):
+        env_conf.add_config(keys=[key], of_type=Path, default=tmp_path / key, desc="")
+    add_env_config(env_conf, state)
+
+    assert _loader(env_conf).test_conf.artifact is None
+    assert "--git-clone-path" in _loader(env_conf).raw["commands"][0]
+
+
+def test_core_pointer_written_before_commands(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the deps install the cached ansible-core wheel, and ade the branch without one.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    installer = pytest.importorskip("ansible_dev_environment.subcommands.installer")
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    wheel = tmp_path / "ansible_core-2.19.0-py3-none-any.whl"
+    wheels: dict[str, Path | None] = {"2.19": wheel, "2.18": None}
+    monkeypatch.setattr(environment, "cache_available", lambda: True)
+    monkeypatch.setattr(CoreWheelCache, "ensure", lambda _, core: wheels[core])
+    monkeypatch.setattr(CoreWheelCache, "revision", lambda *_: None)
+
+    for core, args, requirement in (
+        ("2.19", "", f"ansible-core @ {wheel.as_uri()}\n"),
+        ("2.18", "--acv stable-2.18", ""),
+    ):
+        env_name = f"unit-py3.13-{core}"
+        env_conf, state = _make_env_conf(tmp_path, env_name)
+        add_env_config(env_conf, state)
+        loader = _loader(env_conf)
+        pointer = tmp_path / ".tox" / ".tox-ansible" / "cores" / "acv" / env_name
+        requirements = pointer.with_name(f"{env_name}.txt")
+
+        assert f" $(cat {pointer}) --no-seed" in loader.raw["commands_pre"][0]
+        assert f"-r {requirements}" in loader.raw["deps"].splitlines()
+        loader.test_conf.write_core_requirements()
+        assert requirements.read_text() == requirement
+        before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+        assert pointer.read_text() == args
+        if args:
+            assert installer._resolve_core_package(args.split()[1]).startswith("https://")
+
+
+def test_devel_description_shows_revision(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the description of a moving core names its known commit, without git.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    revision = "0123456789abcdef0123456789abcdef01234567"
+    monkeypatch.setenv("TOX_ANSIBLE_CORE_REVISIONS", f"devel={revision}")
+    monkeypatch.setattr(environment, "cache_available", lambda: True)
+    monkeypatch.setattr("tox_ansible.core_cache.resolve_revision", pytest.fail)
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-devel")
+    add_env_config(env_conf, state)
+
+    assert _loader(env_conf).raw["description"] == (
+        "Unit tests using ansible-core devel (0123456789ab) and python 3.13"
+    )
+    assert not core_cache(state).revisions
+    assert core_cache(state).ttl == 3600  # noqa: PLR2004
+
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-milestone")
+    add_env_config(env_conf, state)
+    assert _loader(env_conf).raw["description"] == (
+        "Unit tests using ansible-core milestone and python 3.13"
+    )
+
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19")
+    add_env_config(env_conf, state)
+    assert _loader(env_conf).raw["description"] == (
+        "Unit tests using ansible-core 2.19 and python 3.13"
+    )
+    assert not core_cache(state).revisions
+
+
+def test_layers_composed_before_deps(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the test types share a tooling layer per python and a core layer per core.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    composed: dict[Path, list[Layer]] = {}
+    monkeypatch.setattr(
+        environment,
+        "compose",
+        lambda env_dir, _, layers, __: composed.setdefault(env_dir, layers),
+    )
+    wheel = Path("/wheels/ansible_core-2.19.0-py3-none-any.whl")
+    wheels = {"2.19": wheel, "2.18": None, "2.17": None}
+    monkeypatch.setattr(environment, "cache_available", lambda: True)
+    monkeypatch.setattr(CoreWheelCache, "wheel", lambda _, core: wheels[core])
+    monkeypatch.setattr(CoreWheelCache, "acv", lambda _, core: f"stable-{core}")
+
+    for env_name in ("unit-py3.13-2.19", "sanity-py3.13-2.19", "unit-py3.13-2.18", "galaxy"):
+        env_conf, state = _make_env_conf(tmp_path, env_name)
+        env_conf.add_config(keys=["env_python"], of_type=Path, default=tmp_path / "py", desc="")
+        add_env_config(env_conf, state)
+        tox_env = cast("ToxEnv", SimpleNamespace(conf=env_conf))
+        before_install(tox_env, "package_deps")
+        before_install(tox_env, "deps")
+
+    work_dir = tmp_path / ".tox"
+    unit, sanity, other = (
+        composed[work_dir / name]
+        for name in ("unit-py3.13-2.19", "sanity-py3.13-2.19", "unit-py3.13-2.18")
+    )
+    assert unit == sanity
+    core, tooling = unit
+    assert (core.name, core.requirements) == ("py3.13-2.19", (wheel.as_uri(),))
+    assert (tooling.name, tooling.requirements) == ("py3.13", environment.TOOLING_LAYER_DEPS)
+    assert tooling.exclude == ("ansible-core",)
+    assert tooling.layers_dir == work_dir / ".tox-ansible" / "layers"
+    assert other == [tooling]
+
+    # uv ignores the .pth of the layers, the environment is populated from a base.
+    populated: dict[Path, BaseEnv] = {}
+    monkeypatch.setattr(
+        BaseEnv,
+        "populate",
+        lambda base, env_dir, _: populated.setdefault(env_dir, base) is base,
+    )
+    for env_name in ("molecule-py3.13-2.17", "molecule-py3.13-2.19"):
+        env_conf, state = _make_env_conf(tmp_path, env_name, runner="uv-venv-runner")
+        env_conf.add_config(keys=["env_python"], of_type=Path, default=tmp_path / "py", desc="")
+        add_env_config(env_conf, state)
+        before_install(cast("ToxEnv", SimpleNamespace(conf=env_conf)), "deps")
+        assert work_dir / env_name not in composed
+    branch, pinned = (
+        populated[work_dir / name] for name in ("molecule-py3.13-2.17", "molecule-py3.13-2.19")
+    )
+    assert (branch.name, branch.requirements) == ("py3.13-2.17", environment.TOOLING_LAYER_DEPS)
+    assert pinned.requirements == (*environment.TOOLING_LAYER_DEPS, wheel.as_uri())
+    assert pinned.bases_dir == work_dir / ".tox-ansible" / "bases"
+
+
+def test_deps_locked_per_python_and_core(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the test types share a dependency lock per python and core.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    (tmp_path / "requirements.txt").write_text("pytest>=8\n-r test-requirements.txt\n")
+    (tmp_path / "test-requirements.txt").write_text("pytest-mock\n")
+    monkeypatch.setattr(environment, "compose", lambda *_: True)
+    wheel = Path("/wheels/ansible_core-2.19.0-py3-none-any.whl")
+    monkeypatch.setattr(environment, "cache_available", lambda: True)
+    monkeypatch.setattr(CoreWheelCache, "wheel", lambda *_: wheel)
+    ensured: list[tuple[str, list[str]]] = []
+    monkeypatch.setattr(
+        DependencyLocks,
+        "ensure",
+        lambda _, name, __, reqs: ensured.append((name, reqs)) or True,
+    )
+    lock = tmp_path / ".tox" / ".tox-ansible" / "locks" / "py3.13-2.19.txt"
+
+    deps = {}
+    for env_name in ("unit-py3.13-2.19", "molecule-py3.13-2.19", "sanity-py3.13-2.19"):
+        env_conf, state = _make_env_conf(tmp_path, env_name)
+        env_conf.add_config(keys=["env_python"], of_type=Path, default=tmp_path / "py", desc="")
+        add_env_config(env_conf, state)
+        deps[env_name] = _loader(env_conf).raw["deps"].splitlines()
+        before_install(cast("ToxEnv", SimpleNamespace(conf=env_conf)), "deps")
+
+    assert "pytest>=7.4.3,>=8" in deps["unit-py3.13-2.19"]
+    assert deps["unit-py3.13-2.19"][-2:] == ["pytest-mock", f"-c {lock}"]
+    assert deps["molecule-py3.13-2.19"][-1] == f"-c {lock}"
+    assert not any(dep.startswith("-c") for dep in deps["sanity-py3.13-2.19"])
+    unit, molecule = ensured
+    assert unit == molecule
+    name, requirements = unit
+    assert name == "py3.13-2.19"
+    assert {
+        environment.MOLECULE_DEP,
+        "pytest-cov>=4.1.0",
+        f"ansible-core @ {wheel.as_uri()}",
+    } <= set(
+        requirements,
+    )
+
+
+@pytest.mark.parametrize(
+    ("acv", "runner", "locked"),
+    (
+        pytest.param("stable-2.19", "virtualenv", False, id="branch"),
+        pytest.param("devel", "virtualenv", False, id="devel"),
+        pytest.param(
+            "https://github.com/ansible/ansible/archive/abc.tar.gz",
+            "virtualenv",
+            True,
+            id="archive",
+        ),
+        pytest.param(
+            "https://github.com/ansible/ansible/archive/abc.tar.gz",
+            "uv-venv-runner",
+            False,
+            id="uv",
+        ),
+    ),
+)
+def test_deps_lock_skipped(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    acv: str,
+    runner: str,
+    *,
+    locked: bool,
+) -> None:
+    """Test a branch core named without its archive and the tox-uv runners are not locked.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+        acv: The ansible-core installed by ade.
+        runner: The tox runner of the environment.
+        locked: Whether the dependencies are locked.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    monkeypatch.setattr(environment, "compose", lambda *_: True)
+    monkeypatch.setattr(environment, "cache_available", lambda: True)
+    monkeypatch.setattr(CoreWheelCache, "wheel", lambda *_: None)
+    monkeypatch.setattr(CoreWheelCache, "acv", lambda *_: acv)
+    ensured: list[list[str]] = []
+    monkeypatch.setattr(
+        DependencyLocks,
+        "ensure",
+        lambda _, __, ___, reqs: ensured.append(reqs) or True,
+    )
+
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19", runner=runner)
+    env_conf.add_config(keys=["env_python"], of_type=Path, default=tmp_path / "py", desc="")
+    add_env_config(env_conf, state)
+    deps = _loader(env_conf).raw["deps"].splitlines()
+    before_install(cast("ToxEnv", SimpleNamespace(conf=env_conf)), "deps")
+
+    assert any(dep.startswith("-c ") for dep in deps) is locked
+    assert len(ensured) == locked
+    if locked:
+        assert f"ansible-core @ {acv}" in ensured[0]
+
+
+def _provision(tmp_path: Path, env_name: str, *, reprovision: bool = False) -> list[str]:
+    """Prepare an environment in a new session and run its recording command.
+
+    Args:
+        tmp_path: The project directory.
+        env_name: The environment name.
+        reprovision: Whether ``--ansible-reprovision`` is given.
+
+    Returns:
+        The pre-run commands of the environment.
+    """
+    env_conf, state = _make_env_conf(tmp_path, env_name, reprovision=reprovision)
+    add_env_config(env_conf, state)
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+    commands_pre: list[str] = _loader(env_conf).raw["commands_pre"]
+    if commands_pre:
+        subprocess.run(commands_pre[-1], shell=True, check=True)
+    return commands_pre
+
+
+def test_commands_pre_skipped_when_provisioned(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test an environment is provisioned again only when its inputs change.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    (tmp_path / "requirements.txt").write_text("requests\n")
+    monkeypatch.setattr(environment, "cache_available", lambda: False)
+    monkeypatch.setattr(environment, "download_available", lambda: False)
+    stamp = tmp_path / ".tox" / "unit-py3.13-2.19" / PROVISION_STAMP
+
+    first = _provision(tmp_path, "unit-py3.13-2.19")
+    assert "ade install -e" in first[0]
+    assert PROVISION_STAMP in first[-1]
+    assert stamp.is_file()
+    assert _provision(tmp_path, "unit-py3.13-2.19") == []
+
+    (tmp_path / "requirements.txt").write_text("requests>=2\n")
+    assert _provision(tmp_path, "unit-py3.13-2.19") == first
+    assert _provision(tmp_path, "unit-py3.13-2.19") == []
+    assert _provision(tmp_path, "unit-py3.13-2.19", reprovision=True) == first
+
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "requirements.yml").write_text("collections: []\n")
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19")
+    add_env_config(env_conf, state)
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+    assert not stamp.exists()
+    assert "ade install -r tests/requirements.yml" in _loader(env_conf).raw["commands_pre"][1]
+
+
+def test_provision_only_skips_tests(tmp_path: Path) -> None:
+    """Test provisioning only keeps commands_pre and orders the environments by core.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19")
+    options = state.conf.options
+    options.provision_only = True
+    options.command = "run-parallel"
+    options.env = CliEnv()
+    start_provision_only(state, ["integration-py3.13-2.19", "unit-py3.13-2.19"])
+
+    add_env_config(env_conf, state)
+    loader = _loader(env_conf)
+
+    assert "depends" in loader.found_keys()
+    assert loader.raw["commands"] == []
+    assert loader.raw["commands_pre"]
+    assert loader.raw["depends"].envs == ["integration-py3.13-2.19"]
+
+
+def test_provisioned_env_exported_and_imported(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a provisioned environment moves to another project through its archive.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(environment, "cache_available", lambda: False)
+    monkeypatch.setattr(environment, "download_available", lambda: False)
+    archive_dir = tmp_path / "archives"
+    env_name = "unit-py3.13-2.19"
+    for project in ("a", "b"):
+        project_dir = tmp_path / project
+        env_dir = project_dir / ".tox" / env_name
+        env_dir.mkdir(parents=True)
+        (env_dir / "pyvenv.cfg").write_text(f"command = python -m virtualenv {env_dir}\n")
+        (project_dir / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+
+    env_conf, state = _make_env_conf(tmp_path / "a", env_name)
+    state.conf.options.export_env = archive_dir
+    add_env_config(env_conf, state)
+    after_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+    assert not archive_dir.exists()
+
+    assert _provision(tmp_path / "a", env_name)
+    after_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+    assert (archive_dir / f"{env_name}.tar.gz").is_file()
+
+    env_conf, state = _make_env_conf(tmp_path / "b", env_name)
+    state.conf.options.import_env = archive_dir
+    add_env_config(env_conf, state)
+    env_dir = tmp_path / "b" / ".tox" / env_name
+    _loader(env_conf).test_conf.import_archive(env_dir)
+
+    assert (env_dir / PROVISION_STAMP).is_file()
+    assert _provision(tmp_path / "b", env_name) == []
+
+
+def test_moving_core_always_provisioned(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test devel is provisioned on every run unless its commit is known.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    monkeypatch.setattr(environment, "cache_available", lambda: False)
+
+    assert _provision(tmp_path, "unit-py3.13-devel")
+    assert _provision(tmp_path, "unit-py3.13-devel")
+
+    archive = "https://github.com/ansible/ansible/archive/0123abc.tar.gz"
+    monkeypatch.setattr(environment, "cache_available", lambda: True)
+    monkeypatch.setattr(CoreWheelCache, "wheel", lambda *_: None)
+    monkeypatch.setattr(CoreWheelCache, "acv", lambda *_: archive)
+    assert _provision(tmp_path, "unit-py3.13-devel")
+    assert _provision(tmp_path, "unit-py3.13-devel") == []
+
+
+def test_sanity_syncs_provisioned_copy(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a source change is synced into the copy sanity installed, not installed again.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text(
+        "namespace: test\nname: test\nversion: 1.0.0\nreadme: README.md\nauthors: [Someone]\n",
+    )
+    (tmp_path / "README.md").write_text("readme")
+    monkeypatch.setattr(environment, "cache_available", lambda: False)
+    env_name = "sanity-py3.13-2.19"
+    install_dir = (
+        tmp_path / ".tox" / env_name / "lib" / "python3.13" / "site-packages"
+    ) / "ansible_collections/test/test"
+
+    env_conf, state = _make_env_conf(tmp_path, env_name)
+    add_env_config(env_conf, state)
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+    artifact = _loader(env_conf).test_conf.artifact_path
+    assert artifact is not None
+    with tarfile.open(artifact) as tar:
+        tar.extractall(install_dir, filter="tar")
+    subprocess.run(_loader(env_conf).raw["commands_pre"][-1], shell=True, check=True)
+
+    (tmp_path / "README.md").write_text("changed")
+    with monkeypatch.context() as patch:
+        # Nothing is built, so the sources are not hashed.
+        patch.setattr("tox_ansible.project.source_digest", pytest.fail)
+        assert _provision(tmp_path, env_name) == []
+    assert (install_dir / "README.md").read_text() == "changed"
+
+    shutil.rmtree(install_dir)
+    assert _provision(tmp_path, env_name)
+
+
+def test_requirements_installed_from_cache(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the collections of the requirements files are installed from the cache.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    (tmp_path / "tests" / "unit").mkdir(parents=True)
+    (tmp_path / "tests" / "unit" / "requirements.yml").write_text("collections: [ns.dep]\n")
+    monkeypatch.setattr(environment, "cache_available", lambda: False)
+    monkeypatch.setattr(environment, "download_available", lambda: True)
+    monkeypatch.setattr(CollectionCache, "install_args", lambda _, req: f"--offline {req}")
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19")
+    add_env_config(env_conf, state)
+    args_file = (
+        tmp_path / ".tox/.tox-ansible/collections/args/unit-py3.13-2.19/tests-unit-requirements.yml"
+    )
+    site_packages = tmp_path / ".tox" / "unit-py3.13-2.19" / "lib" / "python3.13" / "site-packages"
+
+    assert _loader(env_conf).raw["commands_pre"][1] == (
+        f"bash -c 'ansible-galaxy collection install --force -p {site_packages} $(cat {args_file})'"
+    )
+    before_run_commands(cast("ToxEnv", SimpleNamespace(conf=env_conf)))
+    assert args_file.read_text() == "--offline tests/unit/requirements.yml"
+
+    monkeypatch.setattr(environment, "download_available", lambda: False)
+    env_conf, state = _make_env_conf(tmp_path, "unit-py3.13-2.19")
+    add_env_config(env_conf, state)
+    assert "ade install -r tests/unit/requirements.yml" in _loader(env_conf).raw["commands_pre"][1]
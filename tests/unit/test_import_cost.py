@@ -0,0 +1,81 @@
+"""Import cost regression tests for the tox entry point.
+
+The plugin is loaded by every tox invocation, so importing it on top of tox
+must not pull in the matrix, project parsing or command building modules.
+"""
+
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+
+# Cumulative import time of tox_ansible.plugin, in microseconds, once tox is loaded.
+IMPORT_BUDGET_US = 10_000
+ALLOWED_MODULES = ["tox_ansible", "tox_ansible.plugin"]
+
+
+def _python(*args: str) -> subprocess.CompletedProcess[str]:
+    """Run a fresh interpreter.
+
+    Args:
+        *args: The interpreter arguments.
+
+    Returns:
+        The completed process.
+    """
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+
+def test_import_loads_no_extra_modules() -> None:
+    """Test importing the entry point only loads the hook shims."""
+    code = (
+        "import json, sys\n"
+        "import tox.plugin.manager\n"
+        "before = set(sys.modules)\n"
+        "import tox_ansible.plugin\n"
+        "print(json.dumps(sorted(set(sys.modules) - before)))\n"
+    )
+
+    assert json.loads(_python("-c", code).stdout) == ALLOWED_MODULES
+
+
+def test_import_time_budget() -> None:
+    """Test the cold import of the entry point stays within budget."""
+    proc = _python("-X", "importtime", "-c", "import tox.plugin.manager; import tox_ansible.plugin")
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if name.strip() == "tox_ansible.plugin":
+            cumulative_us = int(cumulative)
+
+    assert cumulative_us is not None, proc.stderr
+    assert cumulative_us < IMPORT_BUDGET_US
+
+
+def test_lazy_attribute_access() -> None:
+    """Test names moved out of the entry point are still reachable from it."""
+    code = (
+        "import sys\n"
+        "import tox_ansible.plugin as plugin\n"
+        "assert 'tox_ansible.matrix' not in sys.modules\n"
+        "from tox_ansible.plugin import ENV_LIST, conf_deps, get_collection\n"
+        "from tox_ansible import environment, matrix, project\n"
+        "assert ENV_LIST is matrix.ENV_LIST\n"
+        "assert conf_deps is environment.conf_deps\n"
+        "assert get_collection is project.get_collection\n"
+        "try:\n"
+        "    plugin.does_not_exist\n"
+        "except AttributeError:\n"
+        "    pass\n"
+        "else:\n"
+        "    raise SystemExit(1)\n"
+    )
+
+    _python("-c", code)
@@ -0,0 +1,377 @@
+"""Unit tests for the shared site-packages layers."""
+
+from __future__ import annotations
+
+import errno
+import subprocess
+import sys
+import threading
+import venv
+
+from pathlib import Path
+
+import pytest
+
+from filelock import FileLock
+
+from tox_ansible import layers
+from tox_ansible.layers import LAYERS_MARKER, LAYERS_PTH, Layer, clone_tree, compose, install_layer
+
+
+def _write_layer(target: Path, version: str) -> None:
+    """Write an installed layer stand-in, as ``pip install --target`` lays it out.
+
+    Args:
+        target: The layer directory.
+        version: The version of the probe module.
+    """
+    (target / "probe").mkdir(parents=True)
+    (target / "probe" / "__init__.py").write_text(f"VERSION = {version!r}\n")
+    (target / f"only_{version}.py").write_text("")
+    (target / "bin").mkdir()
+    script = target / "bin" / f"probe-{version}"
+    script.write_text("#!/layer/bin/python3\nimport probe\nprint(probe.VERSION)\n")
+    script.chmod(0o755)
+
+
+def _fake_install(
+    python: Path,
+    target: Path,
+    requirements: tuple[str, ...],
+    wheelhouse: Path | None = None,
+) -> bool:
+    """Fake a pip installation into a layer.
+
+    Args:
+        python: The interpreter running pip.
+        target: The layer directory.
+        requirements: The requirements, the last one naming the probe version.
+        wheelhouse: The wheelhouse to install from.
+
+    Returns:
+        True.
+    """
+    assert python.exists()
+    assert wheelhouse is None
+    _write_layer(target, requirements[-1])
+    return True
+
+
+@pytest.fixture(name="env_dir")
+def fixture_env_dir(tmp_path: Path) -> Path:
+    """Create a virtual environment without pip.
+
+    Args:
+        tmp_path: Pytest fixture.
+
+    Returns:
+        The environment directory.
+    """
+    env_dir = tmp_path / "env"
+    venv.create(env_dir, symlinks=True)
+    return env_dir
+
+
+def _python(env_dir: Path) -> Path:
+    """Return the interpreter of an environment.
+
+    Args:
+        env_dir: The environment directory.
+
+    Returns:
+        The interpreter.
+    """
+    return env_dir / "bin" / "python"
+
+
+def _run(env_dir: Path, code: str) -> str:
+    """Run code with the interpreter of an environment.
+
+    Args:
+        env_dir: The environment directory.
+        code: The code.
+
+    Returns:
+        The output, stripped.
+    """
+    cmd = [str(_python(env_dir)), "-c", code]
+    return subprocess.run(cmd, capture_output=True, check=True, text=True).stdout.strip()
+
+
+def test_import_resolution_order(
+    tmp_path: Path,
+    env_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test imports resolve from the environment, then the core layer, then the tooling layer.
+
+    Args:
+        tmp_path: Pytest fixture.
+        env_dir: The environment.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(layers, "install_layer", _fake_install)
+    python = _python(env_dir)
+    core = Layer(tmp_path / "layers", "py3.13-2.19", python, ("core",))
+    tooling = Layer(tmp_path / "layers", "py3.13", python, ("tooling",))
+
+    assert compose(env_dir, python, [core, tooling])
+
+    paths = _run(env_dir, "import sys; print('\\n'.join(sys.path))").splitlines()
+    site_dir = layers.site_packages(env_dir)
+    assert site_dir is not None
+    assert paths.index(str(site_dir)) < paths.index(str(core.path)) < paths.index(str(tooling.path))
+    assert _run(env_dir, "import probe, only_tooling; print(probe.VERSION)") == "core"
+    assert (
+        subprocess.run(
+            [str(env_dir / "bin" / "probe-tooling")],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+        == "core"
+    )
+
+    (site_dir / "probe.py").write_text("VERSION = 'env'\n")
+    assert _run(env_dir, "import probe; print(probe.VERSION)") == "env"
+
+
+def test_compose_once(tmp_path: Path, env_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test layers are installed once, read-only, and pruned once no environment uses them.
+
+    Args:
+        tmp_path: Pytest fixture.
+        env_dir: The environment.
+        monkeypatch: Pytest fixture.
+    """
+    installs: list[tuple[str, ...]] = []
+
+    def _counting_install(
+        python: Path,
+        target: Path,
+        requirements: tuple[str, ...],
+        wheelhouse: Path | None = None,
+    ) -> bool:
+        """Count the installations.
+
+        Args:
+            python: The interpreter running pip.
+            target: The layer directory.
+            requirements: The requirements.
+            wheelhouse: The wheelhouse to install from.
+
+        Returns:
+            True.
+        """
+        installs.append(requirements)
+        return _fake_install(python, target, requirements, wheelhouse)
+
+    monkeypatch.setattr(layers, "install_layer", _counting_install)
+    python = _python(env_dir)
+    other_env = tmp_path / "other"
+    venv.create(other_env, symlinks=True)
+    tooling = Layer(tmp_path / "layers", "py3.13", python, ("tooling",))
+    shared = Layer(tmp_path / "layers", "py3.13", _python(other_env), ("tooling",))
+
+    assert tooling.key == shared.key
+    assert compose(env_dir, python, [tooling])
+    assert compose(other_env, _python(other_env), [shared])
+    assert compose(env_dir, python, [tooling])
+    assert installs == [("tooling",)]
+    assert (env_dir / LAYERS_MARKER).read_text() == f"py3.13 {tooling.key}"
+    assert not (tooling.path / "probe" / "__init__.py").stat().st_mode & 0o222
+
+    moved = Layer(tmp_path / "layers", "py3.13", python, ("tooling", "moved"))
+    assert compose(env_dir, python, [moved])
+    site_dir = layers.site_packages(env_dir)
+    assert site_dir is not None
+    assert str(moved.path) in (site_dir / LAYERS_PTH).read_text()
+    # The other environment is still composed of the older key.
+    layer_keys = {path.name for path in (tmp_path / "layers" / "py3.13").iterdir()}
+    assert layer_keys == {tooling.key, moved.key}
+
+    shared_moved = Layer(tmp_path / "layers", "py3.13", _python(other_env), ("tooling", "moved"))
+    assert compose(other_env, _python(other_env), [shared_moved])
+    assert [path.name for path in (tmp_path / "layers" / "py3.13").iterdir()] == [moved.key]
+    assert installs == [("tooling",), ("tooling", "moved")]
+
+    # A failed layer is not tried again in the session.
+    session = layers.SessionLayers()
+    monkeypatch.setattr(layers, "install_layer", lambda *_: installs.append(("failing",)) or False)
+    failing = Layer(tmp_path / "layers", "py3.13", python, ("failing",))
+    assert not compose(env_dir, python, [failing], session)
+    assert not compose(other_env, _python(other_env), [failing], session)
+    assert installs[2:] == [("failing",)]
+    assert session.failed == {failing.path}
+    assert not compose(tmp_path / "not-a-venv", python, [moved])
+
+
+def test_layer_excludes_core(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the tooling layer holds no ansible-core and no ansible scripts, but its dependencies.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+
+    def _install_with_core(
+        python: Path,
+        target: Path,
+        requirements: tuple[str, ...],
+        wheelhouse: Path | None = None,
+    ) -> bool:
+        """Fake a pip installation pulling in ansible-core, as pip --target lays it out.
+
+        Args:
+            python: The interpreter running pip.
+            target: The layer directory.
+            requirements: The requirements.
+            wheelhouse: The wheelhouse to install from.
+
+        Returns:
+            True.
+        """
+        _fake_install(python, target, requirements, wheelhouse)
+        dist_info = target / "ansible_core-2.19.0.dist-info"
+        for rel_path in ("ansible/__init__.py", "ansible/cli/adhoc.py", "jinja2/__init__.py"):
+            (target / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (target / rel_path).write_text("")
+        dist_info.mkdir()
+        (target / "bin" / "ansible").write_text("#!/layer/bin/python3\n")
+        (dist_info / "RECORD").write_text(
+            "ansible/__init__.py,,\nansible/cli/adhoc.py,,\n../../bin/ansible,,\n"
+            "ansible_core-2.19.0.dist-info/RECORD,,\n",
+        )
+        return True
+
+    monkeypatch.setattr(layers, "install_layer", _install_with_core)
+    tooling = Layer(
+        tmp_path / "layers",
+        "py3.13",
+        Path(sys.executable),
+        ("pytest-ansible",),
+        exclude=("ansible-core",),
+    )
+
+    assert tooling.ensure(layers.SessionLayers())
+    assert not list(tooling.path.glob("ansible*"))
+    assert not list((tooling.path / "bin").glob("ansible*"))
+    assert (tooling.path / "jinja2" / "__init__.py").is_file()
+    assert (tooling.path / "bin" / "probe-pytest-ansible").is_file()
+    assert (
+        tooling.key != Layer(tooling.layers_dir, "py3.13", tooling.python, ("pytest-ansible",)).key
+    )
+
+
+def test_layer_waits_for_parallel_install(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test a layer installed while waiting for the lock is not installed again.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(layers, "install_layer", pytest.fail)
+    layer = Layer(tmp_path / "layers", "py3.13", Path(sys.executable), ("tooling",))
+    layer.path.parent.mkdir(parents=True)
+    result: list[bool] = []
+
+    with FileLock(tmp_path / "layers" / "py3.13.lock"):
+        thread = threading.Thread(
+            target=lambda: result.append(layer.ensure(layers.SessionLayers()))
+        )
+        thread.start()
+        thread.join(timeout=0.5)
+        assert thread.is_alive()
+        _write_layer(layer.path, "tooling")
+    thread.join()
+
+    assert result == [True]
+
+
+def test_clone_tree(tmp_path: Path) -> None:
+    """Test scripts are rewritten, other files linked and existing files kept.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    src = tmp_path / "src"
+    src.mkdir()
+    script = src / "tool"
+    script.write_text("#!/layer/bin/python3\nimport tool\n")
+    script.chmod(0o555)
+    (src / "data.sh").write_text("echo not python\n")
+    (src / "kept").write_text("layer\n")
+    dst = tmp_path / "dst"
+    dst.mkdir()
+    (dst / "kept").write_text("env\n")
+    python = tmp_path / "env" / "bin" / "python"
+
+    assert clone_tree(src, dst, python) == 2  # noqa: PLR2004
+
+    assert (dst / "tool").read_text() == f"#!{python}\nimport tool\n"
+    assert (dst / "tool").stat().st_mode & 0o777 == 0o755  # noqa: PLR2004
+    assert (dst / "data.sh").read_text() == "echo not python\n"
+    assert (dst / "kept").read_text() == "env\n"
+
+
+def test_link_file_fallbacks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a failed reflink falls back to a hard link, then to a copy.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    src = tmp_path / "src"
+    src.write_text("content")
+
+    def _unsupported(*_: object) -> None:
+        """Fail as a filesystem without the operation.
+
+        Raises:
+            OSError: Always.
+        """
+        raise OSError(errno.EOPNOTSUPP, "not supported")
+
+    monkeypatch.setattr(layers, "_reflink", _unsupported)
+    assert layers._link_file(src, tmp_path / "linked", reflink=True) is False
+    assert (tmp_path / "linked").stat().st_ino == src.stat().st_ino
+
+    monkeypatch.setattr(layers.os, "link", _unsupported)
+    assert layers._link_file(src, tmp_path / "copied", reflink=False) is False
+    assert (tmp_path / "copied").read_text() == "content"
+    assert (tmp_path / "copied").stat().st_ino != src.stat().st_ino
+
+    monkeypatch.setattr(layers, "_reflink", lambda _, dst: dst.write_text("content"))
+    assert layers._link_file(src, tmp_path / "reflinked", reflink=True) is True
+
+
+def test_reflink_platform(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test reflinks are only attempted on Linux.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.setattr(layers.sys, "platform", "darwin")
+    with pytest.raises(OSError, match="only supported on Linux"):
+        layers._reflink(tmp_path / "src", tmp_path / "dst")
+
+
+def test_install_layer(tmp_path: Path) -> None:
+    """Test pip installs into the layer, and a failure is reported.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    python = tmp_path / "python"
+    python.write_text('#!/bin/sh\nmkdir -p "$7/bin"\n: > "$7/bin/$8"\n')
+    python.chmod(0o755)
+
+    assert install_layer(python, tmp_path / "layer", ("pytest",)) is True
+    assert (tmp_path / "layer" / "bin" / "pytest").exists()
+
+    python.write_text("#!/bin/sh\necho 'no matching distribution'\nexit 1\n")
+    assert install_layer(python, tmp_path / "layer", ("pytest",)) is False
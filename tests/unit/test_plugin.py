@@ -7,6 +7,8 @@ import io
 import json
 import os
 import re
+import shutil
+import subprocess
 import typing
 
 from pathlib import Path
@@ -146,10 +148,66 @@ def test_commands_pre_sanity(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) ->
     assert len(result) == expected_commands, result
     assert "ade install --venv" in result[1]
     assert "ade install -e" not in result[1]
-    assert "git init" in result[4]
+    assert "init -q --separate-git-dir" in result[4]
+    assert "--global" not in result[4]
     assert "lib/python3.13/site-packages/ansible_collections/test/test" in result[4]
 
 
+def test_sanity_git_workspace(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Test the sanity git workspace is created once and survives a reinstallation.
+
+    Args:
+        monkeypatch: Pytest fixture.
+        tmp_path: Pytest fixture.
+    """
+    monkeypatch.delenv("GITHUB_ACTIONS", raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "home" / ".config"))
+    monkeypatch.chdir(tmp_path)
+    ini_file = tmp_path / "tox.ini"
+    ini_file.touch()
+    conf = Config.make(
+        Parsed(work_dir=tmp_path, override=[], config_file=ini_file, root_dir=tmp_path),
+        pos_args=[],
+        source=discover_source(ini_file, None),
+        extra_envs=[],
+    ).get_env("sanity-py3.13-2.19")
+    env_dir = tmp_path / "env"
+    conf.add_config(keys=["env_dir", "envdir"], of_type=Path, default=env_dir, desc="")
+    collection = Collection(name="test", namespace="test", version="1.0.0")
+    command = conf_commands_pre(
+        env_conf=conf,
+        collection=collection,
+        test_type="sanity",
+        ansible_version="2.19",
+    )[-1]
+    install_dir = _collection_install_path(conf, collection)
+    install_dir.mkdir(parents=True)
+
+    subprocess.run(command, shell=True, check=True)
+    git_dir = env_dir / ".tox-ansible-git"
+    assert (install_dir / ".git").read_text() == f"gitdir: {git_dir}\n"
+    assert (git_dir / "HEAD").read_text() == "ref: refs/heads/main\n"
+    assert not (tmp_path / "home").exists()
+
+    (git_dir / "marker").touch()
+    shutil.rmtree(install_dir)
+    install_dir.mkdir(parents=True)
+    subprocess.run(command, shell=True, check=True)
+    subprocess.run(command, shell=True, check=True)
+    assert (install_dir / ".git").read_text() == f"gitdir: {git_dir}\n"
+    assert (git_dir / "marker").is_file()
+    (install_dir / "galaxy.yml").touch()
+    listed = subprocess.run(
+        ["git", "ls-files", "--cached", "--others", "--exclude-standard"],  # noqa: S607
+        cwd=install_dir,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert listed.stdout == "galaxy.yml\n"
+
+
 def test_commands_pre_galaxy() -> None:
     """Test pre-command generation for galaxy returns empty list."""
     result = conf_commands_pre(
@@ -903,6 +961,40 @@ def test_conf_setenv_collections_path(tmp_path: Path) -> None:
     assert "site-packages" not in result
 
 
+def test_conf_setenv_shared_caches(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the installers share their caches while XDG_CACHE_HOME stays per environment.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    ini_file = tmp_path / "tox.ini"
+    ini_file.touch()
+    source = discover_source(ini_file, None)
+    config = Config.make(
+        Parsed(work_dir=tmp_path, override=[], config_file=ini_file, root_dir=tmp_path),
+        pos_args=[],
+        source=source,
+        extra_envs=[],
+    )
+    monkeypatch.delenv("PIP_CACHE_DIR", raising=False)
+    monkeypatch.setenv("UV_CACHE_DIR", "/srv/uv-cache")
+    cache_dir = tmp_path / ".tox" / ".tox-ansible" / "cache"
+
+    for env_name, test_type in (("unit-py3.13-2.19", "unit"), ("galaxy", "galaxy")):
+        conf = config.get_env(env_name)
+        conf.add_config(
+            keys=["env_dir", "envdir"],
+            of_type=Path,
+            default=tmp_path / ".tox" / env_name,
+            desc="",
+        )
+        result = conf_setenv(env_conf=conf, test_type=test_type).splitlines()
+        assert f"XDG_CACHE_HOME={tmp_path / '.tox' / env_name}/.cache" in result
+        assert f"PIP_CACHE_DIR={cache_dir / 'pip'}" in result
+        assert not any(line.startswith("UV_CACHE_DIR=") for line in result)
+
+
 def test_conf_setenv_galaxy(tmp_path: Path) -> None:
     """Test that ANSIBLE_COLLECTIONS_PATH is not set for galaxy environments.
 
@@ -0,0 +1,138 @@
+"""Unit tests for the ``--ansible-profile`` timing spans."""
+
+from __future__ import annotations
+
+import io
+import pstats
+
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, cast
+
+from tox.config.cli.parse import Options
+from tox.config.cli.parser import Parsed
+from tox.config.source import discover_source
+from tox.report import ToxHandler
+from tox.session.state import State
+
+from tox_ansible import matrix, plugin, profiling, project
+from tox_ansible.profiling import Profiler
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+
+
+def _make_state(config_file: Path) -> State:
+    """Create a tox state for profiling tests.
+
+    Args:
+        config_file: The tox configuration file.
+
+    Returns:
+        The configured tox state.
+    """
+    source = discover_source(config_file, None)
+    parsed = Parsed(
+        work_dir=config_file.parent / ".tox",
+        override=[],
+        config_file=config_file,
+        root_dir=config_file.parent,
+        ansible=True,
+    )
+    output = io.BytesIO()
+    wrapper = io.TextIOWrapper(output, encoding="utf-8", line_buffering=True)
+    return State(
+        options=Options(
+            parsed=parsed,
+            pos_args="",
+            source=source,
+            cmd_handlers={},
+            log_handler=ToxHandler(level=0, is_colored=False, out_err=(wrapper, wrapper)),
+        ),
+        args=[],
+    )
+
+
+def test_nested_spans() -> None:
+    """Test nested time counts towards the parent cumulative but not its total."""
+    profiler = Profiler()
+
+    with profiler.span("outer"):
+        for _ in range(2):
+            with profiler.span("inner"):
+                pass
+
+    outer, inner = profiler.stats["outer"], profiler.stats["inner"]
+    assert (outer.calls, inner.calls) == (1, 2)
+    assert outer.cumulative >= outer.total + inner.cumulative
+    assert inner.total == inner.cumulative
+    assert profiler.own == outer.cumulative
+    report = profiler.report().splitlines()
+    assert report[0].startswith("tox-ansible profile:")
+    assert report[2].split()[:2] == ["outer", "1"]
+    assert report[3].split()[:2] == ["inner", "2"]
+
+
+def test_helpers_wrapped_and_restored(
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test the helpers report spans while profiling and are restored after.
+
+    Args:
+        tmp_path: Pytest fixture.
+        capsys: Pytest fixture.
+    """
+    config_file = tmp_path / "tox-ansible.ini"
+    config_file.write_text("[ansible]\n")
+    original_scan = vars(project.ProjectIndex)["scan"]
+    original_load = project._load_pyproject_config
+
+    profiler = profiling.start("")
+    assert profiling.start("") is profiler
+    matrix.add_ansible_matrix(_make_state(config_file))
+    profiling.stop()
+    profiling.stop()
+
+    assert set(profiler.stats) >= {
+        "_build_project_context",
+        "_load_pyproject_config",
+        "ProjectIndex.scan",
+        "add_ansible_matrix",
+    }
+    assert profiler.stats["add_ansible_matrix"].calls == 1
+    assert vars(project.ProjectIndex)["scan"] is original_scan
+    assert project._load_pyproject_config is original_load
+    stderr = capsys.readouterr().err
+    assert "add_ansible_matrix" in stderr
+    assert "cProfile" not in stderr
+
+
+def test_run_hook_with_cprofile_dump(
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test the hook shim spans the hook and writes the cProfile statistics.
+
+    Args:
+        tmp_path: Pytest fixture.
+        capsys: Pytest fixture.
+    """
+    dump_path = tmp_path / "hooks.prof"
+    options = cast("Parsed", SimpleNamespace(ansible_profile=str(dump_path)))
+
+    assert plugin._run_hook(options, "tox_add_core_config", max, 1, 2) == 2  # noqa: PLR2004
+    profiling.stop()
+
+    assert pstats.Stats(str(dump_path)).get_stats_profile().func_profiles
+    assert f"cProfile statistics written to {dump_path}" in capsys.readouterr().err
+
+
+def test_run_hook_without_profile() -> None:
+    """Test the hook shim calls straight through without the option."""
+    options = cast("Parsed", SimpleNamespace())
+
+    assert plugin._run_hook(options, "tox_add_core_config", max, 1, 2) == 2  # noqa: PLR2004
+    assert profiling._PROFILER is None
@@ -0,0 +1,165 @@
+"""Unit tests for the session-scoped project context."""
+
+from __future__ import annotations
+
+import io
+import os
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from tox.config.cli.parse import Options
+from tox.config.cli.parser import Parsed
+from tox.config.source import discover_source
+from tox.report import ToxHandler
+from tox.session.state import State
+
+from tox_ansible import project
+from tox_ansible.matrix import add_ansible_matrix
+from tox_ansible.project import _coverage_enabled, project_context
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _make_state(config_file: Path) -> State:
+    """Create a tox state for project context tests.
+
+    Args:
+        config_file: The tox configuration file.
+
+    Returns:
+        The configured tox state.
+    """
+    source = discover_source(config_file, None)
+    parsed = Parsed(
+        work_dir=config_file.parent / ".tox",
+        override=[],
+        config_file=config_file,
+        root_dir=config_file.parent,
+        ansible=True,
+    )
+    output = io.BytesIO()
+    wrapper = io.TextIOWrapper(output, encoding="utf-8", line_buffering=True)
+    return State(
+        options=Options(
+            parsed=parsed,
+            pos_args="",
+            source=source,
+            cmd_handlers={},
+            log_handler=ToxHandler(level=0, is_colored=False, out_err=(wrapper, wrapper)),
+        ),
+        args=[],
+    )
+
+
+def _bump_mtime(path: Path) -> None:
+    """Move the modification time of a file forward.
+
+    Args:
+        path: The file to touch.
+    """
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_project_context_is_reused(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test project files are parsed once for every hook sharing a state.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    config_file = tmp_path / "tox-ansible.ini"
+    config_file.write_text("[ansible]\ncoverage = true\n")
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    state = _make_state(config_file)
+
+    calls: list[Path] = []
+    load = project._load_pyproject_config
+
+    def _counting_load(project_dir: Path) -> dict[str, object] | None:
+        """Count pyproject loads.
+
+        Args:
+            project_dir: The project directory.
+
+        Returns:
+            The parsed configuration.
+        """
+        calls.append(project_dir)
+        return load(project_dir)
+
+    monkeypatch.setattr(project, "_load_pyproject_config", _counting_load)
+
+    add_ansible_matrix(state)
+    for _ in range(3):
+        assert _coverage_enabled(state) is True
+    context = project_context(state)
+
+    assert len(calls) == 1
+    assert context.collection is project_context(state).collection
+    assert context.collection.name == "test"
+
+
+def test_project_context_per_state(tmp_path: Path) -> None:
+    """Test every tox state gets its own context.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    config_file = tmp_path / "tox-ansible.ini"
+    config_file.write_text("[ansible]\n")
+
+    assert project_context(_make_state(config_file)) is not project_context(
+        _make_state(config_file),
+    )
+
+
+def test_project_context_invalidated_on_change(tmp_path: Path) -> None:
+    """Test the context is rebuilt when a source file changes on disk.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    config_file = tmp_path / "pyproject.toml"
+    config_file.write_text('[tool.tox]\n[tool.tox-ansible]\nskip = ["devel"]\n')
+    galaxy_file = tmp_path / "galaxy.yml"
+    galaxy_file.write_text("namespace: test\nname: test\nversion: 1.0.0")
+    state = _make_state(config_file)
+
+    first = project_context(state)
+    assert first.is_current()
+    assert first.ansible_config.skip == ["devel"]
+    assert first.collection.version == "1.0.0"
+
+    galaxy_file.write_text("namespace: test\nname: test\nversion: 2.0.0")
+    _bump_mtime(galaxy_file)
+
+    assert not first.is_current()
+    second = project_context(state)
+    assert second is not first
+    assert second.collection.version == "2.0.0"
+    assert project_context(state) is second
+
+
+def test_project_context_missing_galaxy(tmp_path: Path) -> None:
+    """Test the context builds without galaxy.yml until the collection is needed.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    config_file = tmp_path / "tox-ansible.ini"
+    config_file.write_text("[ansible]\n")
+
+    context = project_context(_make_state(config_file))
+
+    assert context.is_current()
+    assert context.pyproject_config is None
+    with pytest.raises(SystemExit, match="1"):
+        _ = context.collection
+
+    (tmp_path / "galaxy.yml").write_text("namespace: test\nname: test\nversion: 1.0.0")
+    assert not context.is_current()
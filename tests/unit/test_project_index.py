@@ -0,0 +1,148 @@
+"""Unit tests for the filesystem probe index."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from tox_ansible.environment import conf_deps
+from tox_ansible.project import PYTHON_DEPENDENCY_FILES, ProjectIndex
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    import pytest
+
+
+def _write(path: Path, content: str = "") -> None:
+    """Write a file, creating its parent directories.
+
+    Args:
+        path: The file to write.
+        content: The file content.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def test_scan_empty(tmp_path: Path) -> None:
+    """Test scanning a project without any probed content.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    index = ProjectIndex.scan(tmp_path)
+
+    assert not index.files
+    assert not index.has_molecule_scenarios
+    assert not index.has_integration_tests
+    assert not index.python_requirements.requirements
+
+
+def test_scan_requirements(tmp_path: Path) -> None:
+    """Test requirements files are indexed by their relative path.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    _write(tmp_path / "tests" / "requirements.yml", "collections: []")
+    _write(tmp_path / "tests" / "molecule" / "requirements.yml", "collections: []")
+    (tmp_path / "tests" / "unit" / "requirements.yml").mkdir(parents=True)
+
+    index = ProjectIndex.scan(tmp_path)
+
+    assert index.files == {"tests/requirements.yml", "tests/molecule/requirements.yml"}
+    assert index.has_file("tests/requirements.yml")
+    assert not index.has_file("tests/unit/requirements.yml")
+
+
+def test_scan_molecule_scenarios(tmp_path: Path) -> None:
+    """Test only directories holding a molecule.yml count as scenarios.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    molecule_dir = tmp_path / "extensions" / "molecule"
+    _write(molecule_dir / "default" / "molecule.yml")
+    _write(molecule_dir / "other" / "converge.yml")
+    _write(molecule_dir / "config.yml")
+
+    assert ProjectIndex.scan(tmp_path).molecule_scenarios == ("default",)
+
+
+def test_scan_integration_pruned(tmp_path: Path) -> None:
+    """Test the pytest module walk skips venvs, fixtures and hidden trees.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    integration = tmp_path / "tests" / "integration"
+    _write(integration / ".venv" / "pyvenv.cfg")
+    _write(integration / ".venv" / "lib" / "test_hidden.py")
+    _write(integration / "venv" / "pyvenv.cfg")
+    _write(integration / "venv" / "test_venv.py")
+    _write(integration / "fixtures" / "test_fixture.py")
+    _write(integration / "__pycache__" / "test_cached.py")
+    _write(integration / "helpers.py")
+
+    assert not ProjectIndex.scan(tmp_path).has_integration_tests
+
+    _write(integration / "nested" / "deep" / "smoke_test.py")
+    _write(integration / "test_smoke.py")
+    index = ProjectIndex.scan(tmp_path)
+
+    assert index.integration_modules == (
+        "tests/integration/nested/deep/smoke_test.py",
+        "tests/integration/test_smoke.py",
+    )
+    assert index.has_integration_tests
+
+
+def test_scan_integration_targets_not_walked(tmp_path: Path) -> None:
+    """Test ansible-test targets are listed without walking into them.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    targets = tmp_path / "tests" / "integration" / "targets"
+    _write(targets / "smoke" / "files" / "test_payload.py")
+
+    index = ProjectIndex.scan(tmp_path)
+
+    assert index.integration_targets == ("smoke",)
+    assert not index.integration_modules
+    assert index.has_integration_tests
+
+
+def test_python_requirements_order(tmp_path: Path) -> None:
+    """Test the requirements follow the PYTHON_DEPENDENCY_FILES order.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    for req_file in reversed(PYTHON_DEPENDENCY_FILES):
+        _write(tmp_path / req_file, f"dep-{req_file}\n")
+
+    index = ProjectIndex.scan(tmp_path)
+
+    assert index.python_requirements.requirements == tuple(
+        (f"dep-{req_file}", req_file) for req_file in PYTHON_DEPENDENCY_FILES
+    )
+
+
+def test_conf_deps_uses_index(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test dependency files are read from the index rather than the disk.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    _write(tmp_path / "requirements.txt", "indexed-requirement")
+    index = ProjectIndex.scan(tmp_path)
+    assert index.python_requirements.requirements
+    (tmp_path / "requirements.txt").unlink()
+    monkeypatch.chdir(tmp_path)
+
+    for test_type in ("unit", "integration", "molecule"):
+        assert "indexed-requirement" in conf_deps(test_type=test_type, index=index)
+    assert "indexed-requirement" not in conf_deps(test_type="unit")
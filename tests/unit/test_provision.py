@@ -0,0 +1,162 @@
+"""Unit tests for the provisioning fingerprint."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, cast
+
+import pytest
+
+from tox_ansible.provision import (
+    PROVISION_PENDING,
+    PROVISION_STAMP,
+    env_depends,
+    is_provisioned,
+    provision_depends,
+    provision_fingerprint,
+    start_provision_only,
+    start_provisioning,
+)
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from tox.session.state import State
+
+
+def test_fingerprint_inputs(tmp_path: Path) -> None:
+    """Test every input of the provisioning changes the fingerprint.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    env_dir = tmp_path / "env"
+    env_dir.mkdir()
+    (env_dir / "pyvenv.cfg").write_text("version = 3.13.1\n")
+    (tmp_path / "galaxy.yml").write_text("name: test\n")
+    inputs: dict[str, Any] = {
+        "env_dir": env_dir,
+        "acv": "stable-2.19",
+        "deps": "pytest",
+        "commands": ["ade install -e ."],
+        "project_dir": tmp_path,
+        "files": ["galaxy.yml", "requirements.txt"],
+    }
+    fingerprint = provision_fingerprint(**inputs)
+
+    assert provision_fingerprint(**inputs) == fingerprint
+    assert provision_fingerprint(**{**inputs, "files": inputs["files"][::-1]}) == fingerprint
+    for key, value in (
+        ("acv", "file:///ansible_core-2.19.1-py3-none-any.whl"),
+        ("deps", "pytest\nrequests"),
+        ("commands", ["ade install ."]),
+        ("source", "0123abc"),
+    ):
+        assert provision_fingerprint(**{**inputs, key: value}) != fingerprint, key
+
+    (tmp_path / "requirements.txt").write_text("requests\n")
+    assert provision_fingerprint(**inputs) != fingerprint
+    (tmp_path / "requirements.txt").unlink()
+    (env_dir / "pyvenv.cfg").write_text("version = 3.13.2\n")
+    assert provision_fingerprint(**inputs) != fingerprint
+
+
+def test_fingerprint_portable(tmp_path: Path) -> None:
+    """Test an environment keeps its fingerprint in another work dir and project.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    fingerprints = set()
+    for name in ("a", "b"):
+        project_dir = tmp_path / name
+        env_dir = project_dir / ".tox" / "unit"
+        env_dir.mkdir(parents=True)
+        (env_dir / "pyvenv.cfg").write_text(f"command = python -m virtualenv {env_dir}\n")
+        (project_dir / "galaxy.yml").write_text("name: test\n")
+        fingerprints.add(
+            provision_fingerprint(
+                env_dir=env_dir,
+                acv=f"file://{project_dir}/.tox/.tox-ansible/core/ansible_core.whl",
+                deps="pytest",
+                commands=[f"ade install -e {project_dir}"],
+                project_dir=project_dir,
+                files=["galaxy.yml"],
+            ),
+        )
+
+    assert len(fingerprints) == 1
+
+
+def test_start_provisioning(tmp_path: Path) -> None:
+    """Test a new provisioning forgets the previous one until it is recorded.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    (tmp_path / PROVISION_STAMP).write_text("old")
+    assert is_provisioned(tmp_path, "old")
+
+    start_provisioning(tmp_path, "new")
+    assert not is_provisioned(tmp_path, "old")
+    assert (tmp_path / PROVISION_PENDING).read_text() == "new"
+
+    start_provisioning(tmp_path, None)
+    assert not (tmp_path / PROVISION_PENDING).exists()
+
+
+def test_provision_depends() -> None:
+    """Test the environments of a core wait for the first one."""
+    assert provision_depends(
+        [
+            "galaxy",
+            "integration-py3.13-2.19",
+            "integration-py3.13-devel",
+            "sanity-py3.12-2.19",
+            "unit-py3.13-2.19",
+            "unit-py3.13-devel",
+        ],
+    ) == {
+        "sanity-py3.12-2.19": ["integration-py3.13-2.19"],
+        "unit-py3.13-2.19": ["integration-py3.13-2.19"],
+        "unit-py3.13-devel": ["integration-py3.13-devel"],
+    }
+
+
+class _Selection(list[str]):
+    """Stand-in for the environments selected with ``-e``."""
+
+    is_all = False
+    is_default_list = False
+
+
+class _Session:
+    """Weak referenceable stand-in for a tox state."""
+
+    def __init__(self, **options: object) -> None:
+        """Initialize the state.
+
+        Args:
+            **options: The CLI options.
+        """
+        self.conf = SimpleNamespace(options=SimpleNamespace(**options))
+
+
+def test_start_provision_only() -> None:
+    """Test the selected environments are ordered by core, with tox run-parallel only."""
+    matrix = ["integration-py3.13-2.19", "sanity-py3.13-2.19", "unit-py3.13-2.19"]
+    selection = _Selection(["sanity-py3.13-2.19", "unit-py3.13-2.19"])
+    state = cast("State", _Session(command="p", parallel=2, env=selection))
+
+    assert env_depends(state, "unit-py3.13-2.19") == []
+    start_provision_only(state, matrix)
+
+    options = state.conf.options
+    assert (options.command, options.parallel) == ("p", 2)
+    assert env_depends(state, "unit-py3.13-2.19") == ["sanity-py3.13-2.19"]
+    assert env_depends(state, "sanity-py3.13-2.19") == []
+
+    for command in ("legacy", "run", "list"):
+        with pytest.raises(SystemExit, match="1"):
+            start_provision_only(cast("State", _Session(command=command, env=selection)), matrix)
@@ -0,0 +1,176 @@
+"""Unit tests for pruning the matrix with meta/runtime.yml requires_ansible."""
+
+from __future__ import annotations
+
+import io
+import logging
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from tox.config.cli.parse import Options
+from tox.config.cli.parser import Parsed
+from tox.config.source import discover_source
+from tox.report import ToxHandler
+from tox.session.state import State
+
+from tox_ansible.matrix import add_ansible_matrix, cores_outside_requires_ansible, main
+from tox_ansible.project import project_context, read_requires_ansible
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+CORES = ("2.16", "2.18", "2.19", "2.20", "2.21", "milestone", "devel")
+
+
+def _make_state(config_file: Path) -> State:
+    """Create a tox state.
+
+    Args:
+        config_file: The tox configuration file.
+
+    Returns:
+        The configured tox state.
+    """
+    source = discover_source(config_file, None)
+    parsed = Parsed(
+        work_dir=config_file.parent / ".tox",
+        override=[],
+        config_file=config_file,
+        root_dir=config_file.parent,
+        ansible=True,
+    )
+    output = io.BytesIO()
+    wrapper = io.TextIOWrapper(output, encoding="utf-8", line_buffering=True)
+    return State(
+        options=Options(
+            parsed=parsed,
+            pos_args="",
+            source=source,
+            cmd_handlers={},
+            log_handler=ToxHandler(level=0, is_colored=False, out_err=(wrapper, wrapper)),
+        ),
+        args=[],
+    )
+
+
+def _write_runtime(project_dir: Path, content: str) -> None:
+    """Write meta/runtime.yml.
+
+    Args:
+        project_dir: The project directory.
+        content: The file content.
+    """
+    (project_dir / "meta").mkdir(exist_ok=True)
+    (project_dir / "meta" / "runtime.yml").write_text(content)
+
+
+@pytest.mark.parametrize(
+    ("requires_ansible", "excluded"),
+    (
+        (">=2.16.0", []),
+        (">=2.17.0", ["2.16"]),
+        (">=2.20", ["2.16", "2.18", "2.19"]),
+        (">=2.19.3", ["2.16", "2.18"]),
+        ("<2.21", ["2.21", "milestone", "devel"]),
+        ("<2.22", ["milestone", "devel"]),
+        ("<=2.19", ["2.20", "2.21", "milestone", "devel"]),
+        (">=2.16,!=2.18.*", ["2.18"]),
+        (">2.19.2,<2.19.5", ["2.16", "2.18", "2.20", "2.21", "milestone", "devel"]),
+    ),
+)
+def test_cores_outside(requires_ansible: str, excluded: list[str]) -> None:
+    """Test a core series is kept when any of its releases is allowed.
+
+    Args:
+        requires_ansible: The specifier.
+        excluded: The expected excluded cores.
+    """
+    assert cores_outside_requires_ansible(requires_ansible, CORES) == excluded
+
+
+def test_cores_outside_invalid(caplog: pytest.LogCaptureFixture) -> None:
+    """Test an invalid specifier, or one naming no version, prunes nothing.
+
+    Args:
+        caplog: Pytest fixture.
+    """
+    assert not cores_outside_requires_ansible("2.16 or newer", CORES)
+    assert "Invalid requires_ansible '2.16 or newer'" in caplog.text
+    assert not cores_outside_requires_ansible("===2.16.0-custom", CORES)
+    assert "Invalid requires_ansible '===2.16.0-custom'" in caplog.text
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    (
+        ('requires_ansible: ">=2.16.0"\n', ">=2.16.0"),
+        ("plugin_routing: {}\n", None),
+        ("- not a mapping\n", None),
+        ("requires_ansible: 2.16\n", None),
+        ("requires_ansible: [\n", None),
+    ),
+)
+def test_read_requires_ansible(tmp_path: Path, content: str, expected: str | None) -> None:
+    """Test reading the specifier from meta/runtime.yml.
+
+    Args:
+        tmp_path: Pytest fixture.
+        content: The meta/runtime.yml content.
+        expected: The expected specifier.
+    """
+    assert read_requires_ansible(tmp_path) is None
+    _write_runtime(tmp_path, content)
+
+    assert read_requires_ansible(tmp_path) == expected
+
+
+def test_matrix_pruned_with_reason(
+    tmp_path: Path,
+    caplog: pytest.LogCaptureFixture,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Test old cores are dropped and the reason logged.
+
+    Args:
+        tmp_path: Pytest fixture.
+        caplog: Pytest fixture.
+        capsys: Pytest fixture.
+    """
+    config_file = tmp_path / "tox-ansible.ini"
+    config_file.write_text("[ansible]\ndownstream = true\n")
+    _write_runtime(tmp_path, 'requires_ansible: ">=2.20"\n')
+
+    with caplog.at_level(logging.WARNING):
+        env_list = add_ansible_matrix(_make_state(config_file))
+
+    assert "galaxy" in env_list.envs
+    assert "unit-py3.14-2.20" in env_list.envs
+    assert "unit-py3.14-devel" in env_list.envs
+    assert not [env for env in env_list.envs if env.endswith(("2.16", "2.18", "2.19"))]
+    assert (
+        "Skipping ansible-core 2.16, 2.18, 2.19 environments: outside requires_ansible"
+        " '>=2.20' of meta/runtime.yml"
+    ) in caplog.text
+
+    assert main(["--conf", str(config_file), "--matrix-scope", "unit"]) == 0
+    assert '"unit-py3.13-2.19"' not in capsys.readouterr().out
+
+
+def test_context_tracks_runtime(tmp_path: Path) -> None:
+    """Test the project context is rebuilt when meta/runtime.yml changes.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    config_file = tmp_path / "tox-ansible.ini"
+    config_file.write_text("[ansible]\n")
+    state = _make_state(config_file)
+
+    assert project_context(state).requires_ansible is None
+    _write_runtime(tmp_path, 'requires_ansible: ">=2.20"\n')
+
+    assert project_context(state).requires_ansible == ">=2.20"
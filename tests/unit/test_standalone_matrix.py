@@ -0,0 +1,354 @@
+"""Unit tests for the tox-free matrix generator."""
+
+from __future__ import annotations
+
+import io
+import json
+import subprocess
+import sys
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from tox.config.cli.parse import Options
+from tox.config.cli.parser import Parsed
+from tox.config.loader.str_convert import StrConvert
+from tox.config.main import Config
+from tox.config.source import discover_source
+from tox.report import ToxHandler
+from tox.session.state import State
+from tox.tox_env.python import api
+
+from tox_ansible import core_cache, matrix
+from tox_ansible.project import AnsibleConfiguration, load_project_config, read_work_dir
+
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+PROJECTS = {
+    "ini": {
+        "tox-ansible.ini": "[ansible]\nskip =\n    devel\n    py3.11\nmolecule = false\n",
+    },
+    "pyproject": {
+        "pyproject.toml": (
+            '[tool.tox]\nenv_list = []\n[tool.tox-ansible]\ndownstream = true\nskip = ["2.20"]\n'
+        ),
+        "tests/integration/test_smoke.py": "",
+        "extensions/molecule/default/molecule.yml": "",
+    },
+}
+
+
+def _make_project(tmp_path: Path, files: dict[str, str]) -> Path:
+    """Write a project and return its tox configuration file.
+
+    Args:
+        tmp_path: The project directory.
+        files: The file contents by relative path.
+
+    Returns:
+        The tox configuration file.
+    """
+    for rel_path, content in files.items():
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return tmp_path / next(iter(files))
+
+
+def _make_state(config_file: Path, scope: str) -> State:
+    """Create a tox state.
+
+    Args:
+        config_file: The tox configuration file.
+        scope: The matrix scope.
+
+    Returns:
+        The configured tox state.
+    """
+    source = discover_source(config_file, None)
+    parsed = Parsed(
+        work_dir=config_file.parent / ".tox",
+        override=[],
+        config_file=config_file,
+        root_dir=config_file.parent,
+        ansible=True,
+        matrix_scope=scope,
+    )
+    output = io.BytesIO()
+    wrapper = io.TextIOWrapper(output, encoding="utf-8", line_buffering=True)
+    return State(
+        options=Options(
+            parsed=parsed,
+            pos_args="",
+            source=source,
+            cmd_handlers={},
+            log_handler=ToxHandler(level=0, is_colored=False, out_err=(wrapper, wrapper)),
+        ),
+        args=[],
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    (
+        matrix.ENV_LIST,
+        matrix.DOWNSTREAM_EXTRA,
+        "a, {b,c}-d\n\n  {x}-{y, z}, e\na",
+    ),
+)
+def test_expand_env_list_matches_tox(value: str) -> None:
+    """Test the expansion matches the tox env_list conversion.
+
+    Args:
+        value: The env_list value.
+    """
+    assert matrix.expand_env_list(value) == StrConvert().to_env_list(value).envs
+
+
+@pytest.mark.parametrize(
+    "factor",
+    ("py3.11", "py311", "py3", "py", "pypy3.10", "cpython3.12", "foo", "2.19", "devel", "py1"),
+)
+def test_py_factors_re_matches_tox(factor: str) -> None:
+    """Test the python factor pattern agrees with tox.
+
+    Args:
+        factor: The environment factor.
+    """
+    ours = matrix.PY_FACTORS_RE.match(factor)
+    theirs = api.PY_FACTORS_RE.match(factor)
+
+    assert (ours and ours["version"]) == (theirs and theirs["version"])
+
+
+def test_import_without_tox() -> None:
+    """Test the matrix module imports no tox module."""
+    code = (
+        "import sys\n"
+        "import tox_ansible.matrix\n"
+        "print([m for m in sys.modules if m == 'tox' or m.startswith('tox.')])\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    assert proc.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize("project", PROJECTS)
+@pytest.mark.parametrize("scope", ("all", "unit", "galaxy"))
+def test_main_matches_plugin(
+    project: str,
+    scope: str,
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the standalone output is identical to the plugin's.
+
+    Args:
+        project: The project layout.
+        scope: The matrix scope.
+        tmp_path: Pytest fixture.
+        capsys: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.delenv("GITHUB_ACTIONS", raising=False)
+    monkeypatch.delenv("GITHUB_OUTPUT", raising=False)
+    config_file = _make_project(tmp_path, PROJECTS[project])
+
+    env_list = matrix.add_ansible_matrix(_make_state(config_file, scope), scope=scope)
+    matrix.generate_gh_matrix(env_list=env_list, section=scope)
+    expected = capsys.readouterr().out
+
+    assert matrix.main(["--conf", str(config_file), "--matrix-scope", scope]) == 0
+    assert capsys.readouterr().out == expected
+    assert json.loads(expected)
+
+
+def test_main_pins_moving_cores(
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test devel and milestone entries carry the commit they resolved to.
+
+    Args:
+        tmp_path: Pytest fixture.
+        capsys: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.delenv("GITHUB_ACTIONS", raising=False)
+    monkeypatch.delenv("GITHUB_OUTPUT", raising=False)
+    monkeypatch.setenv("TOX_ANSIBLE_CORE_REVISIONS", "devel=0123456789abcdef")
+    config_file = _make_project(tmp_path, {"tox-ansible.ini": "[ansible]\nmolecule = false\n"})
+    monkeypatch.setattr(core_cache, "resolve_revision", pytest.fail)
+
+    assert matrix.main(["--conf", str(config_file), "--matrix-scope", "unit"]) == 0
+    entries = json.loads(capsys.readouterr().out)
+
+    pinned = [entry for entry in entries if "ansible_core_revision" in entry]
+    assert pinned
+    for entry in pinned:
+        assert entry["factors"][-1] == "devel"
+        assert entry["ansible_core_revision"] == "0123456789abcdef"
+        assert "ansible-core devel (0123456789ab) and" in entry["description"]
+    assert all(entry["factors"][-1] != "devel" for entry in entries if entry not in pinned)
+    # The milestone branch is only resolved with --pin-revisions.
+    assert not any(entry["factors"][-1] == "milestone" for entry in pinned)
+
+    resolved: list[str] = []
+    monkeypatch.setattr(matrix, "cache_available", lambda: True)
+    monkeypatch.setattr(
+        core_cache,
+        "resolve_revision",
+        lambda _, ref: resolved.append(ref) or "fedcba9876543210",
+    )
+    args = ["--conf", str(config_file), "--matrix-scope", "unit", "--pin-revisions"]
+    assert matrix.main(args) == 0
+    entries = json.loads(capsys.readouterr().out)
+    assert resolved == ["milestone"]
+    assert {
+        entry["factors"][-1]: entry["ansible_core_revision"]
+        for entry in entries
+        if "ansible_core_revision" in entry
+    } == {"devel": "0123456789abcdef", "milestone": "fedcba9876543210"}
+
+
+@pytest.mark.parametrize(
+    ("name", "content"),
+    (
+        ("tox.ini", "[tox]\nwork_dir = {toxinidir}/build/tox\n"),
+        ("tox-ansible.ini", "[tox]\ntoxworkdir = out\n[ansible]\n"),
+        ("setup.cfg", "[tox:tox]\nwork_dir = cfg\n"),
+        ("pyproject.toml", '[tool.tox]\nwork_dir = "toml"\n'),
+        ("pyproject.toml", '[tool.tox]\nlegacy_tox_ini = """\n[tox]\nwork_dir = legacy\n"""\n'),
+        ("tox.toml", 'work_dir = "{tox_root}/toml"\n'),
+        ("tox-ansible.ini", "[ansible]\n"),
+    ),
+)
+def test_work_dir_matches_tox(name: str, content: str, tmp_path: Path) -> None:
+    """Test the work dir is read from the configuration file as tox reads it.
+
+    Args:
+        name: The configuration file name.
+        content: The configuration file content.
+        tmp_path: Pytest fixture.
+    """
+    config_file = _make_project(tmp_path, {name: content})
+    parsed = Parsed(work_dir=None, override=[], config_file=config_file, root_dir=None)
+    config = Config.make(
+        parsed=parsed,
+        pos_args=[],
+        source=discover_source(config_file, None),
+        extra_envs=[],
+    )
+
+    assert read_work_dir(config_file) == config.core["work_dir"]
+
+
+def test_main_work_dir(
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the commits are recorded in the work dir tox uses, or the one given.
+
+    Args:
+        tmp_path: Pytest fixture.
+        capsys: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    monkeypatch.delenv("GITHUB_ACTIONS", raising=False)
+    monkeypatch.delenv("GITHUB_OUTPUT", raising=False)
+    monkeypatch.setattr(matrix, "cache_available", lambda: True)
+    monkeypatch.setattr(core_cache, "resolve_revision", lambda *_: "0123456789abcdef")
+    config_file = _make_project(
+        tmp_path,
+        {"tox-ansible.ini": "[tox]\nwork_dir = {toxinidir}/build\n[ansible]\nmolecule = false\n"},
+    )
+    args = ["--conf", str(config_file), "--matrix-scope", "unit", "--pin-revisions"]
+
+    assert matrix.main(args) == 0
+    assert (tmp_path / "build" / ".tox-ansible" / "cores" / core_cache.REVISIONS_FILE).is_file()
+    assert not (tmp_path / ".tox").exists()
+
+    assert matrix.main([*args, "--workdir", str(tmp_path / "other")]) == 0
+    assert (tmp_path / "other" / ".tox-ansible" / "cores" / core_cache.REVISIONS_FILE).is_file()
+    capsys.readouterr()
+
+
+def test_main_github_output(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the standalone generator appends the matrix to GITHUB_OUTPUT.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    config_file = _make_project(tmp_path, PROJECTS["ini"])
+    gh_output = tmp_path / "github_output"
+    monkeypatch.setenv("GITHUB_OUTPUT", str(gh_output))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "tox.ini").write_text("[ansible]\nskip = devel, py3.11\nmolecule = false\n")
+
+    assert matrix.main([]) == 0
+    from_cwd = gh_output.read_text()
+    gh_output.unlink()
+    assert matrix.main(["-c", str(config_file)]) == 0
+
+    assert from_cwd.startswith("envlist=")
+    assert gh_output.read_text() == from_cwd
+
+
+def test_main_missing_config(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    """Test a missing configuration file is reported.
+
+    Args:
+        tmp_path: Pytest fixture.
+        caplog: Pytest fixture.
+    """
+    assert matrix.main(["--conf", str(tmp_path / "missing.ini")]) == 1
+    assert "missing.ini does not exist" in caplog.text
+
+
+def test_find_config_file(tmp_path: Path) -> None:
+    """Test configuration files are discovered in the tox order.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    assert matrix.find_config_file(tmp_path) == tmp_path / "tox.ini"
+    (tmp_path / "tox.toml").write_text("")
+    assert matrix.find_config_file(tmp_path) == tmp_path / "tox.toml"
+    (tmp_path / "setup.cfg").write_text("")
+    assert matrix.find_config_file(tmp_path) == tmp_path / "setup.cfg"
+
+
+def test_load_project_config(tmp_path: Path) -> None:
+    """Test the INI configuration is read without tox.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    config_file = tmp_path / "tox-ansible.ini"
+    config_file.write_text(
+        "[ansible]\ncoverage = yes\nskip = devel, 2.19\nmolecule_append =\n    --workers\n    4\n",
+    )
+
+    assert load_project_config(config_file) == (
+        None,
+        AnsibleConfiguration(
+            coverage=True,
+            skip=["devel", "2.19"],
+            molecule_append=["--workers", "4"],
+        ),
+    )
+    assert load_project_config(tmp_path / "tox.toml") == (None, AnsibleConfiguration())
+    assert load_project_config(tmp_path / "tox.ini") == (None, AnsibleConfiguration())
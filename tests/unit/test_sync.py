@@ -0,0 +1,165 @@
+"""Unit tests for the incremental sync of the installed collection."""
+
+from __future__ import annotations
+
+import json
+import tarfile
+
+from pathlib import Path
+
+import pytest
+
+from tox_ansible import sync
+from tox_ansible.artifact import build_collection
+from tox_ansible.project import Collection, get_collection
+from tox_ansible.sync import sync_collection
+
+
+GALAXY_YML = """\
+namespace: ns
+name: coll
+version: 1.0.0
+readme: README.md
+authors:
+  - Someone
+build_ignore:
+  - docs
+"""
+
+
+def _make_collection(project_dir: Path) -> Collection:
+    """Lay out a small collection.
+
+    Args:
+        project_dir: The collection root directory.
+
+    Returns:
+        The collection info.
+    """
+    (project_dir / "galaxy.yml").write_text(GALAXY_YML)
+    for rel_path in (
+        "README.md",
+        "plugins/modules/mod.py",
+        "plugins/modules/old.py",
+        "plugins/filter/old.py",
+        "tests/unit/test_mod.py",
+    ):
+        path = project_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(rel_path)
+    (project_dir / "plugins" / "modules" / "alias.py").symlink_to("mod.py")
+    return get_collection(project_dir / "galaxy.yml")
+
+
+def _install(project_dir: Path, collection: Collection, install_dir: Path) -> None:
+    """Install the collection tarball, as ade does for sanity.
+
+    Args:
+        project_dir: The collection root directory.
+        collection: The collection info.
+        install_dir: The installed collection directory.
+    """
+    build_dir = project_dir.parent / "build"
+    build_dir.mkdir()
+    with tarfile.open(build_collection(project_dir, build_dir, collection)) as tar:
+        tar.extractall(install_dir, filter="tar")
+
+
+def _files_json(project_dir: Path, collection: Collection, build_dir: Path) -> str:
+    """Build the collection again and read its FILES.json.
+
+    Args:
+        project_dir: The collection root directory.
+        collection: The collection info.
+        build_dir: The directory receiving the tarball.
+
+    Returns:
+        The FILES.json content of a fresh build.
+    """
+    build_dir.mkdir()
+    with tarfile.open(build_collection(project_dir, build_dir, collection)) as tar:
+        fileh = tar.extractfile("FILES.json")
+        assert fileh is not None
+        return fileh.read().decode()
+
+
+@pytest.fixture(name="installed")
+def fixture_installed(tmp_path: Path) -> tuple[Path, Collection, Path]:
+    """Lay out a collection and install it.
+
+    Args:
+        tmp_path: Pytest fixture.
+
+    Returns:
+        The collection root directory, the collection info and the installed directory.
+    """
+    project_dir = tmp_path / "project"
+    project_dir.mkdir()
+    collection = _make_collection(project_dir)
+    install_dir = tmp_path / "site-packages" / "ansible_collections" / "ns" / "coll"
+    _install(project_dir, collection, install_dir)
+    return project_dir, collection, install_dir
+
+
+def test_sync_matches_install(
+    installed: tuple[Path, Collection, Path],
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Test the synced copy holds what an installation of the sources would.
+
+    Args:
+        installed: The installed collection.
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    project_dir, collection, install_dir = installed
+    (install_dir / "tests" / "output").mkdir()
+    (install_dir / "tests" / "output" / "junit.xml").write_text("results")
+    (project_dir / "plugins" / "modules" / "mod.py").write_text("changed")
+    (project_dir / "plugins" / "modules" / "mod.py").chmod(0o755)
+    (project_dir / "plugins" / "modules" / "new.py").write_text("new")
+    (project_dir / "plugins" / "modules" / "old.py").unlink()
+    (project_dir / "plugins" / "filter" / "old.py").unlink()
+    (project_dir / "plugins" / "filter").rmdir()
+    (project_dir / "docs").mkdir()
+    (project_dir / "docs" / "notes.txt").write_text("ignored")
+
+    assert sync_collection(project_dir, collection, install_dir)
+
+    modules = install_dir / "plugins" / "modules"
+    assert (modules / "mod.py").read_text() == "changed"
+    assert (modules / "mod.py").stat().st_mode & 0o777 == 0o755  # noqa: PLR2004
+    assert (modules / "new.py").read_text() == "new"
+    assert (modules / "alias.py").readlink() == Path("mod.py")
+    assert not (modules / "old.py").exists()
+    assert not (install_dir / "plugins" / "filter").exists()
+    assert not (install_dir / "docs").exists()
+    assert (install_dir / "tests" / "output" / "junit.xml").read_text() == "results"
+    files_json = (install_dir / "FILES.json").read_text()
+    assert files_json == _files_json(project_dir, collection, tmp_path / "fresh")
+    manifest = json.loads((install_dir / "MANIFEST.json").read_text())
+    assert manifest["collection_info"]["name"] == "coll"
+
+    hashed: list[Path] = []
+    file_digest = sync._file_digest
+    monkeypatch.setattr(sync, "_file_digest", lambda path: hashed.append(path) or file_digest(path))
+    assert sync_collection(project_dir, collection, install_dir)
+    assert hashed == [project_dir / "plugins" / "modules" / "alias.py"]
+    assert (install_dir / "FILES.json").read_text() == files_json
+
+
+def test_sync_unavailable(installed: tuple[Path, Collection, Path]) -> None:
+    """Test a collection is installed again when its copy cannot be synced.
+
+    Args:
+        installed: The installed collection.
+    """
+    project_dir, collection, install_dir = installed
+    manifest = Collection(name="coll", namespace="ns", version="1.0.0", manifest={})
+
+    assert not sync_collection(project_dir, manifest, install_dir)
+    (install_dir / "FILES.json").write_text("not json")
+    assert not sync_collection(project_dir, collection, install_dir)
+    (install_dir / "FILES.json").unlink()
+    assert not sync_collection(project_dir, collection, install_dir)
@@ -0,0 +1,167 @@
+"""Unit tests for the local wheelhouse."""
+
+from __future__ import annotations
+
+import sys
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, cast
+
+import pytest
+
+from tox_ansible import wheelhouse
+from tox_ansible.project import ProjectIndex
+from tox_ansible.wheelhouse import (
+    WHEELHOUSE_BUILD,
+    WHEELHOUSE_USE,
+    active_wheelhouse,
+    build_wheels,
+    index_env,
+    no_index_args,
+    wheelhouse_dir,
+    wheelhouse_requirements,
+)
+
+from .test_dependencies import _wheel
+
+
+if TYPE_CHECKING:
+    from tox.session.state import State
+
+
+class _Selection(list[str]):
+    """Stand-in for the environments selected with ``-e``."""
+
+    is_all = False
+    is_default_list = False
+
+
+def _state(work_dir: Path, **options: object) -> State:
+    """Build a stand-in for a tox state.
+
+    Args:
+        work_dir: The tox work dir.
+        **options: The CLI options.
+
+    Returns:
+        The state.
+    """
+    return cast(
+        "State",
+        SimpleNamespace(
+            conf=SimpleNamespace(
+                core={"work_dir": work_dir},
+                options=SimpleNamespace(**options),
+            ),
+        ),
+    )
+
+
+def test_index_args(tmp_path: Path) -> None:
+    """Test pip and uv are pointed at the wheelhouse alone.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    assert no_index_args(None) == []
+    assert no_index_args(tmp_path) == ["--no-index", "--find-links", str(tmp_path)]
+    assert index_env(tmp_path) == {
+        "PIP_NO_INDEX": "1",
+        "PIP_FIND_LINKS": str(tmp_path),
+        "UV_NO_INDEX": "1",
+        "UV_FIND_LINKS": str(tmp_path),
+    }
+
+
+def test_active_wheelhouse(tmp_path: Path) -> None:
+    """Test the wheelhouse is used when asked, or offline once it exists.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    work_dir = tmp_path / ".tox"
+    assert active_wheelhouse(_state(work_dir, ansible_wheelhouse=None)) is None
+    assert active_wheelhouse(_state(work_dir, ansible_offline=True)) is None
+    with pytest.raises(SystemExit, match="1"):
+        active_wheelhouse(_state(work_dir, ansible_wheelhouse=WHEELHOUSE_USE))
+
+    wheelhouse_dir(work_dir).mkdir(parents=True)
+    expected = work_dir / ".tox-ansible" / "wheelhouse"
+    assert active_wheelhouse(_state(work_dir, ansible_wheelhouse=WHEELHOUSE_USE)) == expected
+    assert active_wheelhouse(_state(work_dir, ansible_offline=True)) == expected
+    assert active_wheelhouse(_state(work_dir, ansible_wheelhouse=WHEELHOUSE_BUILD)) is None
+
+
+def test_requirements_by_python(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the packages of the environments are grouped by python factor.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    (tmp_path / "requirements.txt").write_text("jmespath\n")
+    context = SimpleNamespace(index=ProjectIndex.scan(tmp_path))
+    monkeypatch.setattr("tox_ansible.project.project_context", lambda _: context)
+    monkeypatch.setattr("tox_ansible.core_cache.cache_available", lambda: False)
+
+    found = wheelhouse_requirements(
+        _state(tmp_path / ".tox"),
+        ["unit-py3.13-2.19", "sanity-py3.12-devel", "galaxy", "lint"],
+    )
+
+    default_python = f"py{sys.version_info[0]}.{sys.version_info[1]}"
+    assert sorted(found) == sorted({"py3.12", "py3.13", default_python})
+    assert "jmespath" in found["py3.13"]
+    assert any(line.startswith("molecule") for line in found["py3.13"])
+    assert not any(line.startswith("ansible-core") for line in found["py3.13"])
+    assert found["py3.12"] == ["ansible-dev-environment>=26.2.0"]
+    assert any(line.startswith("galaxy-importer") for line in found[default_python])
+
+
+def test_build_wheels(tmp_path: Path) -> None:
+    """Test the wheels of the requirements and their dependencies are collected.
+
+    Args:
+        tmp_path: Pytest fixture.
+    """
+    wheels = tmp_path / "wheels"
+    _wheel(wheels, "top", "1.0.0", "dep>=1")
+    _wheel(wheels, "dep", "1.1.0")
+    target = tmp_path / "wheelhouse"
+
+    build_wheels(Path(sys.executable), ["--no-index", f"--find-links {wheels}", "top"], target)
+
+    assert sorted(path.name for path in target.iterdir()) == [
+        "dep-1.1.0-py3-none-any.whl",
+        "top-1.0.0-py3-none-any.whl",
+    ]
+    with pytest.raises(SystemExit, match="1"):
+        build_wheels(Path(sys.executable), ["--no-index", "missing"], target)
+
+
+def test_build_skips_missing_python(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the wheels of the pythons not installed are skipped.
+
+    Args:
+        tmp_path: Pytest fixture.
+        monkeypatch: Pytest fixture.
+    """
+    built: list[str] = []
+    monkeypatch.setattr(
+        wheelhouse,
+        "wheelhouse_requirements",
+        lambda _, names: {"py3.99": ["top"], "py3.13": list(names)},
+    )
+    monkeypatch.setattr(
+        wheelhouse,
+        "find_python",
+        lambda python: None if python == "py3.99" else Path(sys.executable),
+    )
+    monkeypatch.setattr(wheelhouse, "build_wheels", lambda _, reqs, __: built.extend(reqs))
+    state = _state(tmp_path / ".tox", env=_Selection(["unit-py3.13-2.19"]))
+
+    wheelhouse.build_wheelhouse(state, ["unit-py3.13-2.19", "sanity-py3.13-2.19"])
+
+    assert built == ["unit-py3.13-2.19"]
+    assert wheelhouse_dir(tmp_path / ".tox").is_dir()